@@ -1,9 +1,25 @@
-import time
 import threading
 import sys
-from gpiozero import LED, Servo
-from celda_carga import CeldaDeCarga  # Nuestra clase V22
+from hardware import obtener_backend
+from celda_carga import CeldaDeCarga, fijar_velocidad_hx711  # Nuestra clase V22
 from sensor_nfc import SensorNFC
+from muestreo_celdas import MotorDeMuestreo
+from motor_ocupacion import MotorDeOcupacion
+from estado_ocupacion import AlmacenDeEstados
+from barrera import ControladorBarrera, ABRIENDO, ABIERTA, CERRANDO, CERRADA
+from runtime_async import RuntimeAsync
+from recursos import GestorDeRecursos
+from grupo_celdas import GrupoDeCeldas
+from dos_canales import HX711DosCanales
+from adquisicion_proceso import AdquisicionEnProceso
+from calibracion import AlmacenDeCalibracion, RetaraEnSegundoPlano
+from planificador_muestreo import PlanificadorDeMuestreo
+from presencia_nfc import PresenciaDeTarjetas
+import bitacora as bitacora_eventos
+from agregador import EnlaceAgregador
+from api_ocupacion import ApiOcupacion
+from trazas import GrabadoraDeMuestras
+import metricas
 
 # --- 1. CONFIGURACIÓN DE HARDWARE ---
 
@@ -13,6 +29,7 @@ PINES_CELDA_2 = {'dt': 5,  'sck': 6}
 PINES_CELDA_3 = {'dt': 13, 'sck': 19}
 
 # Factores de Escala
+# (Por defecto: si calibracion.json tiene el factor de la celda, manda ese)
 FACTOR_CELDA_1 = 215.23999999999901
 FACTOR_CELDA_2 = 92.57142857142857
 FACTOR_CELDA_3 = 33.268571428572095
@@ -29,130 +46,389 @@ PIN_LED_2 = 23
 PIN_LED_3 = 24
 PIN_SERVO = 4 
 
+# --- NUEVO (V32): Barrera sin bloqueo ---
+TIEMPO_BARRERA_ABIERTA = 10.0 # Se extiende si llega otra tarjeta válida
+TIEMPO_MOVIMIENTO_SERVO = 0.3 # Lo que tarda el MG90S en llegar
+
+# --- NUEVO (V33): Runtime asyncio opcional ---
+# Todo (NFC, celdas, barrera, LEDs) en un solo event loop; las lecturas que
+# bloquean van a un pool de HILOS_RUNTIME hilos. También con: Main.py --asyncio
+RUNTIME_ASYNC = False
+HILOS_RUNTIME = 4
+
+# --- NUEVO (V36): Lectura en grupo de los HX711 ---
+# True = los SCK se mueven juntos y los tres DT se leen con un solo
+# group_read por bit (una trama para las tres celdas).
+LECTURA_EN_GRUPO = False
+
+# --- NUEVO (V37): Adquisición del HX711 en otro proceso ---
+# True = el bit-banging corre en un proceso aparte (sin competir por el GIL)
+# y publica las muestras en memoria compartida. NUCLEO_ADQUISICION fija ese
+# proceso a un núcleo (ej. 3 en la Pi 4); None = el que elija el sistema.
+ADQUISICION_EN_PROCESO = False
+NUCLEO_ADQUISICION = None
+
+# --- NUEVO (V38): Calibración guardada ---
+# calibrar_celda.py guarda el factor de cada celda (por par de pines) y aquí
+# se guardan los offsets de tara. Al arrancar se usa el offset guardado si no
+# es más viejo que EDAD_MAXIMA_OFFSET y se revisa en segundo plano (cuando el
+# cajón está vacío) en vez de tarar las tres celdas antes de abrir la puerta.
+ARCHIVO_CALIBRACION = "calibracion.json"
+EDAD_MAXIMA_OFFSET = 7 * 24 * 3600 # Segundos
+INTERVALO_RETARA = 60.0            # Reintento si el cajón estaba ocupado
+
+# --- NUEVO (V39): Corrección de deriva del offset ---
+# Mientras la celda lee vacío (menos de UMBRAL_PARA_LIBERAR, con signo) el
+# offset sigue a las muestras con una EMA lenta (alfa), así la temperatura no
+# vuelve OCUPADO un cajón vacío. 'ventana' (s) es cada cuánto se mide la tasa
+# (g/h) que se exporta en /metrics. None = offset fijo como antes.
+DERIVA = {'alfa': 0.002, 'banda_gramos': UMBRAL_PARA_LIBERAR, 'estables': 20, 'ventana': 300.0}
+
+# --- NUEVO (V35): Métricas (histogramas de latencia + contadores) ---
+# False = apagadas por completo (sin medir y sin servidor HTTP).
+# PUERTO_METRICAS = None para medir sin exportar.
+METRICAS_ACTIVAS = True
+PUERTO_METRICAS = 9108 # GET http://<pi>:9108/metrics (formato Prometheus)
+
+# --- NUEVO (V26): Muestreo concurrente ---
+HILOS_MUESTREO = None  # None = un hilo por celda; un entero = tamaño del pool
+PAUSA_MUESTREO = 0.0   # Pausa (s) entre vueltas de cada carril
+
+# --- NUEVO (V40): Muestreo adaptativo ---
+# Cada cajón se lee según su urgencia (varianza reciente, cercanía a los
+# umbrales, tiempo desde su último cambio): entre periodo_min y periodo_max
+# segundos. Un coche estacionado hace horas se lee cada 2 s; uno que está
+# entrando, lo más rápido que da el HX711. None = leer todas sin parar.
+MUESTREO_ADAPTATIVO = {'periodo_min': 0.1, 'periodo_max': 2.0, 'ruido': 5.0, 'margen': 15.0, 'reciente': 30.0}
+# Al abrir la barrera, estos cajones (índices; None = todos) se leen rápido
+# durante IMPULSO_BARRERA segundos: un coche va hacia ellos.
+CAJONES_CERCA_DE_LA_BARRERA = None
+IMPULSO_BARRERA = 20.0
+
+# --- NUEVO (V41): Lista blanca de UIDs en un índice binario ---
+# valid_uids.txt se compila a valid_uids.idx (tabla hash sobre mmap,
+# sin convertir el UID a texto). Si el .txt cambia (registrar_tarjeta.py) o
+# llega un .idx nuevo, se recarga en caliente cada INTERVALO_LISTA_UIDS s.
+ARCHIVO_UIDS = "valid_uids.txt"
+INDICE_UIDS = "valid_uids.idx"
+INTERVALO_LISTA_UIDS = 2.0
+
+# --- NUEVO (V42): Presencia de tarjetas (adiós al sleep(3) tras cada toque) ---
+# Una tarjeta que se queda en el lector se procesa una sola vez; vuelve a
+# contar cuando se retira al menos TTL_PRESENCIA_TARJETA segundos. Una
+# tarjeta distinta se procesa en la siguiente vuelta del lector.
+TTL_PRESENCIA_TARJETA = 1.0
+MAX_TARJETAS_PRESENTES = 32
+
+# --- NUEVO (V43): Detección de tarjetas por la línea IRQ del PN532 ---
+# Con el pin IRQ del PN532 conectado a este GPIO, el lector se arma una vez
+# y el UID solo se pide cuando la línea baja: sin tarjeta no hay tráfico
+# I2C ni la pausa de 0.1 s entre consultas. None = consultar como antes
+# (read_passive_target + pausa), p. ej. si el IRQ no está cableado.
+PIN_IRQ_NFC = None
+
+# --- NUEVO (V44): Bitácora de eventos (sobrevive a un corte de luz) ---
+# Accesos y cambios de cajón en registros binarios de 32 bytes. Un hilo los
+# escribe por lotes: un write + un fsync cada INTERVALO s (o cada 'lote'
+# registros), así la puerta nunca espera a la SD. Al arrancar, el estado de
+# los cajones sale de la bitácora. None = sin bitácora.
+# Ver la bitácora:  python3 bitacora.py bitacora
+CARPETA_BITACORA = "bitacora"
+BITACORA = {'intervalo': 0.2, 'lote': 64, 'fsync': True,
+            'tamano_segmento': 1 << 20, 'segmentos_max': 16}
+
+# --- NUEVO (V46): Agregador de ocupación (varios Pis en un edificio) ---
+# Cada cambio de cajón se manda (binario, por UDP, por lotes) al agregador
+# del edificio:  python3 agregador.py   en cualquier equipo de la red.
+# Con CAPACIDAD_GLOBAL, si aquí está lleno la barrera abre cuando el
+# agregador dice que hay lugar en otro nodo, siempre que su respuesta no
+# tenga más de EDAD_MAXIMA_CAPACIDAD s. None = este nodo trabaja solo.
+AGREGADOR = None # p. ej. ("192.168.1.10", 9200)
+NODO = 1         # Número de este nodo en el edificio (único)
+CAPACIDAD_GLOBAL = True
+EDAD_MAXIMA_CAPACIDAD = 2.0
+ENLACE_AGREGADOR = {'intervalo': 0.05, 'intervalo_completo': 5.0, 'intervalo_consulta': 0.5}
+
+# --- NUEVO (V47): API de ocupación (solo lectura) ---
+# Para pantallas y apps, desde su propio hilo (asyncio):
+#   GET http://<pi>:8080/ocupacion           JSON con ETag (If-None-Match -> 304)
+#   GET /ocupacion/esperar?version=N         contesta cuando haya otra versión (long-poll)
+#   GET /ocupacion/eventos                   Server-Sent Events
+# El JSON se arma solo cuando cambia un cajón. None = sin API.
+PUERTO_API = 8080
+
+# --- NUEVO (V48): Grabación de muestras crudas (para afinar sin el lote) ---
+# Cada muestra del HX711 (celda, t monotónico, valor de 24 bits) se graba
+# en CARPETA_TRAZAS (registros de 16 bytes en segmentos preasignados y
+# mapeados en memoria; ~330 MB por día con 3 celdas a 80 SPS). Después:
+#   python3 repeticion.py trazas    (prueba umbrales y filtros en segundos)
+# None = sin grabar.
+CARPETA_TRAZAS = None
+TRAZAS = {'tamano_segmento': 16 << 20, 'segmentos_max': 64}
+
+# --- NUEVO (V49): Canal, ganancia y velocidad del HX711 ---
+# GANANCIA_HX711: 128 (como siempre) o 64 (el doble de rango), canal A.
+# SPS_HX711: 10 u 80, según el pin RATE de los módulos. Si RATE está
+# cableado a un GPIO (uno solo alcanza para todos), PIN_RATE_HX711 lo fija.
+# DOS_CANALES: los cajones 1 y 2 en UN HX711 (el de PINES_CELDA_1), el 1
+# en el canal A y el 2 en el canal B (ganancia 32), alternando ráfagas de
+# 'rafaga' muestras; PINES_CELDA_2 queda libre. Conviene a 80 SPS (ver
+# HX711DosCanales). La celda del canal B se calibra con:
+#   python3 calibrar_celda.py 1 32
+# None = un HX711 por cajón. Ni DOS_CANALES ni la ganancia 64 se combinan
+# con LECTURA_EN_GRUPO ni con ADQUISICION_EN_PROCESO: Main no arranca.
+GANANCIA_HX711 = 128
+SPS_HX711 = 10
+PIN_RATE_HX711 = None
+DOS_CANALES = None # Ej.: {'rafaga': 8}
+
+# --- NUEVO (V29): Filtro por muestra ---
+# Cada lectura del HX711 da un peso nuevo (mediana móvil + EMA + rechazo de
+# picos) en lugar de promediar 5. None = volver al promedio de 5 lecturas.
+FILTRO_PESO = {'ventana_mediana': 5, 'alfa_ema': 0.5, 'umbral_atipico': 200.0}
+
+# --- NUEVO (V30): Histéresis vectorizada (NumPy) ---
+# Para lotes grandes: los carriles solo guardan el peso y un 'tick' evalúa
+# todos los cajones juntos con MotorDeOcupacion. Con 3 cajones no hace falta.
+OCUPACION_VECTORIAL = False
+TICK_OCUPACION = 0.05 # Segundos entre ticks
+
 # --- 2. VARIABLES GLOBALES COMPARTIDAS ---
 
-estado_cajones = ['LIBRE', 'LIBRE', 'LIBRE']
-lock_estado = threading.Lock()
-gpio_lock = threading.Lock()
+# --- MODIFICADO (V31): Estado compacto (un byte por cajón) ---
+# El almacén lleva su propio candado de escritura y un contador de libres,
+# así que consultar la capacidad no copia nada ni toma candados.
+estado_cajones = AlmacenDeEstados(3)
+
+# --- MODIFICADO (V34): Un candado por dispositivo (adiós gpio_lock) ---
+# Cada celda (par DT/SCK), cada LED y el servo tienen su propio candado; el
+# servo se pide con prioridad alta. recursos.reporte() dice cuánto se esperó.
+recursos = GestorDeRecursos()
+
+# --- NUEVO (V27): Backend de hardware (real o simulado) ---
+# Se elige en el bloque de inicio (PARKPI_BACKEND=simulado para correr sin la Pi).
+hw = None
+
+# --- NUEVO (V40): Planificador del muestreo adaptativo (se crea al inicio) ---
+planificador = None
+
+# --- NUEVO (V44): Bitácora de eventos (se crea al inicio) ---
+bitacora = None
+
+# --- NUEVO (V46): Enlace con el agregador del edificio (se crea al inicio) ---
+enlace_agregador = None
+
+# --- NUEVO (V47): API de ocupación (se crea al inicio) ---
+api = None
+
+# --- NUEVO (V35): Contadores ---
+C_CONCEDIDOS = metricas.contador("parkpi_accesos_concedidos_total", "Tarjetas que abrieron la barrera")
+C_DENEGADOS_UID = metricas.contador("parkpi_accesos_denegados_total", "Tarjetas rechazadas",
+                                    {'motivo': 'uid_invalido'})
+C_DENEGADOS_LLENO = metricas.contador("parkpi_accesos_denegados_total", "Tarjetas rechazadas",
+                                      {'motivo': 'lleno'})
+C_CAMBIOS = metricas.contador("parkpi_cambios_estado_total", "Cambios LIBRE <-> OCUPADO de los cajones")
+metricas.medidor("parkpi_cajones_libres", "Cajones libres", estado_cajones.libres)
 
 # --- NUEVO (V21): Evento para detener el hilo de forma segura ---
 app_running = threading.Event()
 
 # --- 3. HILO 1: GESTOR DE PESO Y LEDS (FONDO) ---
 
-# --- 3. HILO 1: GESTOR DE PESO Y LEDS (FONDO) ---
+def procesar_lectura(i, peso, leds):
+    """
+    (VERSIÓN 26) Aplica la histéresis a una lectura de la celda 'i'
+    y actualiza su LED y el estado global.
+    Se llama desde el carril de muestreo de esa celda.
+    """
+    # Cada cajón solo lo escribe su propio carril, así que leer el
+    # estado anterior aquí no compite con otro hilo de peso.
+    estado_actual = estado_cajones[i]
+    nuevo_estado = estado_actual
+    if estado_actual == 'LIBRE' and peso > UMBRAL_PARA_OCUPAR:
+        nuevo_estado = 'OCUPADO'
+    elif estado_actual == 'OCUPADO' and peso < UMBRAL_PARA_LIBERAR:
+        nuevo_estado = 'LIBRE'
+
+    aplicar_estado(i, nuevo_estado, peso, leds)
+
+def aplicar_estado(i, nuevo_estado, peso, leds):
+    """Actualiza el LED y el estado global del cajón 'i'."""
+    # Solo el candado de este LED (V34)
+    with recursos.candado(f"led{i+1}"):
+        if nuevo_estado == 'LIBRE':
+            leds[i].on() # Led verde encendido = LIBRE
+        else:
+            leds[i].off() # Led verde apagado = OCUPADO
+
+    if estado_cajones.cambiar(i, nuevo_estado):
+        metricas.contar(C_CAMBIOS)
+        if planificador:
+            planificador.marcar_cambio(i)
+        if bitacora:
+            bitacora.cambio_de_cajon(i, nuevo_estado, peso)
+        if enlace_agregador:
+            enlace_agregador.cambio(i, nuevo_estado)
+        if api:
+            api.cambio()
+        print(f"[Peso] Cajón {i+1} cambió a: {nuevo_estado} (Peso: {peso:.2f}g)")
 
 def gestor_peso_y_leds(celdas, leds):
     """
-    (VERSIÓN 25 - Usa gpio_lock para ser 'thread-safe')
+    (VERSIÓN 26 - Muestreo concurrente por celda)
+    Cada celda se lee en su propio carril (MotorDeMuestreo), con su propio
+    candado. La lectura del HX711 ya no ocurre dentro de gpio_lock, así que
+    una celda lenta no detiene a las demás ni al servo.
+    """
+    if OCUPACION_VECTORIAL:
+        return gestor_peso_vectorial(celdas, leds)
+
+    motor = MotorDeMuestreo(
+        celdas,
+        al_leer=lambda i, peso: procesar_lectura(i, peso, leds),
+        num_hilos=HILOS_MUESTREO,
+        pausa=PAUSA_MUESTREO,
+        candados=[recursos.candado_celda(c) for c in celdas],
+        planificador=planificador
+    )
+    motor.iniciar()
+    try:
+        while app_running.is_set():
+            hw.dormir(0.2)
+    finally:
+        motor.detener()
+
+def gestor_peso_vectorial(celdas, leds):
+    """
+    (VERSIÓN 30) Los carriles solo guardan el último peso de cada celda y
+    MotorDeOcupacion evalúa la histéresis de todos los cajones en cada tick.
+    Solo se tocan los LEDs / estados de los cajones que cambiaron.
+    """
+    ocupacion = MotorDeOcupacion(
+        [c.factor_escala for c in celdas],
+        umbral_ocupar=UMBRAL_PARA_OCUPAR,
+        umbral_liberar=UMBRAL_PARA_LIBERAR
+    )
+    pesos = ocupacion.pesos
+    # (V44) Se parte del estado recuperado de la bitácora
+    for i in range(len(celdas)):
+        ocupacion.estados[i] = estado_cajones.codigo(i)
+
+    def guardar_peso(i, peso):
+        pesos[i] = peso
+
+    # LEDs iniciales (después solo se tocan los cajones que cambian)
+    for i in range(len(celdas)):
+        aplicar_estado(i, ocupacion.estado(i), 0.0, leds)
+
+    motor = MotorDeMuestreo(celdas, al_leer=guardar_peso,
+                            num_hilos=HILOS_MUESTREO, pausa=PAUSA_MUESTREO,
+                            candados=[recursos.candado_celda(c) for c in celdas],
+                            planificador=planificador)
+    motor.iniciar()
+    try:
+        while app_running.is_set():
+            for i in ocupacion.actualizar_pesos(pesos):
+                aplicar_estado(i, ocupacion.estado(i), pesos[i], leds)
+            hw.dormir(TICK_OCUPACION)
+    finally:
+        motor.detener()
+
+# --- 4. HILO 2: GESTOR DE ACCESO NFC (PRINCIPAL) ---
+
+MENSAJES_BARRERA = {
+    ABRIENDO: "[Acceso] Barrera Abriendo (a 90 grados)...",
+    ABIERTA: f"[Acceso] Barrera abierta por {TIEMPO_BARRERA_ABIERTA:g} segundos...",
+    CERRANDO: "[Acceso] Barrera Cerrando (a 0 grados)...",
+    CERRADA: "[Acceso] Barrera cerrada.",
+}
+
+def anunciar_barrera(estado):
+    print(MENSAJES_BARRERA[estado])
+    # --- NUEVO (V40): Un coche va a entrar: leer rápido sus cajones ---
+    if estado == ABRIENDO and planificador:
+        planificador.impulsar(CAJONES_CERCA_DE_LA_BARRERA, IMPULSO_BARRERA)
+
+def decidir_acceso(sensor_nfc, uid, barrera):
+    """
+    (VERSIÓN 41) Decide qué hacer con una tarjeta leída.
+    La usan el hilo NFC y el runtime asyncio. 'uid' es el bytearray del
+    lector (o un string hex).
     """
-    current_celda_index = 0
+    print(f"[NFC] Tarjeta detectada: {uid if isinstance(uid, str) else uid.hex()}")
     
-    while app_running.is_set():
-        try:
-            i = current_celda_index
-            celda = celdas[i]
-            led = leds[i]
-            
-            # --- MODIFICADO (V25): Adquirimos el candado de hardware ---
-            with gpio_lock:
-                # Todo el trabajo de GPIO (leer celda Y prender LED)
-                # ocurre dentro del candado.
-                
-                peso = celda.obtener_peso() # V22 ahora promedia 5 lecturas
-                
-                # --- Lógica de Hysteresis (Sin cambios) ---
-                estado_actual = estado_cajones[i]
-                nuevo_estado = estado_actual 
-                if estado_actual == 'LIBRE' and peso > UMBRAL_PARA_OCUPAR:
-                    nuevo_estado = 'OCUPADO'
-                elif estado_actual == 'OCUPADO' and peso < UMBRAL_PARA_LIBERAR:
-                    nuevo_estado = 'LIBRE'
-                
-                # Actualizamos el LED
-                if nuevo_estado == 'LIBRE':
-                    led.on() # Led verde encendido = LIBRE
-                else:
-                    led.off() # Led verde apagado = OCUPADO
-            # --- MODIFICADO (V25): Liberamos el candado de hardware ---
-            
-            # El estado global se actualiza fuera del candado de GPIO
-            with lock_estado:
-                if estado_cajones[i] != nuevo_estado:
-                    print(f"[Peso] Cajón {i+1} cambió a: {nuevo_estado} (Peso: {peso:.2f}g)")
-                estado_cajones[i] = nuevo_estado
+    # 2. Verificar si es válida
+    # (V41: el bytearray se busca tal cual en el índice)
+    if sensor_nfc.es_valido(uid):
+        print("[Acceso] UID Válido.")
+        
+        # 3. Consultar disponibilidad
+        # (V31: contador O(1), sin copiar la lista ni tomar candados)
+        lugares_disponibles = estado_cajones.hay_libre()
+        
+        # --- NUEVO (V46): Lugar en otro nodo del edificio ---
+        # (la última respuesta del agregador; aquí nunca se espera a la red)
+        if not lugares_disponibles and enlace_agregador and CAPACIDAD_GLOBAL:
+            capacidad = enlace_agregador.capacidad(EDAD_MAXIMA_CAPACIDAD)
+            if capacidad and capacidad.libres - capacidad.propios > 0:
+                lugares_disponibles = True
+                donde = ", ".join(f"nodo {n}: {libres}" for n, libres in capacidad.por_nodo[:3]
+                                  if n != NODO)
+                print(f"[Acceso] Aquí está lleno; hay {capacidad.libres - capacidad.propios} "
+                      f"lugares en el edificio ({donde}).")
             
-            current_celda_index = (current_celda_index + 1) % len(celdas) 
-            time.sleep(0.2) 
+        # 4. Actuar
+        if lugares_disponibles:
+            print("[Acceso] ¡Acceso Concedido! Abriendo barrera...")
+            metricas.contar(C_CONCEDIDOS)
+            if bitacora:
+                bitacora.acceso(bitacora_eventos.ACCESO_CONCEDIDO, uid_bytes(uid))
+            # --- MODIFICADO (V32): Solo se pide; no se espera al servo ---
+            barrera.solicitar_apertura()
+        else:
+            print("[Acceso] Acceso Denegado: Estacionamiento LLENO.")
+            metricas.contar(C_DENEGADOS_LLENO)
+            if bitacora:
+                bitacora.acceso(bitacora_eventos.ACCESO_DENEGADO_LLENO, uid_bytes(uid))
             
-        except Exception as e:
-            if app_running.is_set(): 
-                print(f"[Error Hilo Peso] {e}")
-                time.sleep(1)
+    else:
+        print("[Acceso] Acceso Denegado: UID Inválido.")
+        metricas.contar(C_DENEGADOS_UID)
+        if bitacora:
+            bitacora.acceso(bitacora_eventos.ACCESO_DENEGADO_UID, uid_bytes(uid))
 
-# --- 4. HILO 2: GESTOR DE ACCESO NFC (PRINCIPAL) ---
+def uid_bytes(uid):
+    """UID como bytes (llega como bytearray del lector o como string hex)."""
+    return bytes.fromhex(uid) if isinstance(uid, str) else uid
 
-def gestor_acceso_nfc(sensor_nfc, servo):
+def gestor_acceso_nfc(sensor_nfc, barrera, presencia=None):
     """
     Función que se ejecuta en el hilo principal.
-    (Sin cambios significativos, sigue simulado)
+    (VERSIÓN 32 - La barrera la mueve su propio hilo: este bucle nunca
+    espera al servo y sigue atendiendo tarjetas con la barrera abierta)
+    (VERSIÓN 42 - Sin pausa tras cada toque: 'presencia' descarta las
+    lecturas de una tarjeta que sigue en el lector)
+    (VERSIÓN 43 - Con IRQ, leer_uid() espera la línea; solo se pausa
+    después de leer una tarjeta)
     """
     print("[NFC] Gestor de acceso iniciado. Esperando tarjetas...")
+    if presencia is None:
+        presencia = PresenciaDeTarjetas(hw, TTL_PRESENCIA_TARJETA, MAX_TARJETAS_PRESENTES)
     
     # --- MODIFICADO (V21): El bucle depende del evento ---
     while app_running.is_set():
         # 1. Esperar tarjeta
-        uid_string = sensor_nfc.esperar_y_leer_uid(timeout=0.1)
+        uid = sensor_nfc.leer_uid(timeout=0.1)
         
-        if uid_string:
-            print(f"[NFC] Tarjeta detectada: {uid_string}")
-            
-            # 2. Verificar si es válida
-            if sensor_nfc.es_valido(uid_string):
-                print("[Acceso] UID Válido.")
-                
-                # 3. Consultar disponibilidad
-                lugares_disponibles = False
-                with lock_estado:
-                    estado_actual = estado_cajones.copy()
-                
-                if 'LIBRE' in estado_actual:
-                    lugares_disponibles = True
-                    
-                # 4. Actuar
-                if lugares_disponibles:
-                    print("[Acceso] ¡Acceso Concedido! Abriendo barrera...")
-                    try:
-                        # --- MODIFICADO (V25): Adquirimos el candado de hardware ---
-                        with gpio_lock:
-                            print("[Acceso] Barrera Abriendo (a 90 grados)...")
-                            servo.mid() 
-                        # Liberamos el candado (para que el hilo de peso pueda correr)
-                        
-                        print("[Acceso] Barrera abierta por 10 segundos...")
-                        time.sleep(10) # El sleep largo OCURRE FUERA del candado
-                        
-                        # --- MODIFICADO (V25): Adquirimos el candado de nuevo ---
-                        with gpio_lock:
-                            print("[Acceso] Barrera Cerrando (a 0 grados)...")
-                            servo.min() 
-                        # Liberamos el candado
-                        
-                        print("[Acceso] Barrera cerrada.")
-                    except Exception as e:
-                        print(f"[Error Servo] {e}")
-                else:
-                    print("[Acceso] Acceso Denegado: Estacionamiento LLENO.")
-                    
-            else:
-                print("[Acceso] Acceso Denegado: UID Inválido.")
-            
-            print("[NFC] Esperando 3s para retirar la tarjeta...")
-            time.sleep(3)
+        # --- MODIFICADO (V42): Solo los toques nuevos ---
+        if uid and presencia.nueva(uid):
+            decidir_acceso(sensor_nfc, uid, barrera)
         
         # Pequeña pausa si no se detectó nada
-        # (Importante: time.sleep() cede control a otros hilos)
-        time.sleep(0.1)
+        # (Importante: dormir() cede control a otros hilos)
+        # --- MODIFICADO (V43): Con IRQ la espera ya está en leer_uid() ---
+        if uid or not sensor_nfc.usa_irq:
+            hw.dormir(0.1)
 
 
 # --- 5. BLOQUE DE INICIO ---
@@ -162,7 +438,14 @@ if __name__ == "__main__":
     celdas = []
     leds = []
     servo = None
+    barrera = None
     hilo_peso = None
+    servidor_metricas = None
+    retara = None
+    almacen = None
+    sensor_nfc = None
+    grabadora = None
+    liberar_rate = None
     
     try:
         # --- Inicializar Hardware ---
@@ -171,49 +454,190 @@ if __name__ == "__main__":
         # --- NUEVO (V21): Establecer el evento ---
         app_running.set()
         
-        leds = [LED(PIN_LED_1), LED(PIN_LED_2), LED(PIN_LED_3)]
+        hw = obtener_backend()
+        
+        # --- NUEVO (V35): Métricas ---
+        if not METRICAS_ACTIVAS:
+            metricas.desactivar()
+        elif PUERTO_METRICAS is not None:
+            try:
+                servidor_metricas = metricas.ServidorDeMetricas(PUERTO_METRICAS)
+                servidor_metricas.iniciar()
+            except OSError as e:
+                print(f"[Métricas] No se pudo abrir el puerto {PUERTO_METRICAS}: {e}")
+        
+        leds = [hw.crear_led(PIN_LED_1), hw.crear_led(PIN_LED_2), hw.crear_led(PIN_LED_3)]
         print(f"LEDs (3) inicializados en pines: {PIN_LED_1}, {PIN_LED_2}, {PIN_LED_3}")
         
+        # --- NUEVO (V44): Estado de los cajones desde la bitácora ---
+        # (en vez de suponer que todos están LIBRE tras un corte de luz)
+        if CARPETA_BITACORA is not None:
+            previos = bitacora_eventos.reconstruir_estado(CARPETA_BITACORA, len(estado_cajones))
+            for i, codigo in enumerate(previos):
+                if codigo is not None:
+                    estado_cajones.cambiar(i, codigo)
+                if estado_cajones[i] == 'LIBRE':
+                    leds[i].on()
+                else:
+                    leds[i].off()
+            if any(codigo is not None for codigo in previos):
+                print(f"[Bitácora] Estado recuperado: {estado_cajones.como_lista()}")
+            bitacora = bitacora_eventos.Bitacora(CARPETA_BITACORA, estados=estado_cajones, **BITACORA)
+            bitacora.iniciar()
+        
+        # --- NUEVO (V46): Agregador del edificio ---
+        if AGREGADOR is not None:
+            enlace_agregador = EnlaceAgregador(AGREGADOR, NODO, estado_cajones, **ENLACE_AGREGADOR)
+            enlace_agregador.iniciar()
+        
+        # --- NUEVO (V47): API de ocupación ---
+        if PUERTO_API is not None:
+            try:
+                api = ApiOcupacion(estado_cajones, PUERTO_API)
+                api.iniciar()
+            except OSError as e:
+                print(f"[API] No se pudo abrir el puerto {PUERTO_API}: {e}")
+                api = None
+        
         # --- CÓDIGO REAL DEL SERVO (V24) ---
         # (Ajustamos el pulso para el MG90S)
-        servo = Servo(PIN_SERVO, min_pulse_width=0.5/1000, max_pulse_width=2.5/1000)
+        servo = hw.crear_servo(PIN_SERVO, min_pulse_width=0.5/1000, max_pulse_width=2.5/1000)
         # Asumimos que .min() es 0 grados (CERRADO)
         servo.min() 
         print(f"Servo inicializado en pin: {PIN_SERVO}")
+        
+        usar_asyncio = RUNTIME_ASYNC or "--asyncio" in sys.argv
+        opciones_barrera = {
+            'candado': recursos.candado("servo").prioritario(),
+            'tiempo_abierta': TIEMPO_BARRERA_ABIERTA,
+            'tiempo_movimiento': TIEMPO_MOVIMIENTO_SERVO,
+            'al_cambiar': anunciar_barrera,
+        }
+        
+        # --- NUEVO (V32): La barrera tiene su propio hilo ---
+        # (En el runtime asyncio la barrera usa temporizadores del loop)
+        if not usar_asyncio:
+            barrera = ControladorBarrera(servo, hw, **opciones_barrera)
+            barrera.iniciar()
 
         sensor_nfc = SensorNFC()
         if sensor_nfc.pn532 is None: # (Corregido a pn523 de la clase)
              raise Exception("No se pudo inicializar el lector NFC.")
-        if not sensor_nfc.cargar_uids_validos("valid_uids.txt"):
+        if PIN_IRQ_NFC is not None:
+            sensor_nfc.activar_irq(PIN_IRQ_NFC)
+        # --- MODIFICADO (V41): Índice binario con recarga en caliente ---
+        if not sensor_nfc.cargar_lista_blanca(INDICE_UIDS, ARCHIVO_UIDS, intervalo=INTERVALO_LISTA_UIDS):
              print("[Advertencia] No se cargaron UIDs. Nadie podrá entrar.")
         
-        print("Inicializando celdas de carga (esto tarda)...")
-        celda1 = CeldaDeCarga(pin_dt=PINES_CELDA_1['dt'], pin_sck=PINES_CELDA_1['sck'])
-        celda1.establecer_factor_escala(FACTOR_CELDA_1)
-        
-        celda2 = CeldaDeCarga(pin_dt=PINES_CELDA_2['dt'], pin_sck=PINES_CELDA_2['sck'])
-        celda2.establecer_factor_escala(FACTOR_CELDA_2)
-        
-        celda3 = CeldaDeCarga(pin_dt=PINES_CELDA_3['dt'], pin_sck=PINES_CELDA_3['sck'])
-        celda3.establecer_factor_escala(FACTOR_CELDA_3)
+        print("Inicializando celdas de carga...")
+        # --- NUEVO (V49): Combinaciones que no existen (mejor no arrancar
+        # que correr otra configuración sin avisar). SPS_HX711 sí vale en
+        # todos los modos: el pin RATE lo fija Main y todos esperan a DT. ---
+        if LECTURA_EN_GRUPO or ADQUISICION_EN_PROCESO:
+            modo = "LECTURA_EN_GRUPO" if LECTURA_EN_GRUPO else "ADQUISICION_EN_PROCESO"
+            if DOS_CANALES is not None:
+                raise Exception(f"DOS_CANALES no se combina con {modo}.")
+            if GANANCIA_HX711 != 128:
+                raise Exception(f"{modo} solo lee el canal A con ganancia 128 (GANANCIA_HX711 = {GANANCIA_HX711}).")
+        # --- NUEVO (V49): 10 u 80 SPS con el pin RATE ---
+        if PIN_RATE_HX711 is not None:
+            liberar_rate = fijar_velocidad_hx711(PIN_RATE_HX711, SPS_HX711, hw)
+        opciones_hx711 = {'ganancia': GANANCIA_HX711, 'sps': SPS_HX711}
+        # --- MODIFICADO (V38): Se crean sin tara; la tara sale del archivo ---
+        tarar = None
+        if LECTURA_EN_GRUPO:
+            # --- NUEVO (V36): Una sola tara y una sola trama para las tres ---
+            grupo = GrupoDeCeldas([PINES_CELDA_1, PINES_CELDA_2, PINES_CELDA_3], calibrar=False)
+            celda1, celda2, celda3 = grupo.celdas
+            tarar = lambda por_tarar: grupo.calibrar(por_tarar)
+        elif ADQUISICION_EN_PROCESO:
+            # --- NUEVO (V37): Las celdas leen del anillo compartido ---
+            adquisicion = AdquisicionEnProceso(
+                [PINES_CELDA_1, PINES_CELDA_2, PINES_CELDA_3],
+                nucleo=NUCLEO_ADQUISICION
+            )
+            adquisicion.iniciar()
+            celda1, celda2, celda3 = adquisicion.celdas
+        elif DOS_CANALES is not None:
+            # --- NUEVO (V49): Cajones 1 y 2 en los canales A y B de un HX711 ---
+            convertidor = HX711DosCanales(PINES_CELDA_1['dt'], PINES_CELDA_1['sck'], ganancia_a=GANANCIA_HX711,
+                                          sps=SPS_HX711, calibrar=False, **DOS_CANALES)
+            celda1, celda2 = convertidor.celdas
+            celda3 = CeldaDeCarga(pin_dt=PINES_CELDA_3['dt'], pin_sck=PINES_CELDA_3['sck'], calibrar=False,
+                                  **opciones_hx711)
+        else:
+            celda1 = CeldaDeCarga(pin_dt=PINES_CELDA_1['dt'], pin_sck=PINES_CELDA_1['sck'], calibrar=False,
+                                  **opciones_hx711)
+            celda2 = CeldaDeCarga(pin_dt=PINES_CELDA_2['dt'], pin_sck=PINES_CELDA_2['sck'], calibrar=False,
+                                  **opciones_hx711)
+            celda3 = CeldaDeCarga(pin_dt=PINES_CELDA_3['dt'], pin_sck=PINES_CELDA_3['sck'], calibrar=False,
+                                  **opciones_hx711)
         
         celdas = [celda1, celda2, celda3]
         if None in [c.h for c in celdas]: # Verificamos si alguna celda falló
             raise Exception("Una o más celdas no se inicializaron (self.h es None).")
+        
+        # Offsets guardados y vigentes: sin esperar al HX711. Las demás se
+        # taran todas a la vez (o en grupo) y se guardan.
+        almacen = AlmacenDeCalibracion(ARCHIVO_CALIBRACION, edad_maxima=EDAD_MAXIMA_OFFSET)
+        reusadas = almacen.preparar(celdas, [FACTOR_CELDA_1, FACTOR_CELDA_2, FACTOR_CELDA_3], tarar=tarar)
+        if FILTRO_PESO:
+            for celda in celdas:
+                celda.configurar_filtro(**FILTRO_PESO)
+        if DERIVA:
+            for celda in celdas:
+                celda.configurar_deriva(**DERIVA)
             
         print("¡Todas las celdas calibradas y listas!")
         
-        # --- Iniciar Hilo de Fondo ---
-        print("Iniciando hilo de monitoreo de peso...")
-        hilo_peso = threading.Thread(
-            target=gestor_peso_y_leds, 
-            args=(celdas, leds),
-            daemon=True
+        # --- NUEVO (V48): Grabación de muestras crudas ---
+        if CARPETA_TRAZAS is not None:
+            grabadora = GrabadoraDeMuestras(CARPETA_TRAZAS, hw, **TRAZAS)
+            grabadora.iniciar()
+            grabadora.describir(celdas) # Offset y factor, para pasar a gramos al repetir
+            for i, celda in enumerate(celdas):
+                celda.grabar_en(grabadora, i)
+        
+        if MUESTREO_ADAPTATIVO:
+            planificador = PlanificadorDeMuestreo(
+                len(celdas), hw, UMBRAL_PARA_OCUPAR, UMBRAL_PARA_LIBERAR, **MUESTREO_ADAPTATIVO
+            )
+        
+        # --- NUEVO (V38): Revisión de los offsets guardados (sin bloquear) ---
+        retara = RetaraEnSegundoPlano(
+            [c for c in celdas if c in reusadas], almacen, hw,
+            candados=[recursos.candado_celda(c) for c in celdas if c in reusadas],
+            umbral_vacio=UMBRAL_PARA_LIBERAR,
+            intervalo=INTERVALO_RETARA
         )
-        hilo_peso.start()
         
-        # --- Iniciar Hilo Principal (NFC) ---
-        gestor_acceso_nfc(sensor_nfc, servo)
+        # --- NUEVO (V33): Runtime asyncio (un solo event loop) ---
+        if usar_asyncio:
+            runtime = RuntimeAsync(hw, hilos=HILOS_RUNTIME)
+            runtime.agregar_puerta(
+                sensor_nfc, servo,
+                al_tarjeta=lambda uid, b: decidir_acceso(sensor_nfc, uid, b),
+                presencia=PresenciaDeTarjetas(hw, TTL_PRESENCIA_TARJETA, MAX_TARJETAS_PRESENTES),
+                **opciones_barrera
+            )
+            runtime.agregar_celdas(celdas, lambda i, peso: procesar_lectura(i, peso, leds),
+                                   candados=[recursos.candado_celda(c) for c in celdas],
+                                   planificador=planificador)
+            retara.iniciar()
+            runtime.correr(app_running) # Hasta Ctrl+C
+        else:
+            # --- Iniciar Hilo de Fondo ---
+            print("Iniciando hilo de monitoreo de peso...")
+            hilo_peso = threading.Thread(
+                target=gestor_peso_y_leds, 
+                args=(celdas, leds),
+                daemon=True
+            )
+            hilo_peso.start()
+            retara.iniciar()
+            
+            # --- Iniciar Hilo Principal (NFC) ---
+            gestor_acceso_nfc(sensor_nfc, barrera)
         
     except KeyboardInterrupt:
         print("\nCerrando el programa (Ctrl+C detectado)...")
@@ -225,21 +649,68 @@ if __name__ == "__main__":
         
         # 1. Detener los hilos
         app_running.clear() # Le dice a los hilos que dejen de ejecutarse
+        if retara:
+            retara.detener()
+        if sensor_nfc:
+            sensor_nfc.detener()
         
         # 2. Esperar a que el hilo de peso termine (importante)
         if hilo_peso:
             print("Esperando al hilo de peso...")
             hilo_peso.join() # Espera a que el bucle 'while' termine
             print("Hilo de peso detenido.")
+        if barrera:
+            barrera.detener() # Deja la barrera cerrada
         
         # 3. Ahora SÍ es seguro limpiar el hardware
         print("Limpiando hardware...")
         if leds:
             for led in leds:
                 led.off()
+        # --- NUEVO (V39): Guardar los offsets corregidos por deriva ---
+        if almacen and any(c.deriva for c in celdas):
+            for celda in celdas:
+                if celda.deriva:
+                    print(f"[Deriva] Celda (DT={celda.pin_dt}): {celda.deriva.gramos:+.2f} g corregidos, "
+                          f"{celda.deriva.tasa:+.3f} g/h.")
+                    almacen.registrar(celda, factor=False, guardar=False)
+            almacen.guardar()
+        if grabadora:
+            grabadora.detener()
+            print(f"[Trazas] {grabadora.muestras} muestras crudas grabadas en {CARPETA_TRAZAS}.")
         if celdas:
             for celda in celdas:
                 celda.limpiar() # ¡Vital para liberar pines lgpio!
+        if liberar_rate:
+            liberar_rate()
+        
+        if api:
+            api.detener()
+        
+        # --- NUEVO (V46): Lo último al agregador ---
+        if enlace_agregador:
+            enlace_agregador.detener()
+            print(f"[Agregador] {enlace_agregador.cambios} cambios en {enlace_agregador.deltas} deltas, "
+                  f"{enlace_agregador.paquetes} datagramas ({enlace_agregador.bytes} bytes); "
+                  f"{enlace_agregador.respuestas}/{enlace_agregador.consultas} consultas respondidas.")
+        
+        # --- NUEVO (V44): Lo último de la bitácora al disco ---
+        if bitacora:
+            bitacora.detener()
+            print(f"[Bitácora] {bitacora.escritos} registros en {bitacora.lotes} lotes "
+                  f"({bitacora.fsyncs} fsync).")
+        
+        if planificador:
+            print(f"[Muestreo] {planificador.lecturas} lecturas adaptativas; "
+                  f"plan al cerrar: {planificador.lecturas_por_segundo():.1f} lecturas/s.")
+        
+        # --- NUEVO (V34): Espera en cada candado de dispositivo ---
+        for linea in recursos.reporte():
+            print(linea)
+        for linea in metricas.REGISTRO.resumen():
+            print(linea)
+        if servidor_metricas:
+            servidor_metricas.detener()
         
         print("Programa terminado.")
         sys.exit()
\ No newline at end of file
@@ -0,0 +1,314 @@
+import os
+import time
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from hardware import obtener_backend
+from celda_carga import CeldaDeCarga
+
+# --- Disposición de la memoria compartida ---
+# Palabras int64 ('q'):
+#   [0]                      1 = el trabajador debe seguir, 0 = salir
+#   [1]                      1 = el trabajador ya está leyendo
+#   por celda (3 + 2*cap):   cabeza, tramas, fuera_de_rango,
+#                            cap x (índice, valor crudo)
+# Después, float64 ('d'):    por celda, cap x tiempo (reloj del backend)
+_CONTROL = 2
+_ENCABEZADO = 3
+
+# Valores que el HX711 entrega saturado o con la trama rota
+FUERA_DE_RANGO = (0x7FFFFF, -0x800000, -1)
+
+
+def _tamano(n, capacidad):
+    palabras_q = _CONTROL + n * (_ENCABEZADO + 2 * capacidad)
+    return palabras_q * 8 + n * capacidad * 8, palabras_q
+
+
+class AnilloCompartido:
+    """
+    Buffer circular de (t, valor crudo) de UNA celda dentro de un bloque de
+    shared_memory. Misma API de lectura que BufferCircular (secuencia,
+    leer_desde, ultimo), así que CeldaDeCarga lo usa como 'self.muestras'.
+
+    Hay un solo escritor (el proceso de adquisición). Cada ranura guarda el
+    índice de la muestra que contiene: el escritor lo pone en -1, escribe
+    t y valor y luego pone el índice. El lector vuelve a revisar el índice
+    después de copiar, así que nunca devuelve una ranura a medio escribir o
+    ya sobrescrita (sin candados entre procesos).
+    """
+
+    def __init__(self, buf, k, n, capacidad):
+        _, palabras_q = _tamano(n, capacidad)
+        self.capacidad = capacidad
+        self._q = buf[:palabras_q * 8].cast('q')
+        self._d = buf[palabras_q * 8:_tamano(n, capacidad)[0]].cast('d')
+        self._base = _CONTROL + k * (_ENCABEZADO + 2 * capacidad)
+        self._ranuras = self._base + _ENCABEZADO
+        self._tiempos = k * capacidad
+
+    # --- Lado del escritor ---
+
+    def agregar(self, dato):
+        t, valor = dato
+        q = self._q
+        i = q[self._base]
+        r = i % self.capacidad
+        q[self._ranuras + 2 * r] = -1
+        self._d[self._tiempos + r] = t
+        q[self._ranuras + 2 * r + 1] = valor
+        q[self._ranuras + 2 * r] = i
+        q[self._base] = i + 1
+        q[self._base + 1] += 1
+
+    def contar_fuera_de_rango(self):
+        self._q[self._base + 2] += 1
+
+    # --- Lado del lector ---
+
+    @property
+    def secuencia(self):
+        return self._q[self._base]
+
+    @property
+    def tramas(self):
+        return self._q[self._base + 1]
+
+    @property
+    def fuera_de_rango(self):
+        return self._q[self._base + 2]
+
+    def _leer(self, i):
+        q = self._q
+        r = i % self.capacidad
+        if q[self._ranuras + 2 * r] != i:
+            return None
+        dato = (self._d[self._tiempos + r], q[self._ranuras + 2 * r + 1])
+        if q[self._ranuras + 2 * r] != i:
+            return None # Se sobrescribió mientras la copiábamos
+        return dato
+
+    def leer_desde(self, cursor):
+        sec = self.secuencia
+        datos = []
+        for i in range(max(cursor, sec - self.capacidad), sec):
+            dato = self._leer(i)
+            if dato is not None:
+                datos.append(dato)
+        return datos, sec
+
+    def ultimo(self):
+        sec = self.secuencia
+        return self._leer(sec - 1) if sec else None
+
+    def __len__(self):
+        return min(self.secuencia, self.capacidad)
+
+    def liberar(self):
+        self._q.release()
+        self._d.release()
+
+
+def bucle_adquisicion(backend, pines, anillos, seguir, pausa=0.0005):
+    """
+    Revisa los DT y, en cuanto uno baja, saca su trama y la publica en su
+    anillo con el tiempo del backend. 'seguir()' dice si continuar.
+    Se usa en el proceso de adquisición (y en un hilo, para comparar).
+    """
+    h = backend.abrir_chip(0)
+    try:
+        for dt, sck in pines:
+            backend.reclamar_entrada(h, dt)
+            backend.reclamar_salida(h, sck)
+        leer = backend.leer
+        while seguir():
+            alguna = False
+            for (dt, sck), anillo in zip(pines, anillos):
+                if leer(h, dt) != 0:
+                    continue
+                cruda = backend.leer_trama_hx711(h, dt, sck)
+                t = backend.ahora()
+                if cruda & 0x800000:
+                    cruda |= ~0xFFFFFF
+                if cruda in FUERA_DE_RANGO:
+                    anillo.contar_fuera_de_rango()
+                anillo.agregar((t, cruda))
+                alguna = True
+            if not alguna:
+                time.sleep(pausa)
+    finally:
+        for dt, sck in pines:
+            backend.liberar(h, dt)
+            backend.liberar(h, sck)
+        backend.cerrar_chip(h)
+
+
+def _trabajador(nombre, pines, capacidad, nucleo, fabrica_backend, pausa):
+    """Punto de entrada del proceso de adquisición."""
+    if nucleo is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {nucleo})
+    # (El bloque lo crea y lo borra el proceso principal)
+    shm = shared_memory.SharedMemory(name=nombre)
+    n = len(pines)
+    anillos = [AnilloCompartido(shm.buf, k, n, capacidad) for k in range(n)]
+    control = shm.buf[:_CONTROL * 8].cast('q')
+    backend = (fabrica_backend or obtener_backend)()
+    control[1] = 1
+    try:
+        bucle_adquisicion(backend, pines, anillos, lambda: control[0] == 1, pausa)
+    except KeyboardInterrupt:
+        pass # El principal decide cuándo parar
+    finally:
+        for anillo in anillos:
+            anillo.liberar()
+        control.release()
+        shm.close()
+
+
+class AdquisicionEnProceso:
+    """
+    Saca las tramas de los HX711 en un proceso aparte (sin competir por el
+    GIL con el hilo NFC y compañía), opcionalmente fijo a un núcleo, y las
+    publica con su tiempo en un anillo de shared_memory por celda.
+
+    'celdas' son fachadas con la API de CeldaDeCarga que leen de esos
+    anillos sin copiar el bloque (como el modo eventos).
+    """
+
+    def __init__(self, pines, capacidad=256, nucleo=None, fabrica_backend=None,
+                 pausa=0.0005, backend=None):
+        """
+        pines:           lista de {'dt': .., 'sck': ..}.
+        nucleo:          núcleo de CPU para el proceso (None = el que toque).
+        fabrica_backend: función (importable) que crea el backend DENTRO del
+                         proceso. None = obtener_backend().
+        backend:         backend de este proceso (para el reloj).
+        """
+        self.pines = [(p['dt'], p['sck']) for p in pines]
+        self.capacidad = capacidad
+        self.nucleo = nucleo
+        self.fabrica_backend = fabrica_backend
+        self.pausa = pausa
+        self.backend = backend or obtener_backend()
+
+        tamano, _ = _tamano(len(self.pines), capacidad)
+        self.shm = shared_memory.SharedMemory(create=True, size=tamano)
+        self.shm.buf[:tamano] = bytes(tamano)
+        self._control = self.shm.buf[:_CONTROL * 8].cast('q')
+        self.anillos = [AnilloCompartido(self.shm.buf, k, len(self.pines), capacidad)
+                        for k in range(len(self.pines))]
+        self.celdas = [CeldaDeProceso(self, k, dt, sck) for k, (dt, sck) in enumerate(self.pines)]
+        self.proceso = None
+        self.hilo = None
+        self._lock = threading.Lock()
+        self._activas = len(self.celdas)
+
+    def iniciar(self, en_hilo=False, timeout=15.0):
+        """
+        Arranca el proceso de adquisición. en_hilo=True corre el mismo bucle
+        en un hilo de este proceso (para comparar, o donde no haya procesos).
+        Espera (hasta 'timeout' s reales) a que el proceso esté leyendo: un
+        proceso 'spawn' tarda en importar y sin esto la tara no vería datos.
+        """
+        self._control[0] = 1
+        if en_hilo:
+            backend = (self.fabrica_backend or obtener_backend)()
+            self.hilo = threading.Thread(
+                target=bucle_adquisicion,
+                args=(backend, self.pines, self.anillos, lambda: self._control[0] == 1, self.pausa),
+                name="adquisicion-hx711",
+                daemon=True
+            )
+            self.hilo.start()
+            print(f"[Adquisición] {len(self.pines)} celdas en un hilo (mismo proceso).")
+            return
+        contexto = multiprocessing.get_context("spawn")
+        self.proceso = contexto.Process(
+            target=_trabajador,
+            args=(self.shm.name, self.pines, self.capacidad, self.nucleo,
+                  self.fabrica_backend, self.pausa),
+            name="adquisicion-hx711",
+            daemon=True
+        )
+        self.proceso.start()
+        limite = time.monotonic() + timeout
+        while self._control[1] != 1:
+            if not self.proceso.is_alive() or time.monotonic() > limite:
+                print("[Adquisición] Error: el proceso de adquisición no arrancó.")
+                break
+            time.sleep(0.01)
+        donde = f" en el núcleo {self.nucleo}" if self.nucleo is not None else ""
+        print(f"[Adquisición] {len(self.pines)} celdas en el proceso {self.proceso.pid}{donde}.")
+
+    def detener(self, timeout=2.0):
+        with self._lock:
+            if self.shm is None:
+                return
+            self._control[0] = 0
+            if self.hilo is not None:
+                self.hilo.join(timeout)
+                self.hilo = None
+            if self.proceso is not None:
+                self.proceso.join(timeout)
+                if self.proceso.is_alive():
+                    self.proceso.terminate()
+                    self.proceso.join()
+                self.proceso = None
+            for anillo in self.anillos:
+                anillo.liberar()
+            self._control.release()
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def soltar(self):
+        """Lo llama cada fachada al limpiarse; la última detiene el proceso."""
+        with self._lock:
+            self._activas -= 1
+            ultima = self._activas <= 0 and self.shm is not None
+        if ultima:
+            print("\nDeteniendo el proceso de adquisición...")
+            self.detener()
+            print("Proceso detenido y memoria compartida liberada.")
+
+    def limpiar(self):
+        for celda in self.celdas:
+            celda.limpiar()
+
+
+class CeldaDeProceso(CeldaDeCarga):
+    """
+    Celda de AdquisicionEnProceso con la API de CeldaDeCarga. Funciona como
+    el modo eventos: 'muestras' es el AnilloCompartido de la celda.
+    """
+
+    def __init__(self, adquisicion, indice, pin_dt, pin_sck):
+        # Solo el estado: los pines los tiene el proceso, que lee con un
+        # solo pulso extra (canal A, ganancia 128)
+        self._iniciar_estado(pin_dt, pin_sck, adquisicion.backend)
+        self.adquisicion = adquisicion
+        self.indice = indice
+        self.h = adquisicion # El handle lgpio vive en el otro proceso
+        self.muestras = adquisicion.anillos[indice]
+        self.id_grabacion = indice
+
+    def _esperar_muestras(self, timeout=1.0):
+        # No hay aviso entre procesos: revisamos la cabeza del anillo
+        limite = self.backend.ahora() + timeout
+        while self.muestras.secuencia <= self._cursor:
+            if self.backend.ahora() > limite:
+                raise TimeoutError(f"El HX711 (DT={self.pin_dt}) no entregó datos.")
+            self.despertares += 1
+            self.backend.dormir(0.002)
+        datos, self._cursor = self.muestras.leer_desde(self._cursor)
+        if self.grabadora is not None:
+            self.grabadora.agregar_varias(self.id_grabacion, datos)
+        return [valor for _, valor in datos]
+
+    def iniciar_modo_eventos(self, capacidad=64):
+        return False # Ya lee de un anillo
+
+    def limpiar(self):
+        if self.h:
+            self.h = None
+            self.adquisicion.soltar()
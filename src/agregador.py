@@ -0,0 +1,500 @@
+import time
+import random
+import socket
+import struct
+import threading
+from array import array
+from collections import deque, namedtuple
+from estado_ocupacion import LIBRE, CODIGOS_ESTADO
+import metricas
+
+# --- Protocolo (UDP, little endian) ---
+# Cada datagrama empieza con un encabezado de 20 bytes:
+#   magia "PA", versión, tipo, nodo, época (cambia en cada arranque del
+#   nodo), secuencia del paquete, cajones del nodo, número de entradas.
+# DELTAS y COMPLETO llevan entradas de 7 bytes: cajón, estado, secuencia
+# del cajón (sube con cada cambio; el agregador descarta una entrada que no
+# sea más nueva que la que ya tiene, así un paquete atrasado no pisa uno
+# nuevo). COMPLETO es el estado entero del nodo, mandado de vez en cuando
+# para reponer lo que UDP haya perdido.
+MAGIA = b"PA"
+VERSION = 1
+ENCABEZADO = struct.Struct("<2sBBIIIHH")
+DELTA = struct.Struct("<HBI")
+RESUMEN = struct.Struct("<IIII")  # libres, total, nodos vivos, libres del que pregunta
+NODO_LIBRE = struct.Struct("<IH") # nodo, libres
+TAMANO_MAXIMO = 1400              # Sin fragmentar en una red Ethernet / Wi-Fi
+MAX_ENTRADAS = (TAMANO_MAXIMO - ENCABEZADO.size) // DELTA.size
+MAX_NODOS_RESPUESTA = (TAMANO_MAXIMO - ENCABEZADO.size - RESUMEN.size) // NODO_LIBRE.size
+PUERTO = 9200
+
+DELTAS = 1
+COMPLETO = 2
+CONSULTA = 3
+RESPUESTA = 4
+
+DESCONOCIDO = 0xFF # Cajón del que el agregador aún no sabe nada
+
+Capacidad = namedtuple("Capacidad", "t libres total nodos propios por_nodo")
+
+H_CONSULTA = metricas.histograma("parkpi_agregador_consulta_segundos",
+                                 "Desde que un nodo manda una consulta de capacidad hasta que lee la respuesta")
+C_PAQUETES = metricas.contador("parkpi_agregador_paquetes_total", "Datagramas enviados al agregador")
+
+
+def encabezado(tipo, nodo, epoca, secuencia, cajones, cuenta):
+    return ENCABEZADO.pack(MAGIA, VERSION, tipo, nodo, epoca, secuencia, cajones, cuenta)
+
+
+def paquetes_de_deltas(tipo, nodo, epoca, secuencia, cajones, entradas):
+    """
+    Parte [(cajón, estado, seq), ...] en datagramas de hasta MAX_ENTRADAS.
+    Devuelve (datagramas, siguiente secuencia).
+    """
+    datagramas = []
+    for inicio in range(0, len(entradas), MAX_ENTRADAS):
+        parte = entradas[inicio:inicio + MAX_ENTRADAS]
+        datos = [encabezado(tipo, nodo, epoca, secuencia, cajones, len(parte))]
+        datos += [DELTA.pack(*entrada) for entrada in parte]
+        datagramas.append(b"".join(datos))
+        secuencia = (secuencia + 1) & 0xFFFFFFFF
+    return datagramas, secuencia
+
+
+def parsear_respuesta(datos):
+    """(secuencia, libres, total, nodos, propios, [(nodo, libres), ...]) o None."""
+    if len(datos) < ENCABEZADO.size + RESUMEN.size:
+        return None
+    magia, version, tipo, _, _, secuencia, _, cuenta = ENCABEZADO.unpack_from(datos, 0)
+    if magia != MAGIA or version != VERSION or tipo != RESPUESTA:
+        return None
+    libres, total, nodos, propios = RESUMEN.unpack_from(datos, ENCABEZADO.size)
+    inicio = ENCABEZADO.size + RESUMEN.size
+    por_nodo = tuple(NODO_LIBRE.iter_unpack(datos[inicio:inicio + cuenta * NODO_LIBRE.size]))
+    return secuencia, libres, total, nodos, propios, por_nodo
+
+
+# --- Agregador (un proceso para todo el edificio) ---
+
+class _Nodo:
+    __slots__ = ("epoca", "secuencia", "estados", "seqs", "libres", "visto", "vivo")
+
+    def __init__(self, epoca, cajones):
+        self.epoca = epoca
+        self.secuencia = None
+        self.estados = bytearray([DESCONOCIDO]) * cajones
+        self.seqs = array('I', [0]) * cajones
+        self.libres = 0
+        self.visto = 0.0
+        self.vivo = False
+
+
+class Agregador:
+    """
+    Índice global de los cajones de todos los nodos.
+
+    * Un solo hilo recibe los datagramas: aplica deltas (comparando la
+      secuencia de cada cajón) y contesta consultas con el total de libres
+      y los nodos que tienen lugar. Los contadores globales se mantienen
+      al aplicar, así que una consulta no recorre nada.
+    * Un nodo que no manda nada en 'vencimiento' s deja de contar (sus
+      cajones no se ofrecen) hasta que vuelve a hablar.
+    * Si un nodo reinicia (época nueva), su estado se descarta y se espera
+      su COMPLETO.
+    """
+
+    def __init__(self, puerto=PUERTO, direccion="0.0.0.0", vencimiento=15.0, refresco_lista=0.1):
+        self.puerto = puerto
+        self.direccion = direccion
+        self.vencimiento = vencimiento
+        self.refresco_lista = refresco_lista
+        self._nodos = {}
+        self._libres = 0
+        self._total = 0
+        self._vivos = 0
+        self._lista = b""
+        self._cuenta_lista = 0
+        self._lista_en = -1.0
+        self._socket = None
+        self._activo = False
+        self._hilo = None
+
+        self.paquetes = 0
+        self.deltas = 0
+        self.viejas = 0    # Entradas descartadas por no ser más nuevas
+        self.perdidos = 0  # Huecos en la secuencia de paquetes de los nodos
+        self.consultas = 0
+
+    # --- Consultas locales ---
+
+    def libres(self):
+        return self._libres
+
+    def total(self):
+        return self._total
+
+    def nodos_vivos(self):
+        return self._vivos
+
+    def por_nodo(self):
+        """{nodo: (libres, cajones)} de los nodos vivos."""
+        return {n: (nodo.libres, len(nodo.estados)) for n, nodo in self._nodos.items() if nodo.vivo}
+
+    # --- Procesamiento ---
+
+    def _revivir(self, nodo):
+        if not nodo.vivo:
+            nodo.vivo = True
+            self._libres += nodo.libres
+            self._total += len(nodo.estados)
+            self._vivos += 1
+
+    def _apagar(self, nodo):
+        if nodo.vivo:
+            nodo.vivo = False
+            self._libres -= nodo.libres
+            self._total -= len(nodo.estados)
+            self._vivos -= 1
+
+    def vencer(self, ahora=None):
+        """Deja de contar los nodos que no hablaron en 'vencimiento' s."""
+        ahora = time.monotonic() if ahora is None else ahora
+        for nodo in self._nodos.values():
+            if nodo.vivo and ahora - nodo.visto > self.vencimiento:
+                self._apagar(nodo)
+
+    def atender(self, datos, ahora=None):
+        """Procesa un datagrama. Devuelve la respuesta (bytes) o None."""
+        if len(datos) < ENCABEZADO.size:
+            return None
+        magia, version, tipo, n, epoca, secuencia, cajones, cuenta = ENCABEZADO.unpack_from(datos, 0)
+        if magia != MAGIA or version != VERSION:
+            return None
+        self.paquetes += 1
+        if tipo == CONSULTA:
+            return self._responder(n, secuencia, ahora)
+        if tipo not in (DELTAS, COMPLETO):
+            return None
+
+        nodo = self._nodos.get(n)
+        if nodo is None or nodo.epoca != epoca or len(nodo.estados) != cajones:
+            if nodo is not None:
+                self._apagar(nodo)
+            nodo = self._nodos[n] = _Nodo(epoca, cajones)
+        if nodo.secuencia is None:
+            nodo.secuencia = (secuencia + 1) & 0xFFFFFFFF
+        else:
+            hueco = (secuencia - nodo.secuencia) & 0xFFFFFFFF
+            if hueco < 1 << 31: # (uno atrasado no cuenta ni retrocede)
+                self.perdidos += hueco
+                nodo.secuencia = (secuencia + 1) & 0xFFFFFFFF
+        nodo.visto = time.monotonic() if ahora is None else ahora
+        self._revivir(nodo)
+
+        estados, seqs = nodo.estados, nodo.seqs
+        libres = nodo.libres
+        fin = ENCABEZADO.size + min(cuenta, (len(datos) - ENCABEZADO.size) // DELTA.size) * DELTA.size
+        for cajon, estado, seq in DELTA.iter_unpack(memoryview(datos)[ENCABEZADO.size:fin]):
+            if cajon >= cajones:
+                continue
+            anterior = estados[cajon]
+            if seq <= seqs[cajon] and anterior != DESCONOCIDO:
+                self.viejas += 1
+                continue
+            seqs[cajon] = seq
+            if estado != anterior:
+                estados[cajon] = estado
+                if anterior == LIBRE:
+                    libres -= 1
+                if estado == LIBRE:
+                    libres += 1
+        self.deltas += cuenta
+        self._libres += libres - nodo.libres
+        nodo.libres = libres
+        return None
+
+    def _responder(self, n, secuencia, ahora):
+        self.consultas += 1
+        ahora = time.monotonic() if ahora is None else ahora
+        # La lista de dónde hay lugar se arma a lo más cada 'refresco_lista' s
+        if ahora - self._lista_en >= self.refresco_lista or self._lista_en < 0:
+            lista = sorted(((nodo.libres, m) for m, nodo in self._nodos.items()
+                            if nodo.vivo and nodo.libres), reverse=True)[:MAX_NODOS_RESPUESTA]
+            self._lista = b"".join(NODO_LIBRE.pack(m, min(libres, 0xFFFF)) for libres, m in lista)
+            self._cuenta_lista = len(lista)
+            self._lista_en = ahora
+        nodo = self._nodos.get(n)
+        propios = nodo.libres if nodo is not None and nodo.vivo else 0
+        return (encabezado(RESPUESTA, n, 0, secuencia, 0, self._cuenta_lista) +
+                RESUMEN.pack(self._libres, self._total, self._vivos, propios) + self._lista)
+
+    # --- Servicio ---
+
+    def _bucle(self):
+        sock = self._socket
+        buffer = bytearray(TAMANO_MAXIMO)
+        vista = memoryview(buffer)
+        proxima_revision = time.monotonic() + 1.0
+        while self._activo:
+            try:
+                n, origen = sock.recvfrom_into(buffer)
+            except socket.timeout:
+                n = 0
+            except OSError:
+                if not self._activo:
+                    break
+                continue
+            if n:
+                respuesta = self.atender(vista[:n])
+                if respuesta is not None:
+                    try:
+                        sock.sendto(respuesta, origen)
+                    except OSError:
+                        pass
+            ahora = time.monotonic()
+            if ahora >= proxima_revision:
+                self.vencer(ahora)
+                proxima_revision = ahora + 1.0
+
+    def iniciar(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 21)
+        except OSError:
+            pass
+        self._socket.bind((self.direccion, self.puerto))
+        self.puerto = self._socket.getsockname()[1]
+        self._socket.settimeout(0.5)
+        self._activo = True
+        self._hilo = threading.Thread(target=self._bucle, name="agregador", daemon=True)
+        self._hilo.start()
+        print(f"[Agregador] Escuchando en UDP {self.direccion}:{self.puerto}.")
+
+    def detener(self):
+        self._activo = False
+        if self._hilo:
+            self._hilo.join(timeout=2)
+            self._hilo = None
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+
+# --- Enlace (en cada nodo) ---
+
+class EnlaceAgregador:
+    """
+    Lado del nodo: manda los cambios de sus cajones al agregador y mantiene
+    la última capacidad global conocida.
+
+    * cambio() solo agrega a una deque (sin candados): el carril de peso
+      no espera a la red.
+    * Cada 'intervalo' s un hilo junta lo pendiente; si un cajón cambió
+      varias veces solo va el último estado (coalescencia; si el estado
+      completo ya llevó esa secuencia, no va nada), y todo sale en uno o
+      pocos datagramas.
+    * Cada 'intervalo_completo' s manda el estado entero (repone pérdidas y
+      sirve de latido) y cada 'intervalo_consulta' s pregunta la capacidad.
+    * capacidad(edad_maxima) nunca espera a la red: devuelve la última
+      respuesta, o None si es más vieja que 'edad_maxima' (la edad se
+      cuenta desde que se mandó la consulta).
+    """
+
+    def __init__(self, direccion, nodo, estados, intervalo=0.05, intervalo_completo=5.0,
+                 intervalo_consulta=0.5):
+        self.direccion = direccion
+        self.nodo = nodo
+        self.estados = estados
+        self.intervalo = intervalo
+        self.intervalo_completo = intervalo_completo
+        self.intervalo_consulta = intervalo_consulta
+        self.epoca = random.SystemRandom().getrandbits(32)
+
+        self._cola = deque()
+        self._seqs = array('I', [0]) * len(estados)
+        self._seqs_enviadas = array('I', [0]) * len(estados) # Última secuencia mandada por cajón
+        self._secuencia = 0
+        self._consulta = 0
+        self._consulta_en = {}
+        self._ultimo_completo = None
+        self._ultima_consulta = None
+        self._capacidad = None
+        self._despertar = threading.Event()
+        self._activo = False
+        self._hilo = None
+        self._error = None
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._buffer = bytearray(TAMANO_MAXIMO)
+
+        self.cambios = 0
+        self.deltas = 0
+        self.paquetes = 0
+        self.bytes = 0
+        self.consultas = 0
+        self.respuestas = 0
+
+    # --- Camino rápido ---
+
+    def cambio(self, i, estado):
+        """El cajón 'i' cambió a 'estado' ('LIBRE'/'OCUPADO' o LIBRE/OCUPADO)."""
+        if isinstance(estado, str):
+            estado = CODIGOS_ESTADO[estado]
+        # Cada cajón lo cambia un solo carril, así que su secuencia no compite
+        self._seqs[i] = seq = (self._seqs[i] + 1) & 0xFFFFFFFF
+        self._cola.append((i, estado, seq))
+
+    def capacidad(self, edad_maxima=None):
+        capacidad = self._capacidad
+        if capacidad is None:
+            return None
+        if edad_maxima is not None and time.monotonic() - capacidad.t > edad_maxima:
+            return None
+        return capacidad
+
+    # --- Envío ---
+
+    def _enviar(self, datagramas):
+        for datos in datagramas:
+            try:
+                self._socket.sendto(datos, self.direccion)
+            except OSError as e:
+                if self._error is None:
+                    print(f"[Agregador] No se pudo enviar a {self.direccion[0]}:{self.direccion[1]}: {e}")
+                self._error = e
+                continue
+            self.paquetes += 1
+            self.bytes += len(datos)
+            metricas.contar(C_PAQUETES)
+
+    def _enviar_deltas(self):
+        cola = self._cola
+        ultimos = {}
+        try:
+            while True:
+                i, estado, seq = cola.popleft()
+                ultimos[i] = (i, estado, seq)
+                self.cambios += 1
+        except IndexError:
+            pass
+        # Por secuencia y no por estado: un completo puede llevar el estado
+        # nuevo con la secuencia vieja (el agregador lo descarta), y este
+        # delta es entonces lo único que lo corrige
+        enviadas = self._seqs_enviadas
+        entradas = [entrada for entrada in ultimos.values() if entrada[2] > enviadas[entrada[0]]]
+        if entradas:
+            datagramas, self._secuencia = paquetes_de_deltas(
+                DELTAS, self.nodo, self.epoca, self._secuencia, len(self._seqs), entradas)
+            self._enviar(datagramas)
+            for i, _, seq in entradas:
+                enviadas[i] = seq
+            self.deltas += len(entradas)
+
+    def _enviar_completo(self):
+        # Secuencias antes que estados: el estado se cambia antes de subir
+        # la secuencia, así nunca sale una secuencia nueva con un estado viejo
+        seqs = self._seqs.tolist()
+        _, copia = self.estados.instantanea()
+        entradas = [(i, codigo, seqs[i]) for i, codigo in enumerate(copia)]
+        self._seqs_enviadas = array('I', seqs)
+        datagramas, self._secuencia = paquetes_de_deltas(
+            COMPLETO, self.nodo, self.epoca, self._secuencia, len(seqs), entradas)
+        self._enviar(datagramas)
+
+    def _enviar_consulta(self, ahora):
+        self._consulta = (self._consulta + 1) & 0xFFFFFFFF
+        if len(self._consulta_en) > 8: # Respuestas que nunca llegaron
+            self._consulta_en.clear()
+        self._consulta_en[self._consulta] = ahora
+        self.consultas += 1
+        self._enviar([encabezado(CONSULTA, self.nodo, self.epoca, self._consulta, 0, 0)])
+
+    def _recibir(self):
+        while True:
+            try:
+                n = self._socket.recv_into(self._buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            respuesta = parsear_respuesta(self._buffer[:n])
+            if respuesta is None:
+                continue
+            secuencia, libres, total, nodos, propios, por_nodo = respuesta
+            enviada = self._consulta_en.pop(secuencia, None)
+            if enviada is None:
+                continue
+            ahora = time.monotonic()
+            metricas.observar_segundos(H_CONSULTA, ahora - enviada)
+            self.respuestas += 1
+            if self._capacidad is None or enviada >= self._capacidad.t:
+                self._capacidad = Capacidad(enviada, libres, total, nodos, propios, por_nodo)
+
+    def despachar(self, ahora=None):
+        """Manda lo que toque (deltas, estado completo, consulta) y lee respuestas."""
+        ahora = time.monotonic() if ahora is None else ahora
+        self._recibir()
+        self._enviar_deltas()
+        if self._ultimo_completo is None or ahora - self._ultimo_completo >= self.intervalo_completo:
+            self._enviar_completo()
+            self._ultimo_completo = ahora
+        if self._ultima_consulta is None or ahora - self._ultima_consulta >= self.intervalo_consulta:
+            self._enviar_consulta(ahora)
+            self._ultima_consulta = ahora
+
+    def _bucle(self):
+        while self._activo:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            self.despachar()
+        self.despachar() # Lo último antes de salir
+
+    def iniciar(self):
+        self._activo = True
+        self._hilo = threading.Thread(target=self._bucle, name="enlace-agregador", daemon=True)
+        self._hilo.start()
+        print(f"[Agregador] Nodo {self.nodo} -> {self.direccion[0]}:{self.direccion[1]} "
+              f"(deltas cada {self.intervalo:g} s, completo cada {self.intervalo_completo:g} s).")
+
+    def detener(self):
+        if self._hilo is not None:
+            self._activo = False
+            self._despertar.set()
+            self._hilo.join(timeout=2)
+            self._hilo = None
+        self._socket.close()
+
+
+if __name__ == "__main__":
+    # Uso:  python3 agregador.py [puerto]                  (servicio)
+    #       python3 agregador.py consultar [host[:puerto]]  (capacidad del edificio)
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "consultar":
+        host, _, puerto = (sys.argv[2] if len(sys.argv) > 2 else "127.0.0.1").partition(":")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(2.0)
+        sock.sendto(encabezado(CONSULTA, 0, 0, 1, 0, 0), (host, int(puerto or PUERTO)))
+        try:
+            _, libres, total, nodos, _, por_nodo = parsear_respuesta(sock.recv(TAMANO_MAXIMO))
+        except (socket.timeout, TypeError):
+            print("[Agregador] Sin respuesta.")
+            sys.exit(1)
+        print(f"{libres} libres de {total} cajones en {nodos} nodos.")
+        for nodo, libres_nodo in por_nodo:
+            print(f"  nodo {nodo}: {libres_nodo} libres")
+        sys.exit(0)
+
+    agregador = Agregador(int(sys.argv[1]) if len(sys.argv) > 1 else PUERTO)
+    agregador.iniciar()
+    try:
+        while True:
+            time.sleep(10)
+            print(f"[Agregador] {agregador.libres()} libres de {agregador.total()} en "
+                  f"{agregador.nodos_vivos()} nodos ({agregador.paquetes} paquetes, "
+                  f"{agregador.perdidos} perdidos).")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agregador.detener()
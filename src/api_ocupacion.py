@@ -0,0 +1,278 @@
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import namedtuple
+from urllib.parse import urlsplit, parse_qs
+from estado_ocupacion import NOMBRES_ESTADO, LIBRE
+import metricas
+
+# --- Rutas ---
+RUTA_OCUPACION = "/ocupacion"
+RUTA_ESPERAR = "/ocupacion/esperar" # ?version=N&timeout=s (long-poll)
+RUTA_EVENTOS = "/ocupacion/eventos" # Server-Sent Events
+LATIDO_EVENTOS = 15.0               # s entre comentarios ': latido' del SSE
+MAX_ENCABEZADOS = 8192
+
+# Instantánea inmutable: todo lo que se manda ya está en bytes
+Instantanea = namedtuple("Instantanea", "version etag cuerpo respuesta respuesta_head evento")
+
+C_RESPUESTAS = metricas.contador("parkpi_api_respuestas_total", "Respuestas de la API de ocupación",
+                                 {'codigo': '200'})
+C_NO_MODIFICADAS = metricas.contador("parkpi_api_respuestas_total", "Respuestas de la API de ocupación",
+                                     {'codigo': '304'})
+
+_ESTADOS_HTTP = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+                 405: "Method Not Allowed", 431: "Request Header Fields Too Large"}
+
+
+def _respuesta(codigo, encabezados, cuerpo=b""):
+    lineas = [f"HTTP/1.1 {codigo} {_ESTADOS_HTTP[codigo]}"]
+    lineas += [f"{nombre}: {valor}" for nombre, valor in encabezados]
+    return ("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1") + cuerpo
+
+
+def _error(codigo):
+    cuerpo = f"{codigo} {_ESTADOS_HTTP[codigo]}\n".encode("latin-1")
+    return _respuesta(codigo, [("Content-Type", "text/plain; charset=utf-8"),
+                               ("Content-Length", len(cuerpo))], cuerpo)
+
+
+class ApiOcupacion:
+    """
+    API HTTP de solo lectura con el estado de los cajones, en su propio
+    hilo con su propio event loop (asyncio).
+
+    * GET /ocupacion: la última instantánea. Es inmutable y ya está en
+      bytes (JSON + encabezados), así que atender una petición es buscar
+      el ETag y escribir; con If-None-Match igual se contesta 304.
+    * La instantánea se rehace solo cuando un cajón cambia: cambio() (se
+      llama desde aplicar_estado) agenda UNA reconstrucción en el loop,
+      aunque lleguen varios cambios seguidos. Se lee el estado con
+      instantanea() (sin candados): la API nunca frena al hilo de peso.
+    * GET /ocupacion/esperar?version=N (long-poll) y /ocupacion/eventos
+      (SSE): todos los clientes esperan el mismo futuro, que se resuelve
+      al publicar; mil clientes esperando no cuestan nada.
+    """
+
+    def __init__(self, estados, puerto=8080, direccion="0.0.0.0", espera_maxima=30.0):
+        self.estados = estados
+        self.puerto = puerto
+        self.direccion = direccion
+        self.espera_maxima = espera_maxima
+        self.epoca = f"{random.getrandbits(32):08x}" # El ETag cambia si se reinicia la Pi
+
+        self.instantanea = None
+        self._version = 0
+        self._cambio = None     # Futuro que se resuelve en la próxima publicación
+        self._agendada = False
+        self._loop = None
+        self._servidor = None
+        self._hilo = None
+        self._listo = threading.Event()
+
+        self.reconstrucciones = 0
+        self.clientes = 0   # Conexiones abiertas
+        self.esperando = 0  # Long-poll + SSE
+
+    # --- Instantánea ---
+
+    def _construir(self):
+        self._version += 1
+        version = self._version
+        _, copia = self.estados.instantanea()
+        cuerpo = json.dumps({
+            'version': version,
+            't': round(time.time(), 3),
+            'libres': copia.count(LIBRE),
+            'total': len(copia),
+            'cajones': [NOMBRES_ESTADO[c] for c in copia],
+        }, separators=(",", ":")).encode("utf-8")
+        etag = f'"{self.epoca}-{version}"'
+        encabezados = [("Content-Type", "application/json"), ("Content-Length", len(cuerpo)),
+                       ("ETag", etag), ("Cache-Control", "no-cache"),
+                       ("Access-Control-Allow-Origin", "*")]
+        respuesta_head = _respuesta(200, encabezados)
+        evento = f"id: {version}\nevent: ocupacion\ndata: ".encode("latin-1") + cuerpo + b"\n\n"
+        self.reconstrucciones += 1
+        return Instantanea(version, etag, cuerpo, respuesta_head + cuerpo, respuesta_head, evento)
+
+    def _publicar(self):
+        self._agendada = False
+        self.instantanea = self._construir()
+        cambio, self._cambio = self._cambio, self._loop.create_future()
+        cambio.set_result(self.instantanea)
+
+    def cambio(self):
+        """Un cajón cambió (cualquier hilo). Agenda una sola reconstrucción."""
+        if self._loop is None or self._agendada:
+            return
+        self._agendada = True
+        try:
+            self._loop.call_soon_threadsafe(self._publicar)
+        except RuntimeError: # Loop ya cerrado (apagando)
+            pass
+
+    # --- HTTP ---
+
+    def _no_modificada(self, instantanea):
+        return _respuesta(304, [("ETag", instantanea.etag), ("Cache-Control", "no-cache")])
+
+    async def _esperar_cambio(self, version, segundos):
+        """Espera a que la versión publicada sea distinta de 'version'."""
+        self.esperando += 1
+        try:
+            while self.instantanea.version == version:
+                hecho, _ = await asyncio.wait({self._cambio}, timeout=segundos)
+                if not hecho:
+                    break
+        finally:
+            self.esperando -= 1
+        return self.instantanea
+
+    async def _eventos(self, escritor, ultima):
+        escritor.write(_respuesta(200, [("Content-Type", "text/event-stream"),
+                                        ("Cache-Control", "no-cache"),
+                                        ("Access-Control-Allow-Origin", "*")]))
+        version = self.instantanea.version
+        if ultima != version: # Un cliente que se reconecta no recibe lo que ya tiene
+            escritor.write(self.instantanea.evento)
+        while True:
+            instantanea = await self._esperar_cambio(version, LATIDO_EVENTOS)
+            if instantanea.version == version:
+                escritor.write(b": latido\n\n")
+            else:
+                escritor.write(instantanea.evento)
+                version = instantanea.version
+            await escritor.drain()
+
+    def _version_pedida(self, consulta, si_no_coincide):
+        """La versión que ya tiene el cliente (?version=N o If-None-Match)."""
+        if "version" in consulta:
+            try:
+                return int(consulta["version"][0])
+            except ValueError:
+                return None
+        if si_no_coincide and si_no_coincide.startswith(f'"{self.epoca}-'):
+            try:
+                return int(si_no_coincide[len(self.epoca) + 2:-1])
+            except ValueError:
+                return None
+        return None
+
+    async def _atender(self, lector, escritor):
+        self.clientes += 1
+        try:
+            while True:
+                try:
+                    crudo = await lector.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    escritor.write(_error(431))
+                    return
+                lineas = crudo.decode("latin-1").split("\r\n")
+                partes = lineas[0].split(" ")
+                if len(partes) != 3:
+                    escritor.write(_error(400))
+                    return
+                metodo, destino, protocolo = partes
+                encabezados = {}
+                for linea in lineas[1:]:
+                    nombre, _, valor = linea.partition(":")
+                    if nombre:
+                        encabezados[nombre.strip().lower()] = valor.strip()
+                cerrar = (encabezados.get("connection", "").lower() == "close" or
+                          protocolo == "HTTP/1.0" and encabezados.get("connection", "").lower() != "keep-alive")
+
+                if metodo not in ("GET", "HEAD"):
+                    escritor.write(_error(405))
+                    return
+                url = urlsplit(destino)
+                instantanea = self.instantanea
+                if url.path == RUTA_OCUPACION:
+                    if encabezados.get("if-none-match") == instantanea.etag:
+                        metricas.contar(C_NO_MODIFICADAS)
+                        escritor.write(self._no_modificada(instantanea))
+                    else:
+                        metricas.contar(C_RESPUESTAS)
+                        escritor.write(instantanea.respuesta if metodo == "GET" else instantanea.respuesta_head)
+                elif url.path == RUTA_ESPERAR:
+                    consulta = parse_qs(url.query)
+                    version = self._version_pedida(consulta, encabezados.get("if-none-match"))
+                    try:
+                        segundos = min(float(consulta.get("timeout", [self.espera_maxima])[0]), self.espera_maxima)
+                    except ValueError:
+                        segundos = self.espera_maxima
+                    if version == instantanea.version:
+                        instantanea = await self._esperar_cambio(version, segundos)
+                    if instantanea.version == version:
+                        metricas.contar(C_NO_MODIFICADAS)
+                        escritor.write(self._no_modificada(instantanea))
+                    else:
+                        metricas.contar(C_RESPUESTAS)
+                        escritor.write(instantanea.respuesta)
+                elif url.path == RUTA_EVENTOS:
+                    ultima = encabezados.get("last-event-id")
+                    await self._eventos(escritor, int(ultima) if ultima and ultima.isdigit() else None)
+                    return
+                else:
+                    escritor.write(_error(404))
+                await escritor.drain()
+                if cerrar:
+                    return
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clientes -= 1
+            escritor.close()
+
+    # --- Ciclo de vida ---
+
+    async def _servir(self):
+        self._loop = asyncio.get_running_loop()
+        self._cambio = self._loop.create_future()
+        self.instantanea = self._construir()
+        self._servidor = await asyncio.start_server(self._atender, self.direccion, self.puerto,
+                                                    limit=MAX_ENCABEZADOS, backlog=1024)
+        self.puerto = self._servidor.sockets[0].getsockname()[1]
+        self._listo.set()
+        async with self._servidor:
+            try:
+                await self._servidor.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    def _correr(self):
+        try:
+            asyncio.run(self._servir())
+        except Exception as e:
+            print(f"[API] Error: {e}")
+        finally:
+            self._listo.set()
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._correr, name="api-ocupacion", daemon=True)
+        self._hilo.start()
+        self._listo.wait(5.0)
+        if self._servidor is None:
+            raise OSError(f"No se pudo abrir el puerto {self.puerto}")
+        print(f"[API] Ocupación en http://localhost:{self.puerto}{RUTA_OCUPACION} "
+              f"(long-poll: {RUTA_ESPERAR}, SSE: {RUTA_EVENTOS}).")
+
+    def detener(self):
+        if self._loop is None or self._hilo is None:
+            return
+
+        def cerrar():
+            self._servidor.close()
+            for tarea in asyncio.all_tasks(self._loop):
+                tarea.cancel()
+
+        try:
+            self._loop.call_soon_threadsafe(cerrar)
+        except RuntimeError:
+            pass
+        self._hilo.join(timeout=2)
+        self._hilo = None
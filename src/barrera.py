@@ -0,0 +1,143 @@
+import threading
+import metricas
+
+CERRADA = 'CERRADA'
+ABRIENDO = 'ABRIENDO'
+ABIERTA = 'ABIERTA'
+CERRANDO = 'CERRANDO'
+
+H_SERVO = metricas.histograma("parkpi_servo_segundos",
+                              "Tomar el candado del servo y mandarle la posición")
+
+
+class ControladorBarrera:
+    """
+    Máquina de estados de la barrera: CERRADA -> ABRIENDO -> ABIERTA -> CERRANDO.
+
+    Un hilo propio mueve el servo y lleva los tiempos, así que quien pide
+    abrir (el hilo NFC) nunca se bloquea. Si llega otra tarjeta válida
+    mientras la barrera está abierta, se extiende el tiempo abierta; si
+    llega mientras se está cerrando, se vuelve a abrir.
+    """
+
+    def __init__(self, servo, backend, candado=None, tiempo_abierta=10.0,
+                 tiempo_movimiento=0.3, al_cambiar=None):
+        """
+        servo:             objeto con mid() (abrir) y min() (cerrar).
+        backend:           da el reloj (ahora / dormir).
+        candado:           candado del servo (opcional).
+        tiempo_abierta:    segundos que la barrera queda abierta tras la
+                           última solicitud.
+        tiempo_movimiento: segundos que tarda el servo en llegar.
+        al_cambiar:        función al_cambiar(estado) en cada transición.
+        """
+        self.servo = servo
+        self.backend = backend
+        self.candado = candado or threading.Lock()
+        self.tiempo_abierta = tiempo_abierta
+        self.tiempo_movimiento = tiempo_movimiento
+        self.al_cambiar = al_cambiar
+
+        self.estado = CERRADA
+        self.aperturas = 0  # Veces que el servo se movió a abierto
+        self.extensiones = 0 # Solicitudes que llegaron con la barrera ya abierta
+
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._activo = threading.Event()
+        self._pendiente = False
+        self._limite = 0.0 # Instante en que termina el estado actual
+        self._hilo = None
+
+    # --- API (no bloquea) ---
+
+    def solicitar_apertura(self):
+        """Pide abrir (o mantener abierta) la barrera. Regresa de inmediato."""
+        with self._lock:
+            if self.estado == ABIERTA:
+                self._limite = max(self._limite, self.backend.ahora() + self.tiempo_abierta)
+                self.extensiones += 1
+            else:
+                self._pendiente = True
+        self._despertar.set()
+
+    def esta_abierta(self):
+        return self.estado in (ABRIENDO, ABIERTA)
+
+    def iniciar(self):
+        if self._activo.is_set():
+            return
+        self._activo.set()
+        self._hilo = threading.Thread(target=self._bucle, name="barrera", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo y deja la barrera cerrada."""
+        self._activo.clear()
+        self._despertar.set()
+        if self._hilo:
+            self._hilo.join()
+            self._hilo = None
+        if self.estado != CERRADA:
+            self._mover(CERRANDO, self.servo.min)
+            self._mover(CERRADA, None)
+
+    # --- Hilo de la barrera ---
+
+    def _cambiar(self, estado, accion=None):
+        """Mueve el servo (si hace falta) y avisa del nuevo estado."""
+        if accion is not None:
+            t0 = metricas.inicio()
+            with self.candado:
+                accion()
+            metricas.observar(H_SERVO, t0)
+        if self.al_cambiar:
+            self.al_cambiar(estado)
+
+    def _mover(self, estado, accion):
+        self.estado = estado
+        self._cambiar(estado, accion)
+
+    def _bucle(self):
+        while self._activo.is_set():
+            # La transición se decide y se anota bajo el candado (así una
+            # solicitud nunca ve un estado viejo); el servo se mueve afuera.
+            with self._lock:
+                ahora = self.backend.ahora()
+                pendiente = self._pendiente
+                self._pendiente = False
+                accion, nuevo = None, None
+
+                if pendiente and self.estado in (CERRADA, CERRANDO):
+                    self._limite = ahora + self.tiempo_movimiento
+                    accion, nuevo = self.servo.mid, ABRIENDO
+                    self.aperturas += 1
+                elif pendiente and self.estado == ABRIENDO:
+                    # Ya se está abriendo: cuenta como extensión
+                    self.extensiones += 1
+                elif self.estado == ABRIENDO and ahora >= self._limite:
+                    self._limite = ahora + self.tiempo_abierta
+                    nuevo = ABIERTA
+                elif self.estado == ABIERTA and ahora >= self._limite:
+                    self._limite = ahora + self.tiempo_movimiento
+                    accion, nuevo = self.servo.min, CERRANDO
+                elif self.estado == CERRANDO and ahora >= self._limite:
+                    nuevo = CERRADA
+
+                if nuevo is not None:
+                    self.estado = nuevo
+
+            if nuevo is not None:
+                self._cambiar(nuevo, accion)
+                continue
+
+            if self.estado == CERRADA:
+                # Nada que hacer hasta la siguiente solicitud
+                self._despertar.wait()
+                self._despertar.clear()
+            else:
+                restante = self._limite - self.backend.ahora()
+                if self._despertar.is_set():
+                    self._despertar.clear()
+                else:
+                    self.backend.dormir(min(max(restante, 0.0), 0.05))
@@ -0,0 +1,106 @@
+"""
+Benchmark: adquisición del HX711 en un hilo vs. en un proceso aparte
+(no necesita hardware).
+
+El mismo bucle (bucle_adquisicion) corre en un hilo del proceso principal
+o en el proceso de AdquisicionEnProceso, mientras el proceso principal
+tiene hilos ocupados (como el hilo NFC, la histéresis y lo que se agregue)
+compitiendo por el GIL. Los HX711 simulados corren a 80 SPS con el modelo
+de apagado: si SCK queda en alto más de 60 µs la trama sale rota.
+
+Reporta por modo:
+  * tramas rotas (lejos del valor esperado) y fuera de rango (saturadas)
+  * jitter: desviación y p99 de |intervalo - 1/SPS| entre muestras
+
+Uso:  python3 bench_adquisicion.py [segundos] [hilos_de_carga]
+"""
+import io
+import os
+import sys
+import time
+import threading
+import functools
+import contextlib
+from adquisicion_proceso import AdquisicionEnProceso
+from hardware_simulado import BackendSimulado, TrazaDePeso
+
+SPS = 80
+APAGADO_US = 60
+PINES = [{'dt': 17, 'sck': 27}, {'dt': 5, 'sck': 6}, {'dt': 13, 'sck': 19}]
+OFFSET = 50000
+TOLERANCIA = 2000 # Crudo; el ruido simulado es de 20
+DURACION = 10.0
+HILOS_DE_CARGA = 2
+
+
+def crear_sim(sps, apagado_us):
+    """Fábrica del backend (se llama dentro del proceso de adquisición)."""
+    sim = BackendSimulado(semilla=5, escala=1.0)
+    for p in PINES:
+        sim.agregar_hx711(p['dt'], p['sck'], TrazaDePeso([(0.0, 0.0)]), factor=100.0,
+                          offset=OFFSET, sps=sps, apagado_us=apagado_us)
+    return sim
+
+
+def carga(activo):
+    """Trabajo Python puro que compite por el GIL."""
+    while activo.is_set():
+        sum(i * i for i in range(5000))
+
+
+def correr(en_hilo):
+    fabrica = functools.partial(crear_sim, SPS, APAGADO_US)
+    nucleo = (os.cpu_count() or 1) - 1 # El último núcleo para la adquisición
+    with contextlib.redirect_stdout(io.StringIO()):
+        adq = AdquisicionEnProceso(PINES, capacidad=int(SPS * DURACION * 2),
+                                   nucleo=None if en_hilo else nucleo,
+                                   fabrica_backend=fabrica, backend=fabrica())
+        adq.iniciar(en_hilo=en_hilo)
+
+    activo = threading.Event()
+    activo.set()
+    hilos = [threading.Thread(target=carga, args=(activo,), daemon=True) for _ in range(HILOS_DE_CARGA)]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(DURACION)
+    activo.clear()
+    for hilo in hilos:
+        hilo.join()
+
+    tramas = rotas = fuera = 0
+    desvios = []
+    for anillo in adq.anillos:
+        datos, _ = anillo.leer_desde(0)
+        tramas += len(datos)
+        fuera += anillo.fuera_de_rango
+        rotas += sum(1 for _, valor in datos if abs(valor - OFFSET) > TOLERANCIA)
+        tiempos = [t for t, _ in datos]
+        desvios += [abs((b - a) - 1.0 / SPS) for a, b in zip(tiempos, tiempos[1:])]
+    with contextlib.redirect_stdout(io.StringIO()):
+        adq.detener()
+
+    desvios.sort()
+    media = sum(desvios) / len(desvios) if desvios else float('nan')
+    p99 = desvios[min(len(desvios) - 1, int(len(desvios) * 0.99))] if desvios else float('nan')
+    return tramas, rotas, fuera, media, p99, desvios[-1] if desvios else float('nan')
+
+
+def main():
+    global DURACION, HILOS_DE_CARGA
+    if len(sys.argv) > 1:
+        DURACION = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        HILOS_DE_CARGA = int(sys.argv[2])
+
+    print(f"{len(PINES)} HX711 a {SPS} SPS durante {DURACION:g} s, {HILOS_DE_CARGA} hilos de carga, "
+          f"apagado si SCK > {APAGADO_US} µs. {os.cpu_count()} núcleo(s).")
+    print(f"{'modo':<8} {'tramas':>7} {'rotas':>6} {'% rotas':>8} {'fuera rango':>11} "
+          f"{'jitter medio ms':>15} {'p99 ms':>8} {'máx ms':>8}")
+    for nombre, en_hilo in (("hilo", True), ("proceso", False)):
+        tramas, rotas, fuera, media, p99, maximo = correr(en_hilo)
+        print(f"{nombre:<8} {tramas:>7} {rotas:>6} {rotas / max(tramas, 1) * 100:>7.2f}% {fuera:>11} "
+              f"{media * 1000:>15.3f} {p99 * 1000:>8.3f} {maximo * 1000:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
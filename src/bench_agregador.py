@@ -0,0 +1,182 @@
+"""
+Prueba de carga del agregador (agregador.py): cientos de nodos simulados en
+una sola máquina, por UDP en localhost. El agregador corre en su propio
+proceso (como en el edificio); los nodos, en este.
+
+Cada nodo tiene CAJONES cajones y cambia CAMBIOS_POR_NODO cajones por
+segundo (mucho más que un lote real: es una prueba de carga); una fracción
+REBOTES de los cambios vuelve atrás a los 20 ms (un coche que se acomoda).
+Modos:
+
+  * inmediato:  un datagrama por cambio (sin lotes ni coalescencia)
+  * lotes:      EnlaceAgregador con su intervalo de 50 ms
+
+Reporta datagramas y bytes por segundo hacia el agregador, los que el
+agregador procesó y perdió, el error de su total de libres contra la
+verdad (consultas cada 0.1 s y al final) y la edad de la capacidad que
+ven los nodos (consulta -> respuesta leída; el nodo lee en su siguiente
+vuelta, así que incluye hasta un intervalo de espera).
+
+Uso:  python3 bench_agregador.py [nodos] [segundos] [cambios_por_nodo]
+"""
+import io
+import sys
+import time
+import random
+import contextlib
+import multiprocessing
+import socket
+import agregador
+from estado_ocupacion import AlmacenDeEstados, LIBRE, OCUPADO
+
+NODOS = 200
+CAJONES = 64
+SEGUNDOS = 5.0
+CAMBIOS_POR_NODO = 10.0 # Cambios por segundo en cada nodo
+REBOTES = 0.3
+REBOTE = 0.02          # s
+PASO = 0.005           # s entre vueltas del simulador
+PUERTO = 9277
+
+
+def servir(puerto, listo, fin, resultado):
+    with contextlib.redirect_stdout(io.StringIO()):
+        servicio = agregador.Agregador(puerto, "127.0.0.1")
+        servicio.iniciar()
+    listo.set()
+    fin.wait()
+    servicio.detener()
+    resultado.send((servicio.paquetes, servicio.deltas, servicio.viejas, servicio.perdidos,
+                    servicio.consultas))
+
+
+def consultar(sock, secuencia):
+    sock.sendto(agregador.encabezado(agregador.CONSULTA, 0, 0, secuencia, 0, 0), ("127.0.0.1", PUERTO))
+
+
+def correr(inmediato, semilla):
+    listo, fin = multiprocessing.Event(), multiprocessing.Event()
+    recibir, enviar = multiprocessing.Pipe(duplex=False)
+    proceso = multiprocessing.Process(target=servir, args=(PUERTO, listo, fin, enviar))
+    proceso.start()
+    listo.wait()
+    agregador.H_CONSULTA.reiniciar()
+
+    rnd = random.Random(semilla)
+    nodos = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for n in range(NODOS):
+            estados = AlmacenDeEstados(CAJONES)
+            for i in range(CAJONES):
+                if rnd.random() < 0.7:
+                    estados.cambiar(i, OCUPADO)
+            enlace = agregador.EnlaceAgregador(("127.0.0.1", PUERTO), n + 1, estados)
+            # Cada nodo despacha en su propio instante (como hilos independientes)
+            nodos.append([estados, enlace, rnd.uniform(0, enlace.intervalo)])
+    libres = sum(e.libres() for e, _, _ in nodos)
+
+    sonda = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sonda.setblocking(False)
+    enviadas = {}
+    errores = []
+    rebotes = []
+    prob = CAMBIOS_POR_NODO * PASO
+    inicio = time.monotonic()
+    proxima_sonda = inicio
+    ahora = inicio
+
+    def cambiar(estados, enlace, i, estado):
+        if estados.cambiar(i, estado):
+            enlace.cambio(i, estado)
+            return 1 if estado == LIBRE else -1
+        return 0
+
+    while ahora - inicio < SEGUNDOS + 1.0:
+        cambios = ahora - inicio < SEGUNDOS
+        for nodo in nodos:
+            estados, enlace, proximo = nodo
+            if cambios and rnd.random() < prob:
+                i = rnd.randrange(CAJONES)
+                nuevo = OCUPADO if estados.codigo(i) == LIBRE else LIBRE
+                libres += cambiar(estados, enlace, i, nuevo)
+                if rnd.random() < REBOTES:
+                    rebotes.append((ahora + REBOTE, estados, enlace, i, 1 - nuevo))
+                if inmediato:
+                    enlace.despachar(ahora)
+            if ahora >= proximo:
+                enlace.despachar(ahora)
+                nodo[2] = ahora + enlace.intervalo
+        while rebotes and rebotes[0][0] <= ahora:
+            _, estados, enlace, i, estado = rebotes.pop(0)
+            libres += cambiar(estados, enlace, i, estado)
+            if inmediato:
+                enlace.despachar(ahora)
+
+        # Sonda: libres según el agregador vs. la verdad al preguntar
+        if ahora >= proxima_sonda:
+            secuencia = len(enviadas) + 1
+            enviadas[secuencia] = libres
+            consultar(sonda, secuencia)
+            proxima_sonda = ahora + 0.1
+        try:
+            while True:
+                respuesta = agregador.parsear_respuesta(sonda.recv(agregador.TAMANO_MAXIMO))
+                if respuesta:
+                    errores.append(abs(respuesta[1] - enviadas[respuesta[0]]))
+        except BlockingIOError:
+            pass
+        time.sleep(PASO)
+        ahora = time.monotonic()
+
+    # Estado final (ya sin cambios)
+    sonda.setblocking(True)
+    sonda.settimeout(1.0)
+    consultar(sonda, 0)
+    final = agregador.parsear_respuesta(sonda.recv(agregador.TAMANO_MAXIMO))
+    fin.set()
+    servicio = recibir.recv()
+    proceso.join()
+
+    cambios = sum(e.cambios for _, e, _ in nodos)
+    deltas = sum(e.deltas for _, e, _ in nodos)
+    paquetes = sum(e.paquetes for _, e, _ in nodos)
+    bytes_ = sum(e.bytes for _, e, _ in nodos)
+    for _, enlace, _ in nodos:
+        enlace.detener()
+    sonda.close()
+    duracion = ahora - inicio
+    h = agregador.H_CONSULTA
+    return {
+        'cambios': cambios, 'deltas': deltas,
+        'paquetes_s': paquetes / duracion, 'bytes_s': bytes_ / duracion,
+        'servicio': servicio, 'errores': sorted(errores),
+        'final': final[1] - libres if final else None,
+            'rtt': (h.percentil(50) / 1e6, h.percentil(99) / 1e6),
+    }
+
+
+def main():
+    global NODOS, SEGUNDOS, CAMBIOS_POR_NODO
+    if len(sys.argv) > 1:
+        NODOS = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        SEGUNDOS = float(sys.argv[2])
+    if len(sys.argv) > 3:
+        CAMBIOS_POR_NODO = float(sys.argv[3])
+
+    print(f"{NODOS} nodos x {CAJONES} cajones, {CAMBIOS_POR_NODO:g} cambios/s por nodo "
+          f"({REBOTES:.0%} rebotan), {SEGUNDOS:g} s.")
+    print(f"{'modo':<10} {'cambios':>7} {'deltas':>7} {'dgram/s':>8} {'KB/s':>6} {'procesados':>10} "
+          f"{'perdidos':>8} {'error p50':>9} {'error máx':>9} {'final':>5} {'edad p50/p99 ms':>16}")
+    for nombre, inmediato in (("inmediato", True), ("lotes", False)):
+        r = correr(inmediato, 1)
+        paquetes, _, _, perdidos, _ = r['servicio']
+        errores = r['errores']
+        print(f"{nombre:<10} {r['cambios']:>7} {r['deltas']:>7} {r['paquetes_s']:>8.0f} "
+              f"{r['bytes_s'] / 1024:>6.1f} {paquetes:>10} {perdidos:>8} "
+              f"{errores[len(errores) // 2]:>9} {errores[-1]:>9} {r['final']:>5} "
+              f"{r['rtt'][0]:>10.1f}/{r['rtt'][1]:<5.1f}")
+
+
+if __name__ == "__main__":
+    main()
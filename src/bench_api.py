@@ -0,0 +1,227 @@
+"""
+Prueba de carga de la API de ocupación (api_ocupacion.py) contra un lote
+simulado. El servidor corre en su propio proceso junto con:
+
+  * un cambio de cajón al azar cada CAMBIO s (el lote simulado)
+  * un "carril de peso" que despierta cada 10 ms; se mide cuánto se
+    atrasa (lo que la API le roba al camino caliente)
+
+Servidores:
+
+  * ingenuo:     ThreadingHTTPServer (un hilo por conexión) que copia el
+                 estado y arma el JSON en cada petición
+  * instantánea: ApiOcupacion (asyncio, JSON preconstruido, ETag)
+
+Carga (un proceso cliente con asyncio, conexiones keep-alive):
+
+  * GET:            CONEXIONES clientes pidiendo /ocupacion sin parar
+  * GET + ETag:     lo mismo con If-None-Match (casi todo es 304)
+  * long-poll:      ESPERANDO clientes en /ocupacion/esperar; latencia de
+                    cambio -> respuesta en todos ellos
+
+Uso:  python3 bench_api.py [segundos] [conexiones] [esperando]
+"""
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import threading
+import contextlib
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from api_ocupacion import ApiOcupacion
+from estado_ocupacion import AlmacenDeEstados
+
+SEGUNDOS = 5.0
+CONEXIONES = 50
+ESPERANDO = 2000
+CAJONES = 64
+CAMBIO = 0.5   # s entre cambios de cajón
+PERIODO = 0.01 # s del carril de peso simulado
+PUERTO = 9381
+
+
+def percentil(datos, p):
+    return datos[min(len(datos) - 1, int(len(datos) * p))] if datos else float('nan')
+
+
+# --- Servidor (proceso aparte) ---
+
+def servidor_ingenuo(estados, puerto):
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # keep-alive, como la otra
+
+        def do_GET(self):
+            cajones = estados.como_lista()
+            cuerpo = json.dumps({'t': time.time(), 'libres': cajones.count('LIBRE'),
+                                 'total': len(cajones), 'cajones': cajones}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", puerto), Manejador)
+    servidor.daemon_threads = True
+    servidor.request_queue_size = 1024
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor.shutdown
+
+
+def servir(modo, puerto, listo, fin, resultado):
+    estados = AlmacenDeEstados(CAJONES)
+    rnd = random.Random(3)
+    if modo == "ingenuo":
+        detener = servidor_ingenuo(estados, puerto)
+        avisar = lambda: None
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            api = ApiOcupacion(estados, puerto, "127.0.0.1")
+            api.iniciar()
+        detener, avisar = api.detener, api.cambio
+    atrasos = []
+    activo = threading.Event()
+    activo.set()
+
+    def lote():
+        while activo.is_set():
+            time.sleep(CAMBIO)
+            i = rnd.randrange(CAJONES)
+            estados.cambiar(i, 'OCUPADO' if estados[i] == 'LIBRE' else 'LIBRE')
+            avisar()
+
+    def carril():
+        proximo = time.perf_counter()
+        while activo.is_set():
+            proximo += PERIODO
+            time.sleep(max(0.0, proximo - time.perf_counter()))
+            atrasos.append(time.perf_counter() - proximo)
+
+    hilos = [threading.Thread(target=lote, daemon=True), threading.Thread(target=carril, daemon=True)]
+    for hilo in hilos:
+        hilo.start()
+    listo.set()
+    fin.wait()
+    activo.clear()
+    for hilo in hilos:
+        hilo.join()
+    detener()
+    resultado.send(sorted(atrasos[len(atrasos) // 10:])) # Sin el arranque
+
+
+# --- Cliente ---
+
+async def leer_respuesta(lector):
+    encabezado = await lector.readuntil(b"\r\n\r\n")
+    largo = 0
+    etag = None
+    for linea in encabezado.split(b"\r\n")[1:]:
+        nombre, _, valor = linea.partition(b":")
+        nombre = nombre.lower()
+        if nombre == b"content-length":
+            largo = int(valor)
+        elif nombre == b"etag":
+            etag = valor.strip()
+    cuerpo = await lector.readexactly(largo) if largo else b""
+    return int(encabezado[9:12]), etag, cuerpo
+
+
+async def cliente_get(fin, latencias, con_etag):
+    lector, escritor = await asyncio.open_connection("127.0.0.1", PUERTO)
+    etag = None
+    try:
+        while time.perf_counter() < fin:
+            extra = b"If-None-Match: " + etag + b"\r\n" if con_etag and etag else b""
+            t0 = time.perf_counter()
+            escritor.write(b"GET /ocupacion HTTP/1.1\r\nHost: x\r\n" + extra + b"\r\n")
+            codigo, nuevo, _ = await leer_respuesta(lector)
+            latencias.append(time.perf_counter() - t0)
+            etag = nuevo or etag
+    finally:
+        escritor.close()
+
+
+async def carga_get(segundos, conexiones, con_etag):
+    latencias = []
+    fin = time.perf_counter() + segundos
+    await asyncio.gather(*(cliente_get(fin, latencias, con_etag) for _ in range(conexiones)))
+    return latencias
+
+
+async def cliente_espera(version, llegadas):
+    lector, escritor = await asyncio.open_connection("127.0.0.1", PUERTO)
+    try:
+        escritor.write(f"GET /ocupacion/esperar?version={version}&timeout=10 HTTP/1.1\r\nHost: x\r\n\r\n"
+                       .encode("latin-1"))
+        codigo, _, cuerpo = await leer_respuesta(lector)
+        if codigo == 200:
+            llegadas.append(time.time() - json.loads(cuerpo)['t'])
+    finally:
+        escritor.close()
+
+
+async def carga_espera(esperando):
+    lector, escritor = await asyncio.open_connection("127.0.0.1", PUERTO)
+    escritor.write(b"GET /ocupacion HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+    _, _, cuerpo = await leer_respuesta(lector)
+    escritor.close()
+    version = json.loads(cuerpo)['version']
+    llegadas = []
+    await asyncio.gather(*(cliente_espera(version, llegadas) for _ in range(esperando)))
+    return sorted(llegadas)
+
+
+def correr(modo, carga):
+    listo, fin = multiprocessing.Event(), multiprocessing.Event()
+    recibir, enviar = multiprocessing.Pipe(duplex=False)
+    proceso = multiprocessing.Process(target=servir, args=(modo, PUERTO, listo, fin, enviar))
+    proceso.start()
+    listo.wait()
+    try:
+        resultado = asyncio.run(carga())
+    finally:
+        fin.set()
+        atrasos = recibir.recv()
+        proceso.join()
+    return resultado, atrasos
+
+
+def main():
+    global SEGUNDOS, CONEXIONES, ESPERANDO
+    if len(sys.argv) > 1:
+        SEGUNDOS = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        CONEXIONES = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        ESPERANDO = int(sys.argv[3])
+
+    print(f"{CAJONES} cajones, un cambio cada {CAMBIO:g} s; {CONEXIONES} conexiones keep-alive, "
+          f"{SEGUNDOS:g} s por prueba.")
+    print(f"{'servidor':<12} {'carga':<11} {'pet/s':>8} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'atraso del carril p99 / máx ms':>31}")
+    pruebas = [
+        ("ingenuo", "GET", lambda: carga_get(SEGUNDOS, CONEXIONES, False)),
+        ("instantánea", "GET", lambda: carga_get(SEGUNDOS, CONEXIONES, False)),
+        ("instantánea", "GET + ETag", lambda: carga_get(SEGUNDOS, CONEXIONES, True)),
+    ]
+    for servidor, nombre, carga in pruebas:
+        latencias, atrasos = correr(servidor, carga)
+        latencias.sort()
+        print(f"{servidor:<12} {nombre:<11} {len(latencias) / SEGUNDOS:>8.0f} "
+              f"{percentil(latencias, 0.5) * 1000:>7.2f} {percentil(latencias, 0.99) * 1000:>7.2f} "
+              f"{percentil(atrasos, 0.99) * 1000:>20.2f} / {atrasos[-1] * 1000:<8.2f}")
+
+    llegadas, atrasos = correr("instantánea", lambda: carga_espera(ESPERANDO))
+    print(f"\nLong-poll: {ESPERANDO} clientes esperando; {len(llegadas)} despertaron con el cambio: "
+          f"cambio -> respuesta p50 {percentil(llegadas, 0.5) * 1000:.1f} ms, "
+          f"p99 {percentil(llegadas, 0.99) * 1000:.1f} ms; atraso del carril p99 "
+          f"{percentil(atrasos, 0.99) * 1000:.2f} ms.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: tiempo de arranque de las celdas (no necesita hardware).
+
+Mide, en segundos del reloj simulado (lo que tardaría en la Pi), desde que
+se crean las celdas hasta que están listas para muestrear; en Main.py el
+gestor NFC (la primera tarjeta concedida) espera a ese momento.
+
+  * secuencial: como antes, cada CeldaDeCarga se tara al crearse
+    (5 conversiones a 10 SPS + 0.5 s), una tras otra.
+  * paralelo:   sin calibracion.json: se crean sin tara y se taran
+    todas a la vez (AlmacenDeCalibracion.preparar).
+  * guardado:   con offsets vigentes en calibracion.json: no se espera
+    ninguna conversión; la revisión queda para RetaraEnSegundoPlano.
+
+Uso:  python3 bench_arranque.py [escala]
+"""
+import io
+import os
+import sys
+import tempfile
+import contextlib
+from celda_carga import CeldaDeCarga
+from calibracion import AlmacenDeCalibracion
+from hardware_simulado import BackendSimulado, TrazaDePeso
+
+CELDAS = [1, 3, 8, 16, 32]
+ESCALA = 10.0 # Reloj simulado más rápido que el real
+
+
+def crear_sim(n):
+    sim = BackendSimulado(semilla=6, escala=ESCALA)
+    for i in range(n):
+        sim.agregar_hx711(1000 + i, 2000 + i, TrazaDePeso([(0.0, 0.0)]), factor=100.0)
+    return sim
+
+
+def arrancar(n, modo, ruta):
+    sim = crear_sim(n)
+    t0 = sim.ahora()
+    if modo == "secuencial":
+        celdas = []
+        for i in range(n):
+            celda = CeldaDeCarga(pin_dt=1000 + i, pin_sck=2000 + i, backend=sim)
+            celda.establecer_factor_escala(100.0)
+            celdas.append(celda)
+    else:
+        celdas = [CeldaDeCarga(pin_dt=1000 + i, pin_sck=2000 + i, backend=sim, calibrar=False)
+                  for i in range(n)]
+        almacen = AlmacenDeCalibracion(ruta)
+        almacen.preparar(celdas, [100.0] * n)
+    listo = sim.ahora() - t0
+    for celda in celdas:
+        celda.limpiar()
+    return listo
+
+
+def main():
+    global ESCALA
+    if len(sys.argv) > 1:
+        ESCALA = float(sys.argv[1])
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        print(f"Segundos (reloj simulado, escala {ESCALA:g}x) hasta tener las celdas listas.")
+        print(f"{'celdas':>6} {'secuencial':>11} {'paralelo':>9} {'guardado':>9}")
+        for n in CELDAS:
+            ruta = os.path.join(carpeta, f"calibracion_{n}.json")
+            with contextlib.redirect_stdout(io.StringIO()):
+                secuencial = arrancar(n, "secuencial", ruta)
+                paralelo = arrancar(n, "paralelo", ruta)   # Sin archivo: tara y lo escribe
+                guardado = arrancar(n, "guardado", ruta)   # Con el archivo recién escrito
+            print(f"{n:>6} {secuencial:>11.2f} {paralelo:>9.2f} {guardado:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Benchmark de hora pico en la entrada (no necesita hardware).
+
+Compara el gestor de acceso de la versión 25 (servo.mid() + sleep(10) +
+sleep(3) en el hilo NFC) contra el de ahora (ControladorBarrera: la barrera
+se mueve en su propio hilo y se mantiene abierta si llegan más tarjetas).
+
+Los coches llegan en fila (proceso de Poisson). El coche de adelante acerca
+su tarjeta; cuando la barrera está abierta después de que su tarjeta fue
+leída, pasa (tarda T_PASO segundos) y el siguiente puede acercar la suya.
+
+Reporta entradas por minuto y la latencia tarjeta -> barrera abierta.
+
+Uso:  python3 bench_barrera.py [coches_por_minuto] [minutos]
+"""
+import io
+import sys
+import random
+import threading
+import contextlib
+import Main
+from barrera import ControladorBarrera
+from hardware_simulado import BackendSimulado
+from sensor_nfc import SensorNFC
+
+UID = "557ddc3e"
+T_PASO = 3.0          # Segundos que tarda un coche en cruzar
+LLEGADAS_POR_MINUTO = 12.0
+MINUTOS = 20.0
+ESCALA = 100.0
+
+
+class FilaDeCoches:
+    """
+    PN532 simulado que reacciona a la barrera: una fila de coches que
+    acercan su tarjeta uno tras otro.
+    """
+
+    firmware_version = (0x32, 1, 6, 7)
+
+    def __init__(self, sim, servo, llegadas):
+        self.sim = sim
+        self.servo = servo
+        self.coches = [{'llegada': t, 'toque': None, 'leida': None, 'abierta': None}
+                       for t in llegadas]
+        self.k = 0 # Coche al frente de la fila
+        self.libre_desde = 0.0
+
+    def SAM_configuration(self):
+        pass
+
+    def _abierta_desde(self, t0):
+        """Primer instante >= t0 con la barrera abierta (servo en mid)."""
+        estado = None
+        for t, valor in self.servo.historial:
+            if t <= t0:
+                estado = valor
+            elif valor == 0:
+                return t if estado != 0 else t0
+            else:
+                estado = valor
+        return t0 if estado == 0 else None
+
+    def _avanzar_fila(self):
+        while self.k < len(self.coches):
+            coche = self.coches[self.k]
+            if coche['leida'] is None:
+                return
+            t = self._abierta_desde(coche['leida'])
+            if t is None:
+                return
+            coche['abierta'] = t
+            self.libre_desde = t + T_PASO
+            self.k += 1
+
+    def read_passive_target(self, card_baud=0x00, timeout=1):
+        ahora = self.sim.ahora()
+        self._avanzar_fila()
+        if self.k < len(self.coches):
+            coche = self.coches[self.k]
+            disponible = max(coche['llegada'], self.libre_desde)
+            if coche['leida'] is None and ahora >= disponible:
+                coche['toque'] = disponible
+                coche['leida'] = ahora
+                return bytearray.fromhex(UID)
+        self.sim.dormir(timeout)
+        return None
+
+
+GPIO_LOCK_V25 = threading.Lock() # El candado global de la versión 25
+
+
+def gestor_acceso_v25(sensor_nfc, servo):
+    """El bucle de la versión 25 (bloquea 13 s por coche)."""
+    while Main.app_running.is_set():
+        uid_string = sensor_nfc.esperar_y_leer_uid(timeout=0.1)
+        if uid_string:
+            if sensor_nfc.es_valido(uid_string) and Main.estado_cajones.hay_libre():
+                with GPIO_LOCK_V25:
+                    servo.mid()
+                Main.hw.dormir(10)
+                with GPIO_LOCK_V25:
+                    servo.min()
+            Main.hw.dormir(3)
+        Main.hw.dormir(0.1)
+
+
+def correr(modo, llegadas, duracion):
+    sim = BackendSimulado(semilla=1, escala=ESCALA)
+    servo = sim.crear_servo(Main.PIN_SERVO, 0.5/1000, 2.5/1000)
+    servo.min()
+    fila = FilaDeCoches(sim, servo, llegadas)
+    sim.lector = fila
+    Main.hw = sim
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sensor = SensorNFC(backend=sim)
+        sensor.valid_uids = {UID}
+        Main.app_running.set()
+        if modo == 'v25':
+            hilo = threading.Thread(target=gestor_acceso_v25, args=(sensor, servo))
+            barrera = None
+        else:
+            barrera = ControladorBarrera(servo, sim, candado=Main.recursos.candado("servo").prioritario(),
+                                         tiempo_abierta=Main.TIEMPO_BARRERA_ABIERTA,
+                                         tiempo_movimiento=Main.TIEMPO_MOVIMIENTO_SERVO)
+            barrera.iniciar()
+            hilo = threading.Thread(target=Main.gestor_acceso_nfc, args=(sensor, barrera))
+        hilo.start()
+        while sim.ahora() < duracion:
+            sim.dormir(1.0)
+        Main.app_running.clear()
+        hilo.join()
+        if barrera:
+            barrera.detener()
+
+    admitidos = [c for c in fila.coches if c['abierta'] is not None and c['abierta'] <= duracion]
+    latencias = sorted(c['abierta'] - c['toque'] for c in admitidos)
+    por_minuto = len(admitidos) / (duracion / 60.0)
+    if latencias:
+        media = sum(latencias) / len(latencias)
+        p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+    else:
+        media = p95 = float('nan')
+    en_fila = sum(1 for c in fila.coches if c['llegada'] <= duracion) - len(admitidos)
+    return por_minuto, media, p95, en_fila
+
+
+def main():
+    global LLEGADAS_POR_MINUTO, MINUTOS
+    if len(sys.argv) > 1:
+        LLEGADAS_POR_MINUTO = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        MINUTOS = float(sys.argv[2])
+
+    duracion = MINUTOS * 60.0
+    rnd = random.Random(11)
+    llegadas = []
+    t = 0.0
+    while t < duracion:
+        t += rnd.expovariate(LLEGADAS_POR_MINUTO / 60.0)
+        llegadas.append(t)
+
+    print(f"Hora pico: {LLEGADAS_POR_MINUTO:g} coches/min durante {MINUTOS:g} min "
+          f"({len(llegadas)} coches), {T_PASO:g} s para cruzar.")
+    print(f"{'gestor':<10} {'entradas/min':>12} {'lat. media s':>12} {'lat. p95 s':>10} {'en fila':>8}")
+    for modo, nombre in (('v25', 'antes'), ('v32', 'ahora')):
+        por_minuto, media, p95, en_fila = correr(modo, llegadas, duracion)
+        print(f"{nombre:<10} {por_minuto:>12.2f} {media:>12.2f} {p95:>10.2f} {en_fila:>8}")
+
+
+if __name__ == "__main__":
+    main()
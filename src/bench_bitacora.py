@@ -0,0 +1,133 @@
+"""
+Benchmark de la bitácora (bitacora.py). No necesita hardware; escribe en
+una carpeta temporal del disco donde corre (en la Pi, correrlo sobre la SD
+para ver sus tiempos de fsync).
+
+  * síncrono:   lo que haría un registro ingenuo: write + fsync en el
+                mismo hilo que decide el acceso (la puerta espera al disco)
+  * bitácora:   Bitacora con distintos lotes; se mide cuánto tarda
+                registrar() en el hilo que llama (lo único que ve la
+                puerta), cuántos fsync hubo y cuánto tardó el escritor en
+                dejar todo en disco
+  * repetición: leer EVENTOS_REPETICION registros con mmap y reconstruir
+                el estado de los cajones al arrancar
+
+Uso:  python3 bench_bitacora.py [eventos] [eventos_repeticion]
+"""
+import io
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+import contextlib
+import bitacora
+from estado_ocupacion import AlmacenDeEstados
+
+EVENTOS = 5000
+EVENTOS_REPETICION = 1000000
+CAJONES = 64
+PRODUCTORES = 2 # Hilos que registran a la vez (NFC + muestreo)
+CONFIGURACIONES = [
+    ("lote 1 (fsync por evento)", {'intervalo': 0.2, 'lote': 1, 'fsync': True}),
+    ("lote 64 / 0.2 s", {'intervalo': 0.2, 'lote': 64, 'fsync': True}),
+    ("lote 512 / 1 s", {'intervalo': 1.0, 'lote': 512, 'fsync': True}),
+    ("sin fsync", {'intervalo': 0.2, 'lote': 64, 'fsync': False}),
+]
+
+
+def percentil(datos, p):
+    return datos[min(len(datos) - 1, int(len(datos) * p))]
+
+
+def eventos_al_azar(n, semilla):
+    rnd = random.Random(semilla)
+    return [(bitacora.CAJON_OCUPADO if rnd.random() < 0.5 else bitacora.CAJON_LIBRE,
+             rnd.randrange(CAJONES), rnd.uniform(0, 900)) for _ in range(n)]
+
+
+def correr_sincrono(carpeta, eventos):
+    fd = os.open(os.path.join(carpeta, "sincrono.bin"), os.O_WRONLY | os.O_CREAT | os.O_APPEND)
+    tiempos = []
+    for tipo, cajon, peso in eventos:
+        t0 = time.perf_counter()
+        os.write(fd, bitacora.empaquetar(time.time(), tipo, cajon, b"", peso))
+        os.fsync(fd)
+        tiempos.append(time.perf_counter() - t0)
+    os.close(fd)
+    return sorted(tiempos), sum(tiempos), len(eventos)
+
+
+def correr_bitacora(carpeta, eventos, opciones):
+    estados = AlmacenDeEstados(CAJONES)
+    diario = bitacora.Bitacora(carpeta, estados=estados, **opciones)
+    diario.iniciar()
+    partes = [eventos[k::PRODUCTORES] for k in range(PRODUCTORES)]
+    tiempos = [[] for _ in partes]
+
+    def producir(parte, tiempos):
+        for tipo, cajon, peso in parte:
+            t0 = time.perf_counter()
+            diario.registrar(tipo, cajon, peso=peso)
+            tiempos.append(time.perf_counter() - t0)
+            time.sleep(0.0002) # Los eventos reales no llegan todos juntos
+
+    t0 = time.perf_counter()
+    hilos = [threading.Thread(target=producir, args=(p, t)) for p, t in zip(partes, tiempos)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    diario.detener()
+    total = time.perf_counter() - t0
+    return sorted(t for lista in tiempos for t in lista), total, diario
+
+
+def main():
+    global EVENTOS, EVENTOS_REPETICION
+    if len(sys.argv) > 1:
+        EVENTOS = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        EVENTOS_REPETICION = int(sys.argv[2])
+
+    eventos = eventos_al_azar(EVENTOS, 1)
+    print(f"{EVENTOS} eventos, {PRODUCTORES} hilos productores.")
+    print(f"{'modo':<26} {'p50 µs':>8} {'p99 µs':>8} {'máx µs':>9} {'fsync':>6} {'total s':>8}")
+    with tempfile.TemporaryDirectory() as carpeta:
+        tiempos, total, fsyncs = correr_sincrono(carpeta, eventos[:min(EVENTOS, 1000)])
+        print(f"{'síncrono (write+fsync)':<26} {percentil(tiempos, 0.5) * 1e6:>8.1f} "
+              f"{percentil(tiempos, 0.99) * 1e6:>8.1f} {tiempos[-1] * 1e6:>9.1f} {fsyncs:>6} {total:>8.2f}"
+              f"  ({len(tiempos)} eventos)")
+        for nombre, opciones in CONFIGURACIONES:
+            sub = os.path.join(carpeta, nombre.replace(" ", "_").replace("/", "_"))
+            with contextlib.redirect_stdout(io.StringIO()):
+                tiempos, total, diario = correr_bitacora(sub, eventos, opciones)
+            leidos = sum(1 for e in bitacora.leer_eventos(sub) if not e.tipo & bitacora.INSTANTANEA) - 1
+            print(f"{nombre:<26} {percentil(tiempos, 0.5) * 1e6:>8.1f} {percentil(tiempos, 0.99) * 1e6:>8.1f} "
+                  f"{tiempos[-1] * 1e6:>9.1f} {diario.fsyncs:>6} {total:>8.2f}"
+                  f"  ({leidos} en disco)")
+
+        # --- Repetición con mmap ---
+        sub = os.path.join(carpeta, "repeticion")
+        diario = bitacora.Bitacora(sub, estados=AlmacenDeEstados(CAJONES), intervalo=0.05, lote=4096,
+                                   fsync=False, segmentos_max=1000)
+        with contextlib.redirect_stdout(io.StringIO()):
+            diario.iniciar()
+            for tipo, cajon, peso in eventos_al_azar(EVENTOS_REPETICION, 2):
+                diario.registrar(tipo, cajon, peso=peso)
+            diario.detener()
+        n_segmentos = len(bitacora.segmentos(sub))
+        t0 = time.perf_counter()
+        n = sum(1 for _ in bitacora.leer_eventos(sub))
+        t_leer = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        bitacora.reconstruir_estado(sub, CAJONES)
+        t_estado = time.perf_counter() - t0
+        print(f"\nRepetición: {n} registros en {n_segmentos} segmentos: leer todo {t_leer:.2f} s "
+              f"({n / t_leer / 1e6:.2f} M registros/s); reconstruir el estado de {CAJONES} "
+              f"cajones {t_estado * 1000:.1f} ms.")
+
+
+if __name__ == "__main__":
+    main()
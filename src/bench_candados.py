@@ -0,0 +1,109 @@
+"""
+Benchmark de contención de candados (no necesita hardware).
+
+Antes (versión 25) un solo gpio_lock cubría la lectura completa de una
+celda (5 conversiones del HX711, ~0.5 s a 10 SPS) y también el servo.mid()
+del hilo NFC. Ahora (V34) GestorDeRecursos da un candado por dispositivo
+y el servo se pide con prioridad alta.
+
+Las celdas se leen sin parar (como los carriles de MotorDeMuestreo) y cada
+PERIODO_TARJETAS segundos llega una tarjeta válida que mueve el servo.
+Reporta la espera para tomar el candado del servo y, para el modo nuevo,
+GestorDeRecursos.reporte() (espera por dispositivo).
+
+Uso:  python3 bench_candados.py [escala] [segundos_simulados]
+"""
+import io
+import sys
+import threading
+import contextlib
+from celda_carga import CeldaDeCarga
+from hardware_simulado import BackendSimulado, TrazaDePeso
+from recursos import GestorDeRecursos
+
+ESCALA = 10.0
+DURACION = 60.0
+PERIODO_TARJETAS = 1.3 # Segundos simulados entre movimientos del servo
+PINES = [(17, 27), (5, 6), (13, 19)]
+
+
+def crear_lote():
+    sim = BackendSimulado(semilla=2, escala=ESCALA)
+    for dt, sck in PINES:
+        sim.agregar_hx711(dt, sck, TrazaDePeso([(0.0, 0.0)]), factor=100.0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        celdas = [CeldaDeCarga(pin_dt=dt, pin_sck=sck, backend=sim) for dt, sck in PINES]
+        for celda in celdas:
+            celda.establecer_factor_escala(100.0)
+    servo = sim.crear_servo(4, 0.5/1000, 2.5/1000)
+    return sim, celdas, servo
+
+
+def correr(candado_de_celda, candado_servo):
+    """
+    candado_de_celda(i) y candado_servo: los candados de cada modo.
+    Devuelve las esperas (s simulados) para tomar el candado del servo.
+    """
+    sim, celdas, servo = crear_lote()
+    activo = threading.Event()
+    activo.set()
+
+    def carril(i):
+        while activo.is_set():
+            with candado_de_celda(i):
+                celdas[i].obtener_peso()
+
+    hilos = [threading.Thread(target=carril, args=(i,), daemon=True) for i in range(len(celdas))]
+    for hilo in hilos:
+        hilo.start()
+
+    esperas = []
+    fin = sim.ahora() + DURACION
+    while sim.ahora() < fin:
+        sim.dormir(PERIODO_TARJETAS)
+        t0 = sim.ahora()
+        with candado_servo:
+            esperas.append(sim.ahora() - t0)
+            servo.mid()
+
+    activo.clear()
+    for hilo in hilos:
+        hilo.join()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for celda in celdas:
+            celda.limpiar()
+    return sorted(esperas)
+
+
+def imprimir(nombre, esperas):
+    media = sum(esperas) / len(esperas)
+    p95 = esperas[min(len(esperas) - 1, int(len(esperas) * 0.95))]
+    print(f"{nombre:<8} {len(esperas):>9} {media * 1000:>12.1f} {p95 * 1000:>10.1f} {esperas[-1] * 1000:>11.1f}")
+
+
+def main():
+    global ESCALA, DURACION
+    if len(sys.argv) > 1:
+        ESCALA = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        DURACION = float(sys.argv[2])
+
+    print(f"Tiempo simulado x{ESCALA:g}, {DURACION:g} s simulados, servo cada {PERIODO_TARJETAS:g} s. "
+          f"Espera del servo en ms simulados.")
+    print(f"{'modo':<8} {'tarjetas':>9} {'espera media':>12} {'espera p95':>10} {'espera máx':>11}")
+
+    # Antes: un solo candado para las celdas y el servo
+    gpio_lock = threading.Lock()
+    imprimir("antes", correr(lambda i: gpio_lock, gpio_lock))
+
+    # Ahora: un candado por dispositivo, el servo con prioridad alta
+    recursos = GestorDeRecursos()
+    imprimir("ahora", correr(lambda i: recursos.candado(f"hx711:{PINES[i][0]}/{PINES[i][1]}"),
+                             recursos.candado("servo").prioritario()))
+    print()
+    for linea in recursos.reporte():
+        print(linea)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: cajón con deriva térmica, offset fijo vs. SeguidorDeDeriva
+(no necesita hardware; reloj discreto, así que corre en segundos).
+
+Una celda cuyo cero sube DERIVA_G_POR_HORA gramos por hora (escalones
+cada minuto) durante HORAS horas, con un coche de 800 g estacionado en
+algunos intervalos. Se lee como en Main.py (filtro por muestra +
+histéresis 35 g / 25 g) y se reporta:
+
+  * falso OCUPADO: minutos en OCUPADO sin coche
+  * coche perdido: minutos en LIBRE con el coche encima
+  * error del cero al final (gramos que marca el cajón vacío)
+  * la tasa de deriva estimada (g/h) que se exporta en /metrics
+
+Uso:  python3 bench_deriva.py [horas] [deriva_g_por_hora]
+"""
+import io
+import sys
+import contextlib
+from celda_carga import CeldaDeCarga
+from hardware_simulado import BackendSimulado, TrazaDePeso
+
+HORAS = 12.0
+DERIVA_G_POR_HORA = 5.0
+SPS = 1 # El HX711 real da 10 SPS; con 1 la simulación es 10 veces más corta
+COCHE = 800.0
+ESTACIONADO = [(2.0, 4.0), (7.0, 7.5), (9.0, 11.0)] # Horas con el coche encima
+UMBRAL_PARA_OCUPAR = 35.0
+UMBRAL_PARA_LIBERAR = 25.0
+FILTRO = {'ventana_mediana': 5, 'alfa_ema': 0.5, 'umbral_atipico': 200.0}
+DERIVA = {'alfa': 0.002, 'banda_gramos': UMBRAL_PARA_LIBERAR, 'estables': 20, 'ventana': 300.0}
+
+
+def hay_coche(t):
+    return any(a * 3600 <= t < b * 3600 for a, b in ESTACIONADO)
+
+
+def traza():
+    puntos = []
+    for minuto in range(int(HORAS * 60) + 1):
+        t = minuto * 60.0
+        puntos.append((t, DERIVA_G_POR_HORA * t / 3600 + (COCHE if hay_coche(t) else 0.0)))
+    return TrazaDePeso(puntos)
+
+
+def correr(con_deriva):
+    sim = BackendSimulado(semilla=8, escala=0) # Reloj discreto
+    sim.agregar_hx711(17, 27, traza(), factor=100.0, sps=SPS)
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda = CeldaDeCarga(pin_dt=17, pin_sck=27, backend=sim)
+        celda.establecer_factor_escala(100.0)
+        celda.configurar_filtro(**FILTRO)
+        if con_deriva:
+            celda.configurar_deriva(**DERIVA)
+
+    estado = 'LIBRE'
+    falso = perdido = 0.0
+    t_anterior = sim.ahora()
+    while sim.ahora() < HORAS * 3600:
+        peso = celda.obtener_peso()
+        t = sim.ahora()
+        if estado == 'LIBRE' and peso > UMBRAL_PARA_OCUPAR:
+            estado = 'OCUPADO'
+        elif estado == 'OCUPADO' and peso < UMBRAL_PARA_LIBERAR:
+            estado = 'LIBRE'
+        # Se ignoran los 30 s después de que el coche llega o se va
+        coche = hay_coche(t)
+        if coche == hay_coche(t - 30):
+            if estado == 'OCUPADO' and not coche:
+                falso += t - t_anterior
+            elif estado == 'LIBRE' and coche:
+                perdido += t - t_anterior
+        t_anterior = t
+
+    cero_real = celda.offset - 50000.0 # El HX711 simulado tiene offset 50000
+    error = DERIVA_G_POR_HORA * HORAS - cero_real / celda.factor_escala
+    tasa = celda.deriva.tasa if celda.deriva else 0.0
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda.limpiar()
+    return falso / 60, perdido / 60, error, tasa
+
+
+def main():
+    global HORAS, DERIVA_G_POR_HORA
+    if len(sys.argv) > 1:
+        HORAS = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        DERIVA_G_POR_HORA = float(sys.argv[2])
+
+    print(f"{HORAS:g} h, deriva {DERIVA_G_POR_HORA:g} g/h, coche de {COCHE:g} g en {ESTACIONADO} h.")
+    print(f"{'modo':<14} {'falso OCUPADO min':>17} {'coche perdido min':>17} {'error cero g':>12} {'tasa g/h':>9}")
+    for nombre, con_deriva in (("offset fijo", False), ("con deriva", True)):
+        falso, perdido, error, tasa = correr(con_deriva)
+        print(f"{nombre:<14} {falso:>17.1f} {perdido:>17.1f} {error:>12.2f} {tasa:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
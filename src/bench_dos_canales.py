@@ -0,0 +1,120 @@
+"""
+Dos cajones: un HX711 por cajón contra un HX711 de dos canales
+(dos_canales.py), sobre el backend simulado en tiempo real escalado.
+
+Configuraciones:
+
+  * 2 x HX711 a 10 SPS:   lo de siempre (modo eventos), 4 GPIO
+  * 2 x HX711 a 80 SPS:   pin RATE en alto, 4 GPIO + RATE
+  * 1 x HX711, A/B 10 SPS: dos canales a la velocidad de fábrica, 2 GPIO
+  * 1 x HX711, A/B 80 SPS: dos canales con ráfagas de RAFAGA, 2 GPIO + RATE
+  * ídem sin asentar:      sin descartar conversiones tras cambiar de canal
+
+Cada cajón tiene un peso fijo (A: PESO_A g, B: PESO_B g) con ruido. Por
+configuración: muestras por segundo de cada cajón, CPU por muestra (del
+proceso, incluye el simulador) y el error de las muestras crudas pasadas
+a gramos (p99 y máximo): sin asentar, las primeras tras cada cambio salen
+a medio camino entre los dos canales.
+
+Uso:  python3 bench_dos_canales.py [segundos simulados] [rafaga]
+"""
+import io
+import sys
+import time
+import contextlib
+from hardware_simulado import BackendSimulado, TrazaDePeso
+from celda_carga import CeldaDeCarga
+from dos_canales import HX711DosCanales
+
+SEGUNDOS = 20.0
+ESCALA = 2.0  # Reloj simulado = 2x el real
+RAFAGA = 8
+PESO_A = 120.0
+PESO_B = 250.0
+FACTOR_A = 215.0
+FACTOR_B = 30.0 # Ganancia 32: menos cuentas por gramo
+OFFSET_A = 50000.0
+OFFSET_B = -12000.0
+RUIDO = 10.0
+
+
+def percentil(datos, p):
+    return datos[min(len(datos) - 1, int(len(datos) * p))] if datos else float('nan')
+
+
+def preparar(sim, dos_canales, sps):
+    traza_a = TrazaDePeso([(0, PESO_A)])
+    traza_b = TrazaDePeso([(0, PESO_B)])
+    if dos_canales:
+        sim.agregar_hx711(17, 27, traza_a, factor=FACTOR_A, offset=OFFSET_A, ruido=RUIDO, sps=sps,
+                          traza_b=traza_b, factor_b=FACTOR_B, offset_b=OFFSET_B)
+    else:
+        sim.agregar_hx711(17, 27, traza_a, factor=FACTOR_A, offset=OFFSET_A, ruido=RUIDO, sps=sps)
+        sim.agregar_hx711(5, 6, traza_b, factor=FACTOR_B, offset=OFFSET_B, ruido=RUIDO, sps=sps)
+
+
+def correr(dos_canales, sps, asentar=True, segundos=SEGUNDOS, rafaga=RAFAGA):
+    sim = BackendSimulado(semilla=4, escala=ESCALA)
+    preparar(sim, dos_canales, sps)
+    with contextlib.redirect_stdout(io.StringIO()):
+        if dos_canales:
+            convertidor = HX711DosCanales(17, 27, backend=sim, sps=sps, rafaga=rafaga, calibrar=False)
+            if not asentar:
+                convertidor.descarte = 0
+            celdas = convertidor.celdas
+        else:
+            celdas = [CeldaDeCarga(17, 27, backend=sim, calibrar=False),
+                      CeldaDeCarga(5, 6, backend=sim, calibrar=False)]
+            for celda in celdas:
+                celda.iniciar_modo_eventos()
+    # Offset y factor conocidos (como si vinieran de calibracion.json)
+    for celda, (offset, factor) in zip(celdas, [(OFFSET_A, FACTOR_A), (OFFSET_B, FACTOR_B)]):
+        celda.offset, celda.factor_escala = offset, factor
+
+    sim.dormir(1.0) # Arranque (asentamiento inicial)
+    cursores = [celda.muestras.secuencia for celda in celdas]
+    errores = [[], []]
+    cpu0 = time.process_time()
+    t0 = sim.ahora()
+    while sim.ahora() - t0 < segundos:
+        sim.dormir(0.1)
+        for k, (celda, verdad) in enumerate(zip(celdas, (PESO_A, PESO_B))):
+            datos, cursores[k] = celda.muestras.leer_desde(cursores[k])
+            errores[k] += [abs((valor - celda.offset) / celda.factor_escala - verdad) for _, valor in datos]
+    cpu = time.process_time() - cpu0
+    duracion = sim.ahora() - t0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for celda in celdas:
+            celda.limpiar()
+    total = sum(len(e) for e in errores)
+    return {
+        'por_segundo': [len(e) / duracion for e in errores],
+        'cpu_us': cpu / total * 1e6 if total else float('nan'),
+        'errores': [sorted(e) for e in errores],
+    }
+
+
+def main():
+    segundos = float(sys.argv[1]) if len(sys.argv) > 1 else SEGUNDOS
+    rafaga = int(sys.argv[2]) if len(sys.argv) > 2 else RAFAGA
+    print(f"2 cajones (A: {PESO_A:g} g, B: {PESO_B:g} g, ruido {RUIDO:g} cuentas), {segundos:g} s simulados "
+          f"por configuración, ráfagas de {rafaga}.")
+    print(f"{'configuración':<24} {'GPIO':>6} {'muestras/s A':>12} {'B':>6} {'CPU µs/muestra':>14} "
+          f"{'error p99 A/B g':>16} {'máx A/B g':>14}")
+    pruebas = [
+        ("2 x HX711 a 10 SPS", "4", False, 10, True),
+        ("2 x HX711 a 80 SPS", "4+RATE", False, 80, True),
+        ("1 x HX711, A/B 10 SPS", "2", True, 10, True),
+        ("1 x HX711, A/B 80 SPS", "2+RATE", True, 80, True),
+        ("  ídem sin asentar", "2+RATE", True, 80, False),
+    ]
+    for nombre, gpio, dos, sps, asentar in pruebas:
+        r = correr(dos, sps, asentar, segundos, rafaga)
+        ea, eb = r['errores']
+        print(f"{nombre:<24} {gpio:>6} {r['por_segundo'][0]:>12.1f} {r['por_segundo'][1]:>6.1f} "
+              f"{r['cpu_us']:>14.0f} {percentil(ea, 0.99):>8.2f}/{percentil(eb, 0.99):<7.2f} "
+              f"{ea[-1] if ea else float('nan'):>6.1f}/{eb[-1] if eb else float('nan'):<7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: sondeo cada 10 ms vs. alertas por flanco en DT (no necesita hardware).
+
+Para 10 y 80 SPS mide, con una celda sobre el backend simulado en tiempo
+real (escala 1):
+  * muestras por segundo que realmente se obtienen
+  * despertares del CPU por segundo (revisiones de DT / callbacks)
+  * tiempo de CPU del proceso
+
+Uso:  python3 bench_eventos_hx711.py [segundos_por_prueba]
+"""
+import io
+import sys
+import time
+import contextlib
+from celda_carga import CeldaDeCarga
+from hardware_simulado import BackendSimulado
+
+DURACION = 3.0
+VELOCIDADES = [10, 80]
+
+
+def crear_celda(sps):
+    sim = BackendSimulado(semilla=1, escala=1.0)
+    sim.agregar_hx711(17, 27, sps=sps)
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda = CeldaDeCarga(pin_dt=17, pin_sck=27, backend=sim)
+    return celda
+
+
+def medir_sondeo(sps):
+    celda = crear_celda(sps)
+    celda.despertares = 0
+    muestras = 0
+    cpu0 = time.process_time()
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < DURACION:
+        celda._read_raw_value()
+        muestras += 1
+    duracion = time.monotonic() - t0
+    cpu = time.process_time() - cpu0
+    despertares = celda.despertares
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda.limpiar()
+    return muestras / duracion, despertares / duracion, cpu
+
+
+def medir_eventos(sps):
+    celda = crear_celda(sps)
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda.iniciar_modo_eventos(capacidad=256)
+    celda.despertares = 0
+    sec0 = celda.muestras.secuencia
+    cpu0 = time.process_time()
+    t0 = time.monotonic()
+    # El consumidor no hace nada: las muestras llegan solas al buffer
+    time.sleep(DURACION)
+    duracion = time.monotonic() - t0
+    cpu = time.process_time() - cpu0
+    muestras = celda.muestras.secuencia - sec0
+    despertares = celda.despertares
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda.limpiar()
+    return muestras / duracion, despertares / duracion, cpu
+
+
+def main():
+    global DURACION
+    if len(sys.argv) > 1:
+        DURACION = float(sys.argv[1])
+
+    print(f"{DURACION:g} s por prueba, tiempo real.")
+    print(f"{'SPS':>4} {'modo':<8} {'muestras/s':>11} {'despertares/s':>14} {'CPU s':>7}")
+    for sps in VELOCIDADES:
+        base = medir_sondeo(sps)
+        evt = medir_eventos(sps)
+        print(f"{sps:>4} {'sondeo':<8} {base[0]:>11.1f} {base[1]:>14.1f} {base[2]:>7.3f}")
+        print(f"{sps:>4} {'eventos':<8} {evt[0]:>11.1f} {evt[1]:>14.1f} {evt[2]:>7.3f}")
+        print(f"     -> {evt[0] / base[0]:.2f}x muestras/s, "
+              f"{base[1] / max(evt[1], 1e-9):.1f}x menos despertares")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark: promedio de 5 lecturas vs. filtro por muestra (no necesita hardware).
+
+Corre la misma histéresis de Main.py sobre una celda simulada con ruido y
+picos sueltos (golpes, vibraciones), con el reloj simulado en modo discreto
+(determinista). Compara:
+  * decisiones de estado por segundo (al mismo ritmo del ADC)
+  * transiciones falsas (cambios de estado sin que llegue/salga un coche)
+  * latencia de detección de las llegadas y salidas reales
+
+Uso:  python3 bench_filtro.py [segundos_simulados]
+"""
+import io
+import sys
+import random
+import contextlib
+from celda_carga import CeldaDeCarga
+from hardware_simulado import BackendSimulado, TrazaDePeso
+
+UMBRAL_PARA_OCUPAR = 35.0
+UMBRAL_PARA_LIBERAR = 25.0
+
+SPS = 10
+FACTOR = 100.0
+RUIDO = 500.0          # Crudo (= 5 g de desviación estándar)
+PESO_COCHE = 800.0
+PICOS_POR_MINUTO = 8
+ALTURA_PICO = 300.0    # g, dura una sola conversión
+
+DURACION = 1800.0
+
+CONFIGURACIONES = [
+    ("promedio 5", None),
+    ("mediana 5", {'ventana_mediana': 5, 'alfa_ema': 1.0}),
+    ("mediana+EMA", {'ventana_mediana': 5, 'alfa_ema': 0.5}),
+    ("med+EMA+atip", {'ventana_mediana': 5, 'alfa_ema': 0.5, 'umbral_atipico': 200.0}),
+]
+
+
+def crear_escenario(duracion, semilla=3):
+    """Coches que llegan y se van + picos sueltos. Devuelve (traza, eventos)."""
+    rnd = random.Random(semilla)
+    puntos = [(0.0, 0.0)]
+    eventos = [] # (t, estado esperado)
+    t = 20.0
+    while t < duracion - 60:
+        llegada = t + rnd.uniform(10, 60)
+        salida = llegada + rnd.uniform(30, 120)
+        if salida > duracion - 10:
+            break
+        eventos += [(llegada, 'OCUPADO'), (salida, 'LIBRE')]
+        t = salida
+    # Nivel base según los eventos
+    def nivel(x):
+        ocupado = False
+        for te, estado in eventos:
+            if te <= x:
+                ocupado = (estado == 'OCUPADO')
+        return PESO_COCHE if ocupado else 0.0
+    for te, estado in eventos:
+        puntos.append((te, PESO_COCHE if estado == 'OCUPADO' else 0.0))
+    # Picos de una sola conversión, hacia arriba o hacia abajo
+    n_picos = int(duracion / 60 * PICOS_POR_MINUTO)
+    for _ in range(n_picos):
+        tp = rnd.uniform(5, duracion)
+        base = nivel(tp)
+        signo = 1 if base == 0 else rnd.choice([-1, 1])
+        puntos.append((tp, base + signo * ALTURA_PICO))
+        puntos.append((tp + 1.0 / SPS, base))
+    return TrazaDePeso(puntos), eventos
+
+
+def correr(config, traza, eventos, duracion):
+    sim = BackendSimulado(semilla=7, escala=0) # Reloj discreto
+    sim.agregar_hx711(17, 27, traza, factor=FACTOR, ruido=RUIDO, sps=SPS)
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda = CeldaDeCarga(pin_dt=17, pin_sck=27, backend=sim)
+        celda.establecer_factor_escala(FACTOR)
+        if config:
+            celda.configurar_filtro(**config)
+
+    estado = 'LIBRE'
+    transiciones = []
+    decisiones = 0
+    t0 = sim.ahora()
+    while sim.ahora() < duracion:
+        peso = celda.obtener_peso()
+        decisiones += 1
+        if estado == 'LIBRE' and peso > UMBRAL_PARA_OCUPAR:
+            estado = 'OCUPADO'
+            transiciones.append((sim.ahora(), estado))
+        elif estado == 'OCUPADO' and peso < UMBRAL_PARA_LIBERAR:
+            estado = 'LIBRE'
+            transiciones.append((sim.ahora(), estado))
+    t_total = sim.ahora() - t0
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda.limpiar()
+
+    # Empatamos cada evento real con la primera transición a ese estado
+    latencias = []
+    usadas = set()
+    for k, (te, esperado) in enumerate(eventos):
+        limite = eventos[k + 1][0] if k + 1 < len(eventos) else duracion
+        for j, (tt, nuevo) in enumerate(transiciones):
+            if j not in usadas and te <= tt < limite and nuevo == esperado:
+                latencias.append(tt - te)
+                usadas.add(j)
+                break
+    falsas = len(transiciones) - len(usadas)
+    perdidas = len(eventos) - len(latencias)
+    media = sum(latencias) / len(latencias) if latencias else float('nan')
+    return decisiones / t_total, falsas, perdidas, media
+
+
+def main():
+    global DURACION
+    if len(sys.argv) > 1:
+        DURACION = float(sys.argv[1])
+
+    traza, eventos = crear_escenario(DURACION)
+    print(f"{DURACION:g} s simulados a {SPS} SPS, {len(eventos)} eventos reales, "
+          f"{PICOS_POR_MINUTO} picos/min de {ALTURA_PICO:g} g.")
+    print(f"{'filtro':<14} {'decisiones/s':>12} {'falsas':>7} {'perdidas':>9} {'latencia s':>11}")
+    for nombre, config in CONFIGURACIONES:
+        dps, falsas, perdidas, lat = correr(config, traza, eventos, DURACION)
+        print(f"{nombre:<14} {dps:>12.2f} {falsas:>7} {perdidas:>9} {lat:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: lectura celda por celda vs. GrupoDeCeldas (no necesita hardware).
+
+  * celda/celda: una CeldaDeCarga por HX711, leídas una tras otra (cada
+    trama son 24 x (escribir, leer, escribir) + 2 llamadas).
+  * grupo: GrupoDeCeldas con un SCK compartido; cada bit es un solo
+    escribir_grupo / leer_grupo / escribir_grupo para todas las celdas.
+
+Reporta, al agregar celdas:
+  * llamadas Python -> backend (lgpio) por muestra de cada celda
+  * µs de CPU por muestra de cada celda (reloj discreto y el HX711 siempre
+    listo, así que solo cuenta el costo de sacar los bits)
+  * muestras/s por celda que aguanta la CPU en ese bucle (el HX711 además
+    limita a 10 u 80 SPS)
+
+Las llamadas al simulador no cuestan lo mismo que a lgpio en la Pi, pero
+el número de llamadas por muestra es el mismo. Ojo: en el simulador
+leer_grupo / escribir_grupo recorren los N HX711 en Python, así que el
+CPU del modo grupo incluye simular N chips (en la Pi eso lo hace el kernel).
+
+Uso:  python3 bench_grupo_hx711.py [rondas]
+"""
+import io
+import sys
+import time
+import contextlib
+from celda_carga import CeldaDeCarga
+from grupo_celdas import GrupoDeCeldas
+from hardware_simulado import BackendSimulado, TrazaDePeso
+
+CELDAS = [1, 2, 4, 8, 16, 32]
+RONDAS = 300
+SCK_COMPARTIDO = 2000
+
+
+def contar_llamadas(sim):
+    """Envuelve las llamadas de línea del backend para contarlas (sin anidar)."""
+    cuenta = {'n': 0, 'dentro': False}
+
+    def envolver(funcion):
+        def contada(*args):
+            if cuenta['dentro']:
+                return funcion(*args)
+            cuenta['n'] += 1
+            cuenta['dentro'] = True
+            try:
+                return funcion(*args)
+            finally:
+                cuenta['dentro'] = False
+        return contada
+
+    for nombre in ('leer', 'escribir', 'leer_grupo', 'escribir_grupo'):
+        setattr(sim, nombre, envolver(getattr(sim, nombre)))
+    return cuenta
+
+
+def crear_sim(n, compartido):
+    sim = BackendSimulado(semilla=4, escala=0) # Reloj discreto
+    for i in range(n):
+        sck = SCK_COMPARTIDO if compartido else 2000 + i
+        sim.agregar_hx711(1000 + i, sck, TrazaDePeso([(0.0, 0.0)]), factor=100.0, sps=1e9)
+    return sim
+
+
+def medir_individual(n):
+    sim = crear_sim(n, compartido=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        celdas = [CeldaDeCarga(pin_dt=1000 + i, pin_sck=2000 + i, backend=sim) for i in range(n)]
+    cuenta = contar_llamadas(sim)
+    t0 = time.process_time()
+    for _ in range(RONDAS):
+        for celda in celdas:
+            celda._read_raw_value()
+    cpu = time.process_time() - t0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for celda in celdas:
+            celda.limpiar()
+    return cuenta['n'], cpu
+
+
+def medir_grupo(n):
+    sim = crear_sim(n, compartido=True)
+    pines = [{'dt': 1000 + i, 'sck': SCK_COMPARTIDO} for i in range(n)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        grupo = GrupoDeCeldas(pines, backend=sim, calibrar=False)
+    cuenta = contar_llamadas(sim)
+    t0 = time.process_time()
+    for _ in range(RONDAS):
+        # Cada carril pide su muestra; la primera lee la trama de todas
+        for celda in grupo.celdas:
+            celda._read_raw_value()
+    cpu = time.process_time() - t0
+    with contextlib.redirect_stdout(io.StringIO()):
+        grupo.limpiar()
+    return cuenta['n'], cpu
+
+
+def main():
+    global RONDAS
+    if len(sys.argv) > 1:
+        RONDAS = int(sys.argv[1])
+
+    print(f"{RONDAS} rondas (una muestra de cada celda por ronda).")
+    print(f"{'celdas':>6} {'modo':<12} {'llamadas/muestra':>16} {'µs CPU/muestra':>15} {'muestras/s/celda':>17}")
+    for n in CELDAS:
+        for nombre, medir in (("celda/celda", medir_individual), ("grupo", medir_grupo)):
+            llamadas, cpu = medir(n)
+            muestras = RONDAS * n
+            por_ronda = cpu / RONDAS
+            print(f"{n:>6} {nombre:<12} {llamadas / muestras:>16.1f} {cpu / muestras * 1e6:>15.1f} "
+                  f"{1.0 / por_ronda:>17,.0f}")
+
+
+if __name__ == "__main__":
+    main()
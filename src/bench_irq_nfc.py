@@ -0,0 +1,105 @@
+"""
+Benchmark: PN532 consultado (read_passive_target(0.1) + pausa de 0.1 s)
+vs. detección por la línea IRQ (SensorNFC.activar_irq). No necesita
+hardware; reloj discreto.
+
+Corre Main.gestor_acceso_nfc con el PN532 simulado, que cuenta las
+transacciones I2C como adafruit_pn532 (comando, ACK, un sondeo de estado
+cada 10 ms mientras espera la respuesta, leer la respuesta):
+
+  * reposo:  una hora sin tarjetas; transacciones I2C, comandos
+             InListPassiveTarget y vueltas del bucle NFC por hora
+  * toques:  TOQUES tarjetas distintas en instantes al azar; latencia
+             toque -> decisión de acceso (media, mediana, p90, máxima)
+
+Uso:  python3 bench_irq_nfc.py [horas_de_reposo] [toques]
+"""
+import io
+import sys
+import random
+import contextlib
+import Main
+from hardware_simulado import BackendSimulado
+from sensor_nfc import SensorNFC
+
+HORAS = 1.0
+TOQUES = 200
+SEPARACION = 10.0 # s entre toques (en promedio)
+TOQUE = 0.5       # s que se deja la tarjeta en el lector
+PIN_IRQ = 4
+
+
+def correr(con_irq, toques, fin):
+    sim = BackendSimulado(semilla=1, escala=0) # Reloj discreto
+    sim.programar_toques(toques)
+    Main.hw = sim
+    decisiones = []
+    vueltas = [0]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sensor = SensorNFC(backend=sim)
+        if con_irq:
+            sensor.activar_irq(PIN_IRQ)
+    leer = sensor.leer_uid
+
+    def leer_hasta_el_fin(timeout=0.5):
+        vueltas[0] += 1
+        if sim.ahora() > fin:
+            Main.app_running.clear()
+        return leer(timeout)
+
+    sensor.leer_uid = leer_hasta_el_fin
+    decidir = Main.decidir_acceso
+    Main.decidir_acceso = lambda s, uid, b: decisiones.append((sim.ahora(), bytes(uid)))
+    transacciones = sim.lector.transacciones
+    comandos = sim.lector.comandos
+    try:
+        Main.app_running.set()
+        with contextlib.redirect_stdout(io.StringIO()):
+            Main.gestor_acceso_nfc(sensor, None)
+    finally:
+        Main.decidir_acceso = decidir
+        sensor.detener()
+    horas = sim.ahora() / 3600
+    return (decisiones, (sim.lector.transacciones - transacciones) / horas,
+            (sim.lector.comandos - comandos) / horas, vueltas[0] / horas)
+
+
+def latencias(toques, decisiones):
+    resultado = []
+    for inicio, uid, duracion in toques:
+        uid = bytes.fromhex(uid)
+        t = next((t for t, u in decisiones if u == uid and inicio <= t <= inicio + duracion), None)
+        if t is not None:
+            resultado.append(t - inicio)
+    return sorted(resultado)
+
+
+def main():
+    global HORAS, TOQUES
+    if len(sys.argv) > 1:
+        HORAS = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        TOQUES = int(sys.argv[2])
+
+    rnd = random.Random(4)
+    toques, t = [], 5.0
+    for k in range(TOQUES):
+        t += rnd.uniform(0.5, 1.5) * SEPARACION
+        toques.append((t, f"{k:08x}", TOQUE))
+
+    print(f"Reposo: {HORAS:g} h sin tarjetas. Toques: {TOQUES} tarjetas de {TOQUE:g} s.")
+    print(f"{'modo':<10} {'I2C/h reposo':>12} {'comandos/h':>10} {'vueltas/h':>9} "
+          f"{'perdidos':>8} {'media ms':>8} {'mediana ms':>10} {'p90 ms':>7} {'máx ms':>7}")
+    for nombre, con_irq in (("consulta", False), ("IRQ", True)):
+        _, transacciones, comandos, vueltas = correr(con_irq, [], HORAS * 3600)
+        decisiones, _, _, _ = correr(con_irq, toques, toques[-1][0] + 5.0)
+        datos = latencias(toques, decisiones)
+        print(f"{nombre:<10} {transacciones:>12.0f} {comandos:>10.0f} {vueltas:>9.0f} "
+              f"{len(toques) - len(datos):>8} {sum(datos) / len(datos) * 1000:>8.1f} "
+              f"{datos[len(datos) // 2] * 1000:>10.1f} "
+              f"{datos[int(len(datos) * 0.9)] * 1000:>7.1f} {datos[-1] * 1000:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark: lista blanca de UIDs, set de strings vs. índice binario con
+mmap (lista_blanca.py). No necesita hardware.
+
+Para cada tamaño se generan UIDs de 4 y 7 bytes al azar y, en un proceso
+nuevo por modo (para que la memoria de uno no ensucie al otro):
+
+  * set:    cargar_uids_validos() de SensorNFC (un str por UID) y la
+            búsqueda de siempre: uid.hex() in set
+  * índice: ListaBlanca sobre el .idx ya compilado; contiene(bytearray)
+
+Reporta el tiempo de carga, lo que creció el RSS del proceso al cargar y
+la latencia media de una búsqueda (tarjeta válida y tarjeta inválida),
+con el bytearray tal como lo da read_passive_target.
+
+Uso:  python3 bench_lista_blanca.py [tamaños separados por coma]
+"""
+import io
+import os
+import sys
+import time
+import random
+import tempfile
+import contextlib
+import subprocess
+import lista_blanca
+from sensor_nfc import SensorNFC
+from hardware_simulado import BackendSimulado
+
+TAMANOS = [1000, 100000, 1000000]
+BUSQUEDAS = 200000
+
+
+def rss_kb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def generar(n, ruta_texto, ruta_indice):
+    rnd = random.Random(5)
+    with open(ruta_texto, 'w') as f:
+        for _ in range(n):
+            f.write(rnd.randbytes(rnd.choice((4, 7))).hex() + "\n")
+    lista_blanca.compilar(ruta_texto, ruta_indice)
+
+
+def consultas(ruta_texto):
+    """Mitad UIDs de la lista, mitad desconocidos (como bytearray)."""
+    with open(ruta_texto) as f:
+        validos = [bytearray.fromhex(linea.strip()) for linea in f]
+    rnd = random.Random(6)
+    aciertos = [rnd.choice(validos) for _ in range(BUSQUEDAS // 2)]
+    fallos = [bytearray(rnd.randbytes(7)) for _ in range(BUSQUEDAS // 2)]
+    return aciertos, fallos
+
+
+def medir(modo, ruta_texto, ruta_indice):
+    """Corre dentro del proceso hijo; imprime una línea de resultados."""
+    aciertos, fallos = consultas(ruta_texto)
+    sim = BackendSimulado(semilla=1, escala=0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sensor = SensorNFC(backend=sim)
+        antes = rss_kb()
+        t0 = time.perf_counter()
+        if modo == "set":
+            sensor.cargar_uids_validos(ruta_texto)
+        else:
+            sensor.cargar_lista_blanca(ruta_indice, None, vigilar=False)
+        carga = time.perf_counter() - t0
+        memoria = rss_kb() - antes
+
+    resultados = [modo, carga, memoria]
+    for uids, esperado in ((aciertos, True), (fallos, False)):
+        t0 = time.perf_counter()
+        for uid in uids:
+            if sensor.es_valido(uid) != esperado:
+                raise AssertionError(f"{modo}: {uid.hex()} debió dar {esperado}")
+        resultados.append((time.perf_counter() - t0) / len(uids))
+    print(" ".join(str(r) for r in resultados))
+
+
+def main():
+    global TAMANOS
+    if len(sys.argv) > 1 and sys.argv[1] == "--hijo":
+        medir(*sys.argv[2:5])
+        return
+    if len(sys.argv) > 1:
+        TAMANOS = [int(n) for n in sys.argv[1].split(",")]
+
+    print(f"{BUSQUEDAS // 2} búsquedas válidas + {BUSQUEDAS // 2} inválidas por modo "
+          f"(es_valido() con el bytearray del lector).")
+    print(f"{'UIDs':>8} {'modo':<7} {'carga ms':>9} {'RSS KiB':>9} {'válida µs':>10} {'inválida µs':>12}")
+    with tempfile.TemporaryDirectory() as carpeta:
+        for n in TAMANOS:
+            ruta_texto = os.path.join(carpeta, f"uids_{n}.txt")
+            ruta_indice = os.path.join(carpeta, f"uids_{n}.idx")
+            generar(n, ruta_texto, ruta_indice)
+            for modo in ("set", "indice"):
+                salida = subprocess.run([sys.executable, __file__, "--hijo", modo, ruta_texto, ruta_indice],
+                                        capture_output=True, text=True, check=True).stdout
+                _, carga, memoria, acierto, fallo = salida.split()
+                print(f"{n:>8} {modo:<7} {float(carga) * 1000:>9.1f} {int(memoria):>9} "
+                      f"{float(acierto) * 1e6:>10.2f} {float(fallo) * 1e6:>12.2f}")
+            print(f"{'':>8} (archivo .idx: {os.path.getsize(ruta_indice) // 1024} KiB)")
+
+
+if __name__ == "__main__":
+    main()
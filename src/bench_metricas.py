@@ -0,0 +1,79 @@
+"""
+Benchmark del costo de las métricas (no necesita hardware).
+
+Mide los caminos instrumentados con las métricas encendidas y apagadas:
+  * es_valido() en un bucle cerrado (el caso más corto que se mide)
+  * obtener_peso() sobre un HX711 simulado con el reloj discreto: el
+    tiempo es solo CPU (trama bit a bit + promedio), sin la espera del ADC
+  * esperar_y_leer_uid() sin tarjeta (timeout 0 con el reloj discreto)
+
+y lo compara con el tiempo real de cada vuelta en la Pi (una conversión
+del HX711 a 10 SPS = 100 ms; el bucle NFC usa timeout=0.1 s).
+
+Uso:  python3 bench_metricas.py [repeticiones]
+"""
+import io
+import sys
+import time
+import contextlib
+import metricas
+from celda_carga import CeldaDeCarga
+from hardware_simulado import BackendSimulado, TrazaDePeso
+from sensor_nfc import SensorNFC
+
+REPETICIONES = 20000
+VUELTA_REAL_PESO = 0.5 # obtener_peso() en la Pi: 5 conversiones a 10 SPS
+VUELTA_REAL_NFC = 0.1  # esperar_y_leer_uid(timeout=0.1) sin tarjeta
+
+
+def crear():
+    sim = BackendSimulado(semilla=1, escala=0) # Reloj discreto
+    sim.agregar_hx711(17, 27, TrazaDePeso([(0.0, 0.0)]), factor=100.0, sps=1e9)
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda = CeldaDeCarga(pin_dt=17, pin_sck=27, backend=sim)
+        celda.establecer_factor_escala(100.0)
+        sensor = SensorNFC(backend=sim)
+    sensor.valid_uids = {f"{i:08x}" for i in range(1000)}
+    return celda, sensor
+
+
+def cronometrar(funcion, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        funcion()
+    return (time.perf_counter() - t0) / n
+
+
+def main():
+    global REPETICIONES
+    if len(sys.argv) > 1:
+        REPETICIONES = int(sys.argv[1])
+
+    celda, sensor = crear()
+    casos = [
+        ("es_valido", lambda: sensor.es_valido("000001f4"), REPETICIONES * 10, VUELTA_REAL_NFC),
+        ("obtener_peso", celda.obtener_peso, REPETICIONES // 10, VUELTA_REAL_PESO),
+        ("leer_uid (vacío)", lambda: sensor.esperar_y_leer_uid(timeout=0), REPETICIONES, VUELTA_REAL_NFC),
+    ]
+
+    print(f"{'camino':<18} {'apagadas µs':>12} {'encendidas µs':>14} {'costo µs':>9} {'% CPU':>7} {'% vuelta Pi':>12}")
+    for nombre, funcion, n, vuelta in casos:
+        # Calentamos y alternamos para no favorecer a ninguno
+        cronometrar(funcion, n // 10 + 1)
+        apagadas, encendidas = [], []
+        for _ in range(3):
+            metricas.desactivar()
+            apagadas.append(cronometrar(funcion, n))
+            metricas.activar()
+            encendidas.append(cronometrar(funcion, n))
+        apagada, encendida = min(apagadas), min(encendidas)
+        costo = encendida - apagada
+        print(f"{nombre:<18} {apagada * 1e6:>12.2f} {encendida * 1e6:>14.2f} {costo * 1e6:>9.2f} "
+              f"{costo / apagada * 100:>6.1f}% {costo / vuelta * 100:>11.4f}%")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda.limpiar()
+
+
+if __name__ == "__main__":
+    main()
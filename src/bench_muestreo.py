@@ -0,0 +1,148 @@
+"""
+Benchmark del muestreo de celdas (no necesita hardware).
+
+Compara el bucle round-robin original de gestor_peso_y_leds (candado global
++ 0.2 s entre celdas) contra MotorDeMuestreo (un carril por celda y un pool
+de tamaño fijo). Usa CeldaDeCarga de verdad sobre el backend simulado
+(HX711 simulados a nivel de pines, 10 SPS).
+
+Reporta, para 3 a 64 celdas:
+  * refresco por cajón (lecturas/s de cada celda)
+  * latencia de detección (desde que llega el coche hasta que el cajón
+    cambia a OCUPADO)
+
+El tiempo simulado corre 'escala' veces más rápido que el real; los
+resultados se reportan en segundos simulados.
+
+Uso:  python3 bench_muestreo.py [escala]
+"""
+import io
+import sys
+import random
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from celda_carga import CeldaDeCarga
+from hardware_simulado import BackendSimulado, TrazaDePeso
+from muestreo_celdas import MotorDeMuestreo
+
+UMBRAL_PARA_OCUPAR = 35.0
+UMBRAL_PARA_LIBERAR = 25.0
+
+SPS = 10                  # Velocidad por defecto del HX711
+LECTURAS_POR_PESO = 5     # obtener_peso() promedia 5 conversiones
+PAUSA_ROUND_ROBIN = 0.2   # time.sleep(0.2) del bucle original
+TAMANO_POOL = 8
+CELDAS = [3, 8, 16, 32, 64]
+FACTOR = 100.0
+
+ESCALA = 10.0
+
+
+class Resultados:
+    def __init__(self, sim, llegadas):
+        self.sim = sim
+        self.llegadas = llegadas
+        self.estado = ['LIBRE'] * len(llegadas)
+        self.deteccion = [None] * len(llegadas)
+        self.lock = threading.Lock()
+
+    def procesar(self, i, peso):
+        if self.estado[i] == 'LIBRE' and peso > UMBRAL_PARA_OCUPAR:
+            with self.lock:
+                self.estado[i] = 'OCUPADO'
+                self.deteccion[i] = self.sim.ahora() - self.llegadas[i]
+
+    def completo(self):
+        return None not in self.deteccion
+
+
+def crear_lote(n, ventana, semilla=1):
+    """
+    Crea n celdas sobre un backend simulado. Los coches (500 g) llegan en un
+    instante aleatorio dentro de 'ventana' segundos tras la calibración.
+    """
+    rnd = random.Random(semilla)
+    sim = BackendSimulado(semilla=semilla, escala=ESCALA)
+    # La calibración de todas las celdas dura ~1 s simulado
+    inicio = 2.0
+    llegadas = [inicio + rnd.uniform(0, ventana) for _ in range(n)]
+    for i in range(n):
+        traza = TrazaDePeso([(0.0, 0.0), (llegadas[i], 500.0)])
+        sim.agregar_hx711(1000 + i, 2000 + i, traza, factor=FACTOR, sps=SPS)
+
+    def crear(i):
+        celda = CeldaDeCarga(pin_dt=1000 + i, pin_sck=2000 + i, backend=sim)
+        celda.establecer_factor_escala(FACTOR)
+        return celda
+
+    # (Silenciamos los print de inicialización de cada celda)
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            celdas = list(pool.map(crear, range(n)))
+    return sim, celdas, Resultados(sim, llegadas)
+
+
+def correr_round_robin(sim, celdas, res, limite):
+    """El bucle de la versión 25: una celda a la vez, bajo un candado global."""
+    gpio_lock = threading.Lock()
+    lecturas = [0] * len(celdas)
+    i = 0
+    while not res.completo() and sim.ahora() < limite:
+        with gpio_lock:
+            peso = celdas[i].obtener_peso()
+        lecturas[i] += 1
+        res.procesar(i, peso)
+        i = (i + 1) % len(celdas)
+        sim.dormir(PAUSA_ROUND_ROBIN)
+    return lecturas
+
+
+def correr_motor(sim, celdas, res, limite, num_hilos):
+    motor = MotorDeMuestreo(celdas, al_leer=res.procesar, num_hilos=num_hilos)
+    motor.iniciar()
+    while not res.completo() and sim.ahora() < limite:
+        sim.dormir(0.05)
+    motor.detener()
+    return motor.lecturas
+
+
+def medir(nombre, n, correr):
+    # Los coches llegan durante los primeros 10 s simulados
+    ventana = 10.0
+    sim, celdas, res = crear_lote(n, ventana)
+    # Límite generoso: el round-robin con 64 celdas tarda ~45 s por vuelta
+    t0 = sim.ahora()
+    limite = t0 + ventana + n * (LECTURAS_POR_PESO / SPS + PAUSA_ROUND_ROBIN) * 2 + 5
+    with contextlib.redirect_stdout(io.StringIO()):
+        lecturas = correr(sim, celdas, res, limite)
+        duracion = sim.ahora() - t0
+        for celda in celdas:
+            celda.limpiar()
+
+    refresco = sum(lecturas) / n / duracion if duracion else 0.0
+    latencias = sorted(d for d in res.deteccion if d is not None)
+    if latencias:
+        media = sum(latencias) / len(latencias)
+        p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+    else:
+        media = p95 = float('nan')
+    perdidos = res.deteccion.count(None)
+    print(f"{nombre:<14} {n:>6} {refresco:>12.2f} {media:>12.2f} {p95:>10.2f} {perdidos:>9}")
+
+
+def main():
+    global ESCALA
+    if len(sys.argv) > 1:
+        ESCALA = float(sys.argv[1])
+
+    print(f"Tiempo simulado x{ESCALA:g}. HX711 a {SPS} SPS, {LECTURAS_POR_PESO} lecturas por peso.")
+    print(f"{'modo':<14} {'celdas':>6} {'refresco Hz':>12} {'lat. media s':>12} {'lat. p95 s':>10} {'sin detec.':>9}")
+    for n in CELDAS:
+        medir("round-robin", n, correr_round_robin)
+        medir("hilo/celda", n, lambda s, c, r, l: correr_motor(s, c, r, l, None))
+        medir(f"pool({TAMANO_POOL})", n, lambda s, c, r, l: correr_motor(s, c, r, l, TAMANO_POOL))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: histéresis escalar (un float a la vez, lista de strings) vs.
+MotorDeOcupacion (NumPy, todos los cajones en un tick).
+
+Ambos caminos parten de lecturas crudas y hacen la misma conversión a
+gramos que CeldaDeCarga.obtener_peso(). Reporta cajones evaluados por
+segundo para 3, 100, 1,000 y 10,000 cajones.
+
+Uso:  python3 bench_ocupacion.py [segundos_por_prueba]
+"""
+import sys
+import time
+import random
+import numpy as np
+from motor_ocupacion import MotorDeOcupacion
+
+UMBRAL_PARA_OCUPAR = 35.0
+UMBRAL_PARA_LIBERAR = 25.0
+CAJONES = [3, 100, 1000, 10000]
+DURACION = 1.0
+TICKS_DISTINTOS = 64 # Lecturas precalculadas que se van rotando
+
+
+def crear_datos(n, semilla=5):
+    rnd = random.Random(semilla)
+    factores = [rnd.uniform(30, 220) for _ in range(n)]
+    offsets = [rnd.uniform(-80000, 80000) for _ in range(n)]
+    ticks = []
+    ocupado = [rnd.random() < 0.5 for _ in range(n)]
+    for _ in range(TICKS_DISTINTOS):
+        fila = []
+        for i in range(n):
+            if rnd.random() < 0.02: # De vez en cuando llega / sale un coche
+                ocupado[i] = not ocupado[i]
+            gramos = (800.0 if ocupado[i] else 0.0) + rnd.gauss(0, 5)
+            fila.append(offsets[i] + gramos * factores[i])
+        ticks.append(fila)
+    return factores, offsets, ticks
+
+
+def tick_escalar(crudas, offsets, factores, estados):
+    """La lógica de gestor_peso_y_leds, cajón por cajón."""
+    cambios = []
+    for i in range(len(crudas)):
+        lectura_neta = crudas[i] - offsets[i]
+        if factores[i] == 0:
+            peso = 0.0
+        else:
+            peso = abs(lectura_neta / factores[i])
+            if abs(lectura_neta) < (factores[i] * 0.5):
+                peso = 0.0
+        estado_actual = estados[i]
+        nuevo_estado = estado_actual
+        if estado_actual == 'LIBRE' and peso > UMBRAL_PARA_OCUPAR:
+            nuevo_estado = 'OCUPADO'
+        elif estado_actual == 'OCUPADO' and peso < UMBRAL_PARA_LIBERAR:
+            nuevo_estado = 'LIBRE'
+        if nuevo_estado != estado_actual:
+            estados[i] = nuevo_estado
+            cambios.append(i)
+    return cambios
+
+
+def medir_escalar(n, factores, offsets, ticks):
+    estados = ['LIBRE'] * n
+    hechos = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < DURACION:
+        tick_escalar(ticks[hechos % TICKS_DISTINTOS], offsets, factores, estados)
+        hechos += 1
+    return hechos * n / (time.perf_counter() - t0)
+
+
+def medir_vectorial(n, factores, offsets, ticks):
+    motor = MotorDeOcupacion(factores, offsets, UMBRAL_PARA_OCUPAR, UMBRAL_PARA_LIBERAR)
+    arreglos = [np.array(t) for t in ticks]
+    hechos = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < DURACION:
+        motor.actualizar_crudas(arreglos[hechos % TICKS_DISTINTOS])
+        hechos += 1
+    return hechos * n / (time.perf_counter() - t0)
+
+
+def main():
+    global DURACION
+    if len(sys.argv) > 1:
+        DURACION = float(sys.argv[1])
+
+    print(f"{'cajones':>8} {'escalar cajones/s':>18} {'NumPy cajones/s':>16} {'aceleración':>12}")
+    for n in CAJONES:
+        factores, offsets, ticks = crear_datos(n)
+        escalar = medir_escalar(n, factores, offsets, ticks)
+        vectorial = medir_vectorial(n, factores, offsets, ticks)
+
+        # Verificación: ambos caminos deben llegar al mismo estado
+        estados = ['LIBRE'] * n
+        motor = MotorDeOcupacion(factores, offsets, UMBRAL_PARA_OCUPAR, UMBRAL_PARA_LIBERAR)
+        for t in ticks:
+            tick_escalar(t, offsets, factores, estados)
+            motor.actualizar_crudas(np.array(t))
+        iguales = all(estados[i] == motor.estado(i) for i in range(n))
+
+        print(f"{n:>8} {escalar:>18,.0f} {vectorial:>16,.0f} {vectorial / escalar:>11.1f}x"
+              f"{'' if iguales else '  (¡ESTADOS DISTINTOS!)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark: latencia de detección vs. lecturas/s, muestreo fijo vs.
+PlanificadorDeMuestreo (no necesita hardware; reloj discreto).
+
+Un solo carril (como un pool de 1 hilo) atiende CAJONES celdas reales
+(CeldaDeCarga + filtro por muestra, como Main.py) sobre HX711 simulados a
+10 SPS; cada lectura además cuesta COSTO_LECTURA s de CPU. Cada cajón
+recibe y pierde coches al azar (el coche tarda 2 s en subir).
+
+  * fijo:        round-robin con una pausa entre vueltas (la pausa fija
+                 cuántas lecturas/s se gastan)
+  * adaptativo:  PlanificadorDeMuestreo con distintos periodo_max
+  * + barrera:   además, la barrera se abre ANTICIPO s antes de cada
+                 llegada e impulsa todos los cajones
+
+Reporta lecturas/s totales y la latencia (s) desde que llega o se va el
+coche hasta que el cajón cambia de estado: mediana, p90 y máxima
+('perdidos': cambios sin detectar, casi siempre porque la simulación
+terminó antes).
+
+Uso:  python3 bench_planificador.py [minutos] [cajones]
+"""
+import io
+import sys
+import random
+import contextlib
+from celda_carga import CeldaDeCarga
+from hardware_simulado import BackendSimulado, TrazaDePeso
+from planificador_muestreo import PlanificadorDeMuestreo
+
+MINUTOS = 20.0
+CAJONES = 16
+COSTO_LECTURA = 0.004 # s de CPU por lectura (bit-banging + filtro)
+COCHE = 800.0
+ESTANCIA = (60.0, 300.0) # Segundos con y sin coche (al azar, uniforme)
+ANTICIPO = 5.0           # La barrera se abre 5 s antes de que llegue el coche
+IMPULSO = 20.0
+UMBRAL_PARA_OCUPAR = 35.0
+UMBRAL_PARA_LIBERAR = 25.0
+FILTRO = {'ventana_mediana': 5, 'alfa_ema': 0.5, 'umbral_atipico': 200.0}
+PAUSAS_FIJO = [0.0, 0.5, 2.0]
+PERIODOS_MAX = [1.0, 2.0, 4.0]
+
+
+def crear_eventos(rnd):
+    """Por cajón: lista de (t, 'OCUPADO'/'LIBRE') y la traza de peso."""
+    eventos, trazas = [], []
+    for _ in range(CAJONES):
+        t = rnd.uniform(*ESTANCIA)
+        ocupado = False
+        puntos = [(0.0, 0.0)]
+        cambios = []
+        while t < MINUTOS * 60:
+            ocupado = not ocupado
+            cambios.append((t, 'OCUPADO' if ocupado else 'LIBRE'))
+            # El coche sube (o baja) en 2 s
+            for paso in range(1, 5):
+                fraccion = paso / 4 if ocupado else 1 - paso / 4
+                puntos.append((t + paso * 0.5, COCHE * fraccion))
+            t += rnd.uniform(*ESTANCIA)
+        eventos.append(cambios)
+        trazas.append(TrazaDePeso(puntos))
+    return eventos, trazas
+
+
+def crear_celdas(trazas):
+    sim = BackendSimulado(semilla=9, escala=0) # Reloj discreto
+    for i, traza in enumerate(trazas):
+        sim.agregar_hx711(1000 + i, 2000 + i, traza, factor=100.0, sps=10)
+    with contextlib.redirect_stdout(io.StringIO()):
+        celdas = [CeldaDeCarga(pin_dt=1000 + i, pin_sck=2000 + i, backend=sim) for i in range(CAJONES)]
+        for celda in celdas:
+            celda.establecer_factor_escala(100.0)
+            celda.configurar_filtro(**FILTRO)
+    return sim, celdas
+
+
+class Detector:
+    """Histéresis de Main.py; guarda cuándo cambió cada cajón."""
+
+    def __init__(self):
+        self.estados = ['LIBRE'] * CAJONES
+        self.cambios = [[] for _ in range(CAJONES)]
+
+    def procesar(self, i, peso, t):
+        estado = self.estados[i]
+        if estado == 'LIBRE' and peso > UMBRAL_PARA_OCUPAR:
+            estado = 'OCUPADO'
+        elif estado == 'OCUPADO' and peso < UMBRAL_PARA_LIBERAR:
+            estado = 'LIBRE'
+        if estado != self.estados[i]:
+            self.estados[i] = estado
+            self.cambios[i].append((t, estado))
+            return True
+        return False
+
+    def latencias(self, eventos):
+        latencias = []
+        for cambios_reales, cambios in zip(eventos, self.cambios):
+            for t, estado in cambios_reales:
+                detectado = next((tc for tc, e in cambios if e == estado and tc >= t), None)
+                if detectado is not None:
+                    latencias.append(detectado - t)
+        return sorted(latencias)
+
+
+def leer(sim, celda, detector, i):
+    peso = celda.obtener_peso()
+    sim.dormir(COSTO_LECTURA)
+    return peso, detector.procesar(i, peso, sim.ahora())
+
+
+def correr_fijo(eventos, trazas, pausa):
+    sim, celdas = crear_celdas(trazas)
+    detector = Detector()
+    lecturas = 0
+    while sim.ahora() < MINUTOS * 60:
+        for i, celda in enumerate(celdas):
+            leer(sim, celda, detector, i)
+            lecturas += 1
+        sim.dormir(pausa)
+    return lecturas, detector.latencias(eventos), celdas
+
+
+def correr_adaptativo(eventos, trazas, periodo_max, con_barrera):
+    sim, celdas = crear_celdas(trazas)
+    detector = Detector()
+    plan = PlanificadorDeMuestreo(CAJONES, sim, UMBRAL_PARA_OCUPAR, UMBRAL_PARA_LIBERAR,
+                                  periodo_max=periodo_max)
+    aperturas = sorted(t - ANTICIPO for cambios in eventos for t, e in cambios if e == 'OCUPADO')
+    indices = range(CAJONES)
+    while sim.ahora() < MINUTOS * 60:
+        if con_barrera and aperturas and aperturas[0] <= sim.ahora():
+            aperturas.pop(0)
+            plan.impulsar(None, IMPULSO)
+        i, falta = plan.siguiente(indices)
+        if falta > 0:
+            if con_barrera and aperturas:
+                falta = min(falta, max(0.0, aperturas[0] - sim.ahora()) + 1e-6)
+            sim.dormir(falta)
+            continue
+        peso, cambio = leer(sim, celdas[i], detector, i)
+        if cambio:
+            plan.marcar_cambio(i)
+        plan.registrar(i, peso, celdas[i].peso_instantaneo)
+    return plan.lecturas, detector.latencias(eventos), celdas
+
+
+def percentil(datos, p):
+    return datos[min(len(datos) - 1, int(len(datos) * p))] if datos else float('nan')
+
+
+def main():
+    global MINUTOS, CAJONES
+    if len(sys.argv) > 1:
+        MINUTOS = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        CAJONES = int(sys.argv[2])
+
+    eventos, trazas = crear_eventos(random.Random(3))
+    total = sum(len(c) for c in eventos)
+    print(f"{CAJONES} cajones, {MINUTOS:g} min simulados, {total} llegadas/salidas, "
+          f"{COSTO_LECTURA * 1000:g} ms de CPU por lectura.")
+    print(f"{'modo':<28} {'lecturas/s':>10} {'mediana s':>10} {'p90 s':>7} {'máx s':>7} {'perdidos':>8}")
+
+    corridas = [(f"fijo, pausa {p:g} s", lambda p=p: correr_fijo(eventos, trazas, p)) for p in PAUSAS_FIJO]
+    corridas += [(f"adaptativo, máx {m:g} s", lambda m=m: correr_adaptativo(eventos, trazas, m, False))
+                 for m in PERIODOS_MAX]
+    corridas += [(f"adaptativo + barrera, máx {m:g} s", lambda m=m: correr_adaptativo(eventos, trazas, m, True))
+                 for m in PERIODOS_MAX]
+    for nombre, correr in corridas:
+        lecturas, latencias, celdas = correr()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for celda in celdas:
+                celda.limpiar()
+        print(f"{nombre:<28} {lecturas / (MINUTOS * 60):>10.1f} {percentil(latencias, 0.5):>10.2f} "
+              f"{percentil(latencias, 0.9):>7.2f} {latencias[-1] if latencias else float('nan'):>7.2f} "
+              f"{total - len(latencias):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: gestor de acceso con sleep(3) tras cada toque (versión 41) vs.
+PresenciaDeTarjetas (versión 42). No necesita hardware; reloj discreto.
+
+Escenarios (PN532 simulado con un horario de toques):
+
+  * seguidas:  dos conductores distintos; el segundo acerca su tarjeta
+               SEPARACION s después del primero y la deja ahí hasta
+               ESPERA_MAXIMA s (o hasta que se decide)
+  * olvidada:  una tarjeta que se queda OLVIDADA s sobre el lector
+  * retoque:   la misma tarjeta, retirada y vuelta a acercar 2 s después
+
+Reporta cuántas decisiones de acceso hubo contra los toques reales, los
+toques perdidos y la latencia toque -> decisión (mediana y máxima).
+
+Uso:  python3 bench_presencia.py [pasadas]
+"""
+import io
+import sys
+import contextlib
+import Main
+from hardware_simulado import BackendSimulado
+from sensor_nfc import SensorNFC
+
+PASADAS = 50
+SEPARACION = 0.7    # s entre el toque del primer conductor y el del segundo
+TOQUE = 0.5         # s que se deja la tarjeta en el lector
+ESPERA_MAXIMA = 5.0 # s que el segundo conductor espera con la tarjeta en el lector
+OLVIDADA = 10.0     # s que se queda la tarjeta olvidada
+CICLO = 30.0        # s entre pasadas
+
+
+def escenario(nombre):
+    toques = []
+    for k in range(PASADAS):
+        t = 5.0 + k * CICLO
+        if nombre == "seguidas":
+            toques += [(t, f"{k:08x}", TOQUE), (t + SEPARACION, f"{k + 1000:08x}", ESPERA_MAXIMA)]
+        elif nombre == "olvidada":
+            toques.append((t, "557ddc3e", OLVIDADA))
+        else:
+            toques += [(t, "557ddc3e", TOQUE), (t + TOQUE + 2.0, "557ddc3e", TOQUE)]
+    return toques
+
+
+def gestor_acceso_v41(sensor_nfc, barrera):
+    """El bucle de la versión 41 (duerme 3 s tras cada toque)."""
+    while Main.app_running.is_set():
+        uid = sensor_nfc.leer_uid(timeout=0.1)
+        if uid:
+            Main.decidir_acceso(sensor_nfc, uid, barrera)
+            Main.hw.dormir(3)
+        Main.hw.dormir(0.1)
+
+
+def correr(gestor, toques):
+    sim = BackendSimulado(semilla=1, escala=0) # Reloj discreto
+    sim.programar_toques(toques)
+    Main.hw = sim
+    fin = toques[-1][0] + CICLO
+    decisiones = []
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sensor = SensorNFC(backend=sim)
+    leer = sensor.leer_uid
+
+    def leer_hasta_el_fin(timeout=0.5):
+        if sim.ahora() > fin:
+            Main.app_running.clear()
+        return leer(timeout)
+
+    sensor.leer_uid = leer_hasta_el_fin
+    decidir = Main.decidir_acceso
+    Main.decidir_acceso = lambda s, uid, b: decisiones.append((sim.ahora(), bytes(uid)))
+    try:
+        Main.app_running.set()
+        with contextlib.redirect_stdout(io.StringIO()):
+            gestor(sensor, None)
+    finally:
+        Main.decidir_acceso = decidir
+    return decisiones
+
+
+def latencias(toques, decisiones):
+    """Latencia de cada toque (None = no hubo decisión mientras estaba la tarjeta)."""
+    resultado = []
+    for inicio, uid, duracion in toques:
+        uid = bytes.fromhex(uid)
+        t = next((t for t, u in decisiones if u == uid and inicio <= t <= inicio + duracion), None)
+        resultado.append(None if t is None else t - inicio)
+    return resultado
+
+
+def main():
+    global PASADAS
+    if len(sys.argv) > 1:
+        PASADAS = int(sys.argv[1])
+
+    print(f"{PASADAS} pasadas por escenario; lector: leer_uid(timeout=0.1) + pausa de 0.1 s.")
+    print(f"{'escenario':<10} {'gestor':<11} {'toques':>6} {'decisiones':>10} {'perdidos':>8} "
+          f"{'mediana s':>9} {'máx s':>6}")
+    gestores = (("sleep(3)", gestor_acceso_v41), ("presencia", Main.gestor_acceso_nfc))
+    for nombre in ("seguidas", "olvidada", "retoque"):
+        toques = escenario(nombre)
+        for nombre_gestor, gestor in gestores:
+            decisiones = correr(gestor, toques)
+            datos = sorted(l for l in latencias(toques, decisiones) if l is not None)
+            mediana = datos[len(datos) // 2] if datos else float('nan')
+            maxima = datos[-1] if datos else float('nan')
+            print(f"{nombre:<10} {nombre_gestor:<11} {len(toques):>6} {len(decisiones):>10} "
+                  f"{len(toques) - len(datos):>8} {mediana:>9.2f} {maxima:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark del registro de una flotilla (registrar_tarjeta.py). No necesita
+hardware; escribe en una carpeta temporal.
+
+  * por tarjeta:  lo que hacía la versión 44: abrir, agregar una línea y
+                  cerrar valid_uids.txt por cada toque, sin revisar repetidos
+  * por lotes:    ArchivoDeUIDs: repetidos descartados en memoria y el
+                  archivo reescrito (temporal + rename) cada LOTE tarjetas
+
+Se simulan TARJETAS tarjetas con una fracción REPETIDAS de toques
+repetidos. Reporta el tiempo total, las escrituras, las líneas del archivo
+final y lo que tarda en compilarse valid_uids.idx con ese archivo.
+
+Uso:  python3 bench_registro.py [tarjetas] [lote]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import lista_blanca
+import registrar_tarjeta
+
+TARJETAS = 5000
+REPETIDAS = 0.2 # Fracción de toques que repiten una tarjeta ya registrada
+LOTE = 50
+
+
+def toques_al_azar(n, semilla):
+    rnd = random.Random(semilla)
+    vistos, toques = [], []
+    while len(vistos) < n:
+        if vistos and rnd.random() < REPETIDAS:
+            toques.append(rnd.choice(vistos))
+        else:
+            uid = rnd.getrandbits(rnd.choice((32, 56))).to_bytes(8, 'big').lstrip(b"\0").hex()
+            vistos.append(uid)
+            toques.append(uid)
+    return toques
+
+
+def por_tarjeta(ruta, toques):
+    for uid in toques:
+        with open(ruta, 'a') as f:
+            f.write(uid + "\n")
+    return len(toques)
+
+
+def por_lotes(ruta, toques, lote):
+    archivo = registrar_tarjeta.ArchivoDeUIDs(ruta)
+    for uid in toques:
+        archivo.agregar(uid)
+        if archivo.pendientes >= lote:
+            archivo.guardar()
+    if archivo.pendientes:
+        archivo.guardar()
+    return archivo.guardados
+
+
+def main():
+    global TARJETAS, LOTE
+    if len(sys.argv) > 1:
+        TARJETAS = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        LOTE = int(sys.argv[2])
+
+    toques = toques_al_azar(TARJETAS, 1)
+    print(f"{TARJETAS} tarjetas, {len(toques)} toques ({len(toques) - TARJETAS} repetidos); lote de {LOTE}.")
+    print(f"{'modo':<12} {'total ms':>9} {'escrituras':>10} {'líneas':>7} {'compilar ms':>11}")
+    with tempfile.TemporaryDirectory() as carpeta:
+        for nombre, funcion in (("por tarjeta", por_tarjeta),
+                                ("por lotes", lambda r, t: por_lotes(r, t, LOTE))):
+            ruta = os.path.join(carpeta, nombre.replace(" ", "_") + ".txt")
+            t0 = time.perf_counter()
+            escrituras = funcion(ruta, toques)
+            total = time.perf_counter() - t0
+            with open(ruta) as f:
+                lineas = sum(1 for _ in f)
+            t0 = time.perf_counter()
+            lista_blanca.compilar(ruta, ruta + ".idx")
+            compilar = time.perf_counter() - t0
+            print(f"{nombre:<12} {total * 1000:>9.1f} {escrituras:>10} {lineas:>7} {compilar * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
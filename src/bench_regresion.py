@@ -0,0 +1,418 @@
+"""
+Suite de rendimiento con líneas base (no necesita hardware).
+
+Mide los caminos calientes sobre el backend simulado (el mismo de
+PARKPI_BACKEND=simulado) y guarda los resultados en JSON; 'comparar' falla
+(código de salida 1) si alguna métrica empeoró más que la tolerancia.
+
+Métricas de CPU (µs por llamada; la mejor de --tandas tandas, como en
+bench_metricas.py). Cada tanda va pegada a una de una carga de referencia
+fija y se compara la mediana de los cocientes ('relativo'): en una VM o con
+otro proceso la velocidad cambia de un segundo a otro y el cociente mucho
+menos (+-5 % entre corridas contra +-40 % del tiempo solo).
+
+  trama_hx711_us        una trama del HX711 (_read_raw_value: bit-banging
+                        simulado + extensión de signo), reloj discreto
+  obtener_peso_us       obtener_peso() con el promedio de 5 lecturas
+  peso_filtrado_us      obtener_peso() con FILTRO_PESO de Main.py
+  lista_blanca_N_us     es_valido() con el índice de N UIDs (mitad
+                        aciertos, mitad fallos), para cada N de --tamanos
+  histeresis_us         Main.procesar_lectura() (histéresis + LED + estado)
+  ocupacion_1000_us     un tick de MotorDeOcupacion con 1000 cajones
+
+Latencias (mediana de --repeticiones corridas; el arranque, la mejor):
+
+  toque_a_barrera_ms    UID leído -> servo abriendo, con gestor_acceso_nfc
+                        y ControladorBarrera (tiempo real, TOQUES por corrida)
+  arranque_s            Main.py en un proceso nuevo (simulado, escala
+                        ARRANQUE_ESCALA, sin calibracion.json) hasta que el
+                        gestor NFC espera tarjetas
+
+Uso:
+  python3 bench_regresion.py medir [--salida resultados.json] [--repeticiones 5]
+                                   [--tandas 50] [--tamanos 1000,100000,1000000]
+  python3 bench_regresion.py comparar base.json nuevo.json [--tolerancia 0.3]
+                                   [--tolerancia toque_a_barrera_ms=0.5]
+  python3 bench_regresion.py verificar [--base bench_base.json] (medir + comparar;
+                                   la base por defecto es la de esta carpeta)
+
+Para fijar la línea base:  python3 bench_regresion.py medir --salida bench_base.json
+"""
+import gc
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import random
+import itertools
+import platform
+import tempfile
+import threading
+import contextlib
+import subprocess
+import lista_blanca
+from celda_carga import CeldaDeCarga
+from sensor_nfc import SensorNFC
+from motor_ocupacion import MotorDeOcupacion
+from barrera import ControladorBarrera
+from hardware_simulado import BackendSimulado, TrazaDePeso
+
+FORMATO = 1
+TOLERANCIA = 0.3 # 30 % peor que la base = regresión
+REPETICIONES = 5
+TANDAS = 50
+TAMANOS = [1000, 100000, 1000000]
+BUSQUEDAS = 20000
+TOQUES = 10
+ARRANQUE_ESCALA = 10.0
+LISTO = "[NFC] Gestor de acceso iniciado"
+MEJOR_CORRIDA = {'arranque_s'} # Solo el ruido lo alarga: vale el mejor
+CARPETA = os.path.dirname(os.path.abspath(__file__))
+BASE = os.path.join(CARPETA, "bench_base.json")
+
+
+def cronometrar(funcion, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        funcion()
+    return (time.perf_counter() - t0) / n
+
+
+def carga_de_referencia():
+    """Python puro de tamaño fijo: mide qué tan rápida está la máquina ahora."""
+    cuentas = {}
+    for i in range(200):
+        cuentas[i & 31] = cuentas.get(i & 31, 0) + i * 0.5
+    return cuentas
+
+
+def medir_cpu(funcion, n, tandas):
+    """
+    'tandas' tandas de n llamadas (unos 5 ms cada una), cada una pegada a
+    una tanda de la carga de referencia (la velocidad de una VM cambia de
+    un segundo a otro). Devuelve (µs por llamada, µs de la referencia),
+    tanda por tanda.
+    """
+    funcion() # Calentar (cachés, primera asignación)
+    muestras = []
+    gc.disable() # Como timeit: una recolección a media tanda no es del camino
+    try:
+        for _ in range(tandas):
+            referencia = cronometrar(carga_de_referencia, 100)
+            muestras.append((cronometrar(funcion, n) * 1e6, referencia * 1e6))
+    finally:
+        gc.enable()
+    return muestras
+
+
+def mediana(valores):
+    ordenados = sorted(valores)
+    return ordenados[len(ordenados) // 2]
+
+
+# --- Caminos ---
+
+def celda_simulada():
+    sim = BackendSimulado(semilla=1, escala=0) # Reloj discreto: solo CPU
+    sim.agregar_hx711(17, 27, TrazaDePeso([(0.0, 120.0)]), factor=100.0, sps=1e9)
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda = CeldaDeCarga(pin_dt=17, pin_sck=27, backend=sim)
+        celda.establecer_factor_escala(100.0)
+    return celda
+
+
+def medir_celda(tandas):
+    import Main
+    celda = celda_simulada()
+    resultados = {'trama_hx711_us': medir_cpu(celda._read_raw_value, 200, tandas)}
+    celda.filtro = None
+    resultados['obtener_peso_us'] = medir_cpu(celda.obtener_peso, 40, tandas)
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda.configurar_filtro(**Main.FILTRO_PESO)
+    resultados['peso_filtrado_us'] = medir_cpu(celda.obtener_peso, 200, tandas)
+    with contextlib.redirect_stdout(io.StringIO()):
+        celda.limpiar()
+    return resultados
+
+
+def medir_lista_blanca(n, tandas, carpeta):
+    ruta_texto = os.path.join(carpeta, f"uids_{n}.txt")
+    ruta_indice = os.path.join(carpeta, f"uids_{n}.idx")
+    rnd = random.Random(5)
+    validos = [rnd.randbytes(rnd.choice((4, 7))) for _ in range(n)]
+    with open(ruta_texto, 'w') as f:
+        f.write("".join(uid.hex() + "\n" for uid in validos))
+    lista_blanca.compilar(ruta_texto, ruta_indice)
+    consultas = ([bytearray(rnd.choice(validos)) for _ in range(BUSQUEDAS // 2)] +
+                 [bytearray(rnd.randbytes(7)) for _ in range(BUSQUEDAS // 2)])
+    rnd.shuffle(consultas)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sensor = SensorNFC(backend=BackendSimulado(semilla=1, escala=0))
+        sensor.cargar_lista_blanca(ruta_indice, None, vigilar=False)
+    aciertos = sum(1 for uid in consultas if sensor.es_valido(uid))
+    if aciertos < BUSQUEDAS // 2:
+        raise AssertionError(f"lista_blanca_{n}: {aciertos} aciertos de {BUSQUEDAS // 2}")
+    siguiente = itertools.cycle(consultas).__next__
+    return {f'lista_blanca_{n}_us': medir_cpu(lambda: sensor.es_valido(siguiente()), 2000, tandas)}
+
+
+def medir_histeresis(tandas):
+    import Main
+    sim = BackendSimulado(semilla=1, escala=0)
+    Main.hw = sim
+    leds = [sim.crear_led(Main.PIN_LED_1), sim.crear_led(Main.PIN_LED_2), sim.crear_led(Main.PIN_LED_3)]
+    # Casi siempre en la zona muerta o lejos; un cambio de estado cada 50
+    siguiente_peso = itertools.cycle([30.0] * 49 + [80.0] + [60.0] * 49 + [10.0]).__next__
+    with contextlib.redirect_stdout(io.StringIO()):
+        escalar = medir_cpu(lambda: Main.procesar_lectura(0, siguiente_peso(), leds), 1000, tandas)
+
+    ocupacion = MotorDeOcupacion([100.0] * 1000)
+    rnd = random.Random(3)
+    siguiente_tick = itertools.cycle([[rnd.choice((0.0, 30.0, 80.0)) for _ in range(1000)]
+                                      for _ in range(16)]).__next__
+    vectorial = medir_cpu(lambda: ocupacion.actualizar_pesos(siguiente_tick()), 50, tandas)
+    return {'histeresis_us': escalar, 'ocupacion_1000_us': vectorial}
+
+
+class LectorCronometrado:
+    """
+    Envuelve al PN532 simulado y anota cuándo entrega cada UID por primera
+    vez (las lecturas siguientes del mismo toque las descarta la presencia).
+    """
+
+    def __init__(self, lector, reloj):
+        self.lector = lector
+        self.reloj = reloj
+        self.entregas = {}
+
+    def __getattr__(self, nombre):
+        return getattr(self.lector, nombre)
+
+    def read_passive_target(self, card_baud=0x00, timeout=1):
+        uid = self.lector.read_passive_target(card_baud, timeout)
+        if uid is not None:
+            self.entregas.setdefault(bytes(uid), self.reloj.ahora())
+        return uid
+
+
+def medir_toque_a_barrera(repeticiones):
+    """
+    Reloj simulado a escala 1: la latencia es la de la CPU y los hilos.
+    Se mide desde que el lector entrega el UID (la espera del sondeo,
+    hasta 0.1 s sin PIN_IRQ_NFC, es de diseño y no cambia con el código).
+    """
+    import Main
+    latencias = []
+    for _ in range(repeticiones):
+        sim = BackendSimulado(semilla=1, escala=1.0)
+        Main.hw = sim
+        servo = sim.crear_servo(Main.PIN_SERVO, 0.5/1000, 2.5/1000)
+        servo.min()
+        # UIDs distintos: la presencia no descarta ninguno
+        uids = [f"{0x55000000 + k:08x}" for k in range(TOQUES)]
+        t0 = sim.ahora() + 0.2
+        sim.programar_toques([(t0 + 0.25 * k, uid, 0.15) for k, uid in enumerate(uids)])
+        with contextlib.redirect_stdout(io.StringIO()):
+            sensor = SensorNFC(backend=sim)
+            sensor.valid_uids = set(uids)
+            lector = LectorCronometrado(sensor.pn532, sim)
+            sensor.pn532 = lector
+            barrera = ControladorBarrera(servo, sim, candado=Main.recursos.candado("servo").prioritario(),
+                                         tiempo_abierta=0.05, tiempo_movimiento=0.05)
+            barrera.iniciar()
+            Main.app_running.set()
+            hilo = threading.Thread(target=Main.gestor_acceso_nfc, args=(sensor, barrera))
+            hilo.start()
+            sim.dormir(t0 + 0.25 * TOQUES + 0.2 - sim.ahora())
+            Main.app_running.clear()
+            hilo.join()
+            barrera.detener()
+        aperturas = [t for t, valor in servo.historial if valor == 0]
+        for entrega in lector.entregas.values():
+            siguiente = [t for t in aperturas if t >= entrega]
+            if siguiente:
+                latencias.append((siguiente[0] - entrega) * 1e3)
+    if len(latencias) < repeticiones * TOQUES:
+        raise AssertionError(f"toque_a_barrera: {len(latencias)} aperturas de {repeticiones * TOQUES} toques")
+    # Una muestra por toque: la mediana es la del toque típico
+    return {'toque_a_barrera_ms': latencias}
+
+
+def medir_arranque(repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        with tempfile.TemporaryDirectory() as carpeta:
+            shutil.copy(os.path.join(CARPETA, "valid_uids.txt"), carpeta)
+            entorno = dict(os.environ, PARKPI_BACKEND="simulado", PARKPI_ESCALA=str(ARRANQUE_ESCALA),
+                           PYTHONPATH=CARPETA, PYTHONUNBUFFERED="1")
+            entorno.pop("PARKPI_ESCENARIO", None)
+            t0 = time.perf_counter()
+            proceso = subprocess.Popen([sys.executable, os.path.join(CARPETA, "Main.py")], cwd=carpeta,
+                                       env=entorno, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True)
+            listo = None
+            for linea in proceso.stdout:
+                if LISTO in linea:
+                    listo = time.perf_counter() - t0
+                    break
+            proceso.send_signal(signal.SIGINT)
+            try:
+                proceso.communicate(timeout=30)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+                proceso.communicate()
+            if listo is None:
+                raise AssertionError("arranque: Main.py terminó sin llegar al gestor NFC")
+            tiempos.append(listo)
+    return {'arranque_s': tiempos}
+
+
+UNIDADES = {'_us': "µs", '_ms': "ms", '_s': "s"}
+
+
+def medir(repeticiones=REPETICIONES, tandas=TANDAS, tamanos=TAMANOS):
+    crudos = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        pasos = ([("celda", lambda: medir_celda(tandas))] +
+                 [(f"lista blanca ({n})", lambda n=n: medir_lista_blanca(n, tandas, carpeta))
+                  for n in tamanos] +
+                 [("histéresis", lambda: medir_histeresis(tandas)),
+                  ("toque a barrera", lambda: medir_toque_a_barrera(repeticiones)),
+                  ("arranque", lambda: medir_arranque(repeticiones))])
+        for nombre, paso in pasos:
+            t0 = time.perf_counter()
+            crudos.update(paso())
+            print(f"[Bench] {nombre}: {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+
+    metricas_json = {}
+    for nombre, muestras in crudos.items():
+        unidad = next(u for sufijo, u in UNIDADES.items() if nombre.endswith(sufijo))
+        metrica = {'unidad': unidad, 'menor_es_mejor': True}
+        if isinstance(muestras[0], tuple):
+            # CPU: 'valor' es la mejor tanda (un bucle solo sale más lento
+            # por ruido); se compara 'relativo', la mediana de los cocientes
+            # tanda / referencia de al lado
+            tiempos = [t for t, _ in muestras]
+            metrica['valor'] = min(tiempos)
+            metrica['relativo'] = round(mediana([t / r for t, r in muestras]), 5)
+        else:
+            tiempos = muestras
+            metrica['valor'] = min(tiempos) if nombre in MEJOR_CORRIDA else mediana(tiempos)
+        metrica['muestras'] = [round(t, 4) for t in tiempos]
+        metricas_json[nombre] = metrica
+    return {
+        'formato': FORMATO,
+        'fecha': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'maquina': f"{platform.machine()}, {os.cpu_count()} CPU",
+        'metricas': metricas_json,
+    }
+
+
+def comparar(base, nuevo, tolerancia=TOLERANCIA, por_metrica=None):
+    """
+    Imprime la tabla y devuelve los nombres de las métricas que empeoraron.
+    Las de CPU se comparan por 'relativo' (si las dos lo tienen), así una
+    máquina más lenta o más cargada no cuenta como regresión.
+    """
+    por_metrica = por_metrica or {}
+    if base.get('maquina') != nuevo.get('maquina'):
+        print(f"Ojo: la base es de otra máquina ({base.get('maquina')} vs {nuevo.get('maquina')}).")
+    print(f"{'métrica':<24} {'base':>10} {'ahora':>10} {'cambio':>8} {'tolerancia':>10}  resultado")
+    regresiones = []
+    for nombre, b in base['metricas'].items():
+        n = nuevo['metricas'].get(nombre)
+        if n is None:
+            print(f"{nombre:<24} {b['valor']:>10.4g} {'-':>10} {'':>8} {'':>10}  no medida")
+            continue
+        limite = por_metrica.get(nombre, tolerancia)
+        clave = 'relativo' if 'relativo' in b and 'relativo' in n else 'valor'
+        cambio = n[clave] / b[clave] - 1.0 if b[clave] else 0.0
+        peor = cambio if b.get('menor_es_mejor', True) else -cambio
+        resultado = "REGRESIÓN" if peor > limite else ("mejor" if peor < -limite else "ok")
+        if peor > limite:
+            regresiones.append(nombre)
+        print(f"{nombre:<24} {b['valor']:>10.4g} {n['valor']:>10.4g} {cambio:>+8.1%} {limite:>10.0%}  "
+              f"{resultado} ({b['unidad']}{', relativo' if clave == 'relativo' else ''})")
+    for nombre in nuevo['metricas'].keys() - base['metricas'].keys():
+        print(f"{nombre:<24} {'-':>10} {nuevo['metricas'][nombre]['valor']:>10.4g} {'':>8} {'':>10}  nueva")
+    return regresiones
+
+
+def opciones(argv):
+    """Posicionales y --clave valor (como los demás scripts: sin argparse)."""
+    valores = {'salida': None, 'repeticiones': str(REPETICIONES), 'tandas': str(TANDAS), 'tamanos': ",".join(map(str, TAMANOS)),
+               'base': BASE, 'tolerancia': []}
+    posicionales = []
+    i = 0
+    while i < len(argv):
+        if argv[i].startswith("--") and i + 1 < len(argv):
+            clave = argv[i][2:]
+            if clave not in valores:
+                raise SystemExit(f"Opción desconocida: {argv[i]}\n{__doc__}")
+            if clave == 'tolerancia':
+                valores[clave].append(argv[i + 1])
+            else:
+                valores[clave] = argv[i + 1]
+            i += 2
+        else:
+            posicionales.append(argv[i])
+            i += 1
+    tolerancia, por_metrica = TOLERANCIA, {}
+    for valor in valores['tolerancia']:
+        if "=" in valor:
+            nombre, limite = valor.split("=", 1)
+            por_metrica[nombre] = float(limite)
+        else:
+            tolerancia = float(valor)
+    valores['tolerancia'] = (tolerancia, por_metrica)
+    return posicionales, valores
+
+
+def cargar(ruta):
+    with open(ruta, 'r') as f:
+        datos = json.load(f)
+    if datos.get('formato') != FORMATO:
+        raise SystemExit(f"{ruta}: formato {datos.get('formato')} desconocido (se esperaba {FORMATO}).")
+    return datos
+
+
+def main():
+    posicionales, valores = opciones(sys.argv[1:])
+    comando = posicionales[0] if posicionales else "medir"
+    tolerancia, por_metrica = valores['tolerancia']
+
+    if comando == "comparar":
+        if len(posicionales) != 3:
+            raise SystemExit(__doc__)
+        regresiones = comparar(cargar(posicionales[1]), cargar(posicionales[2]), tolerancia, por_metrica)
+    elif comando in ("medir", "verificar"):
+        resultados = medir(int(valores['repeticiones']), int(valores['tandas']),
+                           [int(n) for n in valores['tamanos'].split(",") if n])
+        if valores['salida']:
+            with open(valores['salida'], 'w') as f:
+                json.dump(resultados, f, indent=2, ensure_ascii=False)
+                f.write("\n")
+            print(f"Resultados guardados en {valores['salida']}.")
+        if comando == "medir":
+            for nombre, m in resultados['metricas'].items():
+                print(f"{nombre:<24} {m['valor']:>10.4g} {m['unidad']}")
+            return
+        if not os.path.exists(valores['base']):
+            raise SystemExit(f"No hay línea base ({valores['base']}): "
+                             f"python3 bench_regresion.py medir --salida {valores['base']}")
+        regresiones = comparar(cargar(valores['base']), resultados, tolerancia, por_metrica)
+    else:
+        raise SystemExit(__doc__)
+
+    if regresiones:
+        print(f"\n{len(regresiones)} métrica(s) empeoraron más que la tolerancia: {', '.join(regresiones)}")
+        sys.exit(1)
+    print("\nSin regresiones.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Graba una traza sintética con GrabadoraDeMuestras (trazas.py) y la repite
+con repeticion.py.
+
+La traza: CELDAS celdas a 80 muestras/s durante HORAS horas, con coches
+que llegan y se van (rampa de 1 s y unos segundos de rebote al
+acomodarse), golpes cortos de 30-80 g (una mano, una vibración), ruido
+gaussiano y picos sueltos de +-500 g.
+
+Reporta:
+
+  * el costo de grabar (µs por muestra en agregar(), MB en disco)
+  * cargar las trazas (numpy.memmap) y sacar la referencia
+  * el barrido completo (repeticion.py con su grilla por defecto)
+  * lo que tardaría lo mismo muestra por muestra en Python (FiltroDePeso +
+    histéresis), medido en un tramo y extrapolado
+
+Uso:  python3 bench_repeticion.py [horas] [carpeta]
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import contextlib
+import numpy as np
+import trazas
+import repeticion
+from filtro_peso import FiltroDePeso
+from hardware_simulado import BackendSimulado
+
+HORAS = 6.0
+CELDAS = 3
+SPS = 80.0
+FACTORES = [215.24, 92.57, 33.27]
+OFFSETS = [8123.0, -20456.0, 3310.0]
+PESO_COCHE = (60.0, 180.0) # g
+ESTADIA = 20 * 60.0        # s (media)
+HUECO = 15 * 60.0          # s (media)
+GOLPES = 30                # Por hora
+RUIDO = 3.0                # g
+PICOS = 1e-4               # Probabilidad por muestra
+TRAMO_PYTHON = 200000      # Muestras para medir el camino en Python
+CARPETA = "/tmp/bench_trazas"
+
+
+def senal(rnd, n):
+    """Gramos (sin ruido de cuantización) de una celda durante n muestras."""
+    t = np.arange(n) / SPS
+    gramos = np.zeros(n)
+    ahora = rnd.exponential(HUECO)
+    while ahora < t[-1]:
+        fin = ahora + rnd.exponential(ESTADIA)
+        peso = rnd.uniform(*PESO_COCHE)
+        a, b = int(ahora * SPS), min(n, int(fin * SPS))
+        rampa = np.clip((t[a:b] - ahora) / 1.0, 0.0, 1.0)
+        rebote = 0.3 * np.exp(-(t[a:b] - ahora) / 2.0) * np.sin(2 * np.pi * 1.5 * (t[a:b] - ahora))
+        gramos[a:b] = peso * rampa * (1.0 + rebote)
+        ahora = fin + rnd.exponential(HUECO)
+    for inicio in rnd.uniform(0, t[-1], rnd.poisson(GOLPES * t[-1] / 3600)):
+        a = int(inicio * SPS)
+        gramos[a:a + int(rnd.uniform(0.1, 0.8) * SPS)] += rnd.uniform(30.0, 80.0)
+    gramos += rnd.normal(0.0, RUIDO, n)
+    picos = rnd.random(n) < PICOS
+    gramos[picos] += rnd.choice([-500.0, 500.0], picos.sum())
+    return gramos
+
+
+def grabar(carpeta, horas):
+    shutil.rmtree(carpeta, ignore_errors=True)
+    rnd = np.random.default_rng(11)
+    n = int(horas * 3600 * SPS)
+    crudas = [np.round(OFFSETS[c] + FACTORES[c] * senal(rnd, n)).astype(np.int32) for c in range(CELDAS)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        grabadora = trazas.GrabadoraDeMuestras(carpeta, BackendSimulado(semilla=9, escala=0), segmentos_max=None)
+        grabadora.iniciar()
+    bloque = int(SPS) # Un segundo por celda, intercalado (como los carriles)
+    duracion = 0.0
+    for trozo in range(0, n, 60 * bloque): # Listas de a un minuto (solo se mide agregar())
+        tiempos = (np.arange(trozo, min(n, trozo + 60 * bloque)) / SPS).tolist()
+        valores = [crudas[c][trozo:trozo + 60 * bloque].tolist() for c in range(CELDAS)]
+        t0 = time.perf_counter()
+        for inicio in range(0, len(tiempos), bloque):
+            for c in range(CELDAS):
+                for t, valor in zip(tiempos[inicio:inicio + bloque], valores[c][inicio:inicio + bloque]):
+                    grabadora.agregar(c, t, valor)
+        duracion += time.perf_counter() - t0
+    grabadora.detener()
+
+    class Celda: # Lo que describir() necesita
+        def __init__(self, c):
+            self.pin_dt, self.pin_sck, self.ganancia = 1000 + c, 2000 + c, 128
+            self.offset, self.factor_escala = OFFSETS[c], FACTORES[c]
+    grabadora.describir([Celda(c) for c in range(CELDAS)])
+    tamano = sum(os.path.getsize(ruta) for _, ruta in trazas.segmentos(carpeta))
+    return grabadora.muestras, duracion, tamano
+
+
+def camino_python(t, crudas, offset, factor, ocupar, liberar):
+    """Una configuración, muestra por muestra (lo que haría un script ingenuo)."""
+    f = FiltroDePeso(ventana_mediana=5, alfa_ema=0.5, umbral_atipico=200.0)
+    estado, cambios = 0, 0
+    for cruda in crudas:
+        peso = abs(f.agregar((cruda - offset) / factor))
+        if peso < 0.5:
+            peso = 0.0
+        if estado == 0 and peso > ocupar:
+            estado, cambios = 1, cambios + 1
+        elif estado == 1 and peso < liberar:
+            estado, cambios = 0, cambios + 1
+    return cambios
+
+
+def main():
+    horas = float(sys.argv[1]) if len(sys.argv) > 1 else HORAS
+    carpeta = sys.argv[2] if len(sys.argv) > 2 else CARPETA
+
+    muestras, duracion, tamano = grabar(carpeta, horas)
+    print(f"Grabación: {muestras} muestras ({CELDAS} celdas, {horas:g} h a {SPS:g} SPS) en {duracion:.1f} s: "
+          f"{duracion / muestras * 1e6:.2f} µs por muestra, {tamano / 2**20:.0f} MB "
+          f"({len(trazas.segmentos(carpeta))} segmentos).")
+
+    # El barrido de verdad (salida de repeticion.py tal cual)
+    sys.argv = ["repeticion.py", carpeta]
+    t0 = time.perf_counter()
+    filas = repeticion.main()
+    total = time.perf_counter() - t0
+
+    # Lo mismo en Python puro: un tramo, extrapolado
+    t, crudas, _ = trazas.muestras_por_celda(carpeta)[0]
+    tramo = crudas[:TRAMO_PYTHON].tolist()
+    t0 = time.perf_counter()
+    camino_python(t, tramo, OFFSETS[0], FACTORES[0], 35.0, 25.0)
+    por_muestra = (time.perf_counter() - t0) / len(tramo)
+    configuraciones = len(filas)
+    estimado = por_muestra * muestras * configuraciones
+    print(f"\nRepetición vectorizada: {total:.1f} s en total (carga + referencia + barrido).")
+    print(f"Python muestra por muestra: {por_muestra * 1e6:.2f} µs por muestra y configuración; "
+          f"{configuraciones} configuraciones x {muestras} muestras ~ {estimado / 3600:.1f} h "
+          f"({estimado / total:.0f}x).")
+
+
+if __name__ == "__main__":
+    main()
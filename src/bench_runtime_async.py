@@ -0,0 +1,179 @@
+"""
+Benchmark del runtime asyncio (no necesita hardware).
+
+Compara el runtime de hilos de Main.py (un hilo NFC + un hilo de barrera
+por puerta, MotorDeMuestreo con un hilo por celda) contra RuntimeAsync
+(un event loop + un pool fijo de HILOS_RUNTIME hilos) con varias puertas
+y muchas celdas en modo eventos.
+
+Reporta:
+  * hilos de la aplicación (sin contar los hilos que simulan las alertas
+    de los HX711, que en la Pi son el único hilo de callbacks de lgpio)
+  * latencia tarjeta -> servo abierto (media y p95)
+  * pesos entregados por celda por segundo (el runtime de hilos promedia
+    5 conversiones por peso; el asyncio entrega lo que llegó cada 50 ms)
+
+Uso:  python3 bench_runtime_async.py [escala] [segundos_simulados]
+"""
+import io
+import sys
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import Main
+from barrera import ControladorBarrera
+from celda_carga import CeldaDeCarga
+from hardware_simulado import BackendSimulado, PN532Simulado, ProgramaDeToques, TrazaDePeso
+from muestreo_celdas import MotorDeMuestreo
+from runtime_async import RuntimeAsync
+from sensor_nfc import SensorNFC
+
+UID = "557ddc3e"
+PERIODO_TOQUES = 15.0 # Un coche por puerta cada 15 s (la barrera ya cerró)
+ESCALA = 10.0
+DURACION = 60.0
+ESCENARIOS = [(1, 3), (4, 32), (8, 96)] # (puertas, celdas)
+
+
+def crear_lote(puertas, n):
+    sim = BackendSimulado(semilla=3, escala=ESCALA)
+    for i in range(n):
+        traza = TrazaDePeso([(0.0, 0.0), (5.0 + i * 0.1, 800.0)])
+        sim.agregar_hx711(1000 + i, 2000 + i, traza, factor=100.0)
+
+    def crear(i):
+        celda = CeldaDeCarga(pin_dt=1000 + i, pin_sck=2000 + i, backend=sim)
+        celda.establecer_factor_escala(100.0)
+        celda.iniciar_modo_eventos()
+        return celda
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            celdas = list(pool.map(crear, range(n)))
+
+        # Los toques empiezan después de calibrar (y la prueba dura DURACION)
+        t0 = sim.ahora()
+        lectores = []
+        for g in range(puertas):
+            inicio = t0 + 3.0 + g * 0.37
+            toques = []
+            while inicio < t0 + DURACION:
+                toques.append((inicio, UID, 0.5))
+                inicio += PERIODO_TOQUES
+            lectores.append(PN532Simulado(sim.reloj, ProgramaDeToques(toques)))
+
+        sensores, servos = [], []
+        for g, lector in enumerate(lectores):
+            sim.lector = lector
+            sensor = SensorNFC(backend=sim)
+            sensor.valid_uids = {UID}
+            sensores.append(sensor)
+            servo = sim.crear_servo(3000 + g, 0.5/1000, 2.5/1000)
+            servo.min()
+            servos.append(servo)
+    return sim, t0 + DURACION, celdas, sensores, servos, lectores
+
+
+def correr_hilos(sim, fin, celdas, sensores, servos, contar):
+    barreras = []
+    hilos = []
+    for sensor, servo in zip(sensores, servos):
+        barrera = ControladorBarrera(servo, sim,
+                                     candado=Main.recursos.candado(f"servo:{servo.pin}").prioritario(),
+                                     tiempo_abierta=Main.TIEMPO_BARRERA_ABIERTA,
+                                     tiempo_movimiento=Main.TIEMPO_MOVIMIENTO_SERVO)
+        barrera.iniciar()
+        barreras.append(barrera)
+        hilo = threading.Thread(target=Main.gestor_acceso_nfc, args=(sensor, barrera), daemon=True)
+        hilo.start()
+        hilos.append(hilo)
+    motor = MotorDeMuestreo(celdas, al_leer=contar)
+    motor.iniciar()
+
+    while sim.ahora() < fin:
+        sim.dormir(1.0)
+    activos = threading.active_count()
+
+    Main.app_running.clear()
+    motor.detener()
+    for hilo in hilos:
+        hilo.join()
+    for barrera in barreras:
+        barrera.detener()
+    return activos
+
+
+def correr_async(sim, fin, celdas, sensores, servos, contar):
+    runtime = RuntimeAsync(sim, hilos=Main.HILOS_RUNTIME)
+    for sensor, servo in zip(sensores, servos):
+        runtime.agregar_puerta(sensor, servo,
+                               al_tarjeta=lambda uid, b, s=sensor: Main.decidir_acceso(s, uid, b),
+                               candado=Main.recursos.candado(f"servo:{servo.pin}").prioritario(),
+                               tiempo_abierta=Main.TIEMPO_BARRERA_ABIERTA,
+                               tiempo_movimiento=Main.TIEMPO_MOVIMIENTO_SERVO)
+    runtime.agregar_celdas(celdas, contar)
+
+    activos = []
+    def vigilar():
+        while sim.ahora() < fin:
+            sim.dormir(1.0)
+        activos.append(threading.active_count() - 1) # Sin contar este hilo
+        Main.app_running.clear()
+    vigia = threading.Thread(target=vigilar, daemon=True)
+    vigia.start()
+    runtime.correr(Main.app_running)
+    vigia.join()
+    return activos[0]
+
+
+def latencias(lector, servo):
+    """Desde que se acerca cada tarjeta hasta que el servo llega a 'mid'."""
+    aperturas = [t for t, valor in servo.historial if valor == 0]
+    resultado = []
+    for inicio in lector.programa.inicios:
+        siguiente = [t for t in aperturas if t >= inicio]
+        if siguiente:
+            resultado.append(siguiente[0] - inicio)
+    return resultado
+
+
+def medir(nombre, puertas, n, correr):
+    sim, fin, celdas, sensores, servos, lectores = crear_lote(puertas, n)
+    Main.hw = sim
+    Main.app_running.set()
+    lecturas = [0] * n
+    def contar(i, peso):
+        lecturas[i] += 1
+
+    base = threading.active_count()
+    with contextlib.redirect_stdout(io.StringIO()):
+        activos = correr(sim, fin, celdas, sensores, servos, contar)
+        for celda in celdas:
+            celda.limpiar()
+
+    todas = sorted(l for lector, servo in zip(lectores, servos) for l in latencias(lector, servo))
+    if todas:
+        media = sum(todas) / len(todas)
+        p95 = todas[min(len(todas) - 1, int(len(todas) * 0.95))]
+    else:
+        media = p95 = float('nan')
+    refresco = sum(lecturas) / n / DURACION
+    print(f"{nombre:<8} {puertas:>7} {n:>6} {activos - base:>7} {media:>12.3f} {p95:>10.3f} {refresco:>12.2f}")
+
+
+def main():
+    global ESCALA, DURACION
+    if len(sys.argv) > 1:
+        ESCALA = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        DURACION = float(sys.argv[2])
+
+    print(f"Tiempo simulado x{ESCALA:g}, {DURACION:g} s simulados, un coche por puerta cada {PERIODO_TOQUES:g} s.")
+    print(f"{'runtime':<8} {'puertas':>7} {'celdas':>6} {'hilos':>7} {'lat. media s':>12} {'lat. p95 s':>10} {'pesos/s':>12}")
+    for puertas, n in ESCENARIOS:
+        medir("hilos", puertas, n, correr_hilos)
+        medir("asyncio", puertas, n, correr_async)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+import os
+import mmap
+import time
+import zlib
+import struct
+import threading
+from collections import deque, namedtuple
+from estado_ocupacion import LIBRE, OCUPADO, NOMBRES_ESTADO
+import metricas
+
+# --- Formato ---
+# Cada segmento (bitacora-000001.bin, ...) empieza con un encabezado de 16
+# bytes y sigue con registros de 32 bytes:
+#   t (float64, hora de pared), tipo, cajón, largo del UID (uint8),
+#   UID (10 bytes), peso (float32), crc32 de los 28 bytes anteriores.
+# Un registro a medio escribir (corte de luz) no pasa el crc: la lectura
+# del segmento termina ahí.
+MAGIA = b"PKBIT1\0\0"
+ENCABEZADO = struct.Struct("<8sII") # magia, versión, tamaño de registro
+REGISTRO = struct.Struct("<dBBB10s3xfI")
+VERSION = 1
+PREFIJO = "bitacora-"
+EXTENSION = ".bin"
+
+# --- Tipos de evento ---
+ARRANQUE = 1
+ACCESO_CONCEDIDO = 2
+ACCESO_DENEGADO_UID = 3
+ACCESO_DENEGADO_LLENO = 4
+CAJON_LIBRE = 5
+CAJON_OCUPADO = 6
+INSTANTANEA = 0x80 # Bit extra: estado copiado al abrir un segmento, no un cambio
+NOMBRES_TIPO = {
+    ARRANQUE: "ARRANQUE",
+    ACCESO_CONCEDIDO: "CONCEDIDO",
+    ACCESO_DENEGADO_UID: "DENEGADO_UID",
+    ACCESO_DENEGADO_LLENO: "DENEGADO_LLENO",
+    CAJON_LIBRE: "LIBRE",
+    CAJON_OCUPADO: "OCUPADO",
+}
+TIPO_POR_ESTADO = {LIBRE: CAJON_LIBRE, OCUPADO: CAJON_OCUPADO}
+ESTADO_POR_TIPO = {CAJON_LIBRE: LIBRE, CAJON_OCUPADO: OCUPADO}
+SIN_CAJON = 0xFF
+
+Evento = namedtuple("Evento", "t tipo cajon uid peso")
+
+H_LOTE = metricas.histograma("parkpi_bitacora_lote_segundos",
+                             "Duración de escribir (y fsync) un lote de la bitácora")
+C_REGISTROS = metricas.contador("parkpi_bitacora_registros_total", "Registros escritos en la bitácora")
+
+
+def nombre_segmento(numero):
+    return f"{PREFIJO}{numero:06d}{EXTENSION}"
+
+
+def segmentos(carpeta):
+    """(número, ruta) de los segmentos de 'carpeta', del más viejo al más nuevo."""
+    try:
+        nombres = os.listdir(carpeta)
+    except FileNotFoundError:
+        return []
+    encontrados = []
+    for nombre in nombres:
+        if nombre.startswith(PREFIJO) and nombre.endswith(EXTENSION):
+            try:
+                numero = int(nombre[len(PREFIJO):-len(EXTENSION)])
+            except ValueError:
+                continue
+            encontrados.append((numero, os.path.join(carpeta, nombre)))
+    return sorted(encontrados)
+
+
+def empaquetar(t, tipo, cajon, uid, peso):
+    uid = bytes(uid or b"")[:10]
+    cuerpo = REGISTRO.pack(t, tipo, cajon, len(uid), uid, peso, 0)[:-4]
+    return cuerpo + struct.pack("<I", zlib.crc32(cuerpo))
+
+
+class Bitacora:
+    """
+    Bitácora durable de solo agregar: accesos y cambios de cajón.
+
+    * registrar() solo agrega una tupla a una deque (append es atómico, sin
+      candados): la puerta nunca espera a la tarjeta SD.
+    * Un hilo escritor junta lo pendiente cada 'intervalo' s (o antes, si
+      se acumulan 'lote' registros) y lo escribe con UN write y UN fsync
+      por lote (group commit). Con fsync=False no hay fsync (más rápido,
+      pero un corte de luz puede perder el último lote del page cache).
+    * Segmentos de 'tamano_segmento' bytes; se guardan los últimos
+      'segmentos_max'. Cada segmento nuevo empieza con la instantánea de
+      'estados' (un AlmacenDeEstados), así que para reconstruir el estado
+      basta el último segmento.
+    """
+
+    def __init__(self, carpeta, estados=None, intervalo=0.2, lote=64, fsync=True,
+                 tamano_segmento=1 << 20, segmentos_max=16):
+        self.carpeta = carpeta
+        self.estados = estados
+        self.intervalo = intervalo
+        self.lote = lote
+        self.fsync = fsync
+        self.tamano_segmento = tamano_segmento
+        self.segmentos_max = segmentos_max
+
+        self._cola = deque()
+        self._despertar = threading.Event()
+        self._activo = False
+        self._hilo = None
+        self._fd = None
+        self._numero = 0
+        self._tamano = 0
+
+        self.escritos = 0
+        self.lotes = 0
+        self.fsyncs = 0
+
+    # --- Camino rápido (cualquier hilo) ---
+
+    def registrar(self, tipo, cajon=SIN_CAJON, uid=b"", peso=0.0):
+        self._cola.append((time.time(), tipo, cajon, uid, peso))
+        if len(self._cola) >= self.lote:
+            self._despertar.set()
+
+    def acceso(self, tipo, uid):
+        self.registrar(tipo, uid=uid)
+
+    def cambio_de_cajon(self, cajon, estado, peso):
+        """estado: LIBRE/OCUPADO o 'LIBRE'/'OCUPADO'."""
+        if isinstance(estado, str):
+            estado = NOMBRES_ESTADO.index(estado)
+        self.registrar(TIPO_POR_ESTADO[estado], cajon, peso=peso)
+
+    def pendientes(self):
+        return len(self._cola)
+
+    # --- Segmentos ---
+
+    def _abrir_segmento(self):
+        existentes = segmentos(self.carpeta)
+        self._numero = max([n for n, _ in existentes] + [self._numero]) + 1
+        ruta = os.path.join(self.carpeta, nombre_segmento(self._numero))
+        self._fd = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o644)
+        datos = [ENCABEZADO.pack(MAGIA, VERSION, REGISTRO.size)]
+        if self.estados is not None:
+            _, copia = self.estados.instantanea()
+            ahora = time.time()
+            datos += [empaquetar(ahora, TIPO_POR_ESTADO[codigo] | INSTANTANEA, i, b"", 0.0)
+                      for i, codigo in enumerate(copia)]
+        datos = b"".join(datos)
+        os.write(self._fd, datos)
+        self._tamano = len(datos)
+        # Se borran los más viejos
+        for _, viejo in existentes[:max(0, len(existentes) + 1 - self.segmentos_max)]:
+            os.remove(viejo)
+        # El directorio también se sincroniza, para que el archivo nuevo exista tras un corte
+        if self.fsync:
+            os.fsync(self._fd)
+            self._sincronizar_carpeta()
+
+    def _sincronizar_carpeta(self):
+        try:
+            fd = os.open(self.carpeta, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _cerrar_segmento(self):
+        if self._fd is not None:
+            if self.fsync:
+                os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    # --- Hilo escritor ---
+
+    def _escribir_lote(self):
+        """Escribe lo pendiente (sin pasarse del segmento). Devuelve cuántos."""
+        cola = self._cola
+        cupo = max(1, (self.tamano_segmento - self._tamano) // REGISTRO.size)
+        registros = []
+        try:
+            while len(registros) < cupo:
+                registros.append(empaquetar(*cola.popleft()))
+        except IndexError:
+            pass
+        if not registros:
+            return 0
+        t0 = metricas.inicio()
+        datos = b"".join(registros)
+        os.write(self._fd, datos)
+        if self.fsync:
+            os.fsync(self._fd)
+            self.fsyncs += 1
+        metricas.observar(H_LOTE, t0)
+        metricas.contar(C_REGISTROS, len(registros))
+        self.escritos += len(registros)
+        self.lotes += 1
+        self._tamano += len(datos)
+        if self._tamano >= self.tamano_segmento:
+            self._cerrar_segmento()
+            self._abrir_segmento()
+        return len(registros)
+
+    def _bucle(self):
+        while self._activo:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                while self._escribir_lote():
+                    pass
+            except OSError as e:
+                print(f"[Bitácora] Error escribiendo: {e}")
+        while self._escribir_lote(): # Lo que quedó al detener
+            pass
+
+    def iniciar(self):
+        """Abre un segmento nuevo (con la instantánea) y arranca el escritor."""
+        os.makedirs(self.carpeta, exist_ok=True)
+        self._abrir_segmento()
+        self._activo = True
+        self.registrar(ARRANQUE)
+        self._hilo = threading.Thread(target=self._bucle, name="bitacora", daemon=True)
+        self._hilo.start()
+        print(f"[Bitácora] Escribiendo en {self.carpeta}/{nombre_segmento(self._numero)} "
+              f"(lote cada {self.intervalo:g} s, fsync={'sí' if self.fsync else 'no'}).")
+
+    def detener(self):
+        """Escribe lo pendiente, hace fsync y cierra."""
+        if self._hilo is None:
+            return
+        self._activo = False
+        self._despertar.set()
+        self._hilo.join(timeout=10)
+        self._hilo = None
+        self._cerrar_segmento()
+
+
+# --- Lectura (con mmap) ---
+
+def leer_segmento(ruta):
+    """
+    Eventos de un segmento, en orden. Se detiene en el primer registro que
+    no pasa el crc (el final de un segmento cortado por un apagón).
+    """
+    eventos = []
+    with open(ruta, 'rb') as f:
+        tamano = os.fstat(f.fileno()).st_size
+        if tamano < ENCABEZADO.size:
+            return eventos
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            magia, version, tamano_registro = ENCABEZADO.unpack_from(mapa, 0)
+            if magia != MAGIA or tamano_registro != REGISTRO.size:
+                return eventos
+            fin = ENCABEZADO.size + (tamano - ENCABEZADO.size) // REGISTRO.size * REGISTRO.size
+            vista = memoryview(mapa)[ENCABEZADO.size:fin]
+            try:
+                for i, (t, tipo, cajon, largo, uid, peso, crc) in enumerate(REGISTRO.iter_unpack(vista)):
+                    inicio = i * REGISTRO.size
+                    if zlib.crc32(vista[inicio:inicio + REGISTRO.size - 4]) != crc:
+                        break
+                    eventos.append(Evento(t, tipo, cajon, uid[:largo], peso))
+            finally:
+                vista.release()
+    return eventos
+
+
+def leer_eventos(carpeta):
+    """Todos los eventos de la bitácora, del más viejo al más nuevo."""
+    for _, ruta in segmentos(carpeta):
+        yield from leer_segmento(ruta)
+
+
+def reconstruir_estado(carpeta, n):
+    """
+    Último estado conocido de los n cajones (LIBRE/OCUPADO, o None si la
+    bitácora no dice nada de ese cajón). Lee desde el segmento más nuevo
+    hacia atrás y se detiene en cuanto conoce todos los cajones (casi
+    siempre basta el último segmento, que empieza con una instantánea).
+    """
+    estados = [None] * n
+    faltan = n
+    for _, ruta in reversed(segmentos(carpeta)):
+        for evento in reversed(leer_segmento(ruta)):
+            estado = ESTADO_POR_TIPO.get(evento.tipo & ~INSTANTANEA)
+            if estado is not None and evento.cajon < n and estados[evento.cajon] is None:
+                estados[evento.cajon] = estado
+                faltan -= 1
+                if faltan == 0:
+                    return estados
+    return estados
+
+
+if __name__ == "__main__":
+    # Uso:  python3 bitacora.py [carpeta]   (imprime la bitácora)
+    import sys
+    carpeta = sys.argv[1] if len(sys.argv) > 1 else "bitacora"
+    for evento in leer_eventos(carpeta):
+        tipo = NOMBRES_TIPO.get(evento.tipo & ~INSTANTANEA, evento.tipo)
+        if evento.tipo & INSTANTANEA:
+            tipo += " (instantánea)"
+        cajon = "" if evento.cajon == SIN_CAJON else f" cajón {evento.cajon + 1}"
+        uid = f" UID {evento.uid.hex()}" if evento.uid else ""
+        peso = f" {evento.peso:.1f} g" if evento.peso else ""
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(evento.t))} {tipo}{cajon}{uid}{peso}")
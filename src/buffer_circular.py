@@ -0,0 +1,41 @@
+class BufferCircular:
+    """
+    Buffer circular de tamaño fijo (memoria constante).
+
+    Pensado para un productor (el hilo que lee el HX711) y varios lectores.
+    El productor escribe el dato y DESPUÉS incrementa 'secuencia', así que un
+    lector puede leer sin candado: cada lector guarda su propio cursor
+    (la última secuencia que vio) y pide lo nuevo con leer_desde().
+    """
+
+    def __init__(self, capacidad):
+        if capacidad <= 0:
+            raise ValueError("La capacidad debe ser mayor a 0.")
+        self.capacidad = capacidad
+        self._datos = [None] * capacidad
+        self.secuencia = 0 # Total de datos escritos desde el inicio
+
+    def agregar(self, dato):
+        self._datos[self.secuencia % self.capacidad] = dato
+        self.secuencia += 1
+
+    def ultimo(self):
+        """Último dato escrito (o None si está vacío). No bloquea."""
+        sec = self.secuencia
+        if sec == 0:
+            return None
+        return self._datos[(sec - 1) % self.capacidad]
+
+    def leer_desde(self, cursor):
+        """
+        Devuelve (datos, nuevo_cursor) con todo lo escrito después de 'cursor'.
+        Si el lector se quedó atrás más de 'capacidad' datos, los más viejos
+        ya se sobrescribieron y se pierden.
+        """
+        sec = self.secuencia
+        inicio = max(cursor, sec - self.capacidad)
+        datos = [self._datos[i % self.capacidad] for i in range(inicio, sec)]
+        return datos, sec
+
+    def __len__(self):
+        return min(self.secuencia, self.capacidad)
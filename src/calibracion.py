@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ARCHIVO_CALIBRACION = "calibracion.json"
+EDAD_MAXIMA_OFFSET = 7 * 24 * 3600 # Segundos; un offset más viejo se vuelve a tarar al arrancar
+
+
+def clave_celda(pin_dt, pin_sck, ganancia=128):
+    """
+    Clave de una celda en el archivo: su par de pines ('17/27'). Con otra
+    ganancia (o el canal B del mismo HX711) cambian offset y factor, así
+    que se agrega: '17/27/64', '17/27/32'.
+    """
+    return f"{pin_dt}/{pin_sck}" if ganancia == 128 else f"{pin_dt}/{pin_sck}/{ganancia}"
+
+
+class AlmacenDeCalibracion:
+    """
+    Calibración guardada de cada celda (factor de escala y offset de tara),
+    en un JSON indexado por el par de pines DT/SCK:
+
+        {"celdas": {"17/27": {"nombre": "celda1", "factor": 215.24,
+                              "offset": 49998.2, "fecha_offset": 1760000000.0}}}
+
+    calibrar_celda.py escribe el factor (y el offset con el que lo midió);
+    Main.py lo carga al arrancar y guarda los offsets de cada nueva tara.
+    Se escribe a un temporal y se renombra, así que un corte de luz a media
+    escritura no deja el archivo a medias.
+    """
+
+    def __init__(self, ruta=ARCHIVO_CALIBRACION, edad_maxima=EDAD_MAXIMA_OFFSET):
+        self.ruta = ruta
+        self.edad_maxima = edad_maxima
+        self.celdas = {}
+        self._lock = threading.Lock()
+        self.cargar()
+
+    def cargar(self):
+        """Lee el archivo. Si no existe (o está dañado) empieza vacío."""
+        try:
+            with open(self.ruta, 'r') as f:
+                self.celdas = json.load(f).get('celdas', {})
+            print(f"[Calibración] {len(self.celdas)} celdas cargadas desde {self.ruta}.")
+            return True
+        except FileNotFoundError:
+            print(f"[Calibración] No existe {self.ruta}; se usarán los factores por defecto.")
+        except (OSError, ValueError) as e:
+            print(f"[Calibración] Error leyendo {self.ruta}: {e}")
+        self.celdas = {}
+        return False
+
+    def guardar(self):
+        with self._lock:
+            temporal = self.ruta + ".tmp"
+            with open(temporal, 'w') as f:
+                json.dump({'celdas': self.celdas}, f, indent=2, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, self.ruta)
+
+    def obtener(self, celda):
+        """Datos guardados de la celda (o None)."""
+        return self.celdas.get(clave_celda(celda.pin_dt, celda.pin_sck, celda.ganancia))
+
+    def registrar(self, celda, nombre=None, factor=True, offset=True, guardar=True):
+        """Anota el factor y/o el offset actuales de la celda (y guarda el archivo)."""
+        with self._lock:
+            datos = self.celdas.setdefault(clave_celda(celda.pin_dt, celda.pin_sck, celda.ganancia), {})
+            if nombre is not None:
+                datos['nombre'] = nombre
+            if factor:
+                datos['factor'] = celda.factor_escala
+            if offset:
+                datos['offset'] = celda.offset
+                datos['fecha_offset'] = time.time()
+        if guardar:
+            self.guardar()
+
+    def offset_vigente(self, celda):
+        """Offset guardado si no es más viejo que 'edad_maxima' (o None)."""
+        datos = self.obtener(celda)
+        if not datos or 'offset' not in datos:
+            return None
+        if time.time() - datos.get('fecha_offset', 0) > self.edad_maxima:
+            return None
+        return datos['offset']
+
+    def preparar(self, celdas, factores_por_defecto, tarar=None):
+        """
+        Deja listas las celdas (creadas sin tara) sin esperar conversiones
+        cuando se puede:
+
+          * factor: el guardado, o el de 'factores_por_defecto'.
+          * offset: el guardado si está vigente; si no, se tara (todas las
+            que falten a la vez, cada una en su hilo) y se guarda.
+
+        tarar(celdas): cómo tarar las que falten (ej. GrupoDeCeldas.calibrar).
+        Devuelve las celdas que usan un offset guardado: hay que
+        revisarlas en segundo plano (RetaraEnSegundoPlano).
+        """
+        reusadas, por_tarar = [], []
+        for celda, factor in zip(celdas, factores_por_defecto):
+            datos = self.obtener(celda) or {}
+            celda.establecer_factor_escala(datos.get('factor', factor))
+            offset = self.offset_vigente(celda)
+            if offset is not None:
+                celda.offset = offset
+                print(f"[Calibración] Celda (DT={celda.pin_dt}): offset guardado {offset}.")
+                reusadas.append(celda)
+            else:
+                por_tarar.append(celda)
+
+        if por_tarar:
+            if tarar is not None:
+                tarar(por_tarar)
+            else:
+                tarar_en_paralelo(por_tarar)
+            for celda in por_tarar:
+                if celda.h is not None:
+                    self.registrar(celda, factor=False, guardar=False)
+            self.guardar()
+        return reusadas
+
+
+def tarar_en_paralelo(celdas):
+    """Tara varias celdas a la vez (cada HX711 tiene sus propios pines)."""
+    if not celdas:
+        return
+    with ThreadPoolExecutor(max_workers=len(celdas), thread_name_prefix="tara") as pool:
+        list(pool.map(lambda celda: celda.calibrar(), celdas))
+
+
+def leer_crudas(celda, n=5, candado=None, timeout=5.0):
+    """
+    'n' lecturas crudas de la celda sin restar el offset.
+    Con buffer de muestras (modo eventos / otro proceso) se toman las
+    últimas del buffer sin mover el cursor de quien está muestreando; si
+    no, se leen del HX711 con el candado de la celda.
+    """
+    if celda.muestras is not None:
+        limite = celda.backend.ahora() + timeout
+        inicio = celda.muestras.secuencia
+        while celda.muestras.secuencia - inicio < n:
+            if celda.backend.ahora() > limite:
+                raise TimeoutError(f"El HX711 (DT={celda.pin_dt}) no entregó datos.")
+            celda.backend.dormir(0.05)
+        datos, _ = celda.muestras.leer_desde(celda.muestras.secuencia - n)
+        return [valor for _, valor in datos]
+    with candado or threading.Lock():
+        return [celda._read_raw_value() for _ in range(n)]
+
+
+class RetaraEnSegundoPlano:
+    """
+    Revisa el offset guardado de cada celda sin detener el arranque.
+
+    Cuando el cajón está vacío (el peso con el offset guardado está por
+    debajo de 'umbral_vacio' gramos) toma el promedio de 5 lecturas como
+    nuevo offset y lo guarda. Si el cajón está ocupado (un coche que se
+    quedó de noche) no tara encima del coche: conserva el offset guardado
+    y vuelve a intentar cada 'intervalo' segundos.
+    """
+
+    def __init__(self, celdas, almacen, backend, candados=None, umbral_vacio=25.0, intervalo=60.0):
+        self.celdas = list(celdas)
+        self.almacen = almacen
+        self.backend = backend
+        self.candados = list(candados) if candados is not None else [None] * len(self.celdas)
+        self.umbral_vacio = umbral_vacio
+        self.intervalo = intervalo
+        self.pendientes = list(range(len(self.celdas)))
+        self._activo = threading.Event()
+        self._hilo = None
+
+    def revisar(self, i):
+        """Intenta re-tarar la celda 'i'. Devuelve True si ya quedó revisada."""
+        celda = self.celdas[i]
+        crudas = leer_crudas(celda, 5, self.candados[i])
+        promedio = sum(crudas) / len(crudas)
+        gramos = abs(promedio - celda.offset) / celda.factor_escala if celda.factor_escala else 0.0
+        if gramos >= self.umbral_vacio:
+            print(f"[Calibración] Celda (DT={celda.pin_dt}) con {gramos:.1f} g: se conserva el offset "
+                  f"guardado y se reintenta en {self.intervalo:g} s.")
+            return False
+        print(f"[Calibración] Celda (DT={celda.pin_dt}) re-tarada en segundo plano: "
+              f"offset {celda.offset} -> {promedio} ({gramos:.1f} g de deriva).")
+        celda.fijar_offset(promedio)
+        self.almacen.registrar(celda, factor=False)
+        return True
+
+    def _bucle(self):
+        while self._activo.is_set() and self.pendientes:
+            for i in list(self.pendientes):
+                if not self._activo.is_set():
+                    return
+                try:
+                    if self.revisar(i):
+                        self.pendientes.remove(i)
+                except Exception as e:
+                    print(f"[Calibración] Error re-tarando la celda (DT={self.celdas[i].pin_dt}): {e}")
+            if self.pendientes:
+                self._esperar(self.intervalo)
+
+    def _esperar(self, segundos):
+        # Dormir en pasos cortos para poder detenerse rápido
+        limite = self.backend.ahora() + segundos
+        while self._activo.is_set() and self.backend.ahora() < limite:
+            self.backend.dormir(0.2)
+
+    def iniciar(self):
+        if not self.celdas or self._activo.is_set():
+            return
+        self._activo.set()
+        self._hilo = threading.Thread(target=self._bucle, name="retara", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._activo.clear()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+            self._hilo = None
@@ -1,10 +1,22 @@
 import time
 import sys
 from celda_carga import CeldaDeCarga 
+from hardware import canal_hx711
+from calibracion import AlmacenDeCalibracion, ARCHIVO_CALIBRACION
 
 # --- CONFIGURACIÓN ---
-PINES_CELDA_1_DT = 17   # Conectado a GPIO 17 (Pin 11)
-PINES_CELDA_1_SCK = 27  # Conectado a GPIO 27 (Pin 13)
+# Mismos pines que Main.py. Uso:  python3 calibrar_celda.py [1|2|3] [128|64|32]
+# La ganancia elige el canal: 128 o 64 = canal A, 32 = canal B (la segunda
+# celda de un HX711 de dos canales, ver DOS_CANALES en Main.py).
+PINES_CELDAS = {
+    1: {'dt': 17, 'sck': 27},  # GPIO 17 (Pin 11) / GPIO 27 (Pin 13)
+    2: {'dt': 5,  'sck': 6},
+    3: {'dt': 13, 'sck': 19},
+}
+NUMERO_CELDA = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+PINES_CELDA_DT = PINES_CELDAS[NUMERO_CELDA]['dt']
+PINES_CELDA_SCK = PINES_CELDAS[NUMERO_CELDA]['sck']
+GANANCIA = int(sys.argv[2]) if len(sys.argv) > 2 else 128
 
 celda = None
 
@@ -12,8 +24,10 @@ try:
     print("\n--- Herramienta de Calibración de Celdas de Carga (HX711) ---")
 
     # 1. Inicializar la celda
-    print(f"Inicializando celda en DT={PINES_CELDA_1_DT} y SCK={PINES_CELDA_1_SCK}...")
-    celda = CeldaDeCarga(pin_dt=PINES_CELDA_1_DT, pin_sck=PINES_CELDA_1_SCK)
+    print(f"Inicializando celda {NUMERO_CELDA} en DT={PINES_CELDA_DT} y SCK={PINES_CELDA_SCK} "
+          f"(canal {canal_hx711(GANANCIA)}, ganancia {GANANCIA})...")
+    # (La tara se hace en el PASO 1, con la celda vacía)
+    celda = CeldaDeCarga(pin_dt=PINES_CELDA_DT, pin_sck=PINES_CELDA_SCK, calibrar=False, ganancia=GANANCIA)
     
     if celda.h is None:
         raise Exception("Falló la inicialización de la celda (self.h es None).")
@@ -59,12 +73,18 @@ try:
     
     print("\n--- ¡CÁLCULO COMPLETADO! ---")
     print(f"Tu FACTOR DE ESCALA (Ratio) es: {factor_de_escala}")
-    print("\n¡GUARDA ESTE NÚMERO! Lo necesitarás en tu script 'main.py'.\n")
 
-    # 5. Verificación
-    print("--- PASO 3: VERIFICACIÓN ---")
+    # 5. Guardar (factor + offset de la tara) para que Main.py lo cargue
     print(f"Aplicando el factor {factor_de_escala} a la celda...")
     celda.establecer_factor_escala(factor_de_escala)
+    almacen = AlmacenDeCalibracion(ARCHIVO_CALIBRACION)
+    almacen.registrar(celda, nombre=f"celda{NUMERO_CELDA}")
+    print(f"\nGuardado en {ARCHIVO_CALIBRACION} (celda {NUMERO_CELDA}, DT={PINES_CELDA_DT}/SCK={PINES_CELDA_SCK}, "
+          f"canal {canal_hx711(GANANCIA)} x{GANANCIA}).")
+    print("Main.py lo usará en el próximo arranque.\n")
+
+    # 6. Verificación
+    print("--- PASO 3: VERIFICACIÓN ---")
 
     print("\nAhora mostraré el peso medido en tiempo real.")
     print("Verifica que la lectura sea cercana a los gramos que pusiste.")
@@ -1,54 +1,112 @@
-import time
-import lgpio
 import sys
+import threading
+from hardware import obtener_backend, FLANCO_BAJADA, PULSOS_POR_GANANCIA, ASENTAMIENTO_HX711, conversiones_sin_asentar
+from buffer_circular import BufferCircular
+from filtro_peso import FiltroDePeso
+from deriva import SeguidorDeDeriva
+import metricas
+
+# --- NUEVO (V35): Métricas ---
+H_LECTURA_CRUDA = metricas.histograma("parkpi_hx711_lectura_segundos",
+                                      "Duración de _read_raw_value (espera del dato + trama)")
+H_PESO = metricas.histograma("parkpi_peso_segundos", "Duración de obtener_peso")
 
 class CeldaDeCarga:
     """
     Clase para interactuar con el sensor HX711.
-    (VERSIÓN 21.0 - Limpieza de GPIO más robusta)
+    (VERSIÓN 49.0 - Backend de hardware, adquisición por eventos, filtro por muestra, métricas,
+    tara opcional al crear, corrección de deriva, grabación de muestras crudas y ganancia/velocidad
+    del HX711)
     """
     
-    def __init__(self, pin_dt, pin_sck):
-        self.pin_dt = pin_dt
-        self.pin_sck = pin_sck
-        self.offset = 0
-        self.factor_escala = 1.0
-        self.h = None # Handle para la biblioteca lgpio
-        
-        # Banderas para rastrear qué pines logramos reclamar
-        self._dt_claimed = False
-        self._sck_claimed = False
-        # --------------------
+    def __init__(self, pin_dt, pin_sck, backend=None, calibrar=True, ganancia=128, sps=10):
+        """
+        ganancia: 128 o 64 (canal A) o 32 (canal B). sps: 10 u 80, según
+        el pin RATE del módulo (ver fijar_velocidad_hx711).
+        """
+        self._iniciar_estado(pin_dt, pin_sck, backend, ganancia, sps)
         
         try:
-            self.h = lgpio.gpiochip_open(0)
+            self.h = self.backend.abrir_chip(0)
             
-            lgpio.gpio_claim_input(self.h, self.pin_dt)
+            self.backend.reclamar_entrada(self.h, self.pin_dt)
             self._dt_claimed = True # Marcamos como reclamado
             
-            lgpio.gpio_claim_output(self.h, self.pin_sck)
+            self.backend.reclamar_salida(self.h, self.pin_sck)
             self._sck_claimed = True # Marcamos como reclamado
             
             print(f"Celda de Carga (DT={pin_dt}, SCK={pin_sck}) inicializada con lgpio.")
-            self.calibrar()
+            if ganancia != 128:
+                self._asentar()
+            # --- NUEVO (V38): calibrar=False si el offset viene del archivo ---
+            if calibrar:
+                self.calibrar()
 
         except Exception as e:
             print(f"Error inicializando CeldaDeCarga (DT={pin_dt}): {e}")
             self.limpiar() # Asegurarnos de limpiar si el __init__ falla
             self.h = None # Marcar como fallido
 
+    def _iniciar_estado(self, pin_dt, pin_sck, backend=None, ganancia=128, sps=10):
+        """
+        Todo el estado de la celda, sin tocar los pines. Las celdas que no
+        reclaman pines propios (CeldaDeGrupo, CeldaDeProceso, CeldaDeCanal)
+        lo llaman en vez de __init__ y cambian solo lo que difiere.
+        """
+        if ganancia not in PULSOS_POR_GANANCIA:
+            raise ValueError(f"Ganancia del HX711 inválida: {ganancia} (128, 64 o 32).")
+        if sps not in ASENTAMIENTO_HX711:
+            raise ValueError(f"Velocidad del HX711 inválida: {sps} (10 u 80).")
+        self.pin_dt = pin_dt
+        self.pin_sck = pin_sck
+        self.backend = backend or obtener_backend()
+        # --- NUEVO (V49): Canal/ganancia (pulsos extra tras cada trama) ---
+        self.ganancia = ganancia
+        self.sps = sps
+        self._pulsos = PULSOS_POR_GANANCIA[ganancia]
+        self.offset = 0
+        self.factor_escala = 1.0
+        self.h = None # Handle para la biblioteca lgpio
+        
+        # Banderas para rastrear qué pines logramos reclamar
+        self._dt_claimed = False
+        self._sck_claimed = False
+        # --------------------
+
+        # --- NUEVO (V28): Modo eventos ---
+        self.muestras = None # BufferCircular de (t, valor) en modo eventos
+        self._cursor = 0     # Última muestra consumida por _read_raw_value
+        self._callback = None
+        self._cond = threading.Condition()
+        self._lock_trama = threading.Lock()
+        self.despertares = 0 # Veces que el hilo despertó a revisar DT
+
+        # --- NUEVO (V29): Filtro por muestra (None = promedio de 5) ---
+        self.filtro = None
+        # --- NUEVO (V39): Seguimiento de deriva del offset (None = apagado) ---
+        self.deriva = None
+        self._lock_offset = threading.Lock() # Deriva (carril) vs. re-tara (otro hilo)
+        # --- NUEVO (V40): Peso de la última muestra SIN filtrar (con filtro) ---
+        self.peso_instantaneo = None
+        # --- NUEVO (V48): Grabación de muestras crudas (None = apagada) ---
+        self.grabadora = None
+        self.id_grabacion = 0
+
     def limpiar(self):
         """Libera los pines GPIO de forma segura."""
         if self.h:
             print("\nLimpiando y liberando pines GPIO...")
             try:
+                if self._callback is not None:
+                    self._callback.cancel()
+                    self._callback = None
                 if self._dt_claimed:
-                    lgpio.gpio_free(self.h, self.pin_dt)
+                    self.backend.liberar(self.h, self.pin_dt)
                 if self._sck_claimed:
-                    lgpio.gpio_free(self.h, self.pin_sck)
+                    self.backend.liberar(self.h, self.pin_sck)
                 # ------------------------
                     
-                lgpio.gpiochip_close(self.h)
+                self.backend.cerrar_chip(self.h)
                 self.h = None
                 print("Pines liberados.")
             except Exception as e:
@@ -59,28 +117,101 @@ class CeldaDeCarga:
         self.limpiar()
 
     def _is_ready(self):
-        return lgpio.gpio_read(self.h, self.pin_dt) == 0
+        return self.backend.leer(self.h, self.pin_dt) == 0
 
-    def _read_raw_value(self):
-        while not self._is_ready():
-            time.sleep(0.01)
-
-        lectura_cruda = 0
-        for i in range(24):
-            lgpio.gpio_write(self.h, self.pin_sck, 1)
-            lectura_cruda = (lectura_cruda << 1)
-            if lgpio.gpio_read(self.h, self.pin_dt) == 1:
-                lectura_cruda += 1
-            lgpio.gpio_write(self.h, self.pin_sck, 0)
-        
-        lgpio.gpio_write(self.h, self.pin_sck, 1)
-        lgpio.gpio_write(self.h, self.pin_sck, 0)
+    def _leer_trama(self):
+        # 24 bits + 1, 2 o 3 pulsos extra (canal/ganancia de la siguiente)
+        lectura_cruda = self.backend.leer_trama_hx711(self.h, self.pin_dt, self.pin_sck, self._pulsos)
 
         if lectura_cruda & 0x800000:
             lectura_cruda |= ~0xFFFFFF
             
         return lectura_cruda
 
+    def _asentar(self):
+        """
+        Al encender, el HX711 convierte en canal A con ganancia 128: la
+        primera trama elige la ganancia nueva y las conversiones que tarda
+        en asentarse se descartan.
+        """
+        for _ in range(1 + conversiones_sin_asentar(self.sps)):
+            while not self._is_ready():
+                self.backend.dormir(0.01)
+            self._leer_trama()
+
+    def _read_raw_value(self):
+        t0 = metricas.inicio()
+        if self.muestras is not None:
+            valor = self._esperar_muestras()[-1]
+        else:
+            self.despertares += 1
+            while not self._is_ready():
+                self.backend.dormir(0.01)
+                self.despertares += 1
+            valor = self._leer_trama()
+            if self.grabadora is not None:
+                self.grabadora.agregar(self.id_grabacion, self.backend.ahora(), valor)
+        metricas.observar(H_LECTURA_CRUDA, t0)
+        return valor
+
+    # --- NUEVO (V28): Adquisición por eventos ---
+
+    def iniciar_modo_eventos(self, capacidad=64):
+        """
+        En vez de revisar DT cada 10 ms, arma una alerta de flanco de bajada
+        en DT. Cuando el HX711 avisa que hay dato, los 24 bits se leen de
+        inmediato (en el hilo de callbacks) y se guardan en 'self.muestras'.
+        obtener_peso() y compañía siguen funcionando igual: esperan la
+        siguiente muestra del buffer sin despertar al hilo.
+        """
+        if self.h is None or self._callback is not None:
+            return False
+        self.muestras = BufferCircular(capacidad)
+        self._cursor = 0
+        self.backend.reclamar_alerta(self.h, self.pin_dt, FLANCO_BAJADA)
+        self._callback = self.backend.crear_callback(
+            self.h, self.pin_dt, FLANCO_BAJADA, self._al_flanco_dt
+        )
+        # Si ya había un dato listo antes de armar la alerta no habrá flanco
+        self._al_flanco_dt(0, 0)
+        print(f"Celda (DT={self.pin_dt}) en modo eventos.")
+        return True
+
+    def detener_modo_eventos(self):
+        """Vuelve al modo de sondeo (polling)."""
+        if self._callback is None:
+            return
+        self._callback.cancel()
+        self._callback = None
+        self.muestras = None
+        self.backend.reclamar_entrada(self.h, self.pin_dt)
+
+    def _al_flanco_dt(self, nivel, timestamp):
+        self.despertares += 1
+        with self._lock_trama:
+            # Los bits de la trama también generan flancos de bajada:
+            # si DT ya no está en bajo, no hay una conversión nueva.
+            if self.h is None or not self._is_ready():
+                return
+            valor = self._leer_trama()
+        self.muestras.agregar((self.backend.ahora(), valor))
+        with self._cond:
+            self._cond.notify_all()
+
+    def _esperar_muestras(self, timeout=1.0):
+        """Espera al menos una muestra nueva y devuelve todas las que llegaron."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.muestras.secuencia > self._cursor, timeout):
+                raise TimeoutError(f"El HX711 (DT={self.pin_dt}) no entregó datos.")
+            datos, self._cursor = self.muestras.leer_desde(self._cursor)
+        if self.grabadora is not None:
+            self.grabadora.agregar_varias(self.id_grabacion, datos)
+        return [valor for _, valor in datos]
+
+    def ultima_muestra(self):
+        """Última muestra (t, valor crudo) en modo eventos. No bloquea."""
+        return self.muestras.ultimo() if self.muestras is not None else None
+
     def calibrar(self):
         if self.h is None: return
         try:
@@ -89,7 +220,7 @@ class CeldaDeCarga:
             lecturas = [self._read_raw_value() for _ in range(5)]
             self.offset = sum(lecturas) / len(lecturas)
             print(f"Calibración completada. Offset: {self.offset}")
-            time.sleep(0.5) # Reducimos la espera
+            self.backend.dormir(0.5) # Reducimos la espera
         except Exception as e:
             print(f"Error durante la calibración: {e}")
 
@@ -97,12 +228,55 @@ class CeldaDeCarga:
         self.factor_escala = factor
         print(f"Factor de escala establecido en: {factor}")
 
+    # --- NUEVO (V29): Filtro por muestra ---
+
+    def configurar_filtro(self, **opciones):
+        """
+        Activa el filtro por muestra (ver FiltroDePeso para las opciones).
+        Desde entonces obtener_peso() lee UNA muestra (o las que haya en el
+        buffer en modo eventos) en vez de promediar 5.
+        """
+        self.filtro = FiltroDePeso(**opciones)
+        print(f"Celda (DT={self.pin_dt}) con filtro por muestra: {opciones}")
+
+    def _peso_filtrado(self):
+        if self.muestras is not None:
+            crudas = self._esperar_muestras()
+        else:
+            crudas = [self._read_raw_value()]
+        peso = self._filtrar(crudas)
+        self._seguir_deriva(crudas)
+        return peso
+
+    def _filtrar(self, crudas):
+        if self.factor_escala == 0: return 0.0
+
+        for cruda in crudas:
+            instantaneo = (cruda - self.offset) / self.factor_escala
+            gramos = self.filtro.agregar(instantaneo)
+        # El filtro tarda unas muestras en mostrar un cambio; el planificador
+        # del muestreo mira también la muestra cruda para acelerar antes
+        self.peso_instantaneo = abs(instantaneo)
+
+        # Misma regla que el promedio: abs() y cero por debajo de medio gramo
+        if abs(gramos) < 0.5:
+            return 0.0
+        return abs(gramos)
+
     def obtener_peso(self):
-        """Devuelve el peso actual en gramos, promediando 5 lecturas."""
+        """
+        Devuelve el peso actual en gramos: promedio de 5 lecturas, o el
+        siguiente valor del filtro por muestra si está configurado.
+        """
         if self.h is None: return 0.0
+        t0 = metricas.inicio()
         try:
+            if self.filtro is not None:
+                return self._peso_filtrado()
+
             lecturas = [self._read_raw_value() for _ in range(5)]
             lectura_neta = (sum(lecturas) / len(lecturas)) - self.offset
+            self._seguir_deriva(lecturas)
             
             if self.factor_escala == 0: return 0.0
             
@@ -120,6 +294,68 @@ class CeldaDeCarga:
         except Exception as e:
             print(f"Error al leer el peso: {e}")
             return 0.0
+        finally:
+            metricas.observar(H_PESO, t0)
+
+    # --- NUEVO (V48): Grabación de muestras crudas ---
+
+    def grabar_en(self, grabadora, id_celda):
+        """
+        Cada muestra cruda que consuma esta celda (sondeo, eventos, grupo o
+        proceso) se graba como (id_celda, t, valor) en 'grabadora'
+        (GrabadoraDeMuestras). None = dejar de grabar.
+        """
+        self.id_grabacion = id_celda
+        self.grabadora = grabadora
+
+    # --- NUEVO (V39): Deriva del offset ---
+
+    def configurar_deriva(self, **opciones):
+        """
+        Activa la corrección de deriva (ver SeguidorDeDeriva): mientras la
+        celda lee vacío, el offset sigue lentamente a las muestras crudas.
+        """
+        self.deriva = SeguidorDeDeriva(etiquetas={'celda': f"{self.pin_dt}/{self.pin_sck}"}, **opciones)
+        print(f"Celda (DT={self.pin_dt}) con corrección de deriva: {opciones}")
+
+    def _seguir_deriva(self, crudas):
+        if self.deriva is not None:
+            with self._lock_offset:
+                self.offset = self.deriva.agregar(crudas, self.offset, self.factor_escala, self.backend.ahora())
+
+    def fijar_offset(self, offset):
+        """
+        Cambia el offset desde otro hilo (la re-tara) sin que el carril de
+        muestreo lo pise con el offset anterior al seguir la deriva.
+        """
+        with self._lock_offset:
+            self.offset = offset
+
+    # --- NUEVO (V33): Lectura sin bloqueo (para el runtime asyncio) ---
+
+    def obtener_peso_sin_bloquear(self):
+        """
+        Solo en modo eventos: calcula el peso con las muestras que ya llegaron
+        al buffer, sin esperar. Devuelve None si no hay muestras nuevas.
+        """
+        if self.h is None or self.muestras is None: return None
+        datos, self._cursor = self.muestras.leer_desde(self._cursor)
+        if not datos:
+            return None
+        if self.grabadora is not None:
+            self.grabadora.agregar_varias(self.id_grabacion, datos)
+        crudas = [valor for _, valor in datos]
+        if self.filtro is not None:
+            peso = self._filtrar(crudas)
+            self._seguir_deriva(crudas)
+            return peso
+
+        if self.factor_escala == 0: return 0.0
+        lectura_neta = (sum(crudas) / len(crudas)) - self.offset
+        self._seguir_deriva(crudas)
+        if abs(lectura_neta) < (self.factor_escala * 0.5): # Menos de medio gramo
+            return 0.0
+        return abs(lectura_neta / self.factor_escala)
 
     def obtener_lectura_cruda(self):
         """Devuelve la lectura cruda (promediada), menos el offset."""
@@ -134,4 +370,27 @@ class CeldaDeCarga:
             # ---------------------
         except Exception as e:
             print(f"Error al leer valor en crudo: {e}")
-            return 0
\ No newline at end of file
+            return 0
+
+# --- NUEVO (V49): Pin RATE del HX711 ---
+
+def fijar_velocidad_hx711(pin_rate, sps, backend=None):
+    """
+    Pone en 10 u 80 SPS los HX711 cuyo pin RATE está cableado a 'pin_rate'
+    (una sola salida puede manejar varios módulos; RATE es una entrada).
+    Las celdas se crean después, con el mismo 'sps'. Devuelve una función
+    que libera el pin.
+    """
+    if sps not in ASENTAMIENTO_HX711:
+        raise ValueError(f"Velocidad del HX711 inválida: {sps} (10 u 80).")
+    backend = backend or obtener_backend()
+    h = backend.abrir_chip(0)
+    backend.reclamar_salida(h, pin_rate)
+    backend.escribir(h, pin_rate, 1 if sps == 80 else 0)
+    backend.dormir(ASENTAMIENTO_HX711[sps]) # Que se asienten a la velocidad nueva
+    print(f"HX711 a {sps} SPS (RATE en GPIO {pin_rate}).")
+
+    def liberar():
+        backend.liberar(h, pin_rate)
+        backend.cerrar_chip(h)
+    return liberar
@@ -0,0 +1,88 @@
+import metricas
+
+SEGUNDOS_POR_HORA = 3600.0
+
+
+class SeguidorDeDeriva:
+    """
+    Corrige poco a poco el offset de UNA celda mientras el cajón está
+    claramente vacío (la celda deriva con la temperatura).
+
+    Cada muestra cruda cuyo peso neto CON SIGNO (sin abs()) cae dentro de
+    ±banda_gramos cuenta como 'vacía'. Después de 'estables' muestras vacías
+    seguidas, cada muestra mueve el offset con una EMA lenta:
+
+        offset += alfa * (cruda - offset)
+
+    Con alfa = 0.002 hacen falta ~500 muestras para seguir un cambio, así que
+    un coche que entra (y sale de la banda en pocas muestras) casi no lo
+    mueve. Memoria O(1): solo contadores, sin ventanas de muestras.
+
+    'tasa' es la corrección en gramos por hora, medida por ventanas de
+    'ventana' segundos (del reloj del backend). Se exporta como
+    parkpi_deriva_gramos_por_hora{celda="DT/SCK"} y el total acumulado como
+    parkpi_deriva_gramos{celda="DT/SCK"}.
+    """
+
+    def __init__(self, alfa=0.002, banda_gramos=25.0, estables=20, ventana=300.0, etiquetas=None):
+        self.alfa = alfa
+        self.banda_gramos = banda_gramos
+        self.estables = estables
+        self.ventana = ventana
+
+        self.racha = 0           # Muestras vacías seguidas
+        self.correccion = 0.0    # Suma de correcciones (unidades crudas)
+        self.actualizaciones = 0 # Muestras que movieron el offset
+        self.tasa = 0.0          # g/h de la última ventana con correcciones
+        self.gramos = 0.0        # Corrección acumulada en gramos
+        self._t_ventana = None
+        self._correccion_ventana = 0.0
+
+        if etiquetas is not None:
+            tasa = metricas.medidor("parkpi_deriva_gramos_por_hora",
+                                    "Corrección del offset por deriva (gramos por hora)",
+                                    lambda: self.tasa, etiquetas)
+            total = metricas.medidor("parkpi_deriva_gramos",
+                                     "Corrección acumulada del offset por deriva (gramos)",
+                                     lambda: self.gramos, etiquetas)
+            # (Si la celda se vuelve a crear, el medidor apunta al nuevo seguidor)
+            tasa.funcion = lambda: self.tasa
+            total.funcion = lambda: self.gramos
+
+    def agregar(self, crudas, offset, factor, t):
+        """
+        Procesa las muestras crudas nuevas (sin restar offset) y devuelve el
+        offset corregido. El offset se pasa en cada llamada, así que una
+        re-tara hecha por otro lado se respeta.
+        """
+        if factor == 0:
+            return offset
+        inicial = offset
+        for cruda in crudas:
+            if abs(cruda - offset) / abs(factor) <= self.banda_gramos:
+                self.racha += 1
+                if self.racha > self.estables:
+                    offset += self.alfa * (cruda - offset)
+                    self.actualizaciones += 1
+            else:
+                self.racha = 0
+
+        if offset != inicial:
+            self.correccion += offset - inicial
+            self.gramos = self.correccion / factor
+        self._medir_tasa(factor, t)
+        return offset
+
+    def _medir_tasa(self, factor, t):
+        if self._t_ventana is None:
+            self._t_ventana = t
+            return
+        transcurrido = t - self._t_ventana
+        if transcurrido < self.ventana:
+            return
+        cambio = self.correccion - self._correccion_ventana
+        if cambio != 0:
+            # Sin correcciones (cajón ocupado) se conserva la última tasa
+            self.tasa = cambio / factor / transcurrido * SEGUNDOS_POR_HORA
+        self._t_ventana = t
+        self._correccion_ventana = self.correccion
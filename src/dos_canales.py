@@ -0,0 +1,209 @@
+import threading
+from hardware import (obtener_backend, FLANCO_BAJADA, PULSOS_POR_GANANCIA, ASENTAMIENTO_HX711,
+                      conversiones_sin_asentar)
+from buffer_circular import BufferCircular
+from celda_carga import CeldaDeCarga
+import metricas
+
+H_TRAMA_CANALES = metricas.histograma("parkpi_hx711_canales_trama_segundos",
+                                      "Duración de una trama del HX711 de dos canales (en el callback)")
+C_DESCARTADAS = metricas.contador("parkpi_hx711_canales_descartadas_total",
+                                  "Conversiones tiradas por asentamiento tras cambiar de canal")
+
+
+class HX711DosCanales:
+    """
+    Un HX711 para dos celdas con los mismos dos GPIO (DT, SCK): la del
+    canal A (ganancia 128 o 64) y la del canal B (ganancia 32).
+
+    * Adquisición por eventos (como CeldaDeCarga en modo eventos): cada
+      flanco de bajada de DT lee la trama en el hilo de callbacks y la
+      guarda en el buffer del canal que la convirtió.
+    * Alterna por ráfagas: tras 'rafaga' muestras válidas de un canal, los
+      pulsos extra de la trama eligen el otro. Las conversiones que el
+      HX711 tarda en asentarse tras el cambio (conversiones_sin_asentar:
+      3, a 10 o a 80 SPS) se leen y se tiran, así que cada canal recibe
+      sps * rafaga / (2 * (rafaga + 3)) muestras por segundo: a 80 SPS
+      (pin RATE en alto) y ráfagas de 8, unas 29; a 10 SPS, menos de 4.
+    * 'celdas' son fachadas con la API de CeldaDeCarga (como GrupoDeCeldas):
+      cada una con su offset, factor, filtro y deriva.
+    """
+
+    def __init__(self, pin_dt, pin_sck, backend=None, ganancia_a=128, sps=80, rafaga=8,
+                 capacidad=64, calibrar=True):
+        if ganancia_a not in (128, 64):
+            raise ValueError(f"Ganancia del canal A inválida: {ganancia_a} (128 o 64).")
+        if sps not in ASENTAMIENTO_HX711:
+            raise ValueError(f"Velocidad del HX711 inválida: {sps} (10 u 80).")
+        self.pin_dt = pin_dt
+        self.pin_sck = pin_sck
+        self.backend = backend or obtener_backend()
+        self.ganancias = (ganancia_a, 32)
+        self.sps = sps
+        self.rafaga = max(1, rafaga)
+        self.descarte = conversiones_sin_asentar(sps)
+        # Espera máxima de una muestra de un canal: la ráfaga del otro, el
+        # asentamiento y un margen
+        self.espera_maxima = 2 * (self.rafaga + self.descarte + 1) / sps + 1.0
+        self.h = None
+        self._dt_claimed = False
+        self._sck_claimed = False
+
+        self.muestras = [BufferCircular(capacidad), BufferCircular(capacidad)]
+        self._pulsos = [PULSOS_POR_GANANCIA[g] for g in self.ganancias]
+        # Al encender convierte en A con ganancia 128: si es la del canal A
+        # ya estamos en él, si no hay que cambiar (y asentar) igual
+        self._canal = 0 if ganancia_a == 128 else None
+        self._desde_cambio = 0 # Conversiones desde el último cambio (o el encendido)
+        self._en_rafaga = 0    # Muestras válidas del canal actual
+        self._callback = None
+        self._lock_trama = threading.Lock()
+        self._cond = threading.Condition() # Compartida por las dos fachadas
+        self._activos = [True, True] # Fachadas sin limpiar
+
+        self.tramas = 0
+        self.descartadas = 0
+        self.cambios = 0
+        self.despertares = 0
+
+        try:
+            self.h = self.backend.abrir_chip(0)
+            self.backend.reclamar_entrada(self.h, self.pin_dt)
+            self._dt_claimed = True
+            self.backend.reclamar_salida(self.h, self.pin_sck)
+            self._sck_claimed = True
+            print(f"HX711 de dos canales (DT={pin_dt}, SCK={pin_sck}): A x{ganancia_a} y B x32 "
+                  f"a {sps} SPS, ráfagas de {self.rafaga} ({self.descarte} descartadas por cambio).")
+        except Exception as e:
+            print(f"Error inicializando el HX711 de dos canales (DT={pin_dt}): {e}")
+            self._cerrar()
+
+        self.celdas = [CeldaDeCanal(self, k) for k in range(2)]
+        if self.h is not None:
+            self.iniciar()
+            if calibrar:
+                for celda in self.celdas:
+                    celda.calibrar()
+
+    # --- Adquisición ---
+
+    def iniciar(self):
+        if self.h is None or self._callback is not None:
+            return
+        self.backend.reclamar_alerta(self.h, self.pin_dt, FLANCO_BAJADA)
+        self._callback = self.backend.crear_callback(self.h, self.pin_dt, FLANCO_BAJADA, self._al_flanco_dt)
+        # Si ya había un dato listo antes de armar la alerta no habrá flanco
+        self._al_flanco_dt(0, 0)
+
+    def _siguiente(self, valida):
+        """Canal de la conversión siguiente (lo eligen los pulsos de esta trama)."""
+        if self._canal is None:
+            return 0 if self._activos[0] else 1
+        otro = 1 - self._canal
+        if not self._activos[otro]:
+            return self._canal
+        if not self._activos[self._canal] or self._en_rafaga + valida >= self.rafaga:
+            return otro
+        return self._canal
+
+    def _al_flanco_dt(self, nivel, timestamp):
+        self.despertares += 1
+        with self._lock_trama:
+            # Los bits de la trama también generan flancos de bajada
+            if self.h is None or self.backend.leer(self.h, self.pin_dt) != 0:
+                return
+            t0 = metricas.inicio()
+            canal = self._canal
+            valida = canal is not None and self._desde_cambio >= self.descarte
+            siguiente = self._siguiente(valida)
+            cruda = self.backend.leer_trama_hx711(self.h, self.pin_dt, self.pin_sck, self._pulsos[siguiente])
+            if cruda & 0x800000:
+                cruda |= ~0xFFFFFF
+            self.tramas += 1
+            if valida:
+                self.muestras[canal].agregar((self.backend.ahora(), cruda))
+                self._en_rafaga += 1
+            else:
+                self.descartadas += 1
+                metricas.contar(C_DESCARTADAS)
+            if siguiente != canal:
+                self._canal = siguiente
+                self._desde_cambio = 0
+                self._en_rafaga = 0
+                self.cambios += 1
+            else:
+                self._desde_cambio += 1
+            metricas.observar(H_TRAMA_CANALES, t0)
+        if valida:
+            with self._cond:
+                self._cond.notify_all()
+
+    # --- Limpieza ---
+
+    def _cerrar(self):
+        if self.h is None:
+            return
+        try:
+            if self._callback is not None:
+                self._callback.cancel()
+                self._callback = None
+            if self._dt_claimed:
+                self.backend.liberar(self.h, self.pin_dt)
+            if self._sck_claimed:
+                self.backend.liberar(self.h, self.pin_sck)
+            self.backend.cerrar_chip(self.h)
+        except Exception as e:
+            print(f"Error durante la limpieza del HX711 de dos canales: {e}")
+        self.h = None
+
+    def soltar(self, indice):
+        """
+        Lo llama cada fachada al limpiarse. Con una sola activa se deja de
+        alternar (ya nadie lee el otro canal); la última libera los pines.
+        """
+        with self._lock_trama:
+            self._activos[indice] = False
+            if not any(self._activos) and self.h is not None:
+                print("\nLimpiando y liberando pines GPIO del HX711 de dos canales...")
+                self._cerrar()
+                print("Pines liberados.")
+
+    def limpiar(self):
+        for celda in self.celdas:
+            celda.limpiar()
+
+
+class CeldaDeCanal(CeldaDeCarga):
+    """
+    Un canal de un HX711DosCanales con la API de CeldaDeCarga. Funciona
+    como el modo eventos: 'muestras' es el buffer de su canal.
+    """
+
+    def __init__(self, convertidor, indice):
+        # Solo el estado: los pines los reclama el convertidor
+        self._iniciar_estado(convertidor.pin_dt, convertidor.pin_sck, convertidor.backend,
+                             convertidor.ganancias[indice], convertidor.sps)
+        self.convertidor = convertidor
+        self.indice = indice
+        self.h = convertidor.h
+        self.muestras = convertidor.muestras[indice]
+        self._cond = convertidor._cond
+        self._lock_trama = convertidor._lock_trama
+        self.id_grabacion = indice
+
+    def _esperar_muestras(self, timeout=None):
+        # Mientras el HX711 está en el otro canal no llega nada: se espera
+        # una ráfaga entera más el asentamiento
+        return CeldaDeCarga._esperar_muestras(self, timeout or self.convertidor.espera_maxima)
+
+    def iniciar_modo_eventos(self, capacidad=64):
+        # El convertidor ya adquiere por eventos para los dos canales
+        return False
+
+    def detener_modo_eventos(self):
+        pass
+
+    def limpiar(self):
+        if self.h:
+            self.h = None
+            self.convertidor.soltar(self.indice)
@@ -0,0 +1,99 @@
+import threading
+from array import array
+
+LIBRE = 0
+OCUPADO = 1
+NOMBRES_ESTADO = ('LIBRE', 'OCUPADO')
+CODIGOS_ESTADO = {'LIBRE': LIBRE, 'OCUPADO': OCUPADO}
+
+
+class AlmacenDeEstados:
+    """
+    Estado de todos los cajones, compacto (un byte por cajón en un array('B')).
+
+    * libres() / hay_libre(): contador O(1), sin recorrer la lista.
+    * cajon_libre(): índice de algún cajón libre en O(1) (para asignarlo).
+    * Lecturas sin candado: los escritores se turnan con un candado y usan
+      un contador de secuencia (seqlock); instantanea() reintenta si un
+      escritor cambió algo mientras copiaba.
+    """
+
+    def __init__(self, n, estado_inicial=LIBRE):
+        self._estados = array('B', [estado_inicial] * n)
+        self._lock_escritura = threading.Lock()
+        self.secuencia = 0 # Par = estable, impar = escritura en curso
+
+        # Pila de índices libres + posición de cada cajón en la pila (-1 = ocupado)
+        self._pila_libres = array('l')
+        self._pos = array('l', [-1] * n)
+        for i in range(n):
+            if estado_inicial == LIBRE:
+                self._pos[i] = len(self._pila_libres)
+                self._pila_libres.append(i)
+
+    def __len__(self):
+        return len(self._estados)
+
+    def __getitem__(self, i):
+        return NOMBRES_ESTADO[self._estados[i]]
+
+    def codigo(self, i):
+        return self._estados[i]
+
+    def cambiar(self, i, estado):
+        """
+        Pone el cajón 'i' en 'estado' ('LIBRE'/'OCUPADO' o LIBRE/OCUPADO).
+        Devuelve True si el estado cambió.
+        """
+        if isinstance(estado, str):
+            estado = CODIGOS_ESTADO[estado]
+        if self._estados[i] == estado:
+            return False
+        with self._lock_escritura:
+            if self._estados[i] == estado:
+                return False
+            self.secuencia += 1
+            self._estados[i] = estado
+            if estado == LIBRE:
+                self._pos[i] = len(self._pila_libres)
+                self._pila_libres.append(i)
+            else:
+                # Quitamos 'i' de la pila cambiándolo por el último (O(1))
+                pos = self._pos[i]
+                ultimo = self._pila_libres.pop()
+                if ultimo != i:
+                    self._pila_libres[pos] = ultimo
+                    self._pos[ultimo] = pos
+                self._pos[i] = -1
+            self.secuencia += 1
+        return True
+
+    def libres(self):
+        return len(self._pila_libres)
+
+    def hay_libre(self):
+        return len(self._pila_libres) > 0
+
+    def cajon_libre(self):
+        """Índice de un cajón libre (o None si el lote está lleno)."""
+        try:
+            return self._pila_libres[-1]
+        except IndexError:
+            return None
+
+    def instantanea(self):
+        """
+        Copia consistente de los estados, sin tomar el candado.
+        Devuelve (secuencia, bytes) con un byte por cajón.
+        """
+        while True:
+            antes = self.secuencia
+            if antes % 2 == 0:
+                copia = self._estados.tobytes()
+                if self.secuencia == antes:
+                    return antes, copia
+
+    def como_lista(self):
+        """Estados como lista de strings (el formato de la versión anterior)."""
+        _, copia = self.instantanea()
+        return [NOMBRES_ESTADO[b] for b in copia]
@@ -0,0 +1,90 @@
+import bisect
+from collections import deque
+
+
+class MedianaMovil:
+    """
+    Mediana de las últimas 'ventana' muestras, en memoria constante.
+    Guarda las muestras en orden de llegada (deque) y ordenadas (lista).
+    """
+
+    def __init__(self, ventana):
+        self.ventana = ventana
+        self._llegada = deque(maxlen=ventana)
+        self._ordenadas = []
+
+    def agregar(self, x):
+        if len(self._llegada) == self.ventana:
+            viejo = self._llegada[0]
+            del self._ordenadas[bisect.bisect_left(self._ordenadas, viejo)]
+        self._llegada.append(x)
+        bisect.insort(self._ordenadas, x)
+        return self.valor()
+
+    def valor(self):
+        n = len(self._ordenadas)
+        if n == 0:
+            return 0.0
+        mitad = n // 2
+        if n % 2:
+            return self._ordenadas[mitad]
+        return (self._ordenadas[mitad - 1] + self._ordenadas[mitad]) / 2.0
+
+    def __len__(self):
+        return len(self._llegada)
+
+
+class FiltroDePeso:
+    """
+    Filtro por muestra para una celda: cada lectura cruda produce un peso
+    filtrado nuevo (en lugar de uno cada 5 lecturas).
+
+    Etapas (todas en gramos, con signo):
+      1. Rechazo de atípicos: si una muestra se aleja más de 'umbral_atipico'
+         gramos de la mediana, se reemplaza por la mediana. Tras
+         'max_rechazos' atípicos seguidos se aceptan hasta que la mediana
+         los alcance (es un cambio real, por ejemplo un coche que llega).
+      2. Mediana móvil de 'ventana_mediana' muestras (quita picos sueltos).
+      3. EMA con factor 'alfa_ema' (1.0 = sin suavizado).
+    """
+
+    def __init__(self, ventana_mediana=5, alfa_ema=0.5, umbral_atipico=None, max_rechazos=2):
+        if not 0.0 < alfa_ema <= 1.0:
+            raise ValueError("alfa_ema debe estar en (0, 1].")
+        self.mediana = MedianaMovil(max(1, ventana_mediana))
+        self.alfa_ema = alfa_ema
+        self.umbral_atipico = umbral_atipico
+        self.max_rechazos = max_rechazos
+
+        self.ema = None
+        self.rechazadas = 0 # Total de muestras atípicas reemplazadas
+        self._rechazos_seguidos = 0
+
+    def agregar(self, gramos):
+        """Procesa una muestra (gramos con signo) y devuelve el peso filtrado."""
+        if self.umbral_atipico is not None and len(self.mediana):
+            referencia = self.mediana.valor()
+            if abs(gramos - referencia) > self.umbral_atipico:
+                if self._rechazos_seguidos < self.max_rechazos:
+                    self._rechazos_seguidos += 1
+                    self.rechazadas += 1
+                    gramos = referencia
+                # Si no, se acepta (y las siguientes también, hasta que
+                # la mediana alcance el nuevo nivel)
+            else:
+                self._rechazos_seguidos = 0
+
+        m = self.mediana.agregar(gramos)
+        if self.ema is None:
+            self.ema = m
+        else:
+            self.ema += self.alfa_ema * (m - self.ema)
+        return self.ema
+
+    def valor(self):
+        return self.ema if self.ema is not None else 0.0
+
+    def reiniciar(self):
+        self.mediana = MedianaMovil(self.mediana.ventana)
+        self.ema = None
+        self._rechazos_seguidos = 0
@@ -0,0 +1,183 @@
+import threading
+from hardware import obtener_backend
+from celda_carga import CeldaDeCarga, H_LECTURA_CRUDA
+import metricas
+
+H_TRAMA_GRUPO = metricas.histograma("parkpi_hx711_grupo_lectura_segundos",
+                                    "Duración de una lectura en grupo (todas las celdas)")
+
+
+class GrupoDeCeldas:
+    """
+    Lee varios HX711 a la vez: todos los SCK se mueven juntos (un solo pin
+    compartido o un grupo de pines) y en cada bit los DT se leen con UNA
+    llamada a leer_grupo (lgpio.group_read). Una trama de N celdas cuesta
+    74 llamadas en total, no 74 por celda, y dura lo mismo que una sola.
+
+    'celdas' son fachadas con la misma API que CeldaDeCarga (obtener_peso,
+    obtener_lectura_cruda, calibrar, configurar_filtro, limpiar...), así que
+    Main.py y MotorDeMuestreo las usan igual. Cada lectura en grupo se
+    reparte a todas las fachadas: si varios carriles piden una muestra, la
+    pide uno y los demás usan la misma trama.
+    """
+
+    def __init__(self, pines, backend=None, calibrar=True):
+        """
+        pines: lista de {'dt': .., 'sck': ..} (como PINES_CELDA_1 en Main.py).
+               Las celdas pueden compartir SCK.
+        """
+        self.backend = backend or obtener_backend()
+        self.pines_dt = [p['dt'] for p in pines]
+        self.pines_sck = []
+        for p in pines:
+            if p['sck'] not in self.pines_sck:
+                self.pines_sck.append(p['sck'])
+        self.h = None
+        self._dt_claimed = False
+        self._sck_claimed = False
+
+        self._lock = threading.Lock()
+        self.secuencia = 0 # Tramas en grupo leídas
+        self.valores = [0] * len(self.pines_dt)
+        self.llamadas = 0  # Llamadas al backend (para medir)
+        self._activas = len(self.pines_dt)
+
+        try:
+            self.h = self.backend.abrir_chip(0)
+            self.backend.reclamar_grupo_entrada(self.h, self.pines_dt)
+            self._dt_claimed = True
+            self.backend.reclamar_grupo_salida(self.h, self.pines_sck)
+            self._sck_claimed = True
+            print(f"Grupo de {len(self.pines_dt)} celdas (DT={self.pines_dt}, SCK={self.pines_sck}) "
+                  f"inicializado con lgpio.")
+        except Exception as e:
+            print(f"Error inicializando el grupo de celdas (DT={self.pines_dt}): {e}")
+            self._cerrar()
+
+        self.celdas = [CeldaDeGrupo(self, k, p['dt'], p['sck']) for k, p in enumerate(pines)]
+        if calibrar and self.h is not None:
+            self.calibrar()
+
+    # --- Lectura en grupo ---
+
+    def _todas_listas(self):
+        # DT en bajo = dato listo; el grupo está listo cuando todos están en 0
+        self.llamadas += 1
+        return self.backend.leer_grupo(self.h, self.pines_dt[0]) == 0
+
+    def _leer_tramas(self):
+        t0 = metricas.inicio()
+        while not self._todas_listas():
+            self.backend.dormir(0.01)
+        crudas = self.backend.leer_tramas_hx711_grupo(
+            self.h, self.pines_dt[0], self.pines_sck[0],
+            len(self.pines_dt), len(self.pines_sck)
+        )
+        self.llamadas += 24 * 3 + 2
+        for k, cruda in enumerate(crudas):
+            if cruda & 0x800000:
+                cruda |= ~0xFFFFFF
+            self.valores[k] = cruda
+        self.secuencia += 1
+        metricas.observar(H_TRAMA_GRUPO, t0)
+
+    def muestra(self, k, cursor):
+        """
+        Valor crudo de la celda 'k' más nuevo que 'cursor'. Si todavía no hay
+        una trama nueva, la lee (para todas las celdas).
+        Devuelve (valor, nuevo_cursor).
+        """
+        with self._lock:
+            if self.h is None:
+                raise RuntimeError("El grupo de celdas no está inicializado.")
+            if self.secuencia <= cursor:
+                self._leer_tramas()
+            return self.valores[k], self.secuencia
+
+    def leer_todas(self, n=1):
+        """Promedio de 'n' tramas nuevas de cada celda (sin restar offset)."""
+        sumas = [0] * len(self.pines_dt)
+        with self._lock:
+            for _ in range(n):
+                self._leer_tramas()
+                for k, valor in enumerate(self.valores):
+                    sumas[k] += valor
+        return [s / n for s in sumas]
+
+    def calibrar(self, celdas=None):
+        """
+        Tara con las mismas 5 tramas. 'celdas': solo esas (las demás
+        conservan su offset, p. ej. el guardado); None = todas.
+        """
+        celdas = self.celdas if celdas is None else [c for c in self.celdas if c in celdas]
+        try:
+            print(f"Iniciando calibración en grupo (tara de {len(celdas)} celdas)...")
+            offsets = self.leer_todas(5)
+            for celda in celdas:
+                celda.offset = offsets[celda.indice]
+                celda._cursor = self.secuencia
+            print(f"Calibración completada. Offsets: {[c.offset for c in celdas]}")
+            self.backend.dormir(0.5)
+        except Exception as e:
+            print(f"Error durante la calibración en grupo: {e}")
+
+    # --- Limpieza ---
+
+    def _cerrar(self):
+        if self.h is None:
+            return
+        try:
+            if self._dt_claimed:
+                self.backend.liberar_grupo(self.h, self.pines_dt[0])
+            if self._sck_claimed:
+                self.backend.liberar_grupo(self.h, self.pines_sck[0])
+            self.backend.cerrar_chip(self.h)
+        except Exception as e:
+            print(f"Error durante la limpieza del grupo: {e}")
+        self.h = None
+
+    def soltar(self):
+        """Lo llama cada fachada al limpiarse; la última libera los pines."""
+        with self._lock:
+            self._activas -= 1
+            if self._activas <= 0 and self.h is not None:
+                print("\nLimpiando y liberando pines GPIO del grupo...")
+                self._cerrar()
+                print("Pines liberados.")
+
+    def limpiar(self):
+        for celda in self.celdas:
+            celda.limpiar()
+
+
+class CeldaDeGrupo(CeldaDeCarga):
+    """
+    Una celda de un GrupoDeCeldas con la API de CeldaDeCarga. No reclama
+    pines propios: sus muestras salen de las tramas en grupo.
+    """
+
+    def __init__(self, grupo, indice, pin_dt, pin_sck):
+        # Solo el estado: los pines los reclama el grupo. La trama en grupo
+        # manda un solo pulso extra (canal A, ganancia 128).
+        self._iniciar_estado(pin_dt, pin_sck, grupo.backend)
+        self.grupo = grupo
+        self.indice = indice
+        self.h = grupo.h
+        self.id_grabacion = indice
+
+    def _read_raw_value(self):
+        t0 = metricas.inicio()
+        valor, self._cursor = self.grupo.muestra(self.indice, self._cursor)
+        if self.grabadora is not None:
+            self.grabadora.agregar(self.id_grabacion, self.backend.ahora(), valor)
+        metricas.observar(H_LECTURA_CRUDA, t0)
+        return valor
+
+    def iniciar_modo_eventos(self, capacidad=64):
+        # Las tramas en grupo ya se piden una vez para todas las celdas
+        return False
+
+    def limpiar(self):
+        if self.h:
+            self.h = None
+            self.grupo.soltar()
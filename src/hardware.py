@@ -0,0 +1,275 @@
+import os
+import time
+
+# Flancos para las alertas GPIO (mismos valores que lgpio)
+FLANCO_SUBIDA = 1
+FLANCO_BAJADA = 2
+FLANCO_AMBOS = 3
+
+# Máscara para escribir todos los pines de un grupo (lgpio.GROUP_ALL)
+GRUPO_TODOS = 0xFFFFFFFFFFFFFFFF
+
+# --- HX711: canal, ganancia y velocidad ---
+# Tras los 24 bits, 1, 2 o 3 pulsos más eligen canal y ganancia de la
+# SIGUIENTE conversión: ganancia 128 o 64 en el canal A, 32 en el B.
+PULSOS_POR_GANANCIA = {128: 1, 32: 2, 64: 3}
+# Con el pin RATE en bajo convierte a 10 SPS y en alto a 80 SPS. Al
+# encender o cambiar de canal/ganancia la salida tarda en asentarse
+# (hoja de datos): 400 ms a 10 SPS y 50 ms a 80 SPS, 4 conversiones.
+ASENTAMIENTO_HX711 = {10: 0.4, 80: 0.05}
+
+
+def canal_hx711(ganancia):
+    return 'B' if ganancia == 32 else 'A'
+
+
+def conversiones_sin_asentar(sps):
+    """Conversiones que hay que descartar tras un cambio de canal/ganancia."""
+    return max(0, round(ASENTAMIENTO_HX711[sps] * sps) - 1)
+
+
+class BackendHardware:
+    """
+    Interfaz de hardware que usan CeldaDeCarga, SensorNFC y Main.py.
+
+    Agrupa todo lo que toca el mundo físico:
+      * reloj (ahora / dormir)
+      * líneas GPIO al estilo lgpio (abrir chip, reclamar, leer, escribir)
+      * tramas del HX711 (bit-banging sobre esas líneas)
+      * lector PN532, LEDs y servo
+
+    Hay dos implementaciones: BackendReal (lgpio / gpiozero / adafruit) y
+    BackendSimulado (hardware_simulado.py) para correr sin la Raspberry.
+    """
+
+    # --- Reloj ---
+
+    def ahora(self):
+        return time.monotonic()
+
+    def dormir(self, segundos):
+        time.sleep(segundos)
+
+    def segundos_reales(self, segundos):
+        """Cuántos segundos reales equivalen a 'segundos' de este reloj."""
+        return segundos
+
+    def esperar_evento(self, evento, segundos):
+        """
+        Espera a que se active 'evento' (un threading.Event que activa el
+        callback de una alerta), como mucho 'segundos' de este reloj.
+        Devuelve True si se activó.
+        """
+        return evento.wait(self.segundos_reales(segundos))
+
+    # --- Líneas GPIO (misma firma que lgpio) ---
+
+    def abrir_chip(self, chip):
+        raise NotImplementedError
+
+    def cerrar_chip(self, h):
+        raise NotImplementedError
+
+    def reclamar_entrada(self, h, pin):
+        raise NotImplementedError
+
+    def reclamar_salida(self, h, pin):
+        raise NotImplementedError
+
+    def liberar(self, h, pin):
+        raise NotImplementedError
+
+    def leer(self, h, pin):
+        raise NotImplementedError
+
+    def escribir(self, h, pin, valor):
+        raise NotImplementedError
+
+    # --- Grupos de líneas (lgpio group_*) ---
+    # Un grupo se identifica por su primer pin. En leer_grupo / escribir_grupo
+    # el bit k corresponde a pines[k].
+
+    def reclamar_grupo_entrada(self, h, pines):
+        raise NotImplementedError
+
+    def reclamar_grupo_salida(self, h, pines):
+        raise NotImplementedError
+
+    def liberar_grupo(self, h, pin):
+        raise NotImplementedError
+
+    def leer_grupo(self, h, pin):
+        """Niveles de todo el grupo en una sola llamada (bit k = pines[k])."""
+        raise NotImplementedError
+
+    def escribir_grupo(self, h, pin, bits, mascara=GRUPO_TODOS):
+        """Escribe los pines del grupo cuyo bit está en 'mascara'."""
+        raise NotImplementedError
+
+    # --- Alertas por flanco ---
+
+    def reclamar_alerta(self, h, pin, flanco):
+        """Reclama 'pin' como entrada que genera alertas en 'flanco'."""
+        raise NotImplementedError
+
+    def crear_callback(self, h, pin, flanco, funcion):
+        """
+        Llama funcion(nivel, timestamp_ns) en cada flanco de 'pin'
+        (desde un hilo del backend). Devuelve un objeto con cancel().
+        """
+        raise NotImplementedError
+
+    # --- HX711 ---
+
+    def leer_trama_hx711(self, h, pin_dt, pin_sck, pulsos_extra=1):
+        """
+        Saca los 24 bits de una conversión del HX711 (MSB primero) y manda
+        los pulsos extra que eligen canal/ganancia de la siguiente lectura
+        (1 = canal A, ganancia 128).
+        Devuelve el valor crudo SIN extender el signo.
+        """
+        escribir = self.escribir
+        leer = self.leer
+
+        lectura_cruda = 0
+        for _ in range(24):
+            escribir(h, pin_sck, 1)
+            lectura_cruda = (lectura_cruda << 1)
+            if leer(h, pin_dt) == 1:
+                lectura_cruda += 1
+            escribir(h, pin_sck, 0)
+
+        for _ in range(pulsos_extra):
+            escribir(h, pin_sck, 1)
+            escribir(h, pin_sck, 0)
+
+        return lectura_cruda
+
+    def leer_tramas_hx711_grupo(self, h, pin_dt, pin_sck, n_dt, n_sck, pulsos_extra=1):
+        """
+        Lee a la vez una conversión de n_dt HX711 cuyos DT forman el grupo
+        'pin_dt' y cuyos SCK (uno compartido o varios) forman el grupo
+        'pin_sck'. Cada bit son 3 llamadas para TODAS las celdas: subir los
+        SCK, leer los DT con leer_grupo y bajar los SCK.
+        Devuelve una lista con los n_dt valores crudos SIN extender el signo.
+        """
+        escribir_grupo = self.escribir_grupo
+        leer_grupo = self.leer_grupo
+        todos = (1 << n_sck) - 1
+
+        niveles = []
+        for _ in range(24):
+            escribir_grupo(h, pin_sck, todos, todos)
+            niveles.append(leer_grupo(h, pin_dt))
+            escribir_grupo(h, pin_sck, 0, todos)
+
+        for _ in range(pulsos_extra):
+            escribir_grupo(h, pin_sck, todos, todos)
+            escribir_grupo(h, pin_sck, 0, todos)
+
+        # Trasponemos: de 24 palabras de n_dt bits a n_dt valores de 24 bits
+        valores = []
+        for k in range(n_dt):
+            valor = 0
+            for bits in niveles:
+                valor = (valor << 1) | ((bits >> k) & 1)
+            valores.append(valor)
+        return valores
+
+    # --- Periféricos ---
+
+    def crear_lector_nfc(self):
+        """Devuelve un objeto con la API de adafruit_pn532 (ya inicializado)."""
+        raise NotImplementedError
+
+    def crear_led(self, pin):
+        """Devuelve un objeto con la API de gpiozero.LED."""
+        raise NotImplementedError
+
+    def crear_servo(self, pin, min_pulse_width, max_pulse_width):
+        """Devuelve un objeto con la API de gpiozero.Servo."""
+        raise NotImplementedError
+
+
+class BackendReal(BackendHardware):
+    """
+    Hardware real de la Raspberry Pi (lgpio, gpiozero, adafruit_pn532).
+    Las bibliotecas se importan aquí para que el resto del proyecto pueda
+    importarse en una máquina sin ellas.
+    """
+
+    def __init__(self):
+        import lgpio
+
+        # Usamos las funciones de lgpio directamente: sin capa extra
+        # en el bucle de bit-banging.
+        self.abrir_chip = lgpio.gpiochip_open
+        self.cerrar_chip = lgpio.gpiochip_close
+        self.reclamar_entrada = lgpio.gpio_claim_input
+        self.reclamar_salida = lgpio.gpio_claim_output
+        self.liberar = lgpio.gpio_free
+        self.leer = lgpio.gpio_read
+        self.escribir = lgpio.gpio_write
+        self.liberar_grupo = lgpio.group_free
+        self.escribir_grupo = lgpio.group_write
+        self._lgpio = lgpio
+
+    def reclamar_grupo_entrada(self, h, pines):
+        self._lgpio.group_claim_input(h, pines)
+
+    def reclamar_grupo_salida(self, h, pines):
+        self._lgpio.group_claim_output(h, pines, [0] * len(pines))
+
+    def leer_grupo(self, h, pin):
+        # lgpio devuelve (tamaño del grupo, niveles)
+        _, niveles = self._lgpio.group_read(h, pin)
+        return niveles
+
+    def reclamar_alerta(self, h, pin, flanco):
+        self._lgpio.gpio_claim_alert(h, pin, flanco)
+
+    def crear_callback(self, h, pin, flanco, funcion):
+        # lgpio llama func(chip, gpio, nivel, timestamp)
+        return self._lgpio.callback(h, pin, flanco,
+                                    lambda chip, gpio, nivel, ts: funcion(nivel, ts))
+
+    def crear_lector_nfc(self):
+        import board
+        import busio
+        from adafruit_pn532.i2c import PN532_I2C
+
+        i2c = busio.I2C(board.SCL, board.SDA)
+        return PN532_I2C(i2c, debug=False)
+
+    def crear_led(self, pin):
+        from gpiozero import LED
+        return LED(pin)
+
+    def crear_servo(self, pin, min_pulse_width, max_pulse_width):
+        from gpiozero import Servo
+        return Servo(pin, min_pulse_width=min_pulse_width, max_pulse_width=max_pulse_width)
+
+
+# --- Selección del backend ---
+
+_backend = None
+
+def obtener_backend():
+    """
+    Devuelve el backend del proceso. Por defecto es el real; con la variable
+    de entorno PARKPI_BACKEND=simulado se usa el simulado
+    (ver BackendSimulado.desde_entorno).
+    """
+    global _backend
+    if _backend is None:
+        if os.environ.get("PARKPI_BACKEND", "real") == "simulado":
+            from hardware_simulado import BackendSimulado
+            _backend = BackendSimulado.desde_entorno()
+        else:
+            _backend = BackendReal()
+    return _backend
+
+def establecer_backend(backend):
+    """Fija el backend del proceso (útil para benchmarks)."""
+    global _backend
+    _backend = backend
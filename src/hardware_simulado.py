@@ -0,0 +1,627 @@
+import os
+import csv
+import json
+import time
+import bisect
+import random
+import threading
+from hardware import BackendHardware, FLANCO_BAJADA, GRUPO_TODOS, PULSOS_POR_GANANCIA
+
+
+class RelojSimulado:
+    """
+    Reloj del backend simulado.
+
+    escala > 0: el tiempo simulado corre 'escala' veces más rápido que el
+                real (funciona con varios hilos).
+    escala = 0: modo discreto. El tiempo solo avanza con dormir()/avanzar(),
+                así que es 100% determinista (pensado para un solo hilo).
+    """
+
+    def __init__(self, escala=1.0):
+        self.escala = escala
+        self._t_virtual = 0.0
+        self._real0 = time.monotonic()
+        self._lock = threading.Lock()
+
+    def ahora(self):
+        if self.escala:
+            return (time.monotonic() - self._real0) * self.escala
+        return self._t_virtual
+
+    def dormir(self, segundos):
+        if segundos <= 0:
+            return
+        if self.escala:
+            time.sleep(segundos / self.escala)
+        else:
+            self.avanzar(segundos)
+
+    def avanzar(self, segundos):
+        with self._lock:
+            self._t_virtual += segundos
+
+
+class TrazaDePeso:
+    """
+    Peso (en gramos) a lo largo del tiempo: lista de puntos (t, gramos).
+    Entre puntos se mantiene el último valor (escalón).
+    """
+
+    def __init__(self, puntos=None):
+        puntos = sorted(puntos or [(0.0, 0.0)])
+        self.tiempos = [p[0] for p in puntos]
+        self.gramos = [p[1] for p in puntos]
+
+    def valor(self, t):
+        i = bisect.bisect_right(self.tiempos, t) - 1
+        return self.gramos[i] if i >= 0 else 0.0
+
+    @classmethod
+    def desde_csv(cls, archivo):
+        """Lee un CSV con columnas t,gramos (una traza grabada)."""
+        puntos = []
+        with open(archivo, 'r') as f:
+            for fila in csv.reader(f):
+                if not fila or fila[0].startswith('#'):
+                    continue
+                try:
+                    puntos.append((float(fila[0]), float(fila[1])))
+                except ValueError:
+                    continue # Encabezado
+        return cls(puntos)
+
+
+class ProgramaDeToques:
+    """
+    Horario de tarjetas acercadas al lector: lista de (t_inicio, uid_hex, duracion).
+    """
+
+    def __init__(self, toques=None):
+        self.toques = sorted((t, bytearray.fromhex(uid), d) for t, uid, d in (toques or []))
+        self.inicios = [t for t, _, _ in self.toques]
+
+    def uid_en(self, t):
+        """UID de la tarjeta presente en el instante t (o None)."""
+        i = bisect.bisect_right(self.inicios, t) - 1
+        # Revisamos hacia atrás por si un toque largo se solapa
+        while i >= 0:
+            inicio, uid, duracion = self.toques[i]
+            if t < inicio + duracion:
+                return uid
+            if i == 0 or t - self.inicios[i - 1] > 60:
+                break
+            i -= 1
+        return None
+
+    def siguiente_inicio(self, t):
+        i = bisect.bisect_right(self.inicios, t)
+        return self.inicios[i] if i < len(self.inicios) else None
+
+
+_GANANCIA_POR_PULSOS = {24 + pulsos: ganancia for ganancia, pulsos in PULSOS_POR_GANANCIA.items()}
+
+
+class HX711Simulado:
+    """
+    Modelo a nivel de pines de un HX711 con su celda de carga.
+
+    DT baja cuando hay una conversión lista (cada 1/sps segundos). Cada
+    flanco de subida en SCK saca un bit (MSB primero); tras el pulso 25
+    DT vuelve a subir hasta la siguiente conversión.
+
+    Con 'apagado_us' se modela el apagado del chip: si SCK se queda en alto
+    más de esos microsegundos (reales, p. ej. porque el hilo perdió el GIL a
+    media trama), el resto de los bits de esa trama salen en 1.
+
+    Canal y ganancia: los pulsos tras los 24 bits (25, 26 o 27) eligen los
+    de la conversión siguiente. 'factor' y 'offset' son los del canal A con
+    ganancia 128 (con 64 salen a la mitad); el canal B tiene su propia celda
+    ('traza_b', 'factor_b', 'offset_b', ya con ganancia 32). Tras un cambio
+    la salida llega al valor nuevo en 4 conversiones (asentamiento) y el
+    pin RATE (rate()) pasa de 10 a 80 SPS.
+    """
+
+    def __init__(self, reloj, traza=None, factor=100.0, offset=50000.0,
+                 ruido=20.0, sps=10, semilla=0, apagado_us=None,
+                 traza_b=None, factor_b=None, offset_b=None):
+        self.reloj = reloj
+        self.traza = traza or TrazaDePeso()
+        self.factor = factor
+        self.offset = offset
+        self.traza_b = traza_b or TrazaDePeso()
+        self.factor_b = factor / 4 if factor_b is None else factor_b
+        self.offset_b = offset / 4 if offset_b is None else offset_b
+        self.ruido = ruido
+        self.sps = sps
+        self.rnd = random.Random(semilla)
+
+        self._listo_en = reloj.ahora() + 1.0 / sps
+        self._trama = 0
+        self._pulsos = 0
+        self._sck = 0
+        self.conversiones = 0 # Tramas completas leídas
+
+        self.ganancia = 128      # De la conversión en curso
+        self._desde_cambio = 4   # Conversiones desde el último cambio de canal/ganancia
+        self._ultimo = None      # Último valor entregado (de donde parte el asentamiento)
+        self.cambios_de_canal = 0
+
+        self.apagado_us = apagado_us
+        self.apagados = 0     # Tramas que se rompieron por SCK en alto
+        self._rota = False
+        self._t_subida = 0.0
+
+    def _valor_crudo(self, t):
+        if self.ganancia == 32:
+            crudo = self.offset_b + self.traza_b.valor(t) * self.factor_b
+        else:
+            crudo = (self.offset + self.traza.valor(t) * self.factor) * self.ganancia / 128
+        if self.ruido:
+            crudo += self.rnd.gauss(0.0, self.ruido)
+        if self._desde_cambio < 3 and self._ultimo is not None:
+            crudo = self._ultimo + (crudo - self._ultimo) * (self._desde_cambio + 1) / 4
+        self._ultimo = crudo
+        crudo = int(round(crudo))
+        crudo = max(-0x800000, min(0x7FFFFF, crudo))
+        return crudo & 0xFFFFFF
+
+    def dt(self):
+        if 0 < self._pulsos <= 24:
+            if self._rota:
+                return 1
+            return (self._trama >> (24 - self._pulsos)) & 1
+        return 0 if self.reloj.ahora() >= self._listo_en else 1
+
+    def sck(self, valor):
+        if valor and not self._sck:
+            ahora = self.reloj.ahora()
+            if self._pulsos == 0 or (self._pulsos >= 25 and ahora >= self._listo_en):
+                if ahora < self._listo_en:
+                    # Reloj sin dato listo: el HX711 lo ignora
+                    self._sck = valor
+                    return
+                # Los pulsos de la trama anterior eligieron esta conversión
+                ganancia = _GANANCIA_POR_PULSOS.get(self._pulsos, self.ganancia)
+                if ganancia != self.ganancia:
+                    self.ganancia = ganancia
+                    self._desde_cambio = 0
+                    self.cambios_de_canal += 1
+                else:
+                    self._desde_cambio += 1
+                self._trama = self._valor_crudo(ahora)
+                self._pulsos = 0
+                self._rota = False
+            self._pulsos += 1
+            if self.apagado_us:
+                self._t_subida = time.perf_counter()
+            if self._pulsos == 25:
+                self.conversiones += 1
+                self._listo_en = ahora + 1.0 / self.sps
+        elif not valor and self._sck and self.apagado_us and 0 < self._pulsos <= 24:
+            if (time.perf_counter() - self._t_subida) * 1e6 > self.apagado_us and not self._rota:
+                self._rota = True
+                self.apagados += 1
+        self._sck = valor
+
+    def rate(self, valor):
+        """Pin RATE: 0 = 10 SPS, 1 = 80 SPS."""
+        self.sps = 80 if valor else 10
+
+
+class AlertaHX711Simulada:
+    """
+    Alerta de flanco de bajada en el DT de un HX711 simulado.
+
+    Un hilo espera (con el reloj simulado) a que haya una conversión lista y
+    llama a la función. Solo genera el flanco de 'dato listo', no los flancos
+    de los bits durante la lectura. Necesita el reloj con escala > 0.
+    """
+
+    def __init__(self, hx, funcion):
+        self.hx = hx
+        self.funcion = funcion
+        self._activo = threading.Event()
+        self._activo.set()
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+        self._hilo.start()
+
+    def _bucle(self):
+        reloj = self.hx.reloj
+        ultimo = None
+        while self._activo.is_set():
+            listo_en = self.hx._listo_en
+            espera = listo_en - reloj.ahora()
+            if espera > 0:
+                reloj.dormir(espera)
+                continue
+            if listo_en != ultimo and self.hx.dt() == 0:
+                ultimo = listo_en
+                self.funcion(0, int(reloj.ahora() * 1e9))
+            else:
+                # Nadie leyó la conversión: esperamos a que cambie
+                reloj.dormir(0.1 / self.hx.sps)
+
+    def cancel(self):
+        self._activo.clear()
+
+
+class LedSimulado:
+    """Imita gpiozero.LED y guarda el historial (t, valor)."""
+
+    def __init__(self, reloj, pin):
+        self.reloj = reloj
+        self.pin = pin
+        self.value = 0
+        self.historial = []
+
+    def _poner(self, valor):
+        if valor != self.value:
+            self.historial.append((self.reloj.ahora(), valor))
+        self.value = valor
+
+    def on(self):
+        self._poner(1)
+
+    def off(self):
+        self._poner(0)
+
+    @property
+    def is_lit(self):
+        return bool(self.value)
+
+    def close(self):
+        pass
+
+
+class ServoSimulado:
+    """Imita gpiozero.Servo (-1 = min, 0 = mid, 1 = max) con historial."""
+
+    def __init__(self, reloj, pin):
+        self.reloj = reloj
+        self.pin = pin
+        self.value = None
+        self.historial = []
+
+    def _poner(self, valor):
+        self.value = valor
+        self.historial.append((self.reloj.ahora(), valor))
+
+    def min(self):
+        self._poner(-1)
+
+    def mid(self):
+        self._poner(0)
+
+    def max(self):
+        self._poner(1)
+
+    def close(self):
+        pass
+
+
+class PN532Simulado:
+    """
+    Imita adafruit_pn532 (por I2C) a partir de un ProgramaDeToques.
+
+    Cuenta las transacciones I2C como las hace adafruit_pn532 sin pin IRQ:
+    escribir el comando, leer el ACK, y mientras espera la respuesta un
+    byte de estado cada 10 ms hasta que está lista (y leerla).
+    'comandos' cuenta los InListPassiveTarget enviados.
+
+    La línea IRQ (activa en bajo) se simula en irq(): baja cuando hay una
+    respuesta lista para el InListPassiveTarget pendiente, es decir, en
+    cuanto hay una tarjeta en el campo después de armarlo.
+    """
+
+    firmware_version = (0x32, 1, 6, 7)
+    SONDEO_I2C = 0.01 # adafruit_pn532 (_wait_ready) consulta el estado cada 10 ms
+
+    def __init__(self, reloj, programa=None):
+        self.reloj = reloj
+        self.programa = programa or ProgramaDeToques()
+        self.transacciones = 0
+        self.comandos = 0
+        self.pin_irq = None   # Lo fija el backend al crear la alerta
+        self.armados = 0      # Cuántas veces se envió InListPassiveTarget
+        self._armado_en = None
+
+    def SAM_configuration(self):
+        self.transacciones += 3
+
+    def listo_en(self):
+        """Instante en que la respuesta pendiente está (o estará) lista, o None."""
+        armado_en = self._armado_en
+        if armado_en is None:
+            return None
+        if self.programa.uid_en(armado_en) is not None:
+            return armado_en
+        return self.programa.siguiente_inicio(armado_en)
+
+    def irq(self):
+        """Nivel de la línea IRQ: 0 = hay una respuesta lista."""
+        listo = self.listo_en()
+        return 0 if listo is not None and listo <= self.reloj.ahora() else 1
+
+    def listen_for_passive_target(self, card_baud=0x00, timeout=1):
+        # Comando + estado + ACK
+        self.transacciones += 3
+        self.comandos += 1
+        self.armados += 1
+        self._armado_en = self.reloj.ahora()
+        return True
+
+    def get_passive_target(self, timeout=1):
+        if self._armado_en is None:
+            return None
+        ahora = self.reloj.ahora()
+        listo = self.listo_en()
+        espera = timeout if listo is None else min(max(0.0, listo - ahora), timeout)
+        # Un sondeo del estado cada 10 ms mientras se espera
+        self.transacciones += 1 + int(espera / self.SONDEO_I2C)
+        self.reloj.dormir(espera)
+        if listo is None or listo > ahora + timeout:
+            return None
+        uid = self.programa.uid_en(listo)
+        self.transacciones += 1 # Leer la respuesta
+        self._armado_en = None
+        return bytearray(uid)
+
+    def read_passive_target(self, card_baud=0x00, timeout=1):
+        self.listen_for_passive_target(card_baud, timeout)
+        return self.get_passive_target(timeout)
+
+
+class AlertaPN532Simulada:
+    """
+    Alerta de flanco de bajada en la línea IRQ de un PN532 simulado (un
+    flanco por cada InListPassiveTarget que encuentra tarjeta; el del ACK
+    no se simula).
+
+    Con escala > 0, un hilo espera el flanco con el reloj simulado. En modo
+    discreto no hay hilo: BackendSimulado.esperar_evento() adelanta el reloj
+    hasta proximo_flanco() y llama a disparar().
+    """
+
+    def __init__(self, lector, funcion, con_hilo=True):
+        self.lector = lector
+        self.funcion = funcion
+        self._ultimo = lector.armados # Último InListPassiveTarget avisado
+        self._activo = threading.Event()
+        self._activo.set()
+        if con_hilo:
+            threading.Thread(target=self._bucle, daemon=True).start()
+
+    def proximo_flanco(self, ahora):
+        if self.lector.armados == self._ultimo:
+            return None
+        listo = self.lector.listo_en()
+        return None if listo is None else max(listo, ahora)
+
+    def disparar(self):
+        self._ultimo = self.lector.armados
+        self.funcion(0, int(self.lector.reloj.ahora() * 1e9))
+
+    def _bucle(self):
+        reloj = self.lector.reloj
+        while self._activo.is_set():
+            ahora = reloj.ahora()
+            flanco = self.proximo_flanco(ahora)
+            if flanco is not None and flanco <= ahora:
+                self.disparar()
+            else:
+                espera = 0.01 if flanco is None else flanco - ahora
+                reloj.dormir(min(espera, 0.01))
+
+    def cancel(self):
+        self._activo.clear()
+
+
+class BackendSimulado(BackendHardware):
+    """
+    Backend sin hardware: HX711, PN532, LEDs y servo simulados.
+
+    Todo lo aleatorio sale de 'semilla', así que dos corridas con la misma
+    semilla (y el reloj en modo discreto) dan exactamente lo mismo.
+
+    Ejemplo:
+        sim = BackendSimulado(semilla=1, escala=50)
+        sim.agregar_hx711(17, 27, TrazaDePeso([(0, 0), (5, 800)]), factor=215.2)
+        sim.programar_toques([(2.0, "557ddc3e", 0.5)])
+        establecer_backend(sim)
+    """
+
+    def __init__(self, semilla=0, escala=1.0):
+        self.semilla = semilla
+        self.reloj = RelojSimulado(escala)
+        self.hx711_por_dt = {}
+        self.hx711_por_sck = {} # pin -> lista (varios HX711 pueden compartir SCK)
+        self.hx711_por_rate = {} # pin -> lista (un GPIO puede manejar el RATE de varios)
+        self.leds = {}
+        self.servos = {}
+        self.lector = PN532Simulado(self.reloj)
+
+        self._lock = threading.Lock()
+        self._siguiente_h = 0
+        self._reclamados = {} # pin -> handle
+        self._grupos = {}     # (handle, primer pin) -> pines
+        self._alertas_discretas = [] # Alertas sin hilo (reloj en modo discreto)
+
+    # --- Escenario ---
+
+    def agregar_hx711(self, pin_dt, pin_sck, traza=None, pin_rate=None, **kwargs):
+        kwargs.setdefault('semilla', hash((self.semilla, pin_dt, pin_sck)))
+        hx = HX711Simulado(self.reloj, traza, **kwargs)
+        self.hx711_por_dt[pin_dt] = hx
+        self.hx711_por_sck.setdefault(pin_sck, []).append(hx)
+        if pin_rate is not None:
+            self.hx711_por_rate.setdefault(pin_rate, []).append(hx)
+        return hx
+
+    def programar_toques(self, toques):
+        """toques: lista de (t_inicio, uid_hex, duracion)."""
+        self.lector.programa = ProgramaDeToques(toques)
+
+    @classmethod
+    def desde_entorno(cls):
+        """
+        Crea el backend a partir de variables de entorno:
+          PARKPI_SEMILLA, PARKPI_ESCALA y PARKPI_ESCENARIO (un JSON con
+          {"celdas": [{"dt": 17, "sck": 27, "factor": 215.2,
+                       "traza": [[0, 0], [10, 800]]}],
+           "toques": [[2.0, "557ddc3e", 0.5]]}).
+        Una celda en el canal B del mismo HX711 va en "traza_b" (y
+        "factor_b", "offset_b"); "pin_rate" conecta el pin RATE a un GPIO.
+        """
+        sim = cls(semilla=int(os.environ.get("PARKPI_SEMILLA", "0")),
+                  escala=float(os.environ.get("PARKPI_ESCALA", "1")))
+        archivo = os.environ.get("PARKPI_ESCENARIO")
+        if archivo:
+            with open(archivo, 'r') as f:
+                escenario = json.load(f)
+            for celda in escenario.get("celdas", []):
+                trazas = {}
+                for clave in ("traza", "traza_b"):
+                    traza = celda.get(clave)
+                    if isinstance(traza, str):
+                        trazas[clave] = TrazaDePeso.desde_csv(traza)
+                    elif traza is not None:
+                        trazas[clave] = TrazaDePeso([tuple(p) for p in traza])
+                opciones = {k: v for k, v in celda.items() if k not in ("dt", "sck", "traza", "traza_b")}
+                if "traza_b" in trazas:
+                    opciones["traza_b"] = trazas["traza_b"]
+                sim.agregar_hx711(celda["dt"], celda["sck"], trazas.get("traza"), **opciones)
+            sim.programar_toques([tuple(t) for t in escenario.get("toques", [])])
+        print(f"[Simulado] Backend simulado (semilla={sim.semilla}, escala={sim.reloj.escala}).")
+        return sim
+
+    # --- Reloj ---
+
+    def ahora(self):
+        return self.reloj.ahora()
+
+    def dormir(self, segundos):
+        self.reloj.dormir(segundos)
+
+    def segundos_reales(self, segundos):
+        # En modo discreto el tiempo no corre solo: no hay que esperar nada
+        return segundos / self.reloj.escala if self.reloj.escala else 0.0
+
+    def esperar_evento(self, evento, segundos):
+        if self.reloj.escala:
+            return evento.wait(segundos / self.reloj.escala)
+        # Modo discreto: el reloj salta al próximo flanco de una alerta (o
+        # al final de la espera) y la alerta se dispara en este mismo hilo
+        limite = self.reloj.ahora() + segundos
+        while not evento.is_set():
+            ahora = self.reloj.ahora()
+            flancos = [(a.proximo_flanco(ahora), a) for a in self._alertas_discretas]
+            flancos = [(t, a) for t, a in flancos if t is not None and t <= limite]
+            if not flancos:
+                self.reloj.dormir(limite - ahora)
+                break
+            t, alerta = min(flancos, key=lambda f: f[0])
+            self.reloj.dormir(t - ahora)
+            alerta.disparar()
+        return evento.is_set()
+
+    # --- Líneas GPIO ---
+
+    def abrir_chip(self, chip):
+        with self._lock:
+            self._siguiente_h += 1
+            return self._siguiente_h
+
+    def cerrar_chip(self, h):
+        with self._lock:
+            for pin in [p for p, dueno in self._reclamados.items() if dueno == h]:
+                del self._reclamados[pin]
+
+    def _reclamar(self, h, pin):
+        with self._lock:
+            if self._reclamados.get(pin, h) != h:
+                raise RuntimeError(f"GPIO {pin} ocupado")
+            self._reclamados[pin] = h
+
+    def reclamar_entrada(self, h, pin):
+        self._reclamar(h, pin)
+
+    def reclamar_salida(self, h, pin):
+        self._reclamar(h, pin)
+        self.escribir(h, pin, 0)
+
+    def liberar(self, h, pin):
+        with self._lock:
+            self._reclamados.pop(pin, None)
+
+    def leer(self, h, pin):
+        if pin == self.lector.pin_irq:
+            return self.lector.irq()
+        hx = self.hx711_por_dt.get(pin)
+        return hx.dt() if hx is not None else 0
+
+    def escribir(self, h, pin, valor):
+        for hx in self.hx711_por_sck.get(pin, ()):
+            hx.sck(valor)
+        for hx in self.hx711_por_rate.get(pin, ()):
+            hx.rate(valor)
+
+    # --- Grupos de líneas ---
+
+    def reclamar_grupo_entrada(self, h, pines):
+        for pin in pines:
+            self._reclamar(h, pin)
+        self._grupos[(h, pines[0])] = list(pines)
+
+    def reclamar_grupo_salida(self, h, pines):
+        self.reclamar_grupo_entrada(h, pines)
+        for pin in pines:
+            self.escribir(h, pin, 0)
+
+    def liberar_grupo(self, h, pin):
+        for p in self._grupos.pop((h, pin), ()):
+            self.liberar(h, p)
+
+    def leer_grupo(self, h, pin):
+        bits = 0
+        for k, p in enumerate(self._grupos[(h, pin)]):
+            bits |= self.leer(h, p) << k
+        return bits
+
+    def escribir_grupo(self, h, pin, bits, mascara=GRUPO_TODOS):
+        for k, p in enumerate(self._grupos[(h, pin)]):
+            if (mascara >> k) & 1:
+                self.escribir(h, p, (bits >> k) & 1)
+
+    # --- Alertas por flanco ---
+
+    def reclamar_alerta(self, h, pin, flanco):
+        self._reclamar(h, pin)
+
+    def crear_callback(self, h, pin, flanco, funcion):
+        if not (flanco & FLANCO_BAJADA):
+            raise RuntimeError(f"GPIO {pin}: solo se simulan alertas de bajada")
+        hx = self.hx711_por_dt.get(pin)
+        if hx is not None:
+            return AlertaHX711Simulada(hx, funcion)
+        # Cualquier otro pin es la línea IRQ del PN532
+        self.lector.pin_irq = pin
+        alerta = AlertaPN532Simulada(self.lector, funcion, con_hilo=bool(self.reloj.escala))
+        if not self.reloj.escala:
+            self._alertas_discretas.append(alerta)
+        return alerta
+
+    # --- Periféricos ---
+
+    def crear_lector_nfc(self):
+        return self.lector
+
+    def crear_led(self, pin):
+        led = LedSimulado(self.reloj, pin)
+        self.leds[pin] = led
+        return led
+
+    def crear_servo(self, pin, min_pulse_width, max_pulse_width):
+        servo = ServoSimulado(self.reloj, pin)
+        self.servos[pin] = servo
+        return servo
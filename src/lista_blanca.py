@@ -0,0 +1,235 @@
+import os
+import sys
+import mmap
+import zlib
+import struct
+import threading
+
+# --- Formato del índice (.idx) ---
+# Encabezado de 20 bytes: b"PKUID2\0\0", ancho de la clave, n y 'bits' (uint32).
+# Después, un directorio de 2**bits + 1 enteros (uint32): la cubeta 'c' son
+# las claves [directorio[c], directorio[c + 1]). Al final, las n claves de
+# ANCHO bytes, [largo del UID][UID][ceros], agrupadas por cubeta (crc32 de
+# la clave) y ordenadas dentro de cada una. Unas 4 claves por cubeta: la
+# búsqueda es un crc32 y un find() sobre ~44 bytes, directo sobre el mmap,
+# y el archivo lo comparten todos los procesos (page cache).
+MAGIA = b"PKUID2\0\0"
+ENCABEZADO = struct.Struct("<8sIII")
+DIRECTORIO = struct.Struct("<II")
+LARGO_MAXIMO_UID = 10 # ISO 14443: 4, 7 o 10 bytes
+ANCHO = 1 + LARGO_MAXIMO_UID
+CLAVES_POR_CUBETA = 4
+
+# Prefijo (largo) y relleno de cada largo posible, para armar la clave sin
+# crear bytes intermedios en cada búsqueda
+_PREFIJOS = [bytes((largo,)) for largo in range(LARGO_MAXIMO_UID + 1)]
+_RELLENOS = [bytes(LARGO_MAXIMO_UID - largo) for largo in range(LARGO_MAXIMO_UID + 1)]
+
+
+def clave_uid(uid):
+    """Clave de ancho fijo de un UID (bytes/bytearray, como lo da read_passive_target)."""
+    largo = len(uid)
+    if largo > LARGO_MAXIMO_UID:
+        raise ValueError(f"UID de {largo} bytes (máximo {LARGO_MAXIMO_UID}).")
+    return _PREFIJOS[largo] + uid + _RELLENOS[largo]
+
+
+def leer_texto(ruta):
+    """UIDs (bytes) de un archivo de texto con un UID en hex por línea."""
+    uids, invalidas = [], 0
+    with open(ruta, 'r') as f:
+        for linea in f:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                uid = bytes.fromhex(linea)
+            except ValueError:
+                invalidas += 1
+                continue
+            if 0 < len(uid) <= LARGO_MAXIMO_UID:
+                uids.append(uid)
+            else:
+                invalidas += 1
+    if invalidas:
+        print(f"[NFC] {invalidas} líneas inválidas ignoradas en {ruta}.")
+    return uids
+
+
+def escribir_indice(uids, ruta):
+    """
+    Escribe un índice con los UIDs (sin repetidos). Se escribe a un
+    temporal y se renombra: quien tenga abierto el índice anterior lo sigue
+    viendo completo, y quien lo abra después ve el nuevo completo.
+    Devuelve cuántos UIDs quedaron.
+    """
+    claves = {clave_uid(uid) for uid in uids}
+    bits = (len(claves) // CLAVES_POR_CUBETA).bit_length()
+    corrimiento = 32 - bits
+    claves = sorted((zlib.crc32(clave) >> corrimiento, clave) for clave in claves)
+
+    directorio = [0] * ((1 << bits) + 1)
+    for cubeta, _ in claves:
+        directorio[cubeta + 1] += 1
+    for c in range(1, len(directorio)):
+        directorio[c] += directorio[c - 1]
+
+    temporal = ruta + ".tmp"
+    with open(temporal, 'wb') as f:
+        f.write(ENCABEZADO.pack(MAGIA, ANCHO, len(claves), bits))
+        f.write(struct.pack(f"<{len(directorio)}I", *directorio))
+        f.write(b"".join(clave for _, clave in claves))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+    return len(claves)
+
+
+def compilar(ruta_texto, ruta_indice):
+    """valid_uids.txt -> valid_uids.idx"""
+    return escribir_indice(leer_texto(ruta_texto), ruta_indice)
+
+
+class IndiceDeUIDs:
+    """
+    Un índice (.idx) abierto con mmap, de solo lectura. Inmutable: para
+    cambiar la lista se escribe otro archivo y se abre otro IndiceDeUIDs.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(ruta, 'rb') as f:
+            estado = os.fstat(f.fileno())
+            self.firma = (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+            if estado.st_size < ENCABEZADO.size:
+                raise ValueError(f"{ruta} no es un índice de UIDs.")
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magia, ancho, n, bits = ENCABEZADO.unpack_from(self._mapa, 0)
+        self._claves = ENCABEZADO.size + 4 * ((1 << bits) + 1)
+        if magia != MAGIA or ancho != ANCHO or bits > 32 or self._claves + n * ancho > len(self._mapa):
+            self._mapa.close()
+            raise ValueError(f"{ruta} no es un índice de UIDs (o está truncado).")
+        self.n = n
+        self._corrimiento = 32 - bits
+
+    def __len__(self):
+        return self.n
+
+    def contiene_clave(self, clave):
+        """Busca una clave de ANCHO bytes en su cubeta, sobre el mmap."""
+        mapa = self._mapa
+        cubeta = zlib.crc32(clave) >> self._corrimiento
+        desde, hasta = DIRECTORIO.unpack_from(mapa, ENCABEZADO.size + 4 * cubeta)
+        inicio = self._claves + desde * ANCHO
+        fin = self._claves + hasta * ANCHO
+        i = mapa.find(clave, inicio, fin)
+        while i >= 0 and (i - inicio) % ANCHO: # Coincidencia entre dos claves: seguir
+            i = mapa.find(clave, i + 1, fin)
+        return i >= 0
+
+    def cerrar(self):
+        self._mapa.close()
+
+
+class ListaBlanca:
+    """
+    Lista de UIDs válidos sobre un índice binario con mmap.
+
+    * contiene(uid) busca el bytearray de read_passive_target tal cual (sin
+      .hex()) en su cubeta: el mismo costo con mil o con un millón de UIDs.
+    * Memoria: el archivo (~12 bytes por UID) en el page cache, compartido
+      entre procesos, en vez de un set de strings por proceso.
+    * Cambio en caliente: vigilar() revisa los archivos y, si cambiaron,
+      abre el índice nuevo y lo pone en lugar del anterior con una sola
+      asignación; una búsqueda en curso termina con el índice que tenía.
+
+    ruta_texto (opcional): valid_uids.txt. Si es más nuevo que el índice
+    (p. ej. registrar_tarjeta.py agregó una tarjeta) se recompila el índice.
+    """
+
+    def __init__(self, ruta_indice, ruta_texto=None):
+        self.ruta_indice = ruta_indice
+        self.ruta_texto = ruta_texto
+        self.indice = None
+        self.recargas = 0
+        self._firma_texto = None
+        self._activo = threading.Event()
+        self._hilo = None
+
+    def _firma(self, ruta):
+        try:
+            estado = os.stat(ruta)
+        except FileNotFoundError:
+            return None
+        return (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+
+    def _texto_mas_nuevo(self):
+        if self.ruta_texto is None:
+            return False
+        firma = self._firma(self.ruta_texto)
+        if firma is None or firma == self._firma_texto:
+            return False
+        indice = self._firma(self.ruta_indice)
+        return indice is None or firma[1] > indice[1] or self._firma_texto is not None
+
+    def cargar(self):
+        """Compila el texto si hace falta y abre el índice. Devuelve True si cargó."""
+        if self._texto_mas_nuevo():
+            n = compilar(self.ruta_texto, self.ruta_indice)
+            print(f"[NFC] Índice {self.ruta_indice} recompilado desde {self.ruta_texto} ({n} UIDs).")
+        if self.ruta_texto is not None:
+            self._firma_texto = self._firma(self.ruta_texto)
+        nuevo = IndiceDeUIDs(self.ruta_indice)
+        # Cambio atómico: una sola asignación. El mmap anterior se cierra
+        # solo cuando ya nadie lo usa (al liberarse el objeto).
+        self.indice = nuevo
+        self.recargas += 1
+        return True
+
+    def cambio_pendiente(self):
+        if self._texto_mas_nuevo():
+            return True
+        return self.indice is None or self._firma(self.ruta_indice) != self.indice.firma
+
+    def contiene(self, uid):
+        indice = self.indice # Una sola lectura: la búsqueda no mezcla índices
+        if indice is None or len(uid) > LARGO_MAXIMO_UID:
+            return False
+        return indice.contiene_clave(clave_uid(uid))
+
+    def __len__(self):
+        return len(self.indice) if self.indice is not None else 0
+
+    # --- Recarga en caliente ---
+
+    def _bucle(self, intervalo):
+        while not self._activo.wait(intervalo):
+            try:
+                if self.cambio_pendiente():
+                    self.cargar()
+                    print(f"[NFC] Lista de UIDs recargada en caliente: {len(self)} UIDs.")
+            except Exception as e:
+                print(f"[NFC] Error recargando la lista de UIDs: {e}")
+
+    def vigilar(self, intervalo=2.0):
+        """Revisa los archivos cada 'intervalo' s (reales) en un hilo."""
+        if self._hilo is not None:
+            return
+        self._activo.clear()
+        self._hilo = threading.Thread(target=self._bucle, args=(intervalo,),
+                                      name="lista-blanca", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._activo.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+            self._hilo = None
+
+
+if __name__ == "__main__":
+    # Uso:  python3 lista_blanca.py valid_uids.txt valid_uids.idx
+    if len(sys.argv) != 3:
+        print("Uso: python3 lista_blanca.py <uids.txt> <uids.idx>")
+        sys.exit(1)
+    print(f"{compilar(sys.argv[1], sys.argv[2])} UIDs escritos en {sys.argv[2]}.")
@@ -0,0 +1,258 @@
+"""
+Métricas internas (latencias y contadores) con exportación en el formato
+de texto de Prometheus.
+
+Uso en el camino caliente:
+
+    H_LECTURA = metricas.histograma("parkpi_x_segundos", "Qué mide")
+    ...
+    t0 = metricas.inicio()       # 0 si las métricas están apagadas
+    hacer_algo()
+    metricas.observar(H_LECTURA, t0)
+
+Con metricas.desactivar() inicio() devuelve 0 y observar() / contar()
+regresan sin hacer nada: solo queda una comparación por llamada.
+"""
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+ACTIVAS = True
+
+# --- Histograma estilo HDR ---
+# Valores enteros (ns). Debajo de 2**BITS_SUB cada valor tiene su cubeta;
+# arriba, cada potencia de 2 se parte en 2**(BITS_SUB-1) cubetas, así el
+# error relativo de cualquier percentil es < 2**-(BITS_SUB-1) (~6%).
+BITS_SUB = 5
+_MITAD = 1 << (BITS_SUB - 1)
+_CUBETAS = 64 * _MITAD
+
+
+def _indice(valor):
+    if valor < (1 << BITS_SUB):
+        return valor
+    e = valor.bit_length() - BITS_SUB
+    return e * _MITAD + (valor >> e)
+
+
+def _valor_de(indice):
+    """Límite inferior de la cubeta 'indice'."""
+    if indice < (1 << BITS_SUB):
+        return indice
+    e = indice // _MITAD - 1
+    return (indice - e * _MITAD) << e
+
+
+class Histograma:
+    """
+    Histograma de duraciones en nanosegundos con cubetas logarítmicas.
+
+    observar() no toma candados: si dos hilos escriben a la vez en la misma
+    cubeta se puede perder una cuenta, lo cual no mueve los percentiles.
+    """
+
+    def __init__(self, nombre, ayuda, etiquetas=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas or {}
+        self.cuentas = [0] * _CUBETAS
+        self.total = 0
+        self.suma = 0
+        self.maximo = 0
+
+    def observar_ns(self, ns):
+        if ns < 0:
+            ns = 0
+        self.cuentas[_indice(ns)] += 1
+        self.total += 1
+        self.suma += ns
+        if ns > self.maximo:
+            self.maximo = ns
+
+    def percentil(self, p):
+        """Valor (ns) por debajo del cual cae el p% de las observaciones."""
+        if self.total == 0:
+            return 0
+        objetivo = max(1, int(self.total * p / 100.0 + 0.5))
+        acumulado = 0
+        for i, cuenta in enumerate(self.cuentas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                # Punto medio de la cubeta (nunca más que el máximo visto)
+                return min((_valor_de(i) + _valor_de(i + 1)) // 2, self.maximo)
+        return self.maximo
+
+    def reiniciar(self):
+        self.cuentas = [0] * _CUBETAS
+        self.total = self.suma = self.maximo = 0
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas or {}
+        self.valor = 0
+
+
+class Medidor:
+    """Valor que se calcula al exportar (ej. cajones libres)."""
+
+    def __init__(self, nombre, ayuda, funcion, etiquetas=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.etiquetas = etiquetas or {}
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _obtener(self, clase, nombre, ayuda, etiquetas, *args):
+        clave = (nombre, tuple(sorted((etiquetas or {}).items())))
+        metrica = self._metricas.get(clave)
+        if metrica is None:
+            with self._lock:
+                metrica = self._metricas.get(clave)
+                if metrica is None:
+                    metrica = clase(nombre, ayuda, *args, etiquetas=etiquetas)
+                    self._metricas[clave] = metrica
+        return metrica
+
+    def histograma(self, nombre, ayuda, etiquetas=None):
+        return self._obtener(Histograma, nombre, ayuda, etiquetas)
+
+    def contador(self, nombre, ayuda, etiquetas=None):
+        return self._obtener(Contador, nombre, ayuda, etiquetas)
+
+    def medidor(self, nombre, ayuda, funcion, etiquetas=None):
+        return self._obtener(Medidor, nombre, ayuda, etiquetas, funcion)
+
+    def texto_prometheus(self):
+        """Todas las métricas en el formato de texto de Prometheus (0.0.4)."""
+        with self._lock: # Otro hilo puede estar registrando una métrica nueva
+            elementos = list(self._metricas.items())
+        lineas = []
+        vistos = set()
+        for (nombre, _), m in sorted(elementos, key=lambda x: x[0]):
+            etiquetas = _etiquetas(m.etiquetas)
+            if isinstance(m, Histograma):
+                if nombre not in vistos:
+                    lineas.append(f"# HELP {nombre} {m.ayuda}")
+                    lineas.append(f"# TYPE {nombre} summary")
+                for q, p in (("0.5", 50), ("0.99", 99), ("1", 100)):
+                    valor = m.percentil(p) / 1e9
+                    lineas.append(f"{nombre}{_etiquetas(m.etiquetas, quantile=q)} {valor:.9f}")
+                lineas.append(f"{nombre}_sum{etiquetas} {m.suma / 1e9:.9f}")
+                lineas.append(f"{nombre}_count{etiquetas} {m.total}")
+            elif isinstance(m, Contador):
+                if nombre not in vistos:
+                    lineas.append(f"# HELP {nombre} {m.ayuda}")
+                    lineas.append(f"# TYPE {nombre} counter")
+                lineas.append(f"{nombre}{etiquetas} {m.valor}")
+            else:
+                if nombre not in vistos:
+                    lineas.append(f"# HELP {nombre} {m.ayuda}")
+                    lineas.append(f"# TYPE {nombre} gauge")
+                try:
+                    lineas.append(f"{nombre}{etiquetas} {float(m.funcion())}")
+                except Exception:
+                    continue
+            vistos.add(nombre)
+        return "\n".join(lineas) + "\n"
+
+    def resumen(self):
+        """Una línea por histograma con p50 / p99 / máx (ms)."""
+        with self._lock:
+            elementos = list(self._metricas.items())
+        lineas = []
+        for (nombre, _), m in sorted(elementos, key=lambda x: x[0]):
+            if isinstance(m, Histograma) and m.total:
+                lineas.append(f"[Métricas] {nombre}{_etiquetas(m.etiquetas)}: n={m.total} "
+                              f"p50={m.percentil(50) / 1e6:.3f} ms p99={m.percentil(99) / 1e6:.3f} ms "
+                              f"máx={m.maximo / 1e6:.3f} ms")
+        return lineas
+
+
+def _etiquetas(etiquetas, **extra):
+    todas = dict(etiquetas, **extra)
+    if not todas:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(todas.items())) + "}"
+
+
+REGISTRO = Registro()
+histograma = REGISTRO.histograma
+contador = REGISTRO.contador
+medidor = REGISTRO.medidor
+
+
+# --- API del camino caliente ---
+
+def inicio():
+    return time.perf_counter_ns() if ACTIVAS else 0
+
+
+def observar(histograma, t0):
+    """Registra el tiempo desde 't0' (de inicio()). No hace nada si t0 == 0."""
+    if t0:
+        histograma.observar_ns(time.perf_counter_ns() - t0)
+
+
+def observar_segundos(histograma, segundos):
+    if ACTIVAS:
+        histograma.observar_ns(int(segundos * 1e9))
+
+
+def contar(contador, n=1):
+    if ACTIVAS:
+        contador.valor += n
+
+
+def activar():
+    global ACTIVAS
+    ACTIVAS = True
+
+
+def desactivar():
+    global ACTIVAS
+    ACTIVAS = False
+
+
+# --- Exportación por HTTP ---
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        cuerpo = REGISTRO.texto_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass # Sin una línea por cada scrape
+
+
+class ServidorDeMetricas:
+    """Sirve GET /metrics desde un hilo propio (daemon)."""
+
+    def __init__(self, puerto=9108, direccion="0.0.0.0"):
+        self.servidor = ThreadingHTTPServer((direccion, puerto), _ManejadorMetricas)
+        self.servidor.daemon_threads = True
+        self.puerto = self.servidor.server_address[1]
+        self._hilo = threading.Thread(target=self.servidor.serve_forever, name="metricas", daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+        print(f"[Métricas] Exportando en http://localhost:{self.puerto}/metrics")
+
+    def detener(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
@@ -0,0 +1,85 @@
+try:
+    import numpy as np
+except ImportError: # numpy es opcional: solo lo necesita este motor
+    np = None
+
+from estado_ocupacion import LIBRE, NOMBRES_ESTADO
+
+
+class MotorDeOcupacion:
+    """
+    Histéresis vectorizada (NumPy) para muchos cajones a la vez.
+
+    Guarda offsets, factores de escala (los FACTOR_CELDA_*), umbrales y
+    estados en arreglos. Cada 'tick' evalúa todos los cajones con una sola
+    operación por arreglo y devuelve solo los índices que cambiaron.
+    Los arreglos de trabajo se reservan una vez: un tick no crea memoria
+    nueva salvo el arreglo de índices que devuelve.
+    """
+
+    def __init__(self, factores, offsets=None, umbral_ocupar=35.0, umbral_liberar=25.0):
+        """
+        factores:  factor de escala de cada cajón.
+        offsets:   tara cruda de cada cajón (None = ceros).
+        umbral_*:  un número para todos los cajones o un arreglo por cajón.
+        """
+        if np is None:
+            raise ImportError("MotorDeOcupacion necesita numpy (pip install numpy).")
+
+        self.factores = np.array(factores, dtype=np.float64)
+        n = len(self.factores)
+        self.offsets = np.zeros(n) if offsets is None else np.array(offsets, dtype=np.float64)
+        self.umbral_ocupar = np.broadcast_to(np.asarray(umbral_ocupar, dtype=np.float64), (n,)).copy()
+        self.umbral_liberar = np.broadcast_to(np.asarray(umbral_liberar, dtype=np.float64), (n,)).copy()
+        self.estados = np.zeros(n, dtype=np.uint8) # Todos LIBRE al inicio
+
+        # Factor 0 = celda sin calibrar: su peso siempre es 0
+        self._inv_factores = np.zeros(n)
+        np.divide(1.0, self.factores, out=self._inv_factores, where=self.factores != 0)
+
+        # Arreglos de trabajo
+        self.pesos = np.zeros(n)
+        self._libres = np.zeros(n, dtype=bool)
+        self._ocupar = np.zeros(n, dtype=bool)
+        self._liberar = np.zeros(n, dtype=bool)
+
+    def __len__(self):
+        return len(self.estados)
+
+    def pesos_desde_crudas(self, crudas):
+        """
+        Convierte lecturas crudas a gramos con la misma regla que
+        CeldaDeCarga.obtener_peso(): abs() y cero por debajo de medio gramo.
+        """
+        np.subtract(crudas, self.offsets, out=self.pesos)
+        np.multiply(self.pesos, self._inv_factores, out=self.pesos)
+        np.abs(self.pesos, out=self.pesos)
+        np.less(self.pesos, 0.5, out=self._ocupar)
+        np.copyto(self.pesos, 0.0, where=self._ocupar)
+        return self.pesos
+
+    def actualizar_crudas(self, crudas):
+        """Tick a partir de lecturas crudas (una por cajón)."""
+        return self.actualizar_pesos(self.pesos_desde_crudas(crudas))
+
+    def actualizar_pesos(self, pesos):
+        """
+        Tick a partir de pesos en gramos (uno por cajón).
+        Devuelve los índices de los cajones que cambiaron de estado.
+        """
+        np.equal(self.estados, LIBRE, out=self._libres)
+        np.greater(pesos, self.umbral_ocupar, out=self._ocupar)
+        np.logical_and(self._ocupar, self._libres, out=self._ocupar)
+        np.less(pesos, self.umbral_liberar, out=self._liberar)
+        np.logical_and(self._liberar, self.estados, out=self._liberar) # estados != 0 = OCUPADO
+
+        np.logical_or(self._ocupar, self._liberar, out=self._ocupar)
+        cambios = np.flatnonzero(self._ocupar)
+        self.estados[cambios] ^= 1
+        return cambios
+
+    def estado(self, i):
+        return NOMBRES_ESTADO[self.estados[i]]
+
+    def libres(self):
+        return int(len(self.estados) - np.count_nonzero(self.estados))
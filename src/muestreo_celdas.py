@@ -0,0 +1,117 @@
+import time
+import threading
+
+
+class MotorDeMuestreo:
+    """
+    Motor de muestreo concurrente para las celdas de carga.
+
+    En lugar de visitar las celdas una por una (round-robin), cada celda
+    se lee en su propio 'carril'. Por defecto hay un hilo por celda; si se
+    indica 'num_hilos', las celdas se reparten en un pool de ese tamaño.
+
+    Cada celda tiene su propio candado, así que la lectura de una celda
+    nunca detiene a otra (ni al servo / NFC, que ya no comparten candado
+    con el HX711).
+    """
+
+    def __init__(self, celdas, al_leer, num_hilos=None, pausa=0.0, candados=None, planificador=None):
+        """
+        celdas:    lista de objetos con 'obtener_peso()' (ej. CeldaDeCarga).
+        al_leer:   función al_leer(indice, peso) que se llama tras cada lectura.
+                   Se ejecuta dentro del hilo del carril.
+        num_hilos: None = un hilo por celda. Un entero = tamaño del pool.
+        pausa:     segundos de espera entre vueltas de cada carril.
+        candados:  un candado por celda (ej. de GestorDeRecursos). None = se
+                   crea un threading.Lock por celda.
+        planificador: PlanificadorDeMuestreo. Si se da, cada carril lee la
+                   celda que le toca según el plan (y duerme si ninguna
+                   toca) en vez de leerlas todas sin parar; 'pausa' no se usa.
+        """
+        self.celdas = list(celdas)
+        self.al_leer = al_leer
+        self.pausa = pausa
+
+        if num_hilos is None or num_hilos >= len(self.celdas):
+            num_hilos = len(self.celdas)
+        self.num_hilos = max(1, num_hilos)
+
+        # Un candado por celda (cada celda es dueña de sus líneas lgpio)
+        self.candados = list(candados) if candados is not None else [threading.Lock() for _ in self.celdas]
+        # Contador de lecturas completadas por celda (para medir refresco)
+        self.lecturas = [0] * len(self.celdas)
+
+        self.planificador = planificador
+
+        self._activo = threading.Event()
+        self._hilos = []
+
+    def _carriles(self):
+        """Reparte los índices de celda entre los hilos del pool."""
+        return [list(range(n, len(self.celdas), self.num_hilos))
+                for n in range(self.num_hilos)]
+
+    def _leer(self, i):
+        """Lee la celda 'i' con su candado y avisa. Devuelve el peso (o None)."""
+        try:
+            with self.candados[i]:
+                peso = self.celdas[i].obtener_peso()
+            self.lecturas[i] += 1
+            self.al_leer(i, peso)
+            return peso
+        except Exception as e:
+            if self._activo.is_set():
+                print(f"[Error Muestreo] Celda {i+1}: {e}")
+                time.sleep(1)
+            return None
+
+    def _bucle_carril(self, indices):
+        while self._activo.is_set():
+            for i in indices:
+                if not self._activo.is_set():
+                    break
+                self._leer(i)
+            if self.pausa:
+                time.sleep(self.pausa)
+
+    def _bucle_planificado(self, indices):
+        plan = self.planificador
+        while self._activo.is_set():
+            i, falta = plan.siguiente(indices)
+            if falta > 0:
+                plan.esperar(falta)
+                continue
+            peso = self._leer(i)
+            if peso is not None:
+                plan.registrar(i, peso, getattr(self.celdas[i], 'peso_instantaneo', None))
+
+    def iniciar(self):
+        """Arranca un hilo (daemon) por carril."""
+        if self._activo.is_set():
+            return
+        self._activo.set()
+        self._hilos = []
+        for n, indices in enumerate(self._carriles()):
+            if not indices:
+                continue
+            hilo = threading.Thread(
+                target=self._bucle_planificado if self.planificador else self._bucle_carril,
+                args=(indices,),
+                name=f"muestreo-{n}",
+                daemon=True
+            )
+            hilo.start()
+            self._hilos.append(hilo)
+        print(f"[Muestreo] {len(self.celdas)} celdas en {len(self._hilos)} carriles.")
+
+    def detener(self, timeout=None):
+        """Detiene los carriles y espera a que terminen su lectura actual."""
+        self._activo.clear()
+        if self.planificador:
+            self.planificador.despertar()
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        self._hilos = []
+
+    def esta_activo(self):
+        return self._activo.is_set()
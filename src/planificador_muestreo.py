@@ -0,0 +1,136 @@
+import threading
+
+
+class PlanificadorDeMuestreo:
+    """
+    Decide cada cuánto leer cada cajón, en vez de leerlos todos igual.
+
+    Cada cajón tiene una 'urgencia' entre 0 y 1, la mayor de:
+
+      * varianza:  desviación reciente del peso (EMA), relativa a 'ruido'
+      * banda:     cercanía del peso a la zona entre UMBRAL_PARA_LIBERAR y
+                   UMBRAL_PARA_OCUPAR (dentro de la zona = 1), o que el
+                   peso filtrado y el de la última muestra queden de lados
+                   distintos de la zona (el filtro aún no muestra el cambio)
+      * cambio:    tiempo desde su último cambio LIBRE <-> OCUPADO
+      * impulso:   la barrera se abrió hace poco (impulsar())
+
+    y su periodo va de periodo_max (urgencia 0, un coche estacionado hace
+    horas) a periodo_min (urgencia 1) en escala logarítmica. Los tiempos
+    son del reloj del backend.
+
+    MotorDeMuestreo lo usa así: siguiente() da el cajón que toca (y cuánto
+    falta), registrar() recalcula su periodo tras cada lectura y esperar()
+    duerme hasta entonces (impulsar() despierta a los que esperan).
+    """
+
+    def __init__(self, n, backend, umbral_ocupar, umbral_liberar, periodo_min=0.1,
+                 periodo_max=2.0, ruido=5.0, margen=15.0, reciente=30.0, alfa=0.3,
+                 urgencia_impulso=0.7):
+        self.backend = backend
+        self.umbral_ocupar = umbral_ocupar
+        self.umbral_liberar = umbral_liberar
+        self.periodo_min = periodo_min
+        self.periodo_max = periodo_max
+        self.ruido = ruido       # Gramos de desviación que ya cuentan como urgencia 1
+        self.margen = margen     # Gramos fuera de la zona de histéresis con urgencia > 0
+        self.reciente = reciente # Segundos tras un cambio con urgencia > 0
+        self.alfa = alfa
+        self.urgencia_impulso = urgencia_impulso # Urgencia mínima de un cajón impulsado
+
+        ahora = backend.ahora()
+        self.proxima = [ahora] * n   # Cuándo toca leer cada cajón
+        self.urgencia = [1.0] * n    # Al arrancar todos se leen rápido
+        self._media = [None] * n
+        self._varianza = [0.0] * n
+        self._ultimo_cambio = [ahora] * n
+        self._impulso_hasta = [0.0] * n
+        self.lecturas = 0
+
+        self._cond = threading.Condition()
+
+    # --- Urgencia ---
+
+    def _distancia_a_banda(self, peso):
+        if self.umbral_liberar <= peso <= self.umbral_ocupar:
+            return 0.0
+        return min(abs(peso - self.umbral_liberar), abs(peso - self.umbral_ocupar))
+
+    def _urgencia(self, i, peso, ahora, instantaneo=None):
+        # Varianza: EMA de media y varianza del peso (de la muestra sin
+        # filtrar si se tiene: el filtro esconde justo los cambios)
+        muestra = peso if instantaneo is None else instantaneo
+        media = self._media[i]
+        if media is None:
+            self._media[i] = muestra
+            desviacion = 0.0
+        else:
+            diferencia = muestra - media
+            incremento = self.alfa * diferencia
+            self._media[i] = media + incremento
+            self._varianza[i] = (1 - self.alfa) * (self._varianza[i] + diferencia * incremento)
+            desviacion = self._varianza[i] ** 0.5
+        u_varianza = min(1.0, desviacion / self.ruido)
+
+        # Banda: distancia a la zona de histéresis
+        distancia = self._distancia_a_banda(peso)
+        if instantaneo is not None:
+            if (instantaneo > self.umbral_ocupar) != (peso > self.umbral_ocupar):
+                distancia = 0.0 # La muestra cruzó la zona y el filtro todavía no
+            else:
+                distancia = min(distancia, self._distancia_a_banda(instantaneo))
+        u_banda = max(0.0, 1.0 - distancia / self.margen)
+
+        u_cambio = max(0.0, 1.0 - (ahora - self._ultimo_cambio[i]) / self.reciente)
+        u_impulso = self.urgencia_impulso if ahora < self._impulso_hasta[i] else 0.0
+        return max(u_varianza, u_banda, u_cambio, u_impulso)
+
+    def periodo(self, urgencia):
+        return self.periodo_max * (self.periodo_min / self.periodo_max) ** urgencia
+
+    # --- API del motor ---
+
+    def registrar(self, i, peso, instantaneo=None):
+        """
+        Tras leer el cajón 'i': recalcula su urgencia y su próxima lectura.
+        instantaneo: peso de la última muestra sin filtrar (si hay filtro).
+        """
+        ahora = self.backend.ahora()
+        self.lecturas += 1
+        self.urgencia[i] = self._urgencia(i, peso, ahora, instantaneo)
+        self.proxima[i] = ahora + self.periodo(self.urgencia[i])
+
+    def siguiente(self, indices):
+        """(cajón de 'indices' que toca antes, segundos que faltan para leerlo)."""
+        i = min(indices, key=self.proxima.__getitem__)
+        return i, self.proxima[i] - self.backend.ahora()
+
+    def esperar(self, segundos):
+        """Duerme hasta 'segundos' del backend o hasta un impulso/despertar()."""
+        with self._cond:
+            self._cond.wait(self.backend.segundos_reales(segundos))
+
+    def despertar(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    # --- Eventos ---
+
+    def marcar_cambio(self, i):
+        """El cajón 'i' cambió LIBRE <-> OCUPADO."""
+        self._ultimo_cambio[i] = self.backend.ahora()
+
+    def impulsar(self, indices=None, duracion=20.0):
+        """
+        Lee rápido los cajones 'indices' (None = todos) durante 'duracion'
+        segundos; ej. al abrir la barrera, un coche va hacia ellos.
+        """
+        ahora = self.backend.ahora()
+        for i in (range(len(self.proxima)) if indices is None else indices):
+            self._impulso_hasta[i] = ahora + duracion
+            self.proxima[i] = min(self.proxima[i], ahora)
+        self.despertar()
+
+    def lecturas_por_segundo(self):
+        """Lecturas/s que pide el plan actual (suma de 1/periodo)."""
+        return sum(1.0 / self.periodo(u) for u in self.urgencia)
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+import metricas
+
+C_REPETIDOS = metricas.contador("parkpi_nfc_lecturas_repetidas_total",
+                                "Lecturas de una tarjeta que seguía en el lector (no se procesan)")
+
+
+class PresenciaDeTarjetas:
+    """
+    Recuerda qué tarjetas siguen sobre el lector, para procesar cada toque
+    una sola vez sin dormir después de cada tarjeta.
+
+    Cada UID leído se guarda con la hora en que se vio por última vez. Una
+    lectura es un toque NUEVO si ese UID no se vio en los últimos 'ttl'
+    segundos; si se vio, solo se renueva (una tarjeta que se deja encima
+    del lector se procesa una vez, y otra vez solo si se retira al menos
+    'ttl' segundos). Una tarjeta distinta se procesa en la misma vuelta.
+
+    'ttl' debe ser mayor que el tiempo entre dos lecturas de una tarjeta
+    que sigue encima (incluidas las que el PN532 pierde de vez en cuando).
+    A lo más 'capacidad' UIDs: al pasarse se olvida el visto hace más
+    tiempo. Los tiempos son del reloj del backend.
+    """
+
+    def __init__(self, backend, ttl=1.0, capacidad=32):
+        self.backend = backend
+        self.ttl = ttl
+        self.capacidad = capacidad
+        self._vistas = OrderedDict() # uid (bytes) -> última vez que se leyó
+        self.toques = 0
+        self.repetidas = 0
+
+    def _olvidar_vencidas(self, ahora):
+        # Ordenadas de la vista hace más tiempo a la más reciente
+        while self._vistas:
+            uid, visto = next(iter(self._vistas.items()))
+            if ahora - visto < self.ttl:
+                break
+            del self._vistas[uid]
+
+    def nueva(self, uid):
+        """
+        Registra una lectura del lector. Devuelve True si es un toque nuevo
+        (hay que procesarlo) o False si la tarjeta ya estaba presente.
+        """
+        ahora = self.backend.ahora()
+        self._olvidar_vencidas(ahora)
+        uid = bytes(uid)
+        presente = uid in self._vistas
+        self._vistas[uid] = ahora
+        self._vistas.move_to_end(uid)
+        if len(self._vistas) > self.capacidad:
+            self._vistas.popitem(last=False)
+        if presente:
+            self.repetidas += 1
+            metricas.contar(C_REPETIDOS)
+            return False
+        self.toques += 1
+        return True
+
+    def presentes(self):
+        """UIDs (bytes) vistos en los últimos 'ttl' segundos."""
+        self._olvidar_vencidas(self.backend.ahora())
+        return list(self._vistas)
@@ -0,0 +1,134 @@
+import threading
+import time
+import metricas
+
+# --- Prioridades al pedir un dispositivo (menor número = primero) ---
+PRIORIDAD_ALTA = 0   # La barrera: un conductor autorizado está esperando
+PRIORIDAD_NORMAL = 1 # LEDs, celdas, limpieza
+
+
+class CandadoDeDispositivo:
+    """
+    Candado de un solo dispositivo físico (un par DT/SCK, un LED, el servo).
+
+    * Si hay varios esperando, entra primero el de menor prioridad
+      (y dentro de una prioridad, el que llegó antes).
+    * Mide cuánto esperó cada adquisición: usos, con_espera (los que lo
+      encontraron ocupado), espera_total y espera_max (en segundos reales),
+      y el histograma parkpi_espera_candado_segundos{dispositivo=...}.
+
+    'with candado:' usa PRIORIDAD_NORMAL; 'with candado.prioritario():'
+    usa PRIORIDAD_ALTA.
+    """
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self._cond = threading.Condition(threading.Lock())
+        self._ocupado = False
+        self._turnos = [] # (prioridad, orden) de los que esperan, ordenado
+        self._orden = 0
+
+        self._h_espera = metricas.histograma("parkpi_espera_candado_segundos",
+                                             "Espera para tomar el candado de un dispositivo",
+                                             {'dispositivo': nombre})
+        self.usos = 0
+        self.con_espera = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def adquirir(self, prioridad=PRIORIDAD_NORMAL):
+        with self._cond:
+            if not self._ocupado and not self._turnos:
+                # Camino rápido: libre y sin fila
+                self._ocupado = True
+                self.usos += 1
+                metricas.observar_segundos(self._h_espera, 0.0)
+                return
+            t0 = time.perf_counter()
+            turno = (prioridad, self._orden)
+            self._orden += 1
+            self._turnos.append(turno)
+            self._turnos.sort()
+            while self._ocupado or self._turnos[0] != turno:
+                self._cond.wait()
+            self._turnos.pop(0)
+            self._ocupado = True
+            espera = time.perf_counter() - t0
+            self.usos += 1
+            self.con_espera += 1
+            self.espera_total += espera
+            if espera > self.espera_max:
+                self.espera_max = espera
+            metricas.observar_segundos(self._h_espera, espera)
+
+    def liberar(self):
+        with self._cond:
+            self._ocupado = False
+            if self._turnos:
+                self._cond.notify_all()
+
+    def __enter__(self):
+        self.adquirir()
+        return self
+
+    def __exit__(self, *args):
+        self.liberar()
+
+    def prioritario(self):
+        """Vista del candado que se adquiere con PRIORIDAD_ALTA."""
+        return _VistaConPrioridad(self, PRIORIDAD_ALTA)
+
+    def estadisticas(self):
+        return {
+            'usos': self.usos,
+            'con_espera': self.con_espera,
+            'espera_media': self.espera_total / self.usos if self.usos else 0.0,
+            'espera_max': self.espera_max,
+        }
+
+
+class _VistaConPrioridad:
+    def __init__(self, candado, prioridad):
+        self.candado = candado
+        self.prioridad = prioridad
+
+    def __enter__(self):
+        self.candado.adquirir(self.prioridad)
+        return self.candado
+
+    def __exit__(self, *args):
+        self.candado.liberar()
+
+
+class GestorDeRecursos:
+    """
+    Reemplaza al gpio_lock global: un CandadoDeDispositivo por dispositivo,
+    creado la primera vez que se pide por nombre ('servo', 'led1',
+    'hx711:17/27', ...). Así una lectura de peso solo compite con otras
+    lecturas de la misma celda, nunca con el servo.
+    """
+
+    def __init__(self):
+        self._candados = {}
+        self._lock = threading.Lock()
+
+    def candado(self, nombre):
+        candado = self._candados.get(nombre)
+        if candado is None:
+            with self._lock:
+                candado = self._candados.setdefault(nombre, CandadoDeDispositivo(nombre))
+        return candado
+
+    def candado_celda(self, celda):
+        return self.candado(f"hx711:{celda.pin_dt}/{celda.pin_sck}")
+
+    def estadisticas(self):
+        return {nombre: c.estadisticas() for nombre, c in sorted(self._candados.items())}
+
+    def reporte(self):
+        """Una línea por dispositivo con su espera media y máxima (ms)."""
+        lineas = []
+        for nombre, e in self.estadisticas().items():
+            lineas.append(f"[Recursos] {nombre}: {e['usos']} usos, {e['con_espera']} con espera, "
+                          f"media {e['espera_media'] * 1000:.3f} ms, máx {e['espera_max'] * 1000:.3f} ms")
+        return lineas
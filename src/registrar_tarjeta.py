@@ -1,44 +1,175 @@
+import os
+import csv
 import time
-import board
-import busio
 import sys
-from adafruit_pn532.i2c import PN532_I2C
+from hardware import obtener_backend
+from lista_blanca import LARGO_MAXIMO_UID
+from presencia_nfc import PresenciaDeTarjetas
 
 # Nombre del archivo donde se guardarán los UIDs válidos
 UID_FILE = 'valid_uids.txt'
 
-# --- Inicialización del Lector I2C ---
-try:
-    i2c = busio.I2C(board.SCL, board.SDA)
-    pn532 = PN532_I2C(i2c, debug=False) #debug false no imprime inforrmación de debug
+# --- NUEVO (V45): Registro continuo (flotillas) ---
+# En modo 'continuo' cada tarjeta nueva se guarda sin preguntar; se escriben
+# en lotes de LOTE_REGISTRO tarjetas o cada INTERVALO_REGISTRO segundos.
+LOTE_REGISTRO = 50
+INTERVALO_REGISTRO = 5.0
 
-    # --- Comprobar Conexión ---
-    # Lee la versión del firmware para confirmar que se podrá establecer comunicación
-    versiondata = pn532.firmware_version
-    print(f"\n¡Lector PN532 encontrado!")
-    print(f"Versión de Firmware: {versiondata[0]}.{versiondata[1]}")
+USO = """Uso:
+  python3 registrar_tarjeta.py                    registra tarjetas una por una (pregunta s/n)
+  python3 registrar_tarjeta.py continuo           registra sin preguntar cada tarjeta nueva
+  python3 registrar_tarjeta.py importar <archivo> agrega los UIDs de un .txt o .csv
+  python3 registrar_tarjeta.py exportar <archivo> escribe los UIDs en un .txt o .csv
+  python3 registrar_tarjeta.py compactar          quita repetidos y líneas inválidas
+"""
 
-    # Configura el lector para escuchar tarjetas
-    pn532.SAM_configuration()
 
-except Exception as e:
-    print(f"\n[ERROR FATAL] No se pudo inicializar el PN532.")
-    print(f"Detalle: {e}")
-    print("\nPor favor, verifica lo siguiente:")
-    print("  1. Que el PN532 esté correctamente conectado (SCL a SCL, SDA a SDA).")
-    print("  2. Que la interfaz I2C esté habilitada en 'sudo raspi-config'.")
-    sys.exit()
+# --- Archivo de UIDs ---
 
-print("\n--- Registro de Tarjetas NFC ---")
-print(f"Los UIDs válidos se guardarán en: {UID_FILE}")
+def normalizar_uid(texto):
+    """
+    UID en hex minúsculas sin separadores ('04:A2:1B ...' -> '04a21b...'),
+    o None si no es un UID válido (1 a 10 bytes).
+    """
+    limpio = "".join(c for c in texto.strip() if c not in ": -").lower()
+    try:
+        uid = bytes.fromhex(limpio)
+    except ValueError:
+        return None
+    if not 0 < len(uid) <= LARGO_MAXIMO_UID:
+        return None
+    return uid.hex()
+
+
+def leer_uids(ruta):
+    """
+    Lee un archivo de UIDs: texto (un UID por línea) o CSV (columna 'uid' si
+    tiene encabezado; si no, la primera columna).
+    Devuelve (UIDs sin repetir en su orden, repetidos, inválidos).
+    """
+    with open(ruta, 'r', newline='') as f:
+        if ruta.lower().endswith('.csv'):
+            filas = list(csv.reader(f))
+            columna = 0
+            if filas and 'uid' in [c.strip().lower() for c in filas[0]]:
+                columna = [c.strip().lower() for c in filas[0]].index('uid')
+                filas = filas[1:]
+            valores = [fila[columna] if len(fila) > columna else "" for fila in filas]
+        else:
+            valores = f.read().splitlines()
+
+    uids, vistos = [], set()
+    repetidos = invalidos = 0
+    for valor in valores:
+        if not valor.strip():
+            continue
+        uid = normalizar_uid(valor)
+        if uid is None:
+            invalidos += 1
+        elif uid in vistos:
+            repetidos += 1
+        else:
+            vistos.add(uid)
+            uids.append(uid)
+    return uids, repetidos, invalidos
+
+
+def escribir_uids(ruta, uids):
+    """
+    Escribe el archivo completo en un temporal y lo renombra: quien lo lea
+    (Main.py recarga valid_uids.txt en caliente) ve el archivo anterior o
+    el nuevo, nunca uno a medias.
+    """
+    temporal = ruta + ".tmp"
+    with open(temporal, 'w', newline='') as f:
+        if ruta.lower().endswith('.csv'):
+            escritor = csv.writer(f)
+            escritor.writerow(['uid', 'bytes'])
+            for uid in uids:
+                escritor.writerow([uid, len(uid) // 2])
+        else:
+            for uid in uids:
+                f.write(uid + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+class ArchivoDeUIDs:
+    """
+    valid_uids.txt en memoria: un set para saber al instante si una tarjeta
+    ya está, y las nuevas en espera hasta el siguiente guardar().
+    """
+
+    def __init__(self, ruta=UID_FILE):
+        self.ruta = ruta
+        self.uids = []
+        self.repetidos = self.invalidos = 0
+        if os.path.exists(ruta):
+            self.uids, self.repetidos, self.invalidos = leer_uids(ruta)
+        self._conjunto = set(self.uids)
+        self.pendientes = 0
+        self.guardados = 0 # Cuántas veces se reescribió el archivo
+
+    def __len__(self):
+        return len(self.uids)
+
+    def __contains__(self, uid):
+        return uid in self._conjunto
+
+    def agregar(self, uid):
+        """Agrega un UID (hex). Devuelve True si era nuevo."""
+        if uid in self._conjunto:
+            return False
+        self._conjunto.add(uid)
+        self.uids.append(uid)
+        self.pendientes += 1
+        return True
+
+    def guardar(self):
+        escribir_uids(self.ruta, self.uids)
+        self.pendientes = 0
+        self.guardados += 1
+
+
+# --- Lector ---
+
+def iniciar_lector(backend):
+    try:
+        # El backend real crea el bus I2C y el PN532_I2C (sin debug)
+        pn532 = backend.crear_lector_nfc()
+
+        # --- Comprobar Conexión ---
+        # Lee la versión del firmware para confirmar que se podrá establecer comunicación
+        versiondata = pn532.firmware_version
+        print("\n¡Lector PN532 encontrado!")
+        print(f"Versión de Firmware: {versiondata[0]}.{versiondata[1]}")
+
+        # Configura el lector para escuchar tarjetas
+        pn532.SAM_configuration()
+        return pn532
+
+    except Exception as e:
+        print("\n[ERROR FATAL] No se pudo inicializar el PN532.")
+        print(f"Detalle: {e}")
+        print("\nPor favor, verifica lo siguiente:")
+        print("  1. Que el PN532 esté correctamente conectado (SCL a SCL, SDA a SDA).")
+        print("  2. Que la interfaz I2C esté habilitada en 'sudo raspi-config'.")
+        sys.exit()
+
+
+# --- Modos ---
+
+def registrar_interactivo(archivo, pn532):
+    print("\n--- Registro de Tarjetas NFC ---")
+    print(f"Los UIDs válidos se guardarán en: {archivo.ruta} ({len(archivo)} registrados)")
 
-try:
     while True:
-        print(f"\n[ESPERANDO] Acerca una tarjeta para registrarla (Ctrl+C para salir)...")
-        
+        print("\n[ESPERANDO] Acerca una tarjeta para registrarla (Ctrl+C para salir)...")
+
         # El lector espera a que una tarjeta pasiva sea detectada
         uid = pn532.read_passive_target(timeout=10.0)
-        
+
         # Si no se encontró tarjeta, el bucle 'while' simplemente reinicia
         if uid is None:
             continue
@@ -46,38 +177,125 @@ try:
         # --- Tarjeta Encontrada ---
         # El 'uid' es un bytearray que se convierte en decimal para el código
         uid_string = uid.hex()
-        
-        print(f"\n¡Tarjeta detectada!")
+
+        print("\n¡Tarjeta detectada!")
         print(f"  UID (hex): {uid_string}")
         print(f"  UID (len): {len(uid)} bytes")
 
-        # --- Confirmación del Usuario ---
-        respuesta = ""
-        while respuesta not in ['s', 'n']:
-            respuesta = input(f"¿Deseas guardar este UID? (s/n): ").strip().lower()
-
-        # --- Guardado en Archivo ---
-        if respuesta == 's':
-            try:
-                # 'a' significa 'append' (añadir al final del archivo)
-                with open(UID_FILE, 'a') as f:
-                    f.write(uid_string + "\n")
-                print(f"[ÉXITO] UID {uid_string} guardado en {UID_FILE}")
-            except Exception as e:
-                print(f"[ERROR] No se pudo escribir en el archivo: {e}")
+        # --- NUEVO (V45): Sin repetidos ---
+        if uid_string in archivo:
+            print("[INFO] Esta tarjeta ya está registrada.")
         else:
-            print("[INFO] Operación cancelada. UID no guardado.")
+            # --- Confirmación del Usuario ---
+            respuesta = ""
+            while respuesta not in ['s', 'n']:
+                respuesta = input("¿Deseas guardar este UID? (s/n): ").strip().lower()
+
+            # --- Guardado en Archivo ---
+            if respuesta == 's':
+                try:
+                    archivo.agregar(uid_string)
+                    archivo.guardar()
+                    print(f"[ÉXITO] UID {uid_string} guardado en {archivo.ruta}")
+                    # (V41) Main.py recompila valid_uids.idx y toma la tarjeta en caliente
+                    print("[INFO] Si Main.py está corriendo, la tarjeta vale en unos segundos.")
+                except Exception as e:
+                    print(f"[ERROR] No se pudo escribir en el archivo: {e}")
+            else:
+                print("[INFO] Operación cancelada. UID no guardado.")
 
         # --- Esperar a que se retire la tarjeta ---
         # Esto es importante para no volver a leer la misma tarjeta 100 veces.
         print("\n[INFO] Por favor, retira la tarjeta del lector...")
-        
+
         # Espera en un bucle mientras la tarjeta SIGA presente
         while pn532.read_passive_target(timeout=0.1) is not None:
             time.sleep(0.2) # Pequeña pausa para no saturar el bus I2C
-            
+
         print("[INFO] Tarjeta retirada. Listo para la siguiente.")
 
-except KeyboardInterrupt:
-    print("\n\nCerrando el script de registro. ¡Adiós!")
-    sys.exit()
\ No newline at end of file
+
+def registrar_continuo(archivo, pn532, backend):
+    """
+    (VERSIÓN 45) Sin preguntas: cada tarjeta NUEVA se agrega (las repetidas
+    se ignoran al momento) y el archivo se reescribe por lotes. Una tarjeta
+    que se deja en el lector cuenta una vez (PresenciaDeTarjetas).
+    """
+    print("\n--- Registro Continuo de Tarjetas NFC ---")
+    print(f"Archivo: {archivo.ruta} ({len(archivo)} registrados). Se guarda cada "
+          f"{LOTE_REGISTRO} tarjetas nuevas o {INTERVALO_REGISTRO:g} s. Ctrl+C para terminar.")
+    presencia = PresenciaDeTarjetas(backend)
+    nuevas = repetidas = 0
+    primera_pendiente = None
+
+    try:
+        while True:
+            uid = pn532.read_passive_target(timeout=0.2)
+            ahora = backend.ahora()
+            if uid is not None and presencia.nueva(uid):
+                uid_string = uid.hex()
+                if archivo.agregar(uid_string):
+                    nuevas += 1
+                    if primera_pendiente is None:
+                        primera_pendiente = ahora
+                    print(f"[NUEVA] {uid_string}  ({nuevas} nuevas, {len(archivo)} en total)")
+                else:
+                    repetidas += 1
+                    print(f"[REPETIDA] {uid_string} (ya estaba registrada)")
+
+            if archivo.pendientes and (archivo.pendientes >= LOTE_REGISTRO or
+                                       ahora - primera_pendiente >= INTERVALO_REGISTRO):
+                archivo.guardar()
+                primera_pendiente = None
+                print(f"[GUARDADO] {len(archivo)} UIDs en {archivo.ruta}.")
+    finally:
+        if archivo.pendientes:
+            archivo.guardar()
+        print(f"\n[FIN] {nuevas} tarjetas nuevas, {repetidas} repetidas ignoradas; "
+              f"{len(archivo)} UIDs en {archivo.ruta} ({archivo.guardados} escrituras).")
+
+
+def importar(archivo, ruta):
+    uids, repetidos, invalidos = leer_uids(ruta)
+    nuevas = sum(1 for uid in uids if archivo.agregar(uid))
+    if archivo.pendientes:
+        archivo.guardar()
+    print(f"[IMPORTAR] {ruta}: {len(uids)} UIDs, {nuevas} nuevos, {len(uids) - nuevas} ya registrados, "
+          f"{repetidos} repetidos y {invalidos} inválidos en el archivo. Total: {len(archivo)}.")
+
+
+def exportar(archivo, ruta):
+    escribir_uids(ruta, archivo.uids)
+    print(f"[EXPORTAR] {len(archivo)} UIDs escritos en {ruta}.")
+
+
+def compactar(archivo):
+    archivo.guardar()
+    print(f"[COMPACTAR] {archivo.ruta}: {len(archivo)} UIDs; se quitaron {archivo.repetidos} "
+          f"repetidos y {archivo.invalidos} líneas inválidas.")
+
+
+if __name__ == "__main__":
+    modo = sys.argv[1] if len(sys.argv) > 1 else "interactivo"
+    archivo = ArchivoDeUIDs(UID_FILE)
+
+    if modo in ("importar", "exportar"):
+        if len(sys.argv) < 3:
+            print(USO)
+            sys.exit(1)
+        (importar if modo == "importar" else exportar)(archivo, sys.argv[2])
+    elif modo == "compactar":
+        compactar(archivo)
+    elif modo in ("interactivo", "continuo"):
+        backend = obtener_backend()
+        pn532 = iniciar_lector(backend)
+        try:
+            if modo == "continuo":
+                registrar_continuo(archivo, pn532, backend)
+            else:
+                registrar_interactivo(archivo, pn532)
+        except KeyboardInterrupt:
+            print("\n\nCerrando el script de registro. ¡Adiós!")
+    else:
+        print(USO)
+        sys.exit(1)
@@ -0,0 +1,420 @@
+"""
+Repetición de trazas fuera de línea: carga lo que grabó GrabadoraDeMuestras
+(trazas.py) con numpy.memmap y pasa TODAS las muestras por la lógica de
+ocupación (filtro o promedio de 5 + histéresis) con muchas combinaciones de
+parámetros, en paralelo. Un día de muestras con una configuración se
+prueba en menos de un segundo.
+
+Como las trazas no dicen cuándo llegó un coche de verdad, la referencia se
+saca de la misma traza, sin prisa: mediana centrada de VENTANA_REFERENCIA s
+(mira al futuro, cosa que el lote en vivo no puede) + la histéresis por
+defecto, sin estados que duren menos de MINIMO_REFERENCIA s. Para cada
+configuración se reporta:
+
+  * falsas/h:   transiciones sin una de la referencia (misma dirección) a
+                menos de TOLERANCIA s
+  * perdidas:   transiciones de la referencia que la configuración no vio
+  * latencia:   cuánto después de la referencia detecta (mediana y p90;
+                la referencia tiene resolución de PASO_REFERENCIA s, así
+                que puede salir apenas negativa)
+
+El filtro se evalúa vectorizado: mediana móvil exacta, EMA exacta (por
+bloques), y el rechazo de atípicos comparando con la mediana de las
+muestras crudas anteriores (FiltroDePeso la calcula con las ya aceptadas;
+--verificar compara ambos). La deriva del offset no se repite.
+
+Las trazas de varios arranques se ponen en una sola línea de tiempo y cada
+corrida se convierte con el offset y el factor que tenía (celdas.json).
+
+Uso:  python3 repeticion.py [carpeta] [--ocupar 30,35,40] [--liberar 20,25]
+          [--ventana 1,5,9] [--alfa 0.2,0.5,1] [--atipico no,200] [--promedio si]
+          [--escala 1] [--tolerancia 5] [--procesos N] [--top 15] [--verificar si]
+"""
+import os
+import sys
+import time
+import multiprocessing
+from itertools import product
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    np = None
+
+import trazas
+from estado_ocupacion import LIBRE, OCUPADO
+
+VENTANA_REFERENCIA = 2.0 # s
+PASO_REFERENCIA = 0.1    # s
+MINIMO_REFERENCIA = 3.0  # s
+TOLERANCIA = 5.0         # s
+BLOQUE = 1 << 20         # Muestras por bloque en las medianas (memoria acotada)
+POR_DEFECTO = {
+    'ocupar': "30,35,40,50", 'liberar': "15,20,25,30", 'ventana': "1,5,9,25",
+    'alfa': "0.05,0.2,0.5,1", 'atipico': "no,200", 'promedio': "si", 'escala': "1",
+    'tolerancia': str(TOLERANCIA), 'procesos': str(os.cpu_count() or 1), 'top': "15",
+    'verificar': "no",
+}
+
+
+# --- Piezas vectorizadas ---
+
+def recurrencia(u, g, y0=0.0, bloque=64):
+    """
+    y[n] = g*y[n-1] + u[n], con y[-1] = y0 (la EMA es este caso). Por
+    bloques: dentro de cada bloque, una multiplicación de matrices; entre
+    bloques, la misma recurrencia (con g**bloque) sobre los finales.
+    """
+    n = len(u)
+    if n <= bloque:
+        y = np.empty(n)
+        acumulado = y0
+        for i in range(n):
+            acumulado = g * acumulado + u[i]
+            y[i] = acumulado
+        return y
+    filas = -(-n // bloque)
+    U = np.zeros(filas * bloque)
+    U[:n] = u
+    U = U.reshape(filas, bloque)
+    k = np.arange(bloque)
+    diferencia = k[:, None] - k[None, :]
+    T = np.where(diferencia >= 0, g ** np.maximum(diferencia, 0), 0.0)
+    local = U @ T.T # Cada bloque como si empezara de cero
+    finales = recurrencia(local[:, -1], g ** bloque, y0, bloque)
+    arrastre = np.concatenate(([y0], finales[:-1]))
+    return (local + np.outer(arrastre, g ** (k + 1))).ravel()[:n]
+
+
+def ema(x, alfa):
+    """La EMA de FiltroDePeso (arranca en la primera muestra)."""
+    if len(x) == 0 or alfa >= 1.0:
+        return x.copy()
+    return recurrencia(alfa * x, 1.0 - alfa, x[0])
+
+
+def _medianas(ventanas):
+    """Mediana de cada fila (ordenar filas cortas es más rápido que np.median)."""
+    ordenadas = np.sort(ventanas, axis=1)
+    mitad = ventanas.shape[1] // 2
+    if ventanas.shape[1] % 2:
+        return ordenadas[:, mitad]
+    return (ordenadas[:, mitad - 1] + ordenadas[:, mitad]) / 2.0
+
+
+def mediana_movil(x, ventana, centrada=False):
+    """
+    Mediana de las últimas 'ventana' muestras (al inicio, de las que haya,
+    como MedianaMovil). centrada=True: ventana centrada (mira al futuro).
+    """
+    n = len(x)
+    if ventana <= 1 or n == 0:
+        return x.copy()
+    if centrada:
+        mitad = ventana // 2
+        relleno = np.concatenate((np.full(mitad, x[0]), x, np.full(ventana - 1 - mitad, x[-1])))
+    else:
+        relleno = np.concatenate((np.full(ventana - 1, x[0]), x))
+    salida = np.empty(n)
+    for inicio in range(0, n, BLOQUE):
+        ventanas = sliding_window_view(relleno[inicio:inicio + BLOQUE + ventana - 1], ventana)
+        salida[inicio:inicio + len(ventanas)] = _medianas(ventanas)
+    if not centrada:
+        for i in range(min(ventana - 1, n)):
+            salida[i] = np.median(x[:i + 1])
+    return salida
+
+
+def rechazar_atipicos(x, ventana, umbral, max_rechazos=2):
+    """
+    Como FiltroDePeso: una muestra a más de 'umbral' de la mediana anterior
+    se reemplaza por esa mediana, salvo que ya se hayan reemplazado
+    'max_rechazos' seguidas (entonces es un cambio real y se acepta).
+    """
+    referencia = np.empty(len(x))
+    referencia[0] = x[0]
+    referencia[1:] = mediana_movil(x, ventana)[:-1]
+    atipica = np.abs(x - referencia) > umbral
+    atipica[0] = False
+    indices = np.arange(len(x))
+    ultima_normal = np.maximum.accumulate(np.where(atipica, -1, indices))
+    reemplazar = atipica & (indices - ultima_normal <= max_rechazos)
+    return np.where(reemplazar, referencia, x)
+
+
+def mediana_filtrada(crudas, offset, factor, ventana, atipico):
+    """Gramos tras el rechazo de atípicos y la mediana (lo que entra a la EMA)."""
+    gramos = (crudas - offset) / factor if factor else np.zeros(len(crudas))
+    if atipico is not None:
+        gramos = rechazar_atipicos(gramos, ventana, atipico)
+    return mediana_movil(gramos, ventana)
+
+
+def pesos_ema(medianas, alfa):
+    """Misma regla que el promedio: abs() y cero por debajo de medio gramo."""
+    pesos = np.abs(ema(medianas, alfa))
+    pesos[pesos < 0.5] = 0.0
+    return pesos
+
+
+def pesos_filtrados(t, crudas, offset, factor, ventana, alfa, atipico):
+    """Pesos (g) que daría CeldaDeCarga con el filtro por muestra."""
+    return t, pesos_ema(mediana_filtrada(crudas, offset, factor, ventana, atipico), alfa)
+
+
+def pesos_promedio(t, crudas, offset, factor):
+    """Pesos (g) del promedio de 5 lecturas (sin filtro)."""
+    n = len(crudas) // 5 * 5
+    neto = crudas[:n].reshape(-1, 5).mean(axis=1) - offset
+    pesos = np.abs(neto / factor) if factor else np.zeros(len(neto))
+    pesos[pesos < 0.5] = 0.0
+    return t[4:n:5], pesos
+
+
+def transiciones(t, pesos, ocupar, liberar, inicial=LIBRE):
+    """
+    (instantes, estado nuevo) de cada cambio con la histéresis de
+    procesar_lectura. Solo cuentan los pesos que deciden algo (por encima
+    de 'ocupar' o por debajo de 'liberar'): el estado cambia cuando uno
+    decide distinto que el anterior.
+    """
+    decisivos = np.flatnonzero((pesos > ocupar) | (pesos < liberar))
+    if len(decisivos) == 0:
+        return t[:0], np.zeros(0, dtype=np.int8)
+    ocupado = pesos[decisivos] > ocupar
+    cambios = np.flatnonzero(ocupado[1:] != ocupado[:-1]) + 1
+    if ocupado[0] != (inicial == OCUPADO):
+        cambios = np.concatenate(([0], cambios))
+    return t[decisivos[cambios]], ocupado[cambios].astype(np.int8)
+
+
+def referencia(t, crudas, offset, factor, ocupar, liberar):
+    """
+    Transiciones 'verdaderas' (mirando al futuro) y el estado inicial. Se
+    trabaja sobre medianas de PASO_REFERENCIA s: la ventana centrada de
+    VENTANA_REFERENCIA s no necesita cada muestra.
+    """
+    dt = np.median(np.diff(t)) if len(t) > 1 else 1.0
+    paso = max(1, int(round(PASO_REFERENCIA / dt)))
+    n = len(crudas) // paso * paso
+    bloques = _medianas(crudas[:n].reshape(-1, paso))
+    t_bloques = t[paso // 2:n:paso]
+    ventana = max(1, int(round(VENTANA_REFERENCIA / (dt * paso)))) | 1
+    pesos = np.abs(mediana_movil((bloques - offset) / factor, ventana, centrada=True))
+    decide = (pesos > ocupar) | (pesos < liberar)
+    inicial = OCUPADO if decide.any() and pesos[np.argmax(decide)] > ocupar else LIBRE
+    t_cambios, nuevos = transiciones(t_bloques, pesos, ocupar, liberar, inicial)
+    # Estados que duran menos de MINIMO_REFERENCIA s no cuentan (se acomodó el coche)
+    limpias, estado = [], inicial
+    for i, (tc, nuevo) in enumerate(zip(t_cambios, nuevos)):
+        siguiente = t_cambios[i + 1] if i + 1 < len(t_cambios) else t[-1] + MINIMO_REFERENCIA
+        if siguiente - tc < MINIMO_REFERENCIA or nuevo == estado:
+            continue
+        limpias.append((tc, nuevo))
+        estado = nuevo
+    return np.array([tc for tc, _ in limpias]), np.array([e for _, e in limpias], dtype=np.int8), inicial
+
+
+def emparejar(t_cfg, e_cfg, t_ref, e_ref, tolerancia):
+    """Latencias de las transiciones de referencia detectadas y cuántas falsas hubo."""
+    latencias, usadas = [], 0
+    for estado in (LIBRE, OCUPADO):
+        propias = t_cfg[e_cfg == estado]
+        j = 0
+        for tr in t_ref[e_ref == estado]:
+            while j < len(propias) and propias[j] < tr - tolerancia:
+                j += 1
+            if j < len(propias) and propias[j] <= tr + tolerancia:
+                latencias.append(propias[j] - tr)
+                usadas += 1
+                j += 1
+    return latencias, len(t_cfg) - usadas
+
+
+# --- Barrido (en paralelo) ---
+
+_DATOS = {} # Se llena antes de crear el pool (los procesos lo heredan)
+
+
+def evaluar_filtro(clave):
+    """
+    Todas las combinaciones de alfa y umbrales para una mediana (ventana y
+    atípicos) y escala: la mediana, lo caro, se calcula una vez. Una fila
+    por combinación.
+    """
+    base, escala = clave
+    umbrales, tolerancia = _DATOS['umbrales'], _DATOS['tolerancia']
+    filtros = ["promedio"] if base == "promedio" else [(base[0], alfa, base[1]) for alfa in _DATOS['alfas'][base]]
+    resultados = {(f, u): [0, 0, 0, []] for f in filtros for u in umbrales} # transiciones, falsas, perdidas, latencias
+    for celda, (t, crudas, offset, factor, ref) in _DATOS['celdas'].items():
+        if base == "promedio":
+            senales = [("promedio", *pesos_promedio(t, crudas, offset, factor * escala))]
+        else:
+            medianas = mediana_filtrada(crudas, offset, factor * escala, *base)
+            senales = [(f, t, pesos_ema(medianas, f[1])) for f in filtros]
+        t_ref, e_ref, inicial = ref
+        for filtro, tp, pesos in senales:
+            for ocupar, liberar in umbrales:
+                t_cfg, e_cfg = transiciones(tp, pesos, ocupar, liberar, inicial)
+                latencias, falsas = emparejar(t_cfg, e_cfg, t_ref, e_ref, tolerancia)
+                fila = resultados[(filtro, (ocupar, liberar))]
+                fila[0] += len(t_cfg)
+                fila[1] += falsas
+                fila[2] += len(t_ref) - len(latencias)
+                fila[3] += latencias
+    return [(filtro, escala, umbral, *fila) for (filtro, umbral), fila in resultados.items()]
+
+
+def nombre_filtro(filtro):
+    if filtro == "promedio":
+        return "promedio de 5"
+    ventana, alfa, atipico = filtro
+    return f"med {ventana} ema {alfa:g}" + (f" atíp {atipico:g}" if atipico is not None else "")
+
+
+def lista(texto, tipo=float):
+    return [None if v.strip().lower() in ("no", "none") else tipo(v) for v in texto.split(",")]
+
+
+def opciones(argv):
+    """carpeta y --clave valor (como los demás scripts: sin argparse)."""
+    valores = dict(POR_DEFECTO)
+    carpeta = "trazas"
+    i = 0
+    while i < len(argv):
+        if argv[i].startswith("--") and i + 1 < len(argv):
+            clave = argv[i][2:]
+            if clave not in valores:
+                raise SystemExit(f"Opción desconocida: {argv[i]}\n{__doc__}")
+            valores[clave] = argv[i + 1]
+            i += 2
+        else:
+            carpeta = argv[i]
+            i += 1
+    return carpeta, valores
+
+
+def calibracion_de(crudas, descripcion, corrida, celda, factor_por_defecto):
+    """Offset y factor de 'celda' en 'corrida' (sin celdas.json: vacía al empezar)."""
+    info = trazas.celdas_de_corrida(descripcion, corrida).get(celda, {})
+    offset = info.get('offset')
+    if offset is None:
+        offset = float(np.median(crudas[:50]))
+    return offset, info.get('factor') or factor_por_defecto
+
+
+def unificar_calibracion(crudas, corridas, descripcion, celda, factor_por_defecto):
+    """
+    Cada arranque tara de nuevo (y el factor puede cambiar): las crudas de
+    las corridas anteriores se pasan a la calibración de la última, así la
+    misma cuenta (crudas - offset) / factor da sus gramos de entonces.
+    Devuelve (crudas, offset, factor).
+    """
+    ultima = int(corridas[-1])
+    propias = corridas == ultima
+    offset, factor = calibracion_de(crudas[propias], descripcion, ultima, celda, factor_por_defecto)
+    for corrida in np.unique(corridas):
+        if corrida == ultima:
+            continue
+        de_esta = corridas == corrida
+        offset_c, factor_c = calibracion_de(crudas[de_esta], descripcion, int(corrida), celda, factor_por_defecto)
+        if (offset_c, factor_c) != (offset, factor):
+            crudas[de_esta] = (crudas[de_esta] - offset_c) / factor_c * factor + offset
+    return crudas, offset, factor
+
+
+def verificar(datos, filtro):
+    """Compara el filtro vectorizado con FiltroDePeso muestra por muestra."""
+    from filtro_peso import FiltroDePeso
+    ventana, alfa, atipico = filtro
+    for celda, (t, crudas, offset, factor, _) in sorted(datos.items()):
+        n = min(len(crudas), 200000)
+        _, vectorizado = pesos_filtrados(t[:n], crudas[:n], offset, factor, ventana, alfa, atipico)
+        f = FiltroDePeso(ventana_mediana=ventana, alfa_ema=alfa, umbral_atipico=atipico)
+        exacto = np.array([abs(f.agregar((c - offset) / factor)) for c in crudas[:n]])
+        exacto[exacto < 0.5] = 0.0
+        print(f"[Verificar] celda {celda}: {n} muestras, diferencia máxima {np.abs(vectorizado - exacto).max():.4f} g, "
+              f"{np.count_nonzero(np.abs(vectorizado - exacto) > 0.01)} muestras con más de 0.01 g.")
+
+
+def main():
+    if np is None:
+        raise SystemExit("repeticion.py necesita numpy (pip install numpy).")
+    import Main # Umbrales y filtro de la configuración actual
+    carpeta, valores = opciones(sys.argv[1:])
+
+    t0 = time.perf_counter()
+    muestras = trazas.muestras_por_celda(carpeta)
+    if not muestras:
+        raise SystemExit(f"No hay trazas en {carpeta}.")
+    descripcion = trazas.leer_celdas(carpeta)
+    factores = [Main.FACTOR_CELDA_1, Main.FACTOR_CELDA_2, Main.FACTOR_CELDA_3]
+    celdas = {}
+    for celda, (t, crudas, corridas) in muestras.items():
+        crudas, offset, factor = unificar_calibracion(crudas, corridas, descripcion, celda,
+                                                      factores[celda] if celda < len(factores) else 1.0)
+        ref = referencia(t, crudas, offset, factor, Main.UMBRAL_PARA_OCUPAR, Main.UMBRAL_PARA_LIBERAR)
+        celdas[celda] = (t, crudas, offset, factor, ref)
+    t_carga = time.perf_counter() - t0
+    total = sum(len(t) for t, *_ in celdas.values())
+    horas = sum(t[-1] - t[0] for t, *_ in celdas.values()) / 3600 / len(celdas)
+    referencias = sum(len(ref[0]) for *_, ref in celdas.values())
+    print(f"{total} muestras de {len(celdas)} celdas ({horas:.2f} h) cargadas en {t_carga:.2f} s; "
+          f"{referencias} transiciones de referencia.")
+
+    actual = (Main.FILTRO_PESO['ventana_mediana'], Main.FILTRO_PESO['alfa_ema'],
+              Main.FILTRO_PESO['umbral_atipico']) if Main.FILTRO_PESO else "promedio"
+    if valores['verificar'].lower() in ("si", "sí", "1"):
+        verificar(celdas, actual if actual != "promedio" else (5, 0.5, None))
+
+    filtros = list(product(lista(valores['ventana'], int), lista(valores['alfa']), lista(valores['atipico'])))
+    if valores['promedio'].lower() in ("si", "sí", "1"):
+        filtros.append("promedio")
+    if actual not in filtros:
+        filtros.append(actual)
+    umbrales = [(o, l) for o, l in product(lista(valores['ocupar']), lista(valores['liberar'])) if l < o]
+    if (Main.UMBRAL_PARA_OCUPAR, Main.UMBRAL_PARA_LIBERAR) not in umbrales:
+        umbrales.append((Main.UMBRAL_PARA_OCUPAR, Main.UMBRAL_PARA_LIBERAR))
+    alfas = {}
+    for filtro in filtros:
+        if filtro != "promedio":
+            alfas.setdefault((filtro[0], filtro[2]), []).append(filtro[1])
+    claves = list(product(list(alfas) + ["promedio"] * ("promedio" in filtros), lista(valores['escala'])))
+    _DATOS.update(celdas=celdas, umbrales=umbrales, alfas=alfas, tolerancia=float(valores['tolerancia']))
+
+    t0 = time.perf_counter()
+    procesos = max(1, int(valores['procesos']))
+    if procesos > 1 and len(claves) > 1:
+        with multiprocessing.get_context("fork").Pool(procesos) as pool:
+            partes = pool.map(evaluar_filtro, claves)
+    else:
+        partes = [evaluar_filtro(clave) for clave in claves]
+    filas = [fila for parte in partes for fila in parte]
+    t_barrido = time.perf_counter() - t0
+    print(f"{len(filas)} configuraciones ({len(filtros)} filtros x {len(umbrales)} umbrales) en "
+          f"{t_barrido:.2f} s con {procesos} procesos.\n")
+
+    def orden(fila):
+        _, _, _, _, falsas, perdidas, latencias = fila
+        return (falsas + perdidas, np.median(latencias) if latencias else float('inf'))
+
+    filas.sort(key=orden)
+    top = int(valores['top'])
+    print(f"  {'filtro':<26} {'escala':>6} {'ocupar':>6} {'liberar':>7} {'trans.':>6} {'falsas/h':>8} "
+          f"{'perdidas':>8} {'lat. p50 s':>10} {'lat. p90 s':>10}")
+    for k, (filtro, escala, (ocupar, liberar), n, falsas, perdidas, latencias) in enumerate(filas):
+        es_actual = filtro == actual and escala == 1 and (ocupar, liberar) == (Main.UMBRAL_PARA_OCUPAR,
+                                                                                Main.UMBRAL_PARA_LIBERAR)
+        if k >= top and not es_actual:
+            continue
+        p50 = np.percentile(latencias, 50) if latencias else float('nan')
+        p90 = np.percentile(latencias, 90) if latencias else float('nan')
+        print(f"{'*' if es_actual else ' '} {nombre_filtro(filtro):<26} {escala:>6g} {ocupar:>6g} {liberar:>7g} "
+              f"{n:>6} {falsas / horas:>8.2f} {perdidas:>8} {p50:>10.2f} {p90:>10.2f}")
+    print("\n* = configuración actual de Main.py")
+    return filas
+
+
+if __name__ == "__main__":
+    main()
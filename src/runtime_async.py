@@ -0,0 +1,344 @@
+import asyncio
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+from queue import PriorityQueue
+from barrera import CERRADA, ABRIENDO, ABIERTA, CERRANDO, H_SERVO
+from presencia_nfc import PresenciaDeTarjetas
+import metricas
+
+# --- Prioridades (menor número = se atiende primero) ---
+PRIORIDAD_BARRERA = 0
+PRIORIDAD_NFC = 1
+PRIORIDAD_PESO = 2
+PRIORIDAD_LED = 3
+
+
+class EjecutorConPrioridad:
+    """
+    Pool de hilos de tamaño fijo cuya cola de trabajos es una PriorityQueue.
+    Si todos los hilos están ocupados, una lectura NFC pendiente sale antes
+    que las lecturas de peso que ya estaban esperando.
+    """
+
+    def __init__(self, hilos=4):
+        self._cola = PriorityQueue()
+        self._orden = itertools.count() # Desempate: FIFO dentro de una prioridad
+        self._hilos = []
+        for n in range(hilos):
+            hilo = threading.Thread(target=self._trabajar, name=f"ejecutor-{n}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def enviar(self, prioridad, funcion, *args):
+        futuro = Future()
+        self._cola.put((prioridad, next(self._orden), futuro, funcion, args))
+        return futuro
+
+    def _trabajar(self):
+        while True:
+            _, _, futuro, funcion, args = self._cola.get()
+            if futuro is None:
+                return
+            if not futuro.set_running_or_notify_cancel():
+                continue
+            try:
+                futuro.set_result(funcion(*args))
+            except BaseException as e:
+                futuro.set_exception(e)
+
+    def cerrar(self):
+        for _ in self._hilos:
+            self._cola.put((float('inf'), next(self._orden), None, None, None))
+        for hilo in self._hilos:
+            hilo.join()
+
+
+class CarrilEnPool:
+    """
+    Llamadas de un mismo dispositivo que van al pool sin que el loop las
+    espere, en orden y sin solaparse: enviar() las encola y, si no hay ya
+    uno pedido, pide un trabajo que ejecuta todo lo pendiente (bajo
+    'candado', si hay).
+    """
+
+    def __init__(self, runtime, prioridad, nombre, candado=None):
+        self.runtime = runtime
+        self.prioridad = prioridad
+        self.nombre = nombre
+        self.candado = candado
+        self._pendientes = deque()
+        self._pedido = False
+        self._lock = threading.Lock()
+
+    def enviar(self, funcion, *args):
+        with self._lock:
+            self._pendientes.append((funcion, args))
+            if self._pedido:
+                return
+            self._pedido = True
+        self.runtime.ejecutor.enviar(self.prioridad, self._vaciar)
+
+    def _vaciar(self):
+        if self.candado is None:
+            return self._ejecutar_pendientes()
+        with self.candado:
+            self._ejecutar_pendientes()
+
+    def _ejecutar_pendientes(self):
+        while True:
+            with self._lock:
+                if not self._pendientes:
+                    self._pedido = False
+                    return
+                funcion, args = self._pendientes.popleft()
+            try:
+                funcion(*args)
+            except Exception as e:
+                print(f"[Error Runtime] {self.nombre}: {e}")
+
+
+class BarreraAsync:
+    """
+    La misma máquina de estados que ControladorBarrera, pero con temporizadores
+    del event loop (loop.call_later) en lugar de un hilo por barrera.
+    Todos sus métodos se llaman desde el hilo del loop; el servo se mueve en
+    el pool con PRIORIDAD_BARRERA (el loop no espera al candado del servo).
+    """
+
+    def __init__(self, runtime, servo, candado=None, tiempo_abierta=10.0,
+                 tiempo_movimiento=0.3, al_cambiar=None):
+        self.runtime = runtime
+        self.servo = servo
+        self.candado = candado or threading.Lock()
+        self.tiempo_abierta = tiempo_abierta
+        self.tiempo_movimiento = tiempo_movimiento
+        self.al_cambiar = al_cambiar
+
+        self.estado = CERRADA
+        self.aperturas = 0
+        self.extensiones = 0
+        self._temporizador = None
+        self._servo = CarrilEnPool(runtime, PRIORIDAD_BARRERA, "Barrera", self.candado)
+
+    def _programar(self, segundos, funcion):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+        self._temporizador = self.runtime.loop.call_later(
+            self.runtime.backend.segundos_reales(segundos), funcion)
+
+    @staticmethod
+    def _mover(accion):
+        t0 = metricas.inicio()
+        accion()
+        metricas.observar(H_SERVO, t0)
+
+    def _cambiar(self, estado, accion=None):
+        self.estado = estado
+        if accion is not None:
+            self._servo.enviar(self._mover, accion)
+        if self.al_cambiar:
+            self.al_cambiar(estado)
+
+    def solicitar_apertura(self):
+        if self.estado == ABIERTA:
+            self._programar(self.tiempo_abierta, self._cerrar)
+            self.extensiones += 1
+        elif self.estado == ABRIENDO:
+            self.extensiones += 1
+        else:
+            self.aperturas += 1
+            self._cambiar(ABRIENDO, self.servo.mid)
+            self._programar(self.tiempo_movimiento, self._abierta)
+
+    def esta_abierta(self):
+        return self.estado in (ABRIENDO, ABIERTA)
+
+    def _abierta(self):
+        self._cambiar(ABIERTA)
+        self._programar(self.tiempo_abierta, self._cerrar)
+
+    def _cerrar(self):
+        self._cambiar(CERRANDO, self.servo.min)
+        self._programar(self.tiempo_movimiento, self._cerrada)
+
+    def _cerrada(self):
+        self._temporizador = None
+        self._cambiar(CERRADA)
+
+    def detener(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        if self.estado != CERRADA:
+            self._cambiar(CERRANDO, self.servo.min)
+            self._cambiar(CERRADA)
+
+
+class RuntimeAsync:
+    """
+    Runtime opcional de Main.py sobre un solo event loop de asyncio.
+
+    * Las lecturas que bloquean (PN532, HX711 en modo sondeo) van a un
+      EjecutorConPrioridad compartido de tamaño fijo, no a un hilo por
+      dispositivo.
+    * Las celdas en modo eventos se leen sin bloquear directo desde su
+      buffer (obtener_peso_sin_bloquear), sin usar el pool.
+    * Temporizadores y estados de las barreras corren en el loop; el servo
+      (PRIORIDAD_BARRERA) y al_leer, que enciende los LEDs (PRIORIDAD_LED),
+      van al pool, para que un candado ocupado no frene el loop.
+    """
+
+    def __init__(self, backend, hilos=4, periodo_celdas=0.05):
+        self.backend = backend
+        self.hilos = hilos
+        self.periodo_celdas = periodo_celdas
+        self.loop = None
+        self.ejecutor = None
+        self._puertas = []
+        self._grupos_celdas = []
+
+    # --- Configuración ---
+
+    def agregar_puerta(self, sensor_nfc, servo, al_tarjeta, presencia=None, **opciones_barrera):
+        """
+        Registra un lector NFC + barrera. al_tarjeta(uid, barrera) se llama
+        en el loop con cada toque nuevo (el bytearray del lector, sin
+        convertir; ahí se decide el acceso).
+        presencia: PresenciaDeTarjetas que descarta las lecturas de una
+        tarjeta que sigue en el lector (None = una con valores por defecto).
+        Devuelve la BarreraAsync.
+        """
+        if presencia is None:
+            presencia = PresenciaDeTarjetas(self.backend)
+        barrera = BarreraAsync(self, servo, **opciones_barrera)
+        self._puertas.append((sensor_nfc, barrera, al_tarjeta, presencia))
+        return barrera
+
+    def agregar_celdas(self, celdas, al_leer, candados=None, planificador=None):
+        """
+        al_leer(indice, peso) se llama en el pool (PRIORIDAD_LED) con cada
+        peso nuevo; las de una misma celda van en orden y no se solapan.
+        candados: uno por celda (ej. de GestorDeRecursos), para que otra
+        lectura del mismo HX711 (la re-tara) no se cruce con el muestreo.
+        planificador: PlanificadorDeMuestreo; cada celda espera a que le
+        toque según el plan en vez de leerse sin parar.
+        """
+        celdas = list(celdas)
+        candados = list(candados) if candados is not None else [threading.Lock() for _ in celdas]
+        self._grupos_celdas.append((celdas, al_leer, candados, planificador))
+
+    # --- Ejecución ---
+
+    async def dormir(self, segundos):
+        await asyncio.sleep(self.backend.segundos_reales(segundos))
+
+    async def ejecutar(self, prioridad, funcion, *args):
+        """Corre una función que bloquea en el pool, con prioridad."""
+        return await asyncio.wrap_future(self.ejecutor.enviar(prioridad, funcion, *args))
+
+    async def _tarea_nfc(self, sensor_nfc, barrera, al_tarjeta, presencia):
+        if sensor_nfc.usa_irq:
+            return await self._tarea_nfc_irq(sensor_nfc, barrera, al_tarjeta, presencia)
+        while True:
+            try:
+                uid = await self.ejecutar(PRIORIDAD_NFC, sensor_nfc.leer_uid, 0.1)
+                if uid and presencia.nueva(uid):
+                    al_tarjeta(uid, barrera)
+                await self.dormir(0.1)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Error Runtime] NFC: {e}")
+                await self.dormir(1)
+
+    async def _tarea_nfc_irq(self, sensor_nfc, barrera, al_tarjeta, presencia):
+        """
+        Con IRQ: el lector se arma en el pool y la tarea espera el flanco
+        en el loop, sin ocupar un hilo. Cada segundo se revisa el nivel por
+        si se perdió un flanco (leer_uid(0) lee el GPIO, no usa el bus).
+        Un error del lector no termina la tarea: se reintenta tras una pausa.
+        """
+        aviso = asyncio.Event()
+        sensor_nfc.al_detectar(lambda: self.loop.call_soon_threadsafe(aviso.set))
+        while True:
+            try:
+                if not await self.ejecutar(PRIORIDAD_NFC, sensor_nfc.armar):
+                    await self.dormir(0.1) # Sin armar no llega el flanco
+                    continue
+                try:
+                    await asyncio.wait_for(aviso.wait(), self.backend.segundos_reales(1.0))
+                except asyncio.TimeoutError:
+                    pass
+                aviso.clear()
+                uid = await self.ejecutar(PRIORIDAD_NFC, sensor_nfc.leer_uid, 0)
+                if uid:
+                    if presencia.nueva(uid):
+                        al_tarjeta(uid, barrera)
+                    await self.dormir(0.1)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Error Runtime] NFC: {e}")
+                await self.dormir(1)
+
+    @staticmethod
+    def _leer_peso(celda, candado):
+        with candado:
+            return celda.obtener_peso()
+
+    async def _esperar_turno(self, planificador, i):
+        # En pasos de periodo_min, para notar un impulso de la barrera
+        while True:
+            falta = planificador.proxima[i] - self.backend.ahora()
+            if falta <= 0:
+                return
+            await self.dormir(min(falta, planificador.periodo_min))
+
+    async def _tarea_celda(self, i, celda, al_leer, candado, planificador):
+        carril = CarrilEnPool(self, PRIORIDAD_LED, f"Celda {i+1}")
+        while True:
+            try:
+                if celda.muestras is not None:
+                    peso = celda.obtener_peso_sin_bloquear()
+                    if peso is None:
+                        await self.dormir(self.periodo_celdas)
+                        continue
+                else:
+                    peso = await self.ejecutar(PRIORIDAD_PESO, self._leer_peso, celda, candado)
+                carril.enviar(al_leer, i, peso)
+                if planificador is not None:
+                    planificador.registrar(i, peso, celda.peso_instantaneo)
+                    await self._esperar_turno(planificador, i)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Error Runtime] Celda {i+1}: {e}")
+                await self.dormir(1)
+
+    async def _principal(self, corriendo):
+        self.loop = asyncio.get_running_loop()
+        self.ejecutor = EjecutorConPrioridad(self.hilos)
+        tareas = []
+        for sensor_nfc, barrera, al_tarjeta, presencia in self._puertas:
+            tareas.append(asyncio.create_task(self._tarea_nfc(sensor_nfc, barrera, al_tarjeta, presencia)))
+        for celdas, al_leer, candados, planificador in self._grupos_celdas:
+            for i, (celda, candado) in enumerate(zip(celdas, candados)):
+                tareas.append(asyncio.create_task(self._tarea_celda(i, celda, al_leer, candado, planificador)))
+        print(f"[Runtime] asyncio: {len(self._puertas)} puertas, {len(tareas) - len(self._puertas)} celdas, "
+              f"{self.hilos} hilos de E/S.")
+        try:
+            while corriendo.is_set():
+                await asyncio.sleep(0.1)
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+            for _, barrera, _, _ in self._puertas:
+                barrera.detener()
+            await self.loop.run_in_executor(None, self.ejecutor.cerrar)
+
+    def correr(self, corriendo):
+        """Corre el runtime hasta que se limpie el evento 'corriendo'."""
+        asyncio.run(self._principal(corriendo))
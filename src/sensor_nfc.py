@@ -1,8 +1,15 @@
 import time
-import board
-import busio
 import sys
-from adafruit_pn532.i2c import PN532_I2C
+import threading
+from hardware import obtener_backend, FLANCO_BAJADA
+from lista_blanca import ListaBlanca
+import metricas
+
+# --- NUEVO (V35): Métricas ---
+H_LECTURA_NFC = metricas.histograma("parkpi_nfc_lectura_segundos",
+                                    "Duración de esperar_y_leer_uid (incluye el timeout sin tarjeta)")
+H_VALIDACION = metricas.histograma("parkpi_nfc_validacion_segundos", "Duración de es_valido")
+C_TOQUES = metricas.contador("parkpi_toques_total", "Tarjetas leídas por el PN532")
 
 class SensorNFC:
     """
@@ -10,16 +17,26 @@ class SensorNFC:
     y la validación de tarjetas.
     """
     
-    def __init__(self):
+    def __init__(self, backend=None):
         """
-        Inicializa la conexión I2C con el lector PN532.
+        Inicializa la conexión I2C con el lector PN532
+        (a través del backend de hardware).
         """
+        self.backend = backend or obtener_backend()
         self.pn532 = None
         self.valid_uids = set() # Un 'set' para búsquedas rápidas (O(1))
+        # --- NUEVO (V41): Índice binario con mmap (None = usar el set) ---
+        self.lista = None
+        # --- NUEVO (V43): Detección por la línea IRQ (None = consultar) ---
+        self.pin_irq = None
+        self._h_irq = None
+        self._alerta_irq = None
+        self._irq = threading.Event() # Lo activa el flanco de bajada de IRQ
+        self._avisos = []             # Funciones extra a llamar en cada flanco
+        self._armado = False          # Hay un InListPassiveTarget pendiente
 
         try:
-            i2c = busio.I2C(board.SCL, board.SDA)
-            self.pn532 = PN532_I2C(i2c, debug=False)
+            self.pn532 = self.backend.crear_lector_nfc()
 
             # Comprobar la conexión leyendo la versión del firmware
             versiondata = self.pn532.firmware_version
@@ -58,31 +75,175 @@ class SensorNFC:
             print(f"[ERROR] No se pudo leer el archivo de UIDs: {e}")
             return False
 
-    def es_valido(self, uid_string):
+    def cargar_lista_blanca(self, ruta_indice="valid_uids.idx", ruta_texto="valid_uids.txt",
+                            vigilar=True, intervalo=2.0):
         """
-        Comprueba si un UID (string) está en el set de UIDs válidos.
+        (VERSIÓN 41) Carga los UIDs desde el índice binario (lista_blanca.py),
+        recompilándolo desde 'ruta_texto' si el texto es más nuevo. Con
+        vigilar=True, una tarjeta nueva (o un índice nuevo) se toma sin
+        reiniciar la puerta.
         """
-        return uid_string in self.valid_uids
+        if self.pn532 is None:
+            return False
+        lista = ListaBlanca(ruta_indice, ruta_texto)
+        try:
+            lista.cargar()
+        except FileNotFoundError:
+            print(f"[ERROR] No se encontró el archivo de UIDs: {ruta_texto or ruta_indice}")
+            return False
+        except Exception as e:
+            print(f"[ERROR] No se pudo cargar la lista de UIDs: {e}")
+            return False
+        self.lista = lista
+        print(f"[NFC] Se cargaron {len(lista)} UIDs válidos desde {ruta_indice}.")
+        if vigilar:
+            lista.vigilar(intervalo)
+        return True
 
-    def esperar_y_leer_uid(self, timeout=0.5):
+    def es_valido(self, uid):
+        """
+        Comprueba si un UID está en la lista de UIDs válidos.
+        'uid' puede ser el bytearray del lector (sin convertir) o un string hex.
+        """
+        t0 = metricas.inicio()
+        if self.lista is not None:
+            if isinstance(uid, str):
+                uid = bytes.fromhex(uid)
+            valido = self.lista.contiene(uid)
+        else:
+            if not isinstance(uid, str):
+                uid = uid.hex()
+            valido = uid in self.valid_uids
+        metricas.observar(H_VALIDACION, t0)
+        return valido
+
+    # --- NUEVO (V43): Detección por IRQ ---
+
+    def activar_irq(self, pin_irq, chip=0):
+        """
+        (VERSIÓN 43) Usa la línea IRQ del PN532 (activa en bajo) en vez de
+        consultar el lector: se envía InListPassiveTarget una vez y el UID
+        solo se pide cuando la línea baja (alerta de lgpio). Sin tarjeta
+        no hay tráfico en el bus I2C. Devuelve False (y se sigue
+        consultando) si no se pudo reclamar la línea.
+        """
+        if self.pn532 is None:
+            return False
+        try:
+            self._h_irq = self.backend.abrir_chip(chip)
+            self.backend.reclamar_alerta(self._h_irq, pin_irq, FLANCO_BAJADA)
+            self._alerta_irq = self.backend.crear_callback(self._h_irq, pin_irq, FLANCO_BAJADA, self._al_bajar_irq)
+        except Exception as e:
+            print(f"[NFC] No se pudo usar la línea IRQ (GPIO {pin_irq}): {e}. Se consultará el lector.")
+            self._cerrar_irq()
+            return False
+        self.pin_irq = pin_irq
+        print(f"[NFC] Detección por IRQ en GPIO {pin_irq}.")
+        return True
+
+    @property
+    def usa_irq(self):
+        return self.pin_irq is not None
+
+    def _al_bajar_irq(self, nivel, timestamp):
+        # Hilo de alertas del backend: solo avisar
+        self._irq.set()
+        for aviso in self._avisos:
+            aviso()
+
+    def al_detectar(self, funcion):
+        """Llama funcion() (desde el hilo de alertas) en cada flanco de IRQ."""
+        self._avisos.append(funcion)
+
+    def _irq_en_bajo(self):
+        # Leer el nivel es un GPIO, no una transacción I2C
+        return self.backend.leer(self._h_irq, self.pin_irq) == 0
+
+    def armar(self):
+        """Envía InListPassiveTarget si no hay uno pendiente (modo IRQ)."""
+        if self._armado:
+            return True
+        self._irq.clear()
+        try:
+            if not self.pn532.listen_for_passive_target(timeout=0.1):
+                return False # PN532 ocupado: se reintenta en la siguiente llamada
+        except Exception:
+            # Un ACK perdido (RuntimeError) o un error de I2C (OSError):
+            # como en leer_uid, queda sin armar y se reintenta
+            self._armado = False
+            return False
+        # La línea también baja con el ACK (ya leído): ese flanco no cuenta.
+        # Si ya hay una tarjeta, la respuesta puede estar lista desde ahora.
+        self._irq.clear()
+        self._armado = True
+        if self._irq_en_bajo():
+            self._irq.set()
+        return True
+
+    def _leer_uid_irq(self, timeout):
+        if not self.armar():
+            return None
+        # El flanco solo despierta; manda el nivel (así tampoco se pierde
+        # una respuesta si el flanco no llegó o era el del ACK)
+        self.backend.esperar_evento(self._irq, timeout)
+        self._irq.clear()
+        if not self._irq_en_bajo():
+            return None
+        self._armado = False
+        return self.pn532.get_passive_target(timeout=0.1)
+
+    def leer_uid(self, timeout=0.5):
         """
         Intenta leer una tarjeta. No es bloqueante.
-        Devuelve el UID como string si encuentra una, o None si no.
+        Devuelve el UID tal como lo da el lector (bytearray), o None.
+        Con IRQ (activar_irq) espera hasta 'timeout' s a que la línea baje
+        sin usar el bus.
         """
         if self.pn532 is None:
             return None
             
+        t0 = metricas.inicio()
         try:
-            # 'timeout=0.5' significa que solo espera 0.5s
-            uid = self.pn532.read_passive_target(timeout=timeout)
+            if self.usa_irq:
+                uid = self._leer_uid_irq(timeout)
+            else:
+                # 'timeout=0.5' significa que solo espera 0.5s
+                uid = self.pn532.read_passive_target(timeout=timeout)
             
             if uid is None:
                 return None
             
-            # Convertimos el bytearray a string hexadecimal
-            return uid.hex()
+            metricas.contar(C_TOQUES)
+            return uid
             
         except Exception as e:
             # Esto puede pasar si la tarjeta se retira muy rápido
             # print(f"Error de lectura NFC: {e}")
-            return None
\ No newline at end of file
+            self._armado = False
+            return None
+        finally:
+            metricas.observar(H_LECTURA_NFC, t0)
+
+    def esperar_y_leer_uid(self, timeout=0.5):
+        """
+        Como leer_uid(), pero devuelve el UID como string hexadecimal.
+        """
+        uid = self.leer_uid(timeout)
+        return uid.hex() if uid is not None else None
+
+    def _cerrar_irq(self):
+        if self._alerta_irq is not None:
+            self._alerta_irq.cancel()
+            self._alerta_irq = None
+        if self._h_irq is not None:
+            try:
+                self.backend.cerrar_chip(self._h_irq)
+            except Exception:
+                pass
+            self._h_irq = None
+
+    def detener(self):
+        """Detiene la recarga en caliente de la lista y la alerta de IRQ (si hay)."""
+        if self.lista is not None:
+            self.lista.detener()
+        self._cerrar_irq()
\ No newline at end of file
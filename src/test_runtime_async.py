@@ -0,0 +1,84 @@
+"""
+Pruebas del runtime asyncio con el backend simulado (no necesita hardware).
+
+Un error del PN532 al armar el lector (un ACK perdido, un OSError de I2C)
+no debe terminar la tarea NFC: la puerta tiene que seguir leyendo tarjetas.
+
+Uso:  python3 -m pytest -q test_runtime_async.py
+"""
+import io
+import threading
+import contextlib
+from hardware_simulado import BackendSimulado
+from runtime_async import RuntimeAsync
+from sensor_nfc import SensorNFC
+
+UID = "557ddc3e"
+PIN_IRQ = 4
+ESCALA = 10.0
+TOQUE = (2.0, UID, 0.5) # La tarjeta llega a los 2 s simulados
+FIN = 4.0
+
+
+def leer_con_falla(fallar):
+    """Corre una puerta con IRQ; fallar(sensor) inyecta el error. Devuelve los UIDs leídos."""
+    sim = BackendSimulado(semilla=5, escala=ESCALA)
+    sim.programar_toques([TOQUE])
+    leidos = []
+    corriendo = threading.Event()
+    corriendo.set()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sensor = SensorNFC(backend=sim)
+        assert sensor.activar_irq(PIN_IRQ)
+        fallar(sensor)
+        runtime = RuntimeAsync(sim, hilos=2)
+        runtime.agregar_puerta(sensor, sim.crear_servo(18, 0.5/1000, 2.5/1000),
+                               al_tarjeta=lambda uid, barrera: leidos.append(bytes(uid).hex()))
+
+        def vigilar():
+            while sim.ahora() < FIN:
+                sim.dormir(0.1)
+            corriendo.clear()
+        vigia = threading.Thread(target=vigilar, daemon=True)
+        vigia.start()
+        try:
+            runtime.correr(corriendo)
+        finally:
+            vigia.join()
+            sensor.detener()
+    return leidos
+
+
+def test_armar_que_lanza_no_termina_la_tarea():
+    armar = None
+    llamadas = [0]
+
+    def fallar(sensor):
+        nonlocal armar
+        armar = sensor.armar
+        def armar_con_falla():
+            llamadas[0] += 1
+            if llamadas[0] == 1:
+                raise RuntimeError("Did not receive expected ACK from PN532!")
+            return armar()
+        sensor.armar = armar_con_falla
+
+    assert leer_con_falla(fallar) == [UID]
+    assert llamadas[0] > 1
+
+
+def test_error_de_i2c_al_armar_se_reintenta():
+    llamadas = [0]
+
+    def fallar(sensor):
+        escuchar = sensor.pn532.listen_for_passive_target
+        def escuchar_con_falla(*args, **kwargs):
+            llamadas[0] += 1
+            if llamadas[0] == 1:
+                raise OSError(121, "Remote I/O error")
+            return escuchar(*args, **kwargs)
+        sensor.pn532.listen_for_passive_target = escuchar_con_falla
+
+    assert leer_con_falla(fallar) == [UID]
+    assert llamadas[0] > 1
@@ -0,0 +1,310 @@
+import os
+import json
+import mmap
+import time
+import struct
+import threading
+
+try:
+    import numpy as np
+except ImportError: # numpy solo hace falta para leer (repeticion.py)
+    np = None
+
+from hardware import obtener_backend
+
+# --- Formato ---
+# Cada segmento (traza-000001.bin, ...) se crea de 'tamano_segmento' bytes
+# (preasignado) y se escribe por mmap. Encabezado de 64 bytes:
+#   magia, versión, tamaño de registro, registros escritos (se actualiza en
+#   cada muestra), hora de pared y hora monotónica al abrir el segmento y
+#   la corrida (número del primer segmento que abrió esa grabadora: el
+#   reloj monotónico vuelve a empezar en cada arranque de la Pi).
+# Registros de 16 bytes: t monotónico (float64), valor crudo de 24 bits
+# con signo (int32), celda (uint16), relleno. Mismo diseño que DTYPE, así
+# que numpy.memmap los lee sin parsear nada.
+MAGIA = b"PKTRZ1\0\0"
+ENCABEZADO = struct.Struct("<8sIIQddQ16x")
+REGISTRO = struct.Struct("<diH2x")
+CUENTA = struct.Struct("<Q")
+OFFSET_CUENTA = 16
+VERSION = 2 # La 1 no tenía la corrida
+PREFIJO = "traza-"
+EXTENSION = ".bin"
+ARCHIVO_CELDAS = "celdas.json" # Pines, offset y factor de cada celda, por corrida
+
+DTYPE = None if np is None else np.dtype([('t', '<f8'), ('valor', '<i4'), ('celda', '<u2'), ('relleno', '<u2')])
+
+
+def nombre_segmento(numero):
+    return f"{PREFIJO}{numero:06d}{EXTENSION}"
+
+
+def segmentos(carpeta):
+    """(número, ruta) de los segmentos de 'carpeta', del más viejo al más nuevo."""
+    try:
+        nombres = os.listdir(carpeta)
+    except FileNotFoundError:
+        return []
+    encontrados = []
+    for nombre in nombres:
+        if nombre.startswith(PREFIJO) and nombre.endswith(EXTENSION):
+            try:
+                numero = int(nombre[len(PREFIJO):-len(EXTENSION)])
+            except ValueError:
+                continue
+            encontrados.append((numero, os.path.join(carpeta, nombre)))
+    return sorted(encontrados)
+
+
+class GrabadoraDeMuestras:
+    """
+    Graba cada muestra cruda del HX711 (celda, t, valor) en segmentos
+    preasignados y mapeados en memoria.
+
+    * agregar() escribe 16 bytes en el mapa y sube la cuenta del
+      encabezado: sin write() ni buffers de Python por muestra. El kernel
+      baja las páginas a la SD por su cuenta.
+    * Un candado corto reparte los lugares entre los carriles de muestreo.
+    * Al llenarse un segmento se abre el siguiente; se guardan los últimos
+      'segmentos_max' (None = todos).
+    """
+
+    def __init__(self, carpeta, backend=None, tamano_segmento=16 << 20, segmentos_max=64):
+        self.carpeta = carpeta
+        self.backend = backend or obtener_backend()
+        self.capacidad = (tamano_segmento - ENCABEZADO.size) // REGISTRO.size
+        self.tamano_segmento = ENCABEZADO.size + self.capacidad * REGISTRO.size
+        self.segmentos_max = segmentos_max
+
+        self._lock = threading.Lock()
+        self._fd = None
+        self._mapa = None
+        self._numero = 0
+        self._n = 0
+        self._ruta = None
+        self._corrida = None
+
+        self.muestras = 0
+
+    # --- Segmentos ---
+
+    def _abrir_segmento(self):
+        existentes = segmentos(self.carpeta)
+        self._numero = max([n for n, _ in existentes] + [self._numero]) + 1
+        self._ruta = os.path.join(self.carpeta, nombre_segmento(self._numero))
+        self._fd = os.open(self._ruta, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            os.posix_fallocate(self._fd, 0, self.tamano_segmento) # Bloques reservados de una vez
+        except (AttributeError, OSError):
+            os.ftruncate(self._fd, self.tamano_segmento)
+        self._mapa = mmap.mmap(self._fd, self.tamano_segmento)
+        if self._corrida is None:
+            self._corrida = self._numero
+        ENCABEZADO.pack_into(self._mapa, 0, MAGIA, VERSION, REGISTRO.size, 0, time.time(), self.backend.ahora(),
+                             self._corrida)
+        self._n = 0
+        if self.segmentos_max:
+            for _, viejo in existentes[:max(0, len(existentes) + 1 - self.segmentos_max)]:
+                os.remove(viejo)
+
+    def _cerrar_segmento(self, recortar=False):
+        if self._mapa is None:
+            return
+        self._mapa.flush()
+        self._mapa.close()
+        self._mapa = None
+        if recortar: # El último segmento queda del tamaño de lo grabado
+            os.ftruncate(self._fd, ENCABEZADO.size + self._n * REGISTRO.size)
+        os.close(self._fd)
+        self._fd = None
+
+    # --- Camino rápido (cualquier carril) ---
+
+    def agregar(self, celda, t, valor):
+        with self._lock:
+            if self._mapa is None:
+                return
+            if self._n == self.capacidad:
+                self._cerrar_segmento()
+                self._abrir_segmento()
+            REGISTRO.pack_into(self._mapa, ENCABEZADO.size + self._n * REGISTRO.size, t, valor, celda)
+            self._n += 1
+            CUENTA.pack_into(self._mapa, OFFSET_CUENTA, self._n)
+            self.muestras += 1
+
+    def agregar_varias(self, celda, datos):
+        """datos: [(t, valor), ...] (lo que devuelve el buffer de la celda)."""
+        for t, valor in datos:
+            self.agregar(celda, t, valor)
+
+    # --- Ciclo de vida ---
+
+    def describir(self, celdas):
+        """
+        Guarda pines, offset y factor de cada celda para esta corrida (para
+        convertir a gramos al repetir). Las de corridas anteriores se
+        conservan mientras quede algún segmento suyo.
+        """
+        datos = {str(i): {'dt': c.pin_dt, 'sck': c.pin_sck, 'ganancia': c.ganancia, 'offset': c.offset,
+                          'factor': c.factor_escala}
+                 for i, c in enumerate(celdas)}
+        ruta = os.path.join(self.carpeta, ARCHIVO_CELDAS)
+        try:
+            with open(ruta) as f:
+                guardadas = json.load(f).get('corridas', {})
+        except (FileNotFoundError, ValueError):
+            guardadas = {}
+        numeros = [n for n, _ in segmentos(self.carpeta)]
+        if numeros:
+            # La corrida del segmento más viejo es la mayor que empezó antes que él
+            vigentes = [int(k) for k in guardadas if int(k) <= numeros[0]]
+            desde = max(vigentes) if vigentes else numeros[0]
+            guardadas = {k: v for k, v in guardadas.items() if int(k) >= desde}
+        guardadas[str(self._corrida)] = {'celdas': datos, 't': time.time()}
+        temporal = ruta + ".tmp"
+        with open(temporal, 'w') as f:
+            json.dump({'corridas': guardadas}, f, indent=2)
+        os.replace(temporal, ruta)
+
+    def iniciar(self):
+        os.makedirs(self.carpeta, exist_ok=True)
+        with self._lock:
+            self._abrir_segmento()
+        print(f"[Trazas] Grabando muestras crudas en {self._ruta} "
+              f"({self.capacidad} muestras por segmento).")
+
+    def detener(self):
+        with self._lock:
+            self._cerrar_segmento(recortar=True)
+
+
+# --- Lectura (numpy.memmap, sin parsear) ---
+
+def leer_encabezado(ruta):
+    """(registros, hora de pared, hora monotónica, corrida) del segmento, o None.
+    La corrida es None en los de la versión 1."""
+    with open(ruta, 'rb') as f:
+        datos = f.read(ENCABEZADO.size)
+    if len(datos) < ENCABEZADO.size:
+        return None
+    magia, version, tamano_registro, n, pared, mono, corrida = ENCABEZADO.unpack(datos)
+    if magia != MAGIA or version not in (1, VERSION) or tamano_registro != REGISTRO.size:
+        return None
+    return n, pared, mono, (corrida if version >= 2 else None)
+
+
+def leer_segmento(ruta):
+    """Registros del segmento como arreglo estructurado (DTYPE) mapeado en memoria."""
+    if np is None:
+        raise ImportError("Leer trazas necesita numpy (pip install numpy).")
+    encabezado = leer_encabezado(ruta)
+    if encabezado is None:
+        return np.zeros(0, dtype=DTYPE)
+    n = min(encabezado[0], (os.path.getsize(ruta) - ENCABEZADO.size) // DTYPE.itemsize)
+    if n == 0:
+        return np.zeros(0, dtype=DTYPE)
+    return np.memmap(ruta, dtype=DTYPE, mode='r', offset=ENCABEZADO.size, shape=(n,))
+
+
+def leer_trazas(carpeta):
+    """Los segmentos de 'carpeta' (del más viejo al más nuevo), mapeados."""
+    return [leer_segmento(ruta) for _, ruta in segmentos(carpeta)]
+
+
+def leer_corridas(carpeta):
+    """
+    [(corrida, desfase, registros)] en orden. 't' de los registros es del
+    reloj monotónico de su arranque; t + desfase los pone en una sola línea
+    de tiempo (la hora de pared al abrir la corrida). Si la hora de pared
+    estaba atrasada (una Pi sin reloj antes del NTP), la corrida se corre
+    para empezar después de la anterior: el número de segmento manda.
+    """
+    corridas = []
+    for numero, ruta in segmentos(carpeta):
+        encabezado = leer_encabezado(ruta)
+        if encabezado is None:
+            continue
+        _, pared, mono, corrida = encabezado
+        if corrida is None: # Versión 1: corrida nueva cuando el reloj monotónico vuelve atrás
+            nueva = not corridas or mono < corridas[-1]['ultimo']
+            corrida = numero if nueva else corridas[-1]['corrida']
+        if not corridas or corridas[-1]['corrida'] != corrida:
+            corridas.append({'corrida': corrida, 'pared': pared, 'mono': mono, 'ultimo': mono, 'partes': []})
+        registros = leer_segmento(ruta)
+        if len(registros):
+            corridas[-1]['partes'].append(registros)
+            corridas[-1]['ultimo'] = max(corridas[-1]['ultimo'], float(registros['t'].max()))
+
+    resultado, fin_anterior = [], None
+    for c in corridas:
+        desfase = c['pared'] - c['mono']
+        if fin_anterior is not None and c['mono'] + desfase < fin_anterior:
+            desfase = fin_anterior - c['mono']
+        fin_anterior = c['ultimo'] + desfase
+        registros = np.concatenate(c['partes']) if c['partes'] else np.zeros(0, dtype=DTYPE)
+        resultado.append((c['corrida'], desfase, registros))
+    return resultado
+
+
+def muestras_por_celda(carpeta):
+    """
+    {celda: (t, valor, corrida)} con todos los segmentos: t en la línea de
+    tiempo común (ver leer_corridas), ordenado; corrida de cada muestra.
+    """
+    if np is None:
+        raise ImportError("Leer trazas necesita numpy (pip install numpy).")
+    partes = [(corrida, desfase, r) for corrida, desfase, r in leer_corridas(carpeta) if len(r)]
+    if not partes:
+        return {}
+    resultado = {}
+    for celda in np.unique(np.concatenate([r['celda'] for _, _, r in partes])):
+        tiempos, valores, corridas = [], [], []
+        for corrida, desfase, registros in partes: # Las corridas no se solapan
+            propios = registros[registros['celda'] == celda]
+            orden = np.argsort(propios['t'], kind='stable')
+            tiempos.append(propios['t'][orden] + desfase)
+            valores.append(propios['valor'][orden].astype(np.float64))
+            corridas.append(np.full(len(propios), corrida, dtype=np.int64))
+        resultado[int(celda)] = (np.concatenate(tiempos), np.concatenate(valores), np.concatenate(corridas))
+    return resultado
+
+
+def leer_celdas(carpeta):
+    """
+    Lo que guardó describir(): {corrida: {celda: datos}} ({} si no hay).
+    Un celdas.json viejo (sin corridas) queda como corrida 0.
+    """
+    try:
+        with open(os.path.join(carpeta, ARCHIVO_CELDAS)) as f:
+            datos = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if 'corridas' not in datos:
+        datos = {'corridas': {"0": datos}}
+    return {int(corrida): {int(k): v for k, v in d.get('celdas', {}).items()}
+            for corrida, d in datos['corridas'].items()}
+
+
+def celdas_de_corrida(descripcion, corrida):
+    """Las celdas descritas para 'corrida' (o la última anterior que haya; si no, la primera)."""
+    if not descripcion:
+        return {}
+    anteriores = [c for c in descripcion if c <= corrida]
+    return descripcion[max(anteriores) if anteriores else min(descripcion)]
+
+
+if __name__ == "__main__":
+    # Uso:  python3 trazas.py [carpeta]   (resumen de lo grabado)
+    import sys
+    carpeta = sys.argv[1] if len(sys.argv) > 1 else "trazas"
+    segs = segmentos(carpeta)
+    print(f"{len(segs)} segmentos en {carpeta}.")
+    for corrida, desfase, registros in leer_corridas(carpeta):
+        if len(registros):
+            inicio = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(registros['t'].min() + desfase))
+            print(f"  corrida {corrida}: desde {inicio}, {len(registros)} muestras")
+    for celda, (t, valor, _) in sorted(muestras_por_celda(carpeta).items()):
+        duracion = t[-1] - t[0] if len(t) > 1 else 0.0
+        print(f"  celda {celda}: {len(t)} muestras en {duracion / 3600:.2f} h "
+              f"({len(t) / duracion if duracion else 0:.1f} muestras/s), crudo "
+              f"{valor.min():.0f} .. {valor.max():.0f}")